@@ -3,8 +3,12 @@
 -- do PostgreSQL é iniciado. Ele cria a estrutura completa do banco de dados
 -- para a Parte 2 do projeto e insere alguns dados de exemplo.
 
+-- Extensão de trigramas, usada pela busca de produtos por substring e com tolerância a erros de digitação.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- Limpa tabelas existentes se elas existirem, para garantir um recomeço limpo.
-DROP TABLE IF EXISTS ITEM_PEDIDO, PEDIDO, FUNCIONARIO, CLIENTE_TELEFONE, CLIENTE, ENDERECO_CEP, PRODUTO CASCADE;
+DROP SCHEMA IF EXISTS arquivo CASCADE;
+DROP TABLE IF EXISTS RESERVA_ESTOQUE, ESTOQUE_RELAMPAGO, RESUMO_ESTOQUE, PRODUTO_EXCLUIDO, RESUMO_VENDAS_DIARIO, RESUMO_PEDIDOS_DIARIO, PEDIDO_ARQUIVADO, ITEM_PEDIDO, PEDIDO, FUNCIONARIO, CLIENTE_TELEFONE, CLIENTE, ENDERECO_CEP, PRODUTO CASCADE;
 
 -- Tabela PRODUTO (Entidade principal da loja)
 CREATE TABLE PRODUTO (
@@ -16,9 +20,19 @@ CREATE TABLE PRODUTO (
     categoria VARCHAR(50) NOT NULL,
     fabricado_em_mari BOOLEAN NOT NULL,
     imagem VARCHAR(255),
+    -- Ponto de reposição: com o estoque abaixo dele, o produto aparece em "estoque baixo".
+    estoque_minimo INTEGER NOT NULL DEFAULT 5,
+    -- Versão da linha: id da última transação que a alterou (ver "Sincronização incremental").
+    versao BIGINT NOT NULL DEFAULT 0,
+    -- Documento de busca textual (nome com peso A, descrição com peso B), mantido pelo próprio PostgreSQL.
+    busca_tsv TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('portuguese', coalesce(nome, '')), 'A') ||
+        setweight(to_tsvector('portuguese', coalesce(descricao, '')), 'B')
+    ) STORED,
     CONSTRAINT pk_produto PRIMARY KEY (id_produto),
     CONSTRAINT ck_produto_preco CHECK (preco > 0),
-    CONSTRAINT ck_produto_estoque CHECK (quantidade_estoque >= 0)
+    CONSTRAINT ck_produto_estoque CHECK (quantidade_estoque >= 0),
+    CONSTRAINT ck_produto_estoque_minimo CHECK (estoque_minimo >= 0)
 );
 
 -- Tabela ENDERECO_CEP (Criada para atender a 3ª Forma Normal)
@@ -65,30 +79,57 @@ CREATE TABLE FUNCIONARIO (
     CONSTRAINT pk_funcionario PRIMARY KEY (id_funcionario)
 );
 
--- Tabela PEDIDO
+-- Tabela PEDIDO, particionada por mês de data_pedido (ver "Partições de PEDIDO e
+-- ITEM_PEDIDO" mais abaixo). O particionamento exige data_pedido na chave primária;
+-- id_pedido continua único porque vem sempre da mesma sequência.
 CREATE TABLE PEDIDO (
     id_pedido SERIAL NOT NULL,
-    data_pedido TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    data_pedido TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
     forma_pagamento VARCHAR(50) NOT NULL,
     status_pagamento VARCHAR(50) NOT NULL,
     valor_total NUMERIC(10, 2) NOT NULL,
     id_cliente INTEGER NOT NULL,
     id_funcionario INTEGER NOT NULL,
-    CONSTRAINT pk_pedido PRIMARY KEY (id_pedido),
+    CONSTRAINT pk_pedido PRIMARY KEY (id_pedido, data_pedido),
     CONSTRAINT fk_pedido_cliente FOREIGN KEY (id_cliente) REFERENCES CLIENTE(id_cliente),
     CONSTRAINT fk_pedido_funcionario FOREIGN KEY (id_funcionario) REFERENCES FUNCIONARIO(id_funcionario)
-);
+) PARTITION BY RANGE (data_pedido);
 
 -- Tabela ITEM_PEDIDO (Entidade Associativa)
+-- Guarda uma cópia da data do pedido para ser particionada do mesmo jeito: os itens de
+-- um mês ficam na partição do mesmo mês e saem junto com os pedidos no arquivamento.
 CREATE TABLE ITEM_PEDIDO (
     id_pedido INTEGER NOT NULL,
+    data_pedido TIMESTAMP WITH TIME ZONE NOT NULL,
     id_produto INTEGER NOT NULL,
     quantidade INTEGER NOT NULL,
     preco_unitario_na_venda NUMERIC(10, 2) NOT NULL,
-    CONSTRAINT pk_item_pedido PRIMARY KEY (id_pedido, id_produto),
-    CONSTRAINT fk_item_pedido_pedido FOREIGN KEY (id_pedido) REFERENCES PEDIDO(id_pedido) ON DELETE CASCADE,
+    CONSTRAINT pk_item_pedido PRIMARY KEY (id_pedido, id_produto, data_pedido),
+    CONSTRAINT fk_item_pedido_pedido FOREIGN KEY (id_pedido, data_pedido) REFERENCES PEDIDO(id_pedido, data_pedido) ON DELETE CASCADE,
     CONSTRAINT fk_item_pedido_produto FOREIGN KEY (id_produto) REFERENCES PRODUTO(id_produto)
-);
+) PARTITION BY RANGE (data_pedido);
+
+-- Índices do catálogo paginado (GET /api/produtos)
+-- Cada ordenação usa um índice (coluna, id_produto) para a paginação por cursor (keyset),
+-- e as variantes com categoria na frente atendem o filtro por categoria e as facetas.
+CREATE INDEX IF NOT EXISTS idx_produto_nome_id ON PRODUTO (nome, id_produto);
+CREATE INDEX IF NOT EXISTS idx_produto_preco_id ON PRODUTO (preco, id_produto);
+CREATE INDEX IF NOT EXISTS idx_produto_categoria_nome_id ON PRODUTO (categoria, nome, id_produto);
+CREATE INDEX IF NOT EXISTS idx_produto_categoria_preco_id ON PRODUTO (categoria, preco, id_produto);
+
+-- Índices da busca de produtos (GET /api/produtos/buscar e /api/produtos/autocomplete)
+-- Full-text em português sobre nome + descrição, trigramas para substring/erros de digitação
+-- e um índice de prefixo para o autocomplete.
+CREATE INDEX IF NOT EXISTS idx_produto_busca_tsv ON PRODUTO USING GIN (busca_tsv);
+CREATE INDEX IF NOT EXISTS idx_produto_nome_trgm ON PRODUTO USING GIN (nome gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_produto_nome_prefixo ON PRODUTO (lower(nome) text_pattern_ops);
+
+-- Índice por data do pedido (reconstrução dos resumos de vendas por período)
+CREATE INDEX IF NOT EXISTS idx_pedido_data ON PEDIDO (data_pedido);
+
+-- Índice do histórico de pedidos do cliente (GET /api/pedidos/historico), na mesma
+-- ordem da paginação por cursor: cada página é uma leitura contínua do índice.
+CREATE INDEX IF NOT EXISTS idx_pedido_cliente_data_id ON PEDIDO (id_cliente, data_pedido DESC, id_pedido DESC);
 
 
 -- Inserção de dados iniciais (seed data)
@@ -114,12 +155,20 @@ SELECT
     (ip.quantidade * ip.preco_unitario_na_venda) AS subtotal
 FROM PEDIDO p
 JOIN FUNCIONARIO f ON p.id_funcionario = f.id_funcionario
-JOIN ITEM_PEDIDO ip ON p.id_pedido = ip.id_pedido
+JOIN ITEM_PEDIDO ip ON p.id_pedido = ip.id_pedido AND p.data_pedido = ip.data_pedido
 JOIN PRODUTO prod ON ip.id_produto = prod.id_produto;
 
--- Adicione ao final do arquivo init.sql
-
--- Stored Procedure para criar um pedido completo de forma atômica
+-- Stored Procedure para criar um pedido completo de forma atômica.
+-- Trabalha com o carrinho inteiro de uma vez (sem laço item a item):
+--   1. consolida os itens (ids repetidos têm as quantidades somadas);
+--   2. trava todos os produtos do carrinho em um único SELECT ... FOR UPDATE, sempre
+--      em ordem de id_produto, de modo que dois carrinhos concorrentes com produtos em
+--      comum esperam um pelo outro em vez de entrarem em deadlock;
+--   3. valida existência e estoque, insere os itens em lote e baixa o estoque com um
+--      único UPDATE ... FROM;
+--   4. devolve o id do novo pedido no parâmetro INOUT (retornado pelo CALL).
+-- Produtos em venda relâmpago ficam de fora: eles só são vendidos por reserva
+-- (ver "Venda relâmpago" no fim do arquivo).
 CREATE OR REPLACE PROCEDURE criar_pedido_completo(
     p_id_cliente INTEGER,
     p_id_funcionario INTEGER,
@@ -130,53 +179,1006 @@ CREATE OR REPLACE PROCEDURE criar_pedido_completo(
 LANGUAGE plpgsql
 AS $$
 DECLARE
-    item RECORD;
-    produto_info RECORD;
-    valor_total_calculado NUMERIC(10, 2) := 0;
+    v_ids INTEGER[];
+    v_quantidades INTEGER[];
+    problema RECORD;
+    valor_total_calculado NUMERIC(10, 2);
     tem_desconto BOOLEAN;
+    v_data_pedido TIMESTAMPTZ;
 BEGIN
-    -- 1. Verifica se o cliente tem direito a desconto
-    SELECT (torce_flamengo OR assiste_one_piece OR natural_de_sousa)
-    INTO tem_desconto
-    FROM CLIENTE WHERE id_cliente = p_id_cliente;
+    -- 1. Consolida o carrinho em dois arrays paralelos, já ordenados por id_produto
+    SELECT array_agg(id_produto ORDER BY id_produto), array_agg(quantidade ORDER BY id_produto)
+    INTO v_ids, v_quantidades
+    FROM (
+        SELECT id_produto, SUM(quantidade)::INTEGER AS quantidade
+        FROM json_to_recordset(p_itens) AS x(id_produto INTEGER, quantidade INTEGER)
+        GROUP BY id_produto
+    ) carrinho;
 
-    -- 2. Loop para verificar estoque e calcular o subtotal
-    FOR item IN SELECT * FROM json_to_recordset(p_itens) AS x(id_produto INTEGER, quantidade INTEGER)
-    LOOP
-        -- Trava a linha do produto para evitar condições de corrida
-        SELECT preco, quantidade_estoque, nome INTO produto_info FROM PRODUTO WHERE id_produto = item.id_produto FOR UPDATE;
+    IF v_ids IS NULL THEN
+        RAISE EXCEPTION 'O pedido não possui itens.';
+    END IF;
+    IF EXISTS (SELECT 1 FROM unnest(v_ids, v_quantidades) AS i(id_produto, quantidade)
+               WHERE i.id_produto IS NULL OR i.quantidade IS NULL OR i.quantidade <= 0) THEN
+        RAISE EXCEPTION 'Itens do pedido inválidos: informe id_produto e quantidade positiva.';
+    END IF;
 
-        IF produto_info IS NULL THEN
-            RAISE EXCEPTION 'Produto com ID % não encontrado.', item.id_produto;
-        END IF;
+    -- 2. Trava todas as linhas de uma vez, em ordem crescente de id (ordem global => sem deadlock)
+    PERFORM 1 FROM PRODUTO WHERE id_produto = ANY(v_ids) ORDER BY id_produto FOR UPDATE;
+
+    -- Produtos em venda relâmpago só saem por reserva. A verificação vem depois da trava:
+    -- abrir_venda_relampago trava a mesma linha, então uma venda aberta enquanto este
+    -- pedido esperava já aparece aqui (cada comando vê o que foi confirmado antes dele).
+    SELECT p.nome INTO problema
+    FROM ESTOQUE_RELAMPAGO e
+    JOIN PRODUTO p ON p.id_produto = e.id_produto
+    WHERE e.id_produto = ANY(v_ids)
+    LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Produto em venda relâmpago: reserve o estoque antes de finalizar a compra (%).', problema.nome;
+    END IF;
 
-        IF produto_info.quantidade_estoque < item.quantidade THEN
-            RAISE EXCEPTION 'Estoque insuficiente para o produto: %', produto_info.nome;
+    -- 3. Valida existência e estoque de todos os itens com uma única consulta
+    SELECT i.id_produto, p.nome
+    INTO problema
+    FROM unnest(v_ids, v_quantidades) AS i(id_produto, quantidade)
+    LEFT JOIN PRODUTO p ON p.id_produto = i.id_produto
+    WHERE p.id_produto IS NULL OR p.quantidade_estoque < i.quantidade
+    ORDER BY i.id_produto
+    LIMIT 1;
+
+    IF FOUND THEN
+        IF problema.nome IS NULL THEN
+            RAISE EXCEPTION 'Produto com ID % não encontrado.', problema.id_produto;
         END IF;
+        RAISE EXCEPTION 'Estoque insuficiente para o produto: %', problema.nome;
+    END IF;
 
-        valor_total_calculado := valor_total_calculado + (produto_info.preco * item.quantidade);
-    END LOOP;
+    -- 4. Calcula o total e aplica o desconto, se houver
+    SELECT SUM(p.preco * i.quantidade)
+    INTO valor_total_calculado
+    FROM unnest(v_ids, v_quantidades) AS i(id_produto, quantidade)
+    JOIN PRODUTO p ON p.id_produto = i.id_produto;
+
+    SELECT (torce_flamengo OR assiste_one_piece OR natural_de_sousa)
+    INTO tem_desconto
+    FROM CLIENTE WHERE id_cliente = p_id_cliente;
 
-    -- 3. Aplica o desconto, se houver
     IF tem_desconto THEN
         valor_total_calculado := valor_total_calculado * 0.90;
     END IF;
 
-    -- 4. Insere o pedido na tabela principal
+    -- 5. Insere o pedido e todos os seus itens (com o preço no momento da venda)
     INSERT INTO PEDIDO (id_cliente, id_funcionario, forma_pagamento, status_pagamento, valor_total)
     VALUES (p_id_cliente, p_id_funcionario, p_forma_pagamento, 'Pagamento Aprovado', valor_total_calculado)
-    RETURNING id_pedido INTO p_novo_pedido_id;
+    RETURNING id_pedido, data_pedido INTO p_novo_pedido_id, v_data_pedido;
+
+    INSERT INTO ITEM_PEDIDO (id_pedido, data_pedido, id_produto, quantidade, preco_unitario_na_venda)
+    SELECT p_novo_pedido_id, v_data_pedido, i.id_produto, i.quantidade, p.preco
+    FROM unnest(v_ids, v_quantidades) AS i(id_produto, quantidade)
+    JOIN PRODUTO p ON p.id_produto = i.id_produto;
+
+    -- 6. Baixa o estoque de todos os produtos com um único UPDATE
+    UPDATE PRODUTO p
+    SET quantidade_estoque = p.quantidade_estoque - i.quantidade
+    FROM unnest(v_ids, v_quantidades) AS i(id_produto, quantidade)
+    WHERE p.id_produto = i.id_produto;
+END;
+$$;
+
+-- =====================================================================
+-- Resumos de vendas (rollups) para os relatórios
+-- =====================================================================
+-- Os relatórios de vendas leem destas tabelas em vez de varrer a VIEW
+-- V_VENDAS_DETALHADAS; elas são mantidas por triggers a cada pedido gravado
+-- e podem ser recalculadas com reconstruir_resumo_vendas() (ou com o comando
+-- "flask reconstruir-resumo-vendas").
+
+-- Dia "comercial" da loja: a data do pedido no fuso de Brasília.
+CREATE OR REPLACE FUNCTION dia_venda(p_momento TIMESTAMPTZ) RETURNS DATE
+LANGUAGE sql IMMUTABLE
+AS $$ SELECT (p_momento AT TIME ZONE 'America/Sao_Paulo')::DATE $$;
+
+-- Vendas por dia, vendedor e produto.
+-- "pedidos" conta os pedidos que contêm o produto (cada par pedido/produto é único).
+CREATE TABLE RESUMO_VENDAS_DIARIO (
+    dia DATE NOT NULL,
+    id_funcionario INTEGER NOT NULL,
+    id_produto INTEGER NOT NULL,
+    quantidade BIGINT NOT NULL DEFAULT 0,
+    valor_vendido NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    pedidos INTEGER NOT NULL DEFAULT 0,
+    CONSTRAINT pk_resumo_vendas_diario PRIMARY KEY (dia, id_funcionario, id_produto)
+);
+
+-- Quantidade de pedidos por dia e vendedor. O contador é dividido em 16 "fatias"
+-- (id_pedido % 16) para que checkouts simultâneos do mesmo vendedor não disputem
+-- a mesma linha; os relatórios somam as fatias.
+CREATE TABLE RESUMO_PEDIDOS_DIARIO (
+    dia DATE NOT NULL,
+    id_funcionario INTEGER NOT NULL,
+    fatia SMALLINT NOT NULL,
+    pedidos INTEGER NOT NULL DEFAULT 0,
+    CONSTRAINT pk_resumo_pedidos_diario PRIMARY KEY (dia, id_funcionario, fatia)
+);
+
+-- Soma os itens recém-inseridos (uma vez por comando, não por linha).
+CREATE OR REPLACE FUNCTION resumo_vendas_itens_inseridos() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO RESUMO_VENDAS_DIARIO AS r (dia, id_funcionario, id_produto, quantidade, valor_vendido, pedidos)
+    SELECT dia_venda(p.data_pedido), p.id_funcionario, n.id_produto,
+           SUM(n.quantidade), SUM(n.quantidade * n.preco_unitario_na_venda), COUNT(*)
+    FROM novos_itens n
+    JOIN PEDIDO p ON p.id_pedido = n.id_pedido AND p.data_pedido = n.data_pedido
+    GROUP BY 1, 2, 3
+    ORDER BY 1, 2, 3
+    ON CONFLICT (dia, id_funcionario, id_produto) DO UPDATE
+    SET quantidade = r.quantidade + EXCLUDED.quantidade,
+        valor_vendido = r.valor_vendido + EXCLUDED.valor_vendido,
+        pedidos = r.pedidos + EXCLUDED.pedidos;
+    RETURN NULL;
+END;
+$$;
+
+-- Desconta itens removidos diretamente. Quando o pedido inteiro é excluído, o PEDIDO já
+-- não existe aqui (a exclusão em cascata vem depois) e quem desconta é resumo_vendas_pedido_excluido.
+CREATE OR REPLACE FUNCTION resumo_vendas_itens_excluidos() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE RESUMO_VENDAS_DIARIO r
+    SET quantidade = r.quantidade - d.quantidade,
+        valor_vendido = r.valor_vendido - d.valor,
+        pedidos = r.pedidos - d.pedidos
+    FROM (
+        SELECT dia_venda(p.data_pedido) AS dia, p.id_funcionario, e.id_produto,
+               SUM(e.quantidade) AS quantidade, SUM(e.quantidade * e.preco_unitario_na_venda) AS valor, COUNT(*) AS pedidos
+        FROM itens_excluidos e
+        JOIN PEDIDO p ON p.id_pedido = e.id_pedido AND p.data_pedido = e.data_pedido
+        GROUP BY 1, 2, 3
+    ) d
+    WHERE r.dia = d.dia AND r.id_funcionario = d.id_funcionario AND r.id_produto = d.id_produto;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION resumo_vendas_pedidos_inseridos() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO RESUMO_PEDIDOS_DIARIO AS r (dia, id_funcionario, fatia, pedidos)
+    SELECT dia_venda(data_pedido), id_funcionario, (id_pedido % 16)::SMALLINT, COUNT(*)
+    FROM novos_pedidos
+    GROUP BY 1, 2, 3
+    ORDER BY 1, 2, 3
+    ON CONFLICT (dia, id_funcionario, fatia) DO UPDATE
+    SET pedidos = r.pedidos + EXCLUDED.pedidos;
+    RETURN NULL;
+END;
+$$;
+
+-- Antes de excluir um pedido (os itens ainda existem), desconta o pedido e todos os seus itens.
+CREATE OR REPLACE FUNCTION resumo_vendas_pedido_excluido() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE RESUMO_PEDIDOS_DIARIO
+    SET pedidos = pedidos - 1
+    WHERE dia = dia_venda(OLD.data_pedido) AND id_funcionario = OLD.id_funcionario AND fatia = OLD.id_pedido % 16;
 
-    -- 5. Loop para inserir os itens do pedido e atualizar o estoque
-    FOR item IN SELECT * FROM json_to_recordset(p_itens) AS x(id_produto INTEGER, quantidade INTEGER)
+    UPDATE RESUMO_VENDAS_DIARIO r
+    SET quantidade = r.quantidade - i.quantidade,
+        valor_vendido = r.valor_vendido - i.quantidade * i.preco_unitario_na_venda,
+        pedidos = r.pedidos - 1
+    FROM ITEM_PEDIDO i
+    WHERE i.id_pedido = OLD.id_pedido AND i.data_pedido = OLD.data_pedido
+      AND r.dia = dia_venda(OLD.data_pedido) AND r.id_funcionario = OLD.id_funcionario AND r.id_produto = i.id_produto;
+    RETURN OLD;
+END;
+$$;
+
+CREATE TRIGGER trg_resumo_vendas_itens_inseridos
+AFTER INSERT ON ITEM_PEDIDO
+REFERENCING NEW TABLE AS novos_itens
+FOR EACH STATEMENT EXECUTE FUNCTION resumo_vendas_itens_inseridos();
+
+CREATE TRIGGER trg_resumo_vendas_itens_excluidos
+AFTER DELETE ON ITEM_PEDIDO
+REFERENCING OLD TABLE AS itens_excluidos
+FOR EACH STATEMENT EXECUTE FUNCTION resumo_vendas_itens_excluidos();
+
+CREATE TRIGGER trg_resumo_vendas_pedidos_inseridos
+AFTER INSERT ON PEDIDO
+REFERENCING NEW TABLE AS novos_pedidos
+FOR EACH STATEMENT EXECUTE FUNCTION resumo_vendas_pedidos_inseridos();
+
+CREATE TRIGGER trg_resumo_vendas_pedido_excluido
+BEFORE DELETE ON PEDIDO
+FOR EACH ROW EXECUTE FUNCTION resumo_vendas_pedido_excluido();
+
+-- Recalcula os resumos a partir de PEDIDO/ITEM_PEDIDO para um intervalo de dias
+-- (NULL = sem limite). Usada na carga inicial (backfill) e para corrigir os resumos
+-- após alterações manuais nos pedidos. Devolve o número de linhas de vendas geradas.
+-- Os meses já arquivados (PEDIDO_ARQUIVADO) não estão mais em PEDIDO e ficam de fora:
+-- os resumos deles são a única cópia agregada e não são apagados.
+CREATE OR REPLACE FUNCTION reconstruir_resumo_vendas(p_inicio DATE DEFAULT NULL, p_fim DATE DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_dia_inicio DATE := coalesce(p_inicio, '-infinity'::DATE);
+    v_dia_fim DATE := coalesce(p_fim, 'infinity'::DATE);
+    v_de TIMESTAMPTZ := CASE WHEN p_inicio IS NULL THEN '-infinity'::TIMESTAMPTZ
+                             ELSE p_inicio::TIMESTAMP AT TIME ZONE 'America/Sao_Paulo' END;
+    v_ate TIMESTAMPTZ := CASE WHEN p_fim IS NULL THEN 'infinity'::TIMESTAMPTZ
+                              ELSE (p_fim + 1)::TIMESTAMP AT TIME ZONE 'America/Sao_Paulo' END;
+    v_fim_arquivo DATE;
+    linhas INTEGER;
+BEGIN
+    SELECT (max(mes) + INTERVAL '1 month')::DATE INTO v_fim_arquivo FROM PEDIDO_ARQUIVADO;
+    IF v_fim_arquivo > v_dia_inicio THEN
+        v_dia_inicio := v_fim_arquivo;
+        v_de := v_fim_arquivo::TIMESTAMP AT TIME ZONE 'America/Sao_Paulo';
+    END IF;
+
+    -- Bloqueia escritas nos resumos: pedidos em andamento terminam antes, e os novos
+    -- esperam a reconstrução acabar para somar sobre o resultado dela.
+    LOCK TABLE RESUMO_VENDAS_DIARIO, RESUMO_PEDIDOS_DIARIO IN EXCLUSIVE MODE;
+
+    DELETE FROM RESUMO_VENDAS_DIARIO WHERE dia BETWEEN v_dia_inicio AND v_dia_fim;
+    DELETE FROM RESUMO_PEDIDOS_DIARIO WHERE dia BETWEEN v_dia_inicio AND v_dia_fim;
+
+    INSERT INTO RESUMO_VENDAS_DIARIO (dia, id_funcionario, id_produto, quantidade, valor_vendido, pedidos)
+    SELECT dia_venda(p.data_pedido), p.id_funcionario, i.id_produto,
+           SUM(i.quantidade), SUM(i.quantidade * i.preco_unitario_na_venda), COUNT(*)
+    FROM PEDIDO p
+    JOIN ITEM_PEDIDO i ON i.id_pedido = p.id_pedido AND i.data_pedido = p.data_pedido
+    WHERE p.data_pedido >= v_de AND p.data_pedido < v_ate
+      AND i.data_pedido >= v_de AND i.data_pedido < v_ate  -- Repetido em ITEM_PEDIDO para podar as partições dele também
+    GROUP BY 1, 2, 3;
+    GET DIAGNOSTICS linhas = ROW_COUNT;
+
+    INSERT INTO RESUMO_PEDIDOS_DIARIO (dia, id_funcionario, fatia, pedidos)
+    SELECT dia_venda(data_pedido), id_funcionario, (id_pedido % 16)::SMALLINT, COUNT(*)
+    FROM PEDIDO
+    WHERE data_pedido >= v_de AND data_pedido < v_ate
+    GROUP BY 1, 2, 3;
+
+    RETURN linhas;
+END;
+$$;
+
+-- =====================================================================
+-- Partições de PEDIDO e ITEM_PEDIDO
+-- =====================================================================
+-- As duas tabelas são particionadas por mês de data_pedido, no fuso da loja (como os
+-- resumos): pedido_AAAA_MM e item_pedido_AAAA_MM. Consultas com intervalo de datas
+-- (reconstrução dos resumos, páginas seguintes do histórico) só leem os meses do
+-- intervalo. A manutenção (flask manter-particoes, ou a thread do backend) cria os
+-- meses seguintes antes de eles chegarem e arquiva os antigos, de modo que PEDIDO
+-- mantém um número fixo de meses e o custo das consultas não cresce com os anos.
+-- Não há partição DEFAULT: um pedido fora dos meses criados falha, em vez de cair
+-- numa partição que depois impediria a criação do mês dele.
+CREATE SCHEMA IF NOT EXISTS arquivo;
+
+-- Meses arquivados: as partições deles estão no schema "arquivo", sem chaves estrangeiras.
+CREATE TABLE PEDIDO_ARQUIVADO (
+    mes DATE NOT NULL,
+    pedidos BIGINT NOT NULL,
+    itens BIGINT NOT NULL,
+    bytes BIGINT,  -- Tamanho das duas tabelas, com índices, depois da compactação
+    arquivado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+    CONSTRAINT pk_pedido_arquivado PRIMARY KEY (mes)
+);
+
+-- Cria as partições dos meses de p_de até p_ate (inclusive) que ainda não existem,
+-- pulando os meses já arquivados. Devolve quantos meses foram criados.
+CREATE OR REPLACE FUNCTION criar_particoes_pedido(p_de DATE, p_ate DATE) RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_mes DATE := date_trunc('month', p_de)::DATE;
+    v_sufixo TEXT;
+    v_inicio TIMESTAMPTZ;
+    v_fim TIMESTAMPTZ;
+    criadas INTEGER := 0;
+BEGIN
+    -- Cada processo do backend roda a manutenção: um de cada vez.
+    PERFORM pg_advisory_xact_lock(hashtext('particoes_pedido'));
+    WHILE v_mes <= p_ate LOOP
+        v_sufixo := to_char(v_mes, 'YYYY_MM');
+        IF to_regclass('public.pedido_' || v_sufixo) IS NULL
+           AND NOT EXISTS (SELECT 1 FROM PEDIDO_ARQUIVADO WHERE mes = v_mes) THEN
+            v_inicio := v_mes::TIMESTAMP AT TIME ZONE 'America/Sao_Paulo';
+            v_fim := (v_mes + INTERVAL '1 month')::TIMESTAMP AT TIME ZONE 'America/Sao_Paulo';
+            EXECUTE format('CREATE TABLE %I PARTITION OF PEDIDO FOR VALUES FROM (%L) TO (%L)',
+                           'pedido_' || v_sufixo, v_inicio, v_fim);
+            EXECUTE format('CREATE TABLE %I PARTITION OF ITEM_PEDIDO FOR VALUES FROM (%L) TO (%L)',
+                           'item_pedido_' || v_sufixo, v_inicio, v_fim);
+            criadas := criadas + 1;
+        END IF;
+        v_mes := (v_mes + INTERVAL '1 month')::DATE;
+    END LOOP;
+    RETURN criadas;
+END;
+$$;
+
+-- Arquiva os meses anteriores a p_antes. Para cada mês:
+--   1. desanexa as partições de ITEM_PEDIDO e PEDIDO, tira as chaves estrangeiras
+--      (o arquivo é só leitura), move as tabelas para o schema "arquivo" e registra o
+--      mês em PEDIDO_ARQUIVADO, tudo na mesma transação;
+--   2. já fora de PEDIDO, compacta as tabelas: fillfactor 100 e CLUSTER (reescrita sem
+--      espaço morto, na ordem do cliente para as consultas ao arquivo).
+-- Cada passo confirma a sua transação: o DETACH trava PEDIDO/ITEM_PEDIDO só por um
+-- instante e a reescrita não bloqueia os pedidos novos. Os resumos de vendas dos meses
+-- arquivados continuam nos relatórios. Chame com CALL fora de uma transação; devolve
+-- quantos meses foram arquivados (0 se outro processo já estiver arquivando).
+CREATE OR REPLACE PROCEDURE arquivar_pedidos(p_antes DATE, INOUT p_arquivados INTEGER DEFAULT 0)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_mes DATE;
+    v_pedido TEXT;
+    v_item TEXT;
+    v_indice_cliente TEXT;
+    v_pedidos BIGINT;
+    v_itens BIGINT;
+BEGIN
+    p_arquivados := 0;
+    IF NOT pg_try_advisory_lock(hashtext('particoes_pedido')) THEN
+        RETURN;
+    END IF;
+    FOR v_mes IN
+        SELECT to_date(substr(c.relname, 8), 'YYYY_MM')
+        FROM pg_inherits h
+        JOIN pg_class c ON c.oid = h.inhrelid
+        WHERE h.inhparent = 'pedido'::REGCLASS AND c.relname ~ '^pedido_[0-9]{4}_[0-9]{2}$'
+          AND to_date(substr(c.relname, 8), 'YYYY_MM') < date_trunc('month', p_antes)
+        ORDER BY 1
     LOOP
-        -- Busca o preço no momento da venda para registrar no item_pedido
-        SELECT preco INTO produto_info FROM PRODUTO WHERE id_produto = item.id_produto;
+        v_pedido := 'pedido_' || to_char(v_mes, 'YYYY_MM');
+        v_item := 'item_pedido_' || to_char(v_mes, 'YYYY_MM');
+        SELECT c.relname INTO v_indice_cliente
+        FROM pg_inherits h
+        JOIN pg_class c ON c.oid = h.inhrelid
+        JOIN pg_index x ON x.indexrelid = c.oid
+        WHERE h.inhparent = 'idx_pedido_cliente_data_id'::REGCLASS AND x.indrelid = ('public.' || v_pedido)::REGCLASS;
+        EXECUTE format('SELECT count(*) FROM %I', v_pedido) INTO v_pedidos;
+        EXECUTE format('SELECT count(*) FROM %I', v_item) INTO v_itens;
+
+        EXECUTE format('ALTER TABLE ITEM_PEDIDO DETACH PARTITION %I', v_item);
+        EXECUTE format('ALTER TABLE %I DROP CONSTRAINT fk_item_pedido_pedido, DROP CONSTRAINT fk_item_pedido_produto', v_item);
+        EXECUTE format('ALTER TABLE PEDIDO DETACH PARTITION %I', v_pedido);
+        EXECUTE format('ALTER TABLE %I DROP CONSTRAINT fk_pedido_cliente, DROP CONSTRAINT fk_pedido_funcionario', v_pedido);
+        EXECUTE format('ALTER TABLE %I SET SCHEMA arquivo', v_item);
+        EXECUTE format('ALTER TABLE %I SET SCHEMA arquivo', v_pedido);
+        INSERT INTO PEDIDO_ARQUIVADO (mes, pedidos, itens) VALUES (v_mes, v_pedidos, v_itens);
+        COMMIT;
+
+        EXECUTE format('ALTER TABLE arquivo.%I SET (fillfactor = 100)', v_pedido);
+        EXECUTE format('ALTER TABLE arquivo.%I SET (fillfactor = 100)', v_item);
+        EXECUTE format('CLUSTER arquivo.%I USING %I', v_pedido, v_indice_cliente);
+        EXECUTE format('CLUSTER arquivo.%I USING %I', v_item, v_item || '_pkey');
+        UPDATE PEDIDO_ARQUIVADO
+        SET bytes = pg_total_relation_size(('arquivo.' || v_pedido)::REGCLASS)
+                  + pg_total_relation_size(('arquivo.' || v_item)::REGCLASS)
+        WHERE mes = v_mes;
+        COMMIT;
+        p_arquivados := p_arquivados + 1;
+    END LOOP;
+    PERFORM pg_advisory_unlock(hashtext('particoes_pedido'));
+END;
+$$;
+
+-- O mês atual e os três seguintes; a manutenção cria os próximos.
+SELECT criar_particoes_pedido(dia_venda(now()), (dia_venda(now()) + INTERVAL '3 months')::DATE);
+
+-- =====================================================================
+-- Feed de alterações do catálogo (LISTEN/NOTIFY)
+-- =====================================================================
+-- Cada comando que altera PRODUTO publica no canal 'produtos_alterados' eventos
+-- compactos: {"op": "I"|"U"|"D", "p": [[id_produto, estoque, preco, detalhes], ...]},
+-- em lotes de até 100 produtos ("detalhes" indica que nome, descrição, categoria,
+-- imagem ou origem mudaram e o produto precisa ser relido). Comandos que alteram
+-- mais de 1000 produtos (ex: importação em lote) publicam só {"op": "recarregar"}.
+-- O backend escuta o canal em uma única thread e repassa os eventos aos navegadores
+-- via SSE (/api/produtos/stream). As notificações só são entregues no COMMIT.
+CREATE OR REPLACE FUNCTION notificar_alteracoes_produto() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    total INTEGER;
+    itens JSON;
+    lote JSON;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        SELECT count(*) INTO total FROM produtos_antigos;
+    ELSE
+        SELECT count(*) INTO total FROM produtos_novos;
+    END IF;
+    IF total = 0 THEN
+        RETURN NULL;
+    ELSIF total > 1000 THEN
+        PERFORM pg_notify('produtos_alterados', '{"op":"recarregar"}');
+        RETURN NULL;
+    END IF;
 
-        INSERT INTO ITEM_PEDIDO (id_pedido, id_produto, quantidade, preco_unitario_na_venda)
-        VALUES (p_novo_pedido_id, item.id_produto, item.quantidade, produto_info.preco);
+    IF TG_OP = 'INSERT' THEN
+        SELECT json_agg(json_build_array(n.id_produto, n.quantidade_estoque, n.preco, TRUE) ORDER BY n.id_produto)
+        INTO itens FROM produtos_novos n;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT json_agg(json_build_array(
+                   n.id_produto, n.quantidade_estoque, n.preco,
+                   (n.nome, n.descricao, n.categoria, n.imagem, n.fabricado_em_mari)
+                       IS DISTINCT FROM (a.nome, a.descricao, a.categoria, a.imagem, a.fabricado_em_mari)
+               ) ORDER BY n.id_produto)
+        INTO itens
+        FROM produtos_novos n
+        JOIN produtos_antigos a ON a.id_produto = n.id_produto
+        -- Ignora UPDATEs que não mudaram nada visível no catálogo.
+        WHERE (n.quantidade_estoque, n.preco, n.nome, n.descricao, n.categoria, n.imagem, n.fabricado_em_mari)
+              IS DISTINCT FROM (a.quantidade_estoque, a.preco, a.nome, a.descricao, a.categoria, a.imagem, a.fabricado_em_mari);
+    ELSE
+        SELECT json_agg(json_build_array(a.id_produto, NULL, NULL, FALSE) ORDER BY a.id_produto)
+        INTO itens FROM produtos_antigos a;
+    END IF;
+    IF itens IS NULL THEN
+        RETURN NULL;
+    END IF;
 
-        UPDATE PRODUTO SET quantidade_estoque = quantidade_estoque - item.quantidade WHERE id_produto = item.id_produto;
+    FOR lote IN
+        SELECT json_agg(e ORDER BY i)
+        FROM json_array_elements(itens) WITH ORDINALITY AS t(e, i)
+        GROUP BY (i - 1) / 100
+        ORDER BY (i - 1) / 100
+    LOOP
+        PERFORM pg_notify('produtos_alterados', json_build_object('op', left(TG_OP, 1), 'p', lote)::TEXT);
     END LOOP;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_notificar_produtos_inseridos
+AFTER INSERT ON PRODUTO
+REFERENCING NEW TABLE AS produtos_novos
+FOR EACH STATEMENT EXECUTE FUNCTION notificar_alteracoes_produto();
+
+CREATE TRIGGER trg_notificar_produtos_alterados
+AFTER UPDATE ON PRODUTO
+REFERENCING OLD TABLE AS produtos_antigos NEW TABLE AS produtos_novos
+FOR EACH STATEMENT EXECUTE FUNCTION notificar_alteracoes_produto();
+
+CREATE TRIGGER trg_notificar_produtos_excluidos
+AFTER DELETE ON PRODUTO
+REFERENCING OLD TABLE AS produtos_antigos
+FOR EACH STATEMENT EXECUTE FUNCTION notificar_alteracoes_produto();
+
+-- =====================================================================
+-- Sincronização incremental do catálogo (GET /api/produtos/changes)
+-- =====================================================================
+-- Cada INSERT/UPDATE em PRODUTO grava em "versao" o id da transação (xid8, sempre
+-- crescente); exclusões deixam uma lápide em PRODUTO_EXCLUIDO com a mesma regra.
+-- Quem sincroniza pede "tudo com versao >= X" e recebe como próximo X o xmin do
+-- snapshot da consulta: transações com id menor já terminaram e estão no resultado,
+-- e as ainda abertas têm id >= xmin, então nada se perde (no máximo, repete).
+CREATE TABLE PRODUTO_EXCLUIDO (
+    id_produto INTEGER NOT NULL,
+    versao BIGINT NOT NULL,
+    excluido_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT pk_produto_excluido PRIMARY KEY (id_produto)
+);
+
+CREATE INDEX IF NOT EXISTS idx_produto_versao_id ON PRODUTO (versao, id_produto);
+CREATE INDEX IF NOT EXISTS idx_produto_excluido_versao_id ON PRODUTO_EXCLUIDO (versao, id_produto);
+
+CREATE OR REPLACE FUNCTION versao_atual() RETURNS BIGINT
+LANGUAGE sql VOLATILE
+AS $$ SELECT pg_current_xact_id()::TEXT::BIGINT $$;
+
+-- Atualiza a versão só quando algo visível no catálogo muda.
+CREATE OR REPLACE FUNCTION produto_versionar() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND (NEW.nome, NEW.descricao, NEW.preco, NEW.quantidade_estoque, NEW.categoria, NEW.fabricado_em_mari, NEW.imagem)
+           IS NOT DISTINCT FROM (OLD.nome, OLD.descricao, OLD.preco, OLD.quantidade_estoque, OLD.categoria, OLD.fabricado_em_mari, OLD.imagem) THEN
+        RETURN NEW;
+    END IF;
+    NEW.versao := versao_atual();
+    RETURN NEW;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION produto_lapides_excluidos() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO PRODUTO_EXCLUIDO AS e (id_produto, versao)
+    SELECT id_produto, versao_atual() FROM produtos_excluidos
+    ON CONFLICT (id_produto) DO UPDATE
+    SET versao = EXCLUDED.versao, excluido_em = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$;
+
+-- Um id reaproveitado (ex: importação com id explícito) deixa de ser lápide.
+CREATE OR REPLACE FUNCTION produto_lapides_reinseridos() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM PRODUTO_EXCLUIDO e USING produtos_reinseridos n WHERE e.id_produto = n.id_produto;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_produto_versionar
+BEFORE INSERT OR UPDATE ON PRODUTO
+FOR EACH ROW EXECUTE FUNCTION produto_versionar();
+
+CREATE TRIGGER trg_produto_lapides_excluidos
+AFTER DELETE ON PRODUTO
+REFERENCING OLD TABLE AS produtos_excluidos
+FOR EACH STATEMENT EXECUTE FUNCTION produto_lapides_excluidos();
+
+CREATE TRIGGER trg_produto_lapides_reinseridos
+AFTER INSERT ON PRODUTO
+REFERENCING NEW TABLE AS produtos_reinseridos
+FOR EACH STATEMENT EXECUTE FUNCTION produto_lapides_reinseridos();
+
+-- =====================================================================
+-- Resumo do estoque e produtos abaixo do ponto de reposição
+-- =====================================================================
+-- O relatório de estoque lê desta tabela em vez de agregar PRODUTO inteiro. Ela
+-- é mantida por triggers de comando (uma vez por INSERT/UPDATE/DELETE, com as
+-- tabelas de transição) e pode ser recalculada com reconstruir_resumo_estoque().
+-- Como no RESUMO_PEDIDOS_DIARIO, cada categoria é dividida em 16 "fatias"
+-- (id_produto % 16) para que checkouts simultâneos da mesma categoria não
+-- disputem a mesma linha; o relatório soma as fatias.
+CREATE TABLE RESUMO_ESTOQUE (
+    categoria VARCHAR(50) NOT NULL,
+    fatia SMALLINT NOT NULL,
+    produtos BIGINT NOT NULL DEFAULT 0,
+    unidades BIGINT NOT NULL DEFAULT 0,
+    valor NUMERIC(18, 2) NOT NULL DEFAULT 0,
+    abaixo_minimo BIGINT NOT NULL DEFAULT 0,
+    CONSTRAINT pk_resumo_estoque PRIMARY KEY (categoria, fatia)
+);
+
+-- Índice parcial com só os produtos abaixo do ponto de reposição: continua pequeno
+-- (e a listagem de estoque baixo rápida) independentemente do tamanho do catálogo.
+CREATE INDEX IF NOT EXISTS idx_produto_abaixo_minimo ON PRODUTO (quantidade_estoque, id_produto)
+WHERE quantidade_estoque < estoque_minimo;
+
+-- Soma as linhas novas e desconta as antigas em um único upsert. Cada ramo só
+-- referencia as tabelas de transição que existem para a operação do trigger.
+CREATE OR REPLACE FUNCTION resumo_estoque_aplicar() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO RESUMO_ESTOQUE AS r (categoria, fatia, produtos, unidades, valor, abaixo_minimo)
+        SELECT categoria, (id_produto % 16)::SMALLINT, COUNT(*), SUM(quantidade_estoque),
+               SUM(preco * quantidade_estoque), COUNT(*) FILTER (WHERE quantidade_estoque < estoque_minimo)
+        FROM produtos_novos
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+        ON CONFLICT (categoria, fatia) DO UPDATE
+        SET produtos = r.produtos + EXCLUDED.produtos,
+            unidades = r.unidades + EXCLUDED.unidades,
+            valor = r.valor + EXCLUDED.valor,
+            abaixo_minimo = r.abaixo_minimo + EXCLUDED.abaixo_minimo;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE RESUMO_ESTOQUE r
+        SET produtos = r.produtos - d.produtos,
+            unidades = r.unidades - d.unidades,
+            valor = r.valor - d.valor,
+            abaixo_minimo = r.abaixo_minimo - d.abaixo_minimo
+        FROM (
+            SELECT categoria, (id_produto % 16)::SMALLINT AS fatia, COUNT(*) AS produtos,
+                   SUM(quantidade_estoque) AS unidades, SUM(preco * quantidade_estoque) AS valor,
+                   COUNT(*) FILTER (WHERE quantidade_estoque < estoque_minimo) AS abaixo_minimo
+            FROM produtos_antigos
+            GROUP BY 1, 2
+        ) d
+        WHERE r.categoria = d.categoria AND r.fatia = d.fatia;
+    ELSE
+        -- UPDATE: diferença entre as versões nova e antiga das linhas. Fatias cujo saldo
+        -- é zero (ex: UPDATE que só mudou o nome) não são gravadas.
+        INSERT INTO RESUMO_ESTOQUE AS r (categoria, fatia, produtos, unidades, valor, abaixo_minimo)
+        SELECT categoria, fatia, SUM(produtos), SUM(unidades), SUM(valor), SUM(abaixo_minimo)
+        FROM (
+            SELECT categoria, (id_produto % 16)::SMALLINT AS fatia, 1 AS produtos, quantidade_estoque::BIGINT AS unidades,
+                   preco * quantidade_estoque AS valor, (quantidade_estoque < estoque_minimo)::INTEGER AS abaixo_minimo
+            FROM produtos_novos
+            UNION ALL
+            SELECT categoria, (id_produto % 16)::SMALLINT, -1, -quantidade_estoque::BIGINT,
+                   -(preco * quantidade_estoque), -(quantidade_estoque < estoque_minimo)::INTEGER
+            FROM produtos_antigos
+        ) d
+        GROUP BY 1, 2
+        HAVING SUM(produtos) <> 0 OR SUM(unidades) <> 0 OR SUM(valor) <> 0 OR SUM(abaixo_minimo) <> 0
+        ORDER BY 1, 2
+        ON CONFLICT (categoria, fatia) DO UPDATE
+        SET produtos = r.produtos + EXCLUDED.produtos,
+            unidades = r.unidades + EXCLUDED.unidades,
+            valor = r.valor + EXCLUDED.valor,
+            abaixo_minimo = r.abaixo_minimo + EXCLUDED.abaixo_minimo;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_resumo_estoque_inseridos
+AFTER INSERT ON PRODUTO
+REFERENCING NEW TABLE AS produtos_novos
+FOR EACH STATEMENT EXECUTE FUNCTION resumo_estoque_aplicar();
+
+CREATE TRIGGER trg_resumo_estoque_alterados
+AFTER UPDATE ON PRODUTO
+REFERENCING OLD TABLE AS produtos_antigos NEW TABLE AS produtos_novos
+FOR EACH STATEMENT EXECUTE FUNCTION resumo_estoque_aplicar();
+
+CREATE TRIGGER trg_resumo_estoque_excluidos
+AFTER DELETE ON PRODUTO
+REFERENCING OLD TABLE AS produtos_antigos
+FOR EACH STATEMENT EXECUTE FUNCTION resumo_estoque_aplicar();
+
+-- Recalcula o resumo a partir de PRODUTO (carga inicial ou correção manual).
+CREATE OR REPLACE FUNCTION reconstruir_resumo_estoque() RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    linhas INTEGER;
+BEGIN
+    -- Escritas em PRODUTO esperam a reconstrução, para somar sobre o resultado dela.
+    LOCK TABLE PRODUTO IN SHARE MODE;
+    LOCK TABLE RESUMO_ESTOQUE IN EXCLUSIVE MODE;
+    DELETE FROM RESUMO_ESTOQUE;
+    INSERT INTO RESUMO_ESTOQUE (categoria, fatia, produtos, unidades, valor, abaixo_minimo)
+    SELECT categoria, (id_produto % 16)::SMALLINT, COUNT(*), SUM(quantidade_estoque),
+           SUM(preco * quantidade_estoque), COUNT(*) FILTER (WHERE quantidade_estoque < estoque_minimo)
+    FROM PRODUTO
+    GROUP BY 1, 2;
+    GET DIAGNOSTICS linhas = ROW_COUNT;
+    RETURN linhas;
+END;
+$$;
+
+-- Os produtos de exemplo foram inseridos antes dos triggers existirem.
+SELECT reconstruir_resumo_estoque();
+
+-- =====================================================================
+-- Venda relâmpago: reservas de estoque e confirmação em lote
+-- =====================================================================
+-- No lançamento de uma figure disputada, cada checkout pelo caminho normal trava a
+-- mesma linha de PRODUTO durante a transação inteira e os pedidos fazem fila nela.
+-- Com a venda relâmpago aberta para o produto:
+--   * o estoque reservável fica em ESTOQUE_RELAMPAGO, dividido em 16 "fatias" (como
+--     os resumos), e cada reserva desconta de uma fatia livre em uma transação curta,
+--     sem tocar em PRODUTO;
+--   * a reserva vale por um tempo limitado (RESERVA_ESTOQUE.expira_em); as vencidas
+--     devolvem as unidades às fatias (liberar_reservas_expiradas);
+--   * a compra é confirmada por confirmar_reservas, que grava muitos pedidos de uma
+--     vez (uma trava e uma baixa de estoque por produto para o lote inteiro).
+-- PRODUTO.quantidade_estoque continua sendo o estoque físico: só a confirmação o baixa.
+-- Enquanto a venda está aberta, criar_pedido_completo recusa o produto.
+CREATE TABLE ESTOQUE_RELAMPAGO (
+    id_produto INTEGER NOT NULL,
+    fatia SMALLINT NOT NULL,
+    disponivel INTEGER NOT NULL CHECK (disponivel >= 0),
+    aberta_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+    CONSTRAINT pk_estoque_relampago PRIMARY KEY (id_produto, fatia),
+    CONSTRAINT fk_estoque_relampago_produto FOREIGN KEY (id_produto) REFERENCES PRODUTO(id_produto) ON DELETE CASCADE
+);
+
+-- Uma linha por fatia usada pela reserva. Encerrar a venda (ou excluir o produto)
+-- cancela as reservas pendentes, em cascata.
+CREATE TABLE RESERVA_ESTOQUE (
+    id_reserva BIGINT NOT NULL,
+    id_produto INTEGER NOT NULL,
+    fatia SMALLINT NOT NULL,
+    quantidade INTEGER NOT NULL CHECK (quantidade > 0),
+    id_cliente INTEGER NOT NULL,
+    expira_em TIMESTAMPTZ NOT NULL,
+    CONSTRAINT pk_reserva_estoque PRIMARY KEY (id_reserva, id_produto, fatia),
+    CONSTRAINT fk_reserva_estoque_fatia FOREIGN KEY (id_produto, fatia)
+        REFERENCES ESTOQUE_RELAMPAGO(id_produto, fatia) ON DELETE CASCADE
+);
+CREATE SEQUENCE IF NOT EXISTS reserva_estoque_id_seq OWNED BY RESERVA_ESTOQUE.id_reserva;
+CREATE INDEX IF NOT EXISTS idx_reserva_estoque_expira ON RESERVA_ESTOQUE (expira_em);
+CREATE INDEX IF NOT EXISTS idx_reserva_estoque_fatia ON RESERVA_ESTOQUE (id_produto, fatia);
+
+-- Abre a venda de p_quantidade unidades (padrão: todo o estoque) do produto.
+-- Devolve as unidades colocadas à venda.
+CREATE OR REPLACE FUNCTION abrir_venda_relampago(p_id_produto INTEGER, p_quantidade INTEGER DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_estoque INTEGER;
+    v_nome VARCHAR;
+    v_quantidade INTEGER;
+BEGIN
+    SELECT quantidade_estoque, nome INTO v_estoque, v_nome
+    FROM PRODUTO WHERE id_produto = p_id_produto FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Produto com ID % não encontrado.', p_id_produto;
+    END IF;
+    IF EXISTS (SELECT 1 FROM ESTOQUE_RELAMPAGO WHERE id_produto = p_id_produto) THEN
+        RAISE EXCEPTION 'O produto % já está em venda relâmpago.', v_nome;
+    END IF;
+    v_quantidade := coalesce(p_quantidade, v_estoque);
+    IF v_quantidade <= 0 OR v_quantidade > v_estoque THEN
+        RAISE EXCEPTION 'Quantidade inválida para a venda relâmpago de %: informe de 1 a % unidades.', v_nome, v_estoque;
+    END IF;
+
+    -- Divide as unidades entre as 16 fatias (as primeiras ficam com o resto da divisão)
+    INSERT INTO ESTOQUE_RELAMPAGO (id_produto, fatia, disponivel)
+    SELECT p_id_produto, f, v_quantidade / 16 + CASE WHEN f < v_quantidade % 16 THEN 1 ELSE 0 END
+    FROM generate_series(0, 15) AS f;
+    RETURN v_quantidade;
+END;
+$$;
+
+-- Encerra a venda: as reservas pendentes são canceladas (as unidades delas nunca saíram
+-- de PRODUTO) e o produto volta ao checkout normal. Devolve quantas reservas caíram.
+CREATE OR REPLACE FUNCTION encerrar_venda_relampago(p_id_produto INTEGER) RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_reservas INTEGER;
+BEGIN
+    PERFORM 1 FROM ESTOQUE_RELAMPAGO WHERE id_produto = p_id_produto ORDER BY fatia FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'O produto com ID % não está em venda relâmpago.', p_id_produto;
+    END IF;
+    SELECT count(DISTINCT id_reserva) INTO v_reservas FROM RESERVA_ESTOQUE WHERE id_produto = p_id_produto;
+    DELETE FROM ESTOQUE_RELAMPAGO WHERE id_produto = p_id_produto;
+    RETURN v_reservas;
+END;
+$$;
+
+-- Reserva os itens (JSON como o do criar_pedido_completo) por p_validade. Cada unidade
+-- sai de uma fatia escolhida ao acaso entre as que não estão travadas por outra reserva
+-- (SKIP LOCKED); só quando todas as fatias com saldo estão ocupadas a reserva espera.
+CREATE OR REPLACE FUNCTION reservar_estoque(
+    p_id_cliente INTEGER,
+    p_itens JSON,
+    p_validade INTERVAL,
+    OUT p_id_reserva BIGINT,
+    OUT p_expira_em TIMESTAMPTZ
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    item RECORD;
+    v_falta INTEGER;
+    v_fatia SMALLINT;
+    v_tirado INTEGER;
+    v_produtos INTEGER := 0;
+BEGIN
+    p_id_reserva := nextval('reserva_estoque_id_seq');
+    p_expira_em := now() + p_validade;
+
+    FOR item IN
+        SELECT x.id_produto, SUM(x.quantidade)::INTEGER AS quantidade
+        FROM json_to_recordset(p_itens) AS x(id_produto INTEGER, quantidade INTEGER)
+        GROUP BY x.id_produto
+        ORDER BY x.id_produto
+    LOOP
+        IF item.id_produto IS NULL OR item.quantidade IS NULL OR item.quantidade <= 0 THEN
+            RAISE EXCEPTION 'Itens da reserva inválidos: informe id_produto e quantidade positiva.';
+        END IF;
+        v_produtos := v_produtos + 1;
+        IF NOT EXISTS (SELECT 1 FROM ESTOQUE_RELAMPAGO WHERE id_produto = item.id_produto) THEN
+            RAISE EXCEPTION 'O produto com ID % não está em venda relâmpago.', item.id_produto;
+        END IF;
+
+        v_falta := item.quantidade;
+        WHILE v_falta > 0 LOOP
+            WITH l AS (
+                SELECT f.fatia, least(f.disponivel, v_falta) AS tirar
+                FROM ESTOQUE_RELAMPAGO f
+                WHERE f.id_produto = item.id_produto AND f.disponivel > 0
+                ORDER BY random() LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE ESTOQUE_RELAMPAGO e
+            SET disponivel = e.disponivel - l.tirar
+            FROM l
+            WHERE e.id_produto = item.id_produto AND e.fatia = l.fatia
+            RETURNING l.fatia, l.tirar INTO v_fatia, v_tirado;
+            IF NOT FOUND THEN
+                -- Todas as fatias com saldo estão travadas: espera por uma delas
+                WITH l AS (
+                    SELECT f.fatia, least(f.disponivel, v_falta) AS tirar
+                    FROM ESTOQUE_RELAMPAGO f
+                    WHERE f.id_produto = item.id_produto AND f.disponivel > 0
+                    ORDER BY f.fatia LIMIT 1
+                    FOR UPDATE
+                )
+                UPDATE ESTOQUE_RELAMPAGO e
+                SET disponivel = e.disponivel - l.tirar
+                FROM l
+                WHERE e.id_produto = item.id_produto AND e.fatia = l.fatia
+                RETURNING l.fatia, l.tirar INTO v_fatia, v_tirado;
+                IF NOT FOUND THEN
+                    RAISE EXCEPTION 'Estoque insuficiente para o produto: %',
+                        (SELECT nome FROM PRODUTO WHERE id_produto = item.id_produto);
+                END IF;
+            END IF;
+
+            INSERT INTO RESERVA_ESTOQUE AS r (id_reserva, id_produto, fatia, quantidade, id_cliente, expira_em)
+            VALUES (p_id_reserva, item.id_produto, v_fatia, v_tirado, p_id_cliente, p_expira_em)
+            ON CONFLICT (id_reserva, id_produto, fatia) DO UPDATE SET quantidade = r.quantidade + EXCLUDED.quantidade;
+            v_falta := v_falta - v_tirado;
+        END LOOP;
+    END LOOP;
+
+    IF v_produtos = 0 THEN
+        RAISE EXCEPTION 'A reserva não possui itens.';
+    END IF;
+END;
+$$;
+
+-- Cancela uma reserva do cliente, devolvendo as unidades às fatias.
+-- Devolve as unidades liberadas (0 se a reserva não existe, já venceu ou foi confirmada).
+CREATE OR REPLACE FUNCTION cancelar_reserva(p_id_reserva BIGINT, p_id_cliente INTEGER) RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_unidades INTEGER;
+BEGIN
+    -- Trava as fatias da reserva em ordem antes de devolver
+    PERFORM 1 FROM ESTOQUE_RELAMPAGO e
+    WHERE (e.id_produto, e.fatia) IN (SELECT r.id_produto, r.fatia FROM RESERVA_ESTOQUE r
+                                      WHERE r.id_reserva = p_id_reserva AND r.id_cliente = p_id_cliente)
+    ORDER BY e.id_produto, e.fatia
+    FOR UPDATE;
+
+    WITH canceladas AS (
+        DELETE FROM RESERVA_ESTOQUE
+        WHERE id_reserva = p_id_reserva AND id_cliente = p_id_cliente
+        RETURNING id_produto, fatia, quantidade
+    ), devolvidas AS (
+        UPDATE ESTOQUE_RELAMPAGO e
+        SET disponivel = e.disponivel + c.quantidade
+        FROM canceladas c
+        WHERE e.id_produto = c.id_produto AND e.fatia = c.fatia
+    )
+    SELECT coalesce(SUM(quantidade), 0) INTO v_unidades FROM canceladas;
+    RETURN v_unidades;
+END;
+$$;
+
+-- Devolve às fatias as unidades das reservas vencidas. Fatias travadas por uma reserva
+-- em andamento ficam para a próxima rodada. Devolve as unidades liberadas.
+CREATE OR REPLACE FUNCTION liberar_reservas_expiradas() RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_unidades INTEGER;
+BEGIN
+    WITH fatias AS (
+        SELECT e.id_produto, e.fatia
+        FROM ESTOQUE_RELAMPAGO e
+        WHERE (e.id_produto, e.fatia) IN (SELECT r.id_produto, r.fatia FROM RESERVA_ESTOQUE r
+                                          WHERE r.expira_em <= now())
+        ORDER BY e.id_produto, e.fatia
+        FOR UPDATE SKIP LOCKED
+    ), liberadas AS (
+        DELETE FROM RESERVA_ESTOQUE r
+        USING fatias f
+        WHERE r.id_produto = f.id_produto AND r.fatia = f.fatia AND r.expira_em <= now()
+        RETURNING r.id_produto, r.fatia, r.quantidade
+    ), devolvidas AS (
+        UPDATE ESTOQUE_RELAMPAGO e
+        SET disponivel = e.disponivel + l.quantidade
+        FROM (SELECT id_produto, fatia, SUM(quantidade) AS quantidade FROM liberadas GROUP BY 1, 2) l
+        WHERE e.id_produto = l.id_produto AND e.fatia = l.fatia
+    )
+    SELECT coalesce(SUM(quantidade), 0) INTO v_unidades FROM liberadas;
+    RETURN v_unidades;
+END;
+$$;
+
+-- Confirma um lote de pedidos feitos com reservas, em uma única transação.
+-- p_pedidos: [{"ordem": 0, "id_reserva": 1, "id_cliente": 2, "id_funcionario": 1,
+-- "forma_pagamento": "PIX"}, ...]. Devolve uma linha por pedido: o id do pedido
+-- criado ou o motivo da recusa (reserva inexistente, de outro cliente ou vencida).
+-- Preços e desconto são os do momento da confirmação, como no criar_pedido_completo.
+CREATE OR REPLACE FUNCTION confirmar_reservas(p_pedidos JSON)
+RETURNS TABLE (ordem INTEGER, id_pedido INTEGER, erro TEXT)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    v_ordens INTEGER[];        -- Itens consumidos: pedido (ordem), produto e quantidade
+    v_produtos INTEGER[];
+    v_quantidades INTEGER[];
+    v_pedidos_ordem INTEGER[]; -- Pedidos aceitos e os ids reservados para eles
+    v_pedidos_id INTEGER[];
+    v_data_pedido TIMESTAMPTZ := now();
+    problema RECORD;
+BEGIN
+    -- 1. Consome as reservas ainda válidas (cada uma só vale para o cliente que a fez)
+    WITH pedidos AS (
+        SELECT x.ordem, x.id_reserva, x.id_cliente
+        FROM json_to_recordset(p_pedidos) AS x(ordem INTEGER, id_reserva BIGINT, id_cliente INTEGER)
+    ), consumidas AS (
+        DELETE FROM RESERVA_ESTOQUE r
+        USING pedidos p
+        WHERE r.id_reserva = p.id_reserva AND r.id_cliente = p.id_cliente AND r.expira_em > v_data_pedido
+        RETURNING p.ordem, r.id_produto, r.quantidade
+    )
+    SELECT array_agg(c.ordem ORDER BY c.id_produto, c.ordem), array_agg(c.id_produto ORDER BY c.id_produto, c.ordem),
+           array_agg(c.quantidade ORDER BY c.id_produto, c.ordem)
+    INTO v_ordens, v_produtos, v_quantidades
+    FROM (SELECT c.ordem, c.id_produto, SUM(c.quantidade)::INTEGER AS quantidade
+          FROM consumidas c GROUP BY c.ordem, c.id_produto) c;
+
+    IF v_ordens IS NOT NULL THEN
+        -- 2. Uma trava por produto para o lote inteiro, em ordem de id. NO KEY UPDATE não
+        --    conflita com as travas de chave estrangeira dos itens (nem com as reservas).
+        PERFORM 1 FROM PRODUTO p
+        WHERE p.id_produto = ANY(v_produtos)
+        ORDER BY p.id_produto
+        FOR NO KEY UPDATE;
+
+        -- O estoque reservável nunca passa do físico, a não ser que ele tenha sido
+        -- reduzido à mão durante a venda: aí o lote falha e o backend confirma um a um.
+        SELECT p.nome INTO problema
+        FROM unnest(v_produtos, v_quantidades) AS i(id_produto, quantidade)
+        JOIN PRODUTO p ON p.id_produto = i.id_produto
+        GROUP BY p.id_produto, p.nome, p.quantidade_estoque
+        HAVING p.quantidade_estoque < SUM(i.quantidade)
+        LIMIT 1;
+        IF FOUND THEN
+            RAISE EXCEPTION 'Estoque insuficiente para o produto: %', problema.nome;
+        END IF;
+
+        -- 3. Ids dos novos pedidos, todos da sequência de PEDIDO
+        SELECT array_agg(o.ordem ORDER BY o.ordem), array_agg(nextval('pedido_id_pedido_seq')::INTEGER ORDER BY o.ordem)
+        INTO v_pedidos_ordem, v_pedidos_id
+        FROM (SELECT DISTINCT unnest(v_ordens) AS ordem) o;
+
+        -- 4. Pedidos e itens do lote inteiro, cada um com um INSERT (os resumos de vendas
+        --    são atualizados uma vez por comando)
+        INSERT INTO PEDIDO (id_pedido, data_pedido, id_cliente, id_funcionario, forma_pagamento, status_pagamento, valor_total)
+        SELECT n.id_pedido, v_data_pedido, x.id_cliente, x.id_funcionario, x.forma_pagamento, 'Pagamento Aprovado',
+               CASE WHEN c.torce_flamengo OR c.assiste_one_piece OR c.natural_de_sousa THEN t.total * 0.90 ELSE t.total END
+        FROM unnest(v_pedidos_ordem, v_pedidos_id) AS n(ordem, id_pedido)
+        JOIN json_to_recordset(p_pedidos) AS x(ordem INTEGER, id_cliente INTEGER, id_funcionario INTEGER, forma_pagamento VARCHAR(50))
+            ON x.ordem = n.ordem
+        JOIN (SELECT i.ordem, SUM(p.preco * i.quantidade) AS total
+              FROM unnest(v_ordens, v_produtos, v_quantidades) AS i(ordem, id_produto, quantidade)
+              JOIN PRODUTO p ON p.id_produto = i.id_produto
+              GROUP BY i.ordem) t ON t.ordem = n.ordem
+        LEFT JOIN CLIENTE c ON c.id_cliente = x.id_cliente;
+
+        INSERT INTO ITEM_PEDIDO (id_pedido, data_pedido, id_produto, quantidade, preco_unitario_na_venda)
+        SELECT n.id_pedido, v_data_pedido, i.id_produto, i.quantidade, p.preco
+        FROM unnest(v_ordens, v_produtos, v_quantidades) AS i(ordem, id_produto, quantidade)
+        JOIN unnest(v_pedidos_ordem, v_pedidos_id) AS n(ordem, id_pedido) ON n.ordem = i.ordem
+        JOIN PRODUTO p ON p.id_produto = i.id_produto;
+
+        -- 5. Uma baixa de estoque por produto para o lote inteiro
+        UPDATE PRODUTO p
+        SET quantidade_estoque = p.quantidade_estoque - s.quantidade
+        FROM (SELECT i.id_produto, SUM(i.quantidade) AS quantidade
+              FROM unnest(v_produtos, v_quantidades) AS i(id_produto, quantidade)
+              GROUP BY i.id_produto) s
+        WHERE p.id_produto = s.id_produto;
+    END IF;
+
+    RETURN QUERY
+    SELECT x.ordem, n.id_pedido,
+           CASE WHEN n.id_pedido IS NULL THEN 'Reserva inexistente ou expirada.' END
+    FROM json_to_recordset(p_pedidos) AS x(ordem INTEGER)
+    LEFT JOIN unnest(v_pedidos_ordem, v_pedidos_id) AS n(ordem, id_pedido) ON n.ordem = x.ordem
+    ORDER BY x.ordem;
 END;
-$$; 
\ No newline at end of file
+$$;
@@ -0,0 +1,536 @@
+-- migracoes/particionar_pedidos.sql
+-- Converte PEDIDO e ITEM_PEDIDO de um banco já em uso em tabelas particionadas por mês,
+-- o mesmo esquema que o init.sql cria nos bancos novos. Rode com o psql, fora de uma
+-- transação (o passo 2 confirma um mês por vez), com o backend no ar ou não:
+--     docker compose exec -T db psql -U luffy -d mugiwara_store -v ON_ERROR_STOP=1 -f - < migracoes/particionar_pedidos.sql
+--
+-- 1. Uma transação curta: as tabelas atuais viram PEDIDO_LEGADO e ITEM_PEDIDO_LEGADO e
+--    as novas são criadas, com partições para todos os meses que têm pedidos, junto com
+--    as funções, triggers e a view que passam a usar data_pedido em ITEM_PEDIDO. Daí em
+--    diante os checkouts gravam nas tabelas novas (a sequência de id_pedido é a mesma).
+-- 2. Os pedidos antigos são copiados mês a mês, um COMMIT por mês. Até o fim da cópia,
+--    o histórico dos clientes mostra só os meses já copiados; os relatórios não mudam
+--    (leem os resumos). Os triggers dos resumos ficam desligados nesta sessão, porque
+--    os resumos já contam esses pedidos. Se a cópia for interrompida, rode o arquivo de
+--    novo: o passo 1 é pulado e os pedidos já copiados são ignorados.
+-- 3. As contagens são conferidas e as tabelas antigas, apagadas.
+
+-- =====================================================================
+-- 1. Tabelas particionadas
+-- =====================================================================
+SELECT to_regclass('pedido_legado') IS NULL AS migrar_tabelas \gset
+\if :migrar_tabelas
+BEGIN;
+
+-- Pedidos sem data não teriam partição: precisam ser corrigidos antes.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM PEDIDO WHERE data_pedido IS NULL) THEN
+        RAISE EXCEPTION 'Há pedidos sem data_pedido: preencha a data deles antes de migrar.';
+    END IF;
+END;
+$$;
+
+-- Nomes de índices são únicos no schema: os das tabelas antigas ganham o sufixo _legado.
+ALTER TABLE PEDIDO RENAME TO PEDIDO_LEGADO;
+ALTER TABLE ITEM_PEDIDO RENAME TO ITEM_PEDIDO_LEGADO;
+ALTER TABLE PEDIDO_LEGADO RENAME CONSTRAINT pk_pedido TO pk_pedido_legado;
+ALTER TABLE ITEM_PEDIDO_LEGADO RENAME CONSTRAINT pk_item_pedido TO pk_item_pedido_legado;
+ALTER INDEX idx_pedido_data RENAME TO idx_pedido_data_legado;
+ALTER INDEX idx_pedido_cliente_data_id RENAME TO idx_pedido_cliente_data_id_legado;
+
+-- Tabela PEDIDO, particionada por mês de data_pedido (ver "Partições de PEDIDO e
+-- ITEM_PEDIDO" mais abaixo). O particionamento exige data_pedido na chave primária;
+-- id_pedido continua único porque vem sempre da mesma sequência.
+CREATE TABLE PEDIDO (
+    id_pedido INTEGER NOT NULL DEFAULT nextval('pedido_id_pedido_seq'),
+    data_pedido TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    forma_pagamento VARCHAR(50) NOT NULL,
+    status_pagamento VARCHAR(50) NOT NULL,
+    valor_total NUMERIC(10, 2) NOT NULL,
+    id_cliente INTEGER NOT NULL,
+    id_funcionario INTEGER NOT NULL,
+    CONSTRAINT pk_pedido PRIMARY KEY (id_pedido, data_pedido),
+    CONSTRAINT fk_pedido_cliente FOREIGN KEY (id_cliente) REFERENCES CLIENTE(id_cliente),
+    CONSTRAINT fk_pedido_funcionario FOREIGN KEY (id_funcionario) REFERENCES FUNCIONARIO(id_funcionario)
+) PARTITION BY RANGE (data_pedido);
+
+-- Tabela ITEM_PEDIDO (Entidade Associativa)
+-- Guarda uma cópia da data do pedido para ser particionada do mesmo jeito: os itens de
+-- um mês ficam na partição do mesmo mês e saem junto com os pedidos no arquivamento.
+CREATE TABLE ITEM_PEDIDO (
+    id_pedido INTEGER NOT NULL,
+    data_pedido TIMESTAMP WITH TIME ZONE NOT NULL,
+    id_produto INTEGER NOT NULL,
+    quantidade INTEGER NOT NULL,
+    preco_unitario_na_venda NUMERIC(10, 2) NOT NULL,
+    CONSTRAINT pk_item_pedido PRIMARY KEY (id_pedido, id_produto, data_pedido),
+    CONSTRAINT fk_item_pedido_pedido FOREIGN KEY (id_pedido, data_pedido) REFERENCES PEDIDO(id_pedido, data_pedido) ON DELETE CASCADE,
+    CONSTRAINT fk_item_pedido_produto FOREIGN KEY (id_produto) REFERENCES PRODUTO(id_produto)
+) PARTITION BY RANGE (data_pedido);
+
+-- A sequência continua a mesma: os pedidos novos seguem a numeração dos antigos.
+ALTER SEQUENCE pedido_id_pedido_seq OWNED BY PEDIDO.id_pedido;
+
+-- Índice por data do pedido (reconstrução dos resumos de vendas por período)
+CREATE INDEX IF NOT EXISTS idx_pedido_data ON PEDIDO (data_pedido);
+
+-- Índice do histórico de pedidos do cliente (GET /api/pedidos/historico), na mesma
+-- ordem da paginação por cursor: cada página é uma leitura contínua do índice.
+CREATE INDEX IF NOT EXISTS idx_pedido_cliente_data_id ON PEDIDO (id_cliente, data_pedido DESC, id_pedido DESC);
+
+-- VIEW para simplificar a consulta de vendas por vendedor
+CREATE OR REPLACE VIEW V_VENDAS_DETALHADAS AS
+SELECT
+    f.id_funcionario,
+    f.nome AS nome_vendedor,
+    p.id_pedido,
+    p.data_pedido,
+    prod.nome AS nome_produto,
+    ip.quantidade,
+    ip.preco_unitario_na_venda,
+    (ip.quantidade * ip.preco_unitario_na_venda) AS subtotal
+FROM PEDIDO p
+JOIN FUNCIONARIO f ON p.id_funcionario = f.id_funcionario
+JOIN ITEM_PEDIDO ip ON p.id_pedido = ip.id_pedido AND p.data_pedido = ip.data_pedido
+JOIN PRODUTO prod ON ip.id_produto = prod.id_produto;
+
+-- Stored Procedure para criar um pedido completo de forma atômica.
+-- Trabalha com o carrinho inteiro de uma vez (sem laço item a item):
+--   1. consolida os itens (ids repetidos têm as quantidades somadas);
+--   2. trava todos os produtos do carrinho em um único SELECT ... FOR UPDATE, sempre
+--      em ordem de id_produto, de modo que dois carrinhos concorrentes com produtos em
+--      comum esperam um pelo outro em vez de entrarem em deadlock;
+--   3. valida existência e estoque, insere os itens em lote e baixa o estoque com um
+--      único UPDATE ... FROM;
+--   4. devolve o id do novo pedido no parâmetro INOUT (retornado pelo CALL).
+CREATE OR REPLACE PROCEDURE criar_pedido_completo(
+    p_id_cliente INTEGER,
+    p_id_funcionario INTEGER,
+    p_forma_pagamento VARCHAR(50),
+    p_itens JSON,
+    INOUT p_novo_pedido_id INTEGER
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_ids INTEGER[];
+    v_quantidades INTEGER[];
+    problema RECORD;
+    valor_total_calculado NUMERIC(10, 2);
+    tem_desconto BOOLEAN;
+    v_data_pedido TIMESTAMPTZ;
+BEGIN
+    -- 1. Consolida o carrinho em dois arrays paralelos, já ordenados por id_produto
+    SELECT array_agg(id_produto ORDER BY id_produto), array_agg(quantidade ORDER BY id_produto)
+    INTO v_ids, v_quantidades
+    FROM (
+        SELECT id_produto, SUM(quantidade)::INTEGER AS quantidade
+        FROM json_to_recordset(p_itens) AS x(id_produto INTEGER, quantidade INTEGER)
+        GROUP BY id_produto
+    ) carrinho;
+
+    IF v_ids IS NULL THEN
+        RAISE EXCEPTION 'O pedido não possui itens.';
+    END IF;
+    IF EXISTS (SELECT 1 FROM unnest(v_ids, v_quantidades) AS i(id_produto, quantidade)
+               WHERE i.id_produto IS NULL OR i.quantidade IS NULL OR i.quantidade <= 0) THEN
+        RAISE EXCEPTION 'Itens do pedido inválidos: informe id_produto e quantidade positiva.';
+    END IF;
+
+    -- 2. Trava todas as linhas de uma vez, em ordem crescente de id (ordem global => sem deadlock)
+    PERFORM 1 FROM PRODUTO WHERE id_produto = ANY(v_ids) ORDER BY id_produto FOR UPDATE;
+
+    -- 3. Valida existência e estoque de todos os itens com uma única consulta
+    SELECT i.id_produto, p.nome
+    INTO problema
+    FROM unnest(v_ids, v_quantidades) AS i(id_produto, quantidade)
+    LEFT JOIN PRODUTO p ON p.id_produto = i.id_produto
+    WHERE p.id_produto IS NULL OR p.quantidade_estoque < i.quantidade
+    ORDER BY i.id_produto
+    LIMIT 1;
+
+    IF FOUND THEN
+        IF problema.nome IS NULL THEN
+            RAISE EXCEPTION 'Produto com ID % não encontrado.', problema.id_produto;
+        END IF;
+        RAISE EXCEPTION 'Estoque insuficiente para o produto: %', problema.nome;
+    END IF;
+
+    -- 4. Calcula o total e aplica o desconto, se houver
+    SELECT SUM(p.preco * i.quantidade)
+    INTO valor_total_calculado
+    FROM unnest(v_ids, v_quantidades) AS i(id_produto, quantidade)
+    JOIN PRODUTO p ON p.id_produto = i.id_produto;
+
+    SELECT (torce_flamengo OR assiste_one_piece OR natural_de_sousa)
+    INTO tem_desconto
+    FROM CLIENTE WHERE id_cliente = p_id_cliente;
+
+    IF tem_desconto THEN
+        valor_total_calculado := valor_total_calculado * 0.90;
+    END IF;
+
+    -- 5. Insere o pedido e todos os seus itens (com o preço no momento da venda)
+    INSERT INTO PEDIDO (id_cliente, id_funcionario, forma_pagamento, status_pagamento, valor_total)
+    VALUES (p_id_cliente, p_id_funcionario, p_forma_pagamento, 'Pagamento Aprovado', valor_total_calculado)
+    RETURNING id_pedido, data_pedido INTO p_novo_pedido_id, v_data_pedido;
+
+    INSERT INTO ITEM_PEDIDO (id_pedido, data_pedido, id_produto, quantidade, preco_unitario_na_venda)
+    SELECT p_novo_pedido_id, v_data_pedido, i.id_produto, i.quantidade, p.preco
+    FROM unnest(v_ids, v_quantidades) AS i(id_produto, quantidade)
+    JOIN PRODUTO p ON p.id_produto = i.id_produto;
+
+    -- 6. Baixa o estoque de todos os produtos com um único UPDATE
+    UPDATE PRODUTO p
+    SET quantidade_estoque = p.quantidade_estoque - i.quantidade
+    FROM unnest(v_ids, v_quantidades) AS i(id_produto, quantidade)
+    WHERE p.id_produto = i.id_produto;
+END;
+$$;
+
+-- Soma os itens recém-inseridos (uma vez por comando, não por linha).
+CREATE OR REPLACE FUNCTION resumo_vendas_itens_inseridos() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO RESUMO_VENDAS_DIARIO AS r (dia, id_funcionario, id_produto, quantidade, valor_vendido, pedidos)
+    SELECT dia_venda(p.data_pedido), p.id_funcionario, n.id_produto,
+           SUM(n.quantidade), SUM(n.quantidade * n.preco_unitario_na_venda), COUNT(*)
+    FROM novos_itens n
+    JOIN PEDIDO p ON p.id_pedido = n.id_pedido AND p.data_pedido = n.data_pedido
+    GROUP BY 1, 2, 3
+    ORDER BY 1, 2, 3
+    ON CONFLICT (dia, id_funcionario, id_produto) DO UPDATE
+    SET quantidade = r.quantidade + EXCLUDED.quantidade,
+        valor_vendido = r.valor_vendido + EXCLUDED.valor_vendido,
+        pedidos = r.pedidos + EXCLUDED.pedidos;
+    RETURN NULL;
+END;
+$$;
+
+-- Desconta itens removidos diretamente. Quando o pedido inteiro é excluído, o PEDIDO já
+-- não existe aqui (a exclusão em cascata vem depois) e quem desconta é resumo_vendas_pedido_excluido.
+CREATE OR REPLACE FUNCTION resumo_vendas_itens_excluidos() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE RESUMO_VENDAS_DIARIO r
+    SET quantidade = r.quantidade - d.quantidade,
+        valor_vendido = r.valor_vendido - d.valor,
+        pedidos = r.pedidos - d.pedidos
+    FROM (
+        SELECT dia_venda(p.data_pedido) AS dia, p.id_funcionario, e.id_produto,
+               SUM(e.quantidade) AS quantidade, SUM(e.quantidade * e.preco_unitario_na_venda) AS valor, COUNT(*) AS pedidos
+        FROM itens_excluidos e
+        JOIN PEDIDO p ON p.id_pedido = e.id_pedido AND p.data_pedido = e.data_pedido
+        GROUP BY 1, 2, 3
+    ) d
+    WHERE r.dia = d.dia AND r.id_funcionario = d.id_funcionario AND r.id_produto = d.id_produto;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION resumo_vendas_pedidos_inseridos() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO RESUMO_PEDIDOS_DIARIO AS r (dia, id_funcionario, fatia, pedidos)
+    SELECT dia_venda(data_pedido), id_funcionario, (id_pedido % 16)::SMALLINT, COUNT(*)
+    FROM novos_pedidos
+    GROUP BY 1, 2, 3
+    ORDER BY 1, 2, 3
+    ON CONFLICT (dia, id_funcionario, fatia) DO UPDATE
+    SET pedidos = r.pedidos + EXCLUDED.pedidos;
+    RETURN NULL;
+END;
+$$;
+
+-- Antes de excluir um pedido (os itens ainda existem), desconta o pedido e todos os seus itens.
+CREATE OR REPLACE FUNCTION resumo_vendas_pedido_excluido() RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE RESUMO_PEDIDOS_DIARIO
+    SET pedidos = pedidos - 1
+    WHERE dia = dia_venda(OLD.data_pedido) AND id_funcionario = OLD.id_funcionario AND fatia = OLD.id_pedido % 16;
+
+    UPDATE RESUMO_VENDAS_DIARIO r
+    SET quantidade = r.quantidade - i.quantidade,
+        valor_vendido = r.valor_vendido - i.quantidade * i.preco_unitario_na_venda,
+        pedidos = r.pedidos - 1
+    FROM ITEM_PEDIDO i
+    WHERE i.id_pedido = OLD.id_pedido AND i.data_pedido = OLD.data_pedido
+      AND r.dia = dia_venda(OLD.data_pedido) AND r.id_funcionario = OLD.id_funcionario AND r.id_produto = i.id_produto;
+    RETURN OLD;
+END;
+$$;
+
+CREATE TRIGGER trg_resumo_vendas_itens_inseridos
+AFTER INSERT ON ITEM_PEDIDO
+REFERENCING NEW TABLE AS novos_itens
+FOR EACH STATEMENT EXECUTE FUNCTION resumo_vendas_itens_inseridos();
+
+CREATE TRIGGER trg_resumo_vendas_itens_excluidos
+AFTER DELETE ON ITEM_PEDIDO
+REFERENCING OLD TABLE AS itens_excluidos
+FOR EACH STATEMENT EXECUTE FUNCTION resumo_vendas_itens_excluidos();
+
+CREATE TRIGGER trg_resumo_vendas_pedidos_inseridos
+AFTER INSERT ON PEDIDO
+REFERENCING NEW TABLE AS novos_pedidos
+FOR EACH STATEMENT EXECUTE FUNCTION resumo_vendas_pedidos_inseridos();
+
+CREATE TRIGGER trg_resumo_vendas_pedido_excluido
+BEFORE DELETE ON PEDIDO
+FOR EACH ROW EXECUTE FUNCTION resumo_vendas_pedido_excluido();
+
+-- Recalcula os resumos a partir de PEDIDO/ITEM_PEDIDO para um intervalo de dias
+-- (NULL = sem limite). Usada na carga inicial (backfill) e para corrigir os resumos
+-- após alterações manuais nos pedidos. Devolve o número de linhas de vendas geradas.
+-- Os meses já arquivados (PEDIDO_ARQUIVADO) não estão mais em PEDIDO e ficam de fora:
+-- os resumos deles são a única cópia agregada e não são apagados.
+CREATE OR REPLACE FUNCTION reconstruir_resumo_vendas(p_inicio DATE DEFAULT NULL, p_fim DATE DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_dia_inicio DATE := coalesce(p_inicio, '-infinity'::DATE);
+    v_dia_fim DATE := coalesce(p_fim, 'infinity'::DATE);
+    v_de TIMESTAMPTZ := CASE WHEN p_inicio IS NULL THEN '-infinity'::TIMESTAMPTZ
+                             ELSE p_inicio::TIMESTAMP AT TIME ZONE 'America/Sao_Paulo' END;
+    v_ate TIMESTAMPTZ := CASE WHEN p_fim IS NULL THEN 'infinity'::TIMESTAMPTZ
+                              ELSE (p_fim + 1)::TIMESTAMP AT TIME ZONE 'America/Sao_Paulo' END;
+    v_fim_arquivo DATE;
+    linhas INTEGER;
+BEGIN
+    SELECT (max(mes) + INTERVAL '1 month')::DATE INTO v_fim_arquivo FROM PEDIDO_ARQUIVADO;
+    IF v_fim_arquivo > v_dia_inicio THEN
+        v_dia_inicio := v_fim_arquivo;
+        v_de := v_fim_arquivo::TIMESTAMP AT TIME ZONE 'America/Sao_Paulo';
+    END IF;
+
+    -- Bloqueia escritas nos resumos: pedidos em andamento terminam antes, e os novos
+    -- esperam a reconstrução acabar para somar sobre o resultado dela.
+    LOCK TABLE RESUMO_VENDAS_DIARIO, RESUMO_PEDIDOS_DIARIO IN EXCLUSIVE MODE;
+
+    DELETE FROM RESUMO_VENDAS_DIARIO WHERE dia BETWEEN v_dia_inicio AND v_dia_fim;
+    DELETE FROM RESUMO_PEDIDOS_DIARIO WHERE dia BETWEEN v_dia_inicio AND v_dia_fim;
+
+    INSERT INTO RESUMO_VENDAS_DIARIO (dia, id_funcionario, id_produto, quantidade, valor_vendido, pedidos)
+    SELECT dia_venda(p.data_pedido), p.id_funcionario, i.id_produto,
+           SUM(i.quantidade), SUM(i.quantidade * i.preco_unitario_na_venda), COUNT(*)
+    FROM PEDIDO p
+    JOIN ITEM_PEDIDO i ON i.id_pedido = p.id_pedido AND i.data_pedido = p.data_pedido
+    WHERE p.data_pedido >= v_de AND p.data_pedido < v_ate
+      AND i.data_pedido >= v_de AND i.data_pedido < v_ate  -- Repetido em ITEM_PEDIDO para podar as partições dele também
+    GROUP BY 1, 2, 3;
+    GET DIAGNOSTICS linhas = ROW_COUNT;
+
+    INSERT INTO RESUMO_PEDIDOS_DIARIO (dia, id_funcionario, fatia, pedidos)
+    SELECT dia_venda(data_pedido), id_funcionario, (id_pedido % 16)::SMALLINT, COUNT(*)
+    FROM PEDIDO
+    WHERE data_pedido >= v_de AND data_pedido < v_ate
+    GROUP BY 1, 2, 3;
+
+    RETURN linhas;
+END;
+$$;
+
+-- =====================================================================
+-- Partições de PEDIDO e ITEM_PEDIDO
+-- =====================================================================
+-- As duas tabelas são particionadas por mês de data_pedido, no fuso da loja (como os
+-- resumos): pedido_AAAA_MM e item_pedido_AAAA_MM. Consultas com intervalo de datas
+-- (reconstrução dos resumos, páginas seguintes do histórico) só leem os meses do
+-- intervalo. A manutenção (flask manter-particoes, ou a thread do backend) cria os
+-- meses seguintes antes de eles chegarem e arquiva os antigos, de modo que PEDIDO
+-- mantém um número fixo de meses e o custo das consultas não cresce com os anos.
+-- Não há partição DEFAULT: um pedido fora dos meses criados falha, em vez de cair
+-- numa partição que depois impediria a criação do mês dele.
+CREATE SCHEMA IF NOT EXISTS arquivo;
+
+-- Meses arquivados: as partições deles estão no schema "arquivo", sem chaves estrangeiras.
+CREATE TABLE PEDIDO_ARQUIVADO (
+    mes DATE NOT NULL,
+    pedidos BIGINT NOT NULL,
+    itens BIGINT NOT NULL,
+    bytes BIGINT,  -- Tamanho das duas tabelas, com índices, depois da compactação
+    arquivado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+    CONSTRAINT pk_pedido_arquivado PRIMARY KEY (mes)
+);
+
+-- Cria as partições dos meses de p_de até p_ate (inclusive) que ainda não existem,
+-- pulando os meses já arquivados. Devolve quantos meses foram criados.
+CREATE OR REPLACE FUNCTION criar_particoes_pedido(p_de DATE, p_ate DATE) RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_mes DATE := date_trunc('month', p_de)::DATE;
+    v_sufixo TEXT;
+    v_inicio TIMESTAMPTZ;
+    v_fim TIMESTAMPTZ;
+    criadas INTEGER := 0;
+BEGIN
+    -- Cada processo do backend roda a manutenção: um de cada vez.
+    PERFORM pg_advisory_xact_lock(hashtext('particoes_pedido'));
+    WHILE v_mes <= p_ate LOOP
+        v_sufixo := to_char(v_mes, 'YYYY_MM');
+        IF to_regclass('public.pedido_' || v_sufixo) IS NULL
+           AND NOT EXISTS (SELECT 1 FROM PEDIDO_ARQUIVADO WHERE mes = v_mes) THEN
+            v_inicio := v_mes::TIMESTAMP AT TIME ZONE 'America/Sao_Paulo';
+            v_fim := (v_mes + INTERVAL '1 month')::TIMESTAMP AT TIME ZONE 'America/Sao_Paulo';
+            EXECUTE format('CREATE TABLE %I PARTITION OF PEDIDO FOR VALUES FROM (%L) TO (%L)',
+                           'pedido_' || v_sufixo, v_inicio, v_fim);
+            EXECUTE format('CREATE TABLE %I PARTITION OF ITEM_PEDIDO FOR VALUES FROM (%L) TO (%L)',
+                           'item_pedido_' || v_sufixo, v_inicio, v_fim);
+            criadas := criadas + 1;
+        END IF;
+        v_mes := (v_mes + INTERVAL '1 month')::DATE;
+    END LOOP;
+    RETURN criadas;
+END;
+$$;
+
+-- Arquiva os meses anteriores a p_antes. Para cada mês:
+--   1. desanexa as partições de ITEM_PEDIDO e PEDIDO, tira as chaves estrangeiras
+--      (o arquivo é só leitura), move as tabelas para o schema "arquivo" e registra o
+--      mês em PEDIDO_ARQUIVADO, tudo na mesma transação;
+--   2. já fora de PEDIDO, compacta as tabelas: fillfactor 100 e CLUSTER (reescrita sem
+--      espaço morto, na ordem do cliente para as consultas ao arquivo).
+-- Cada passo confirma a sua transação: o DETACH trava PEDIDO/ITEM_PEDIDO só por um
+-- instante e a reescrita não bloqueia os pedidos novos. Os resumos de vendas dos meses
+-- arquivados continuam nos relatórios. Chame com CALL fora de uma transação; devolve
+-- quantos meses foram arquivados (0 se outro processo já estiver arquivando).
+CREATE OR REPLACE PROCEDURE arquivar_pedidos(p_antes DATE, INOUT p_arquivados INTEGER DEFAULT 0)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_mes DATE;
+    v_pedido TEXT;
+    v_item TEXT;
+    v_indice_cliente TEXT;
+    v_pedidos BIGINT;
+    v_itens BIGINT;
+BEGIN
+    p_arquivados := 0;
+    IF NOT pg_try_advisory_lock(hashtext('particoes_pedido')) THEN
+        RETURN;
+    END IF;
+    FOR v_mes IN
+        SELECT to_date(substr(c.relname, 8), 'YYYY_MM')
+        FROM pg_inherits h
+        JOIN pg_class c ON c.oid = h.inhrelid
+        WHERE h.inhparent = 'pedido'::REGCLASS AND c.relname ~ '^pedido_[0-9]{4}_[0-9]{2}$'
+          AND to_date(substr(c.relname, 8), 'YYYY_MM') < date_trunc('month', p_antes)
+        ORDER BY 1
+    LOOP
+        v_pedido := 'pedido_' || to_char(v_mes, 'YYYY_MM');
+        v_item := 'item_pedido_' || to_char(v_mes, 'YYYY_MM');
+        SELECT c.relname INTO v_indice_cliente
+        FROM pg_inherits h
+        JOIN pg_class c ON c.oid = h.inhrelid
+        JOIN pg_index x ON x.indexrelid = c.oid
+        WHERE h.inhparent = 'idx_pedido_cliente_data_id'::REGCLASS AND x.indrelid = ('public.' || v_pedido)::REGCLASS;
+        EXECUTE format('SELECT count(*) FROM %I', v_pedido) INTO v_pedidos;
+        EXECUTE format('SELECT count(*) FROM %I', v_item) INTO v_itens;
+
+        EXECUTE format('ALTER TABLE ITEM_PEDIDO DETACH PARTITION %I', v_item);
+        EXECUTE format('ALTER TABLE %I DROP CONSTRAINT fk_item_pedido_pedido, DROP CONSTRAINT fk_item_pedido_produto', v_item);
+        EXECUTE format('ALTER TABLE PEDIDO DETACH PARTITION %I', v_pedido);
+        EXECUTE format('ALTER TABLE %I DROP CONSTRAINT fk_pedido_cliente, DROP CONSTRAINT fk_pedido_funcionario', v_pedido);
+        EXECUTE format('ALTER TABLE %I SET SCHEMA arquivo', v_item);
+        EXECUTE format('ALTER TABLE %I SET SCHEMA arquivo', v_pedido);
+        INSERT INTO PEDIDO_ARQUIVADO (mes, pedidos, itens) VALUES (v_mes, v_pedidos, v_itens);
+        COMMIT;
+
+        EXECUTE format('ALTER TABLE arquivo.%I SET (fillfactor = 100)', v_pedido);
+        EXECUTE format('ALTER TABLE arquivo.%I SET (fillfactor = 100)', v_item);
+        EXECUTE format('CLUSTER arquivo.%I USING %I', v_pedido, v_indice_cliente);
+        EXECUTE format('CLUSTER arquivo.%I USING %I', v_item, v_item || '_pkey');
+        UPDATE PEDIDO_ARQUIVADO
+        SET bytes = pg_total_relation_size(('arquivo.' || v_pedido)::REGCLASS)
+                  + pg_total_relation_size(('arquivo.' || v_item)::REGCLASS)
+        WHERE mes = v_mes;
+        COMMIT;
+        p_arquivados := p_arquivados + 1;
+    END LOOP;
+    PERFORM pg_advisory_unlock(hashtext('particoes_pedido'));
+END;
+$$;
+
+-- Todos os meses com pedidos, e os próximos três.
+SELECT criar_particoes_pedido(coalesce(min(dia_venda(data_pedido)), dia_venda(now())),
+                              (dia_venda(now()) + INTERVAL '3 months')::DATE)
+FROM PEDIDO_LEGADO;
+
+-- Copia um mês de pedidos antigos por transação. ON CONFLICT DO NOTHING permite
+-- retomar a cópia depois de uma interrupção.
+CREATE OR REPLACE PROCEDURE migrar_pedidos_legados()
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_mes DATE;
+    v_de TIMESTAMPTZ;
+    v_ate TIMESTAMPTZ;
+BEGIN
+    FOR v_mes IN
+        SELECT generate_series(date_trunc('month', min(dia_venda(data_pedido))),
+                               date_trunc('month', max(dia_venda(data_pedido))), INTERVAL '1 month')::DATE
+        FROM PEDIDO_LEGADO
+    LOOP
+        v_de := v_mes::TIMESTAMP AT TIME ZONE 'America/Sao_Paulo';
+        v_ate := (v_mes + INTERVAL '1 month')::TIMESTAMP AT TIME ZONE 'America/Sao_Paulo';
+        INSERT INTO PEDIDO (id_pedido, data_pedido, forma_pagamento, status_pagamento, valor_total, id_cliente, id_funcionario)
+        SELECT id_pedido, data_pedido, forma_pagamento, status_pagamento, valor_total, id_cliente, id_funcionario
+        FROM PEDIDO_LEGADO
+        WHERE data_pedido >= v_de AND data_pedido < v_ate
+        ON CONFLICT DO NOTHING;
+        INSERT INTO ITEM_PEDIDO (id_pedido, data_pedido, id_produto, quantidade, preco_unitario_na_venda)
+        SELECT i.id_pedido, p.data_pedido, i.id_produto, i.quantidade, i.preco_unitario_na_venda
+        FROM ITEM_PEDIDO_LEGADO i
+        JOIN PEDIDO_LEGADO p ON p.id_pedido = i.id_pedido
+        WHERE p.data_pedido >= v_de AND p.data_pedido < v_ate
+        ON CONFLICT DO NOTHING;
+        RAISE NOTICE 'Pedidos de % copiados.', to_char(v_mes, 'MM/YYYY');
+        COMMIT;
+    END LOOP;
+END;
+$$;
+
+COMMIT;
+\endif
+
+-- =====================================================================
+-- 2. Cópia dos pedidos, mês a mês
+-- =====================================================================
+-- 'replica' desliga os triggers (resumos e chaves estrangeiras) só nesta sessão.
+SET session_replication_role = replica;
+CALL migrar_pedidos_legados();
+RESET session_replication_role;
+
+-- =====================================================================
+-- 3. Conferência e limpeza
+-- =====================================================================
+BEGIN;
+DO $$
+DECLARE
+    faltando_pedidos BIGINT;
+    faltando_itens BIGINT;
+BEGIN
+    SELECT count(*) INTO faltando_pedidos FROM PEDIDO_LEGADO l
+    WHERE NOT EXISTS (SELECT 1 FROM PEDIDO p WHERE p.id_pedido = l.id_pedido AND p.data_pedido = l.data_pedido);
+    SELECT count(*) INTO faltando_itens FROM ITEM_PEDIDO_LEGADO l
+    WHERE NOT EXISTS (SELECT 1 FROM ITEM_PEDIDO i WHERE i.id_pedido = l.id_pedido AND i.id_produto = l.id_produto);
+    IF faltando_pedidos > 0 OR faltando_itens > 0 THEN
+        RAISE EXCEPTION '% pedidos e % itens não foram copiados; as tabelas antigas foram mantidas.',
+            faltando_pedidos, faltando_itens;
+    END IF;
+END;
+$$;
+DROP TABLE ITEM_PEDIDO_LEGADO, PEDIDO_LEGADO;
+DROP PROCEDURE migrar_pedidos_legados();
+COMMIT;
+
+ANALYZE PEDIDO;
+ANALYZE ITEM_PEDIDO;
@@ -0,0 +1,235 @@
+# --- Controle de admissão por classe de rota ---
+# Todas as rotas dividem as mesmas threads do servidor e o mesmo pool de conexões: uma
+# enxurrada de requisições caras (logins com pbkdf2, relatórios, catálogo completo) não
+# pode atrasar as baratas (produto por id) nem o checkout. Cada rota controlada pertence
+# a uma classe, com:
+#   * limite de requisições em andamento e fila de espera limitada;
+#   * espera máxima na fila;
+#   * prioridade: quando uma vaga abre, quem espera na classe de menor número passa na frente.
+# Há também um limite total (a soma de todas as classes), do qual algumas vagas ficam
+# reservadas às classes de prioridade 0 (checkout): as demais nunca ocupam o limite inteiro.
+# Fila da classe cheia: 429 imediato. Espera máxima esgotada: 503. Ambos com Retry-After.
+import asyncio  # Espera por uma vaga no servidor assíncrono, sem ocupar o loop
+import bisect  # Fila de espera ordenada por (prioridade, chegada)
+import itertools  # Ordem de chegada para desempatar a prioridade
+import math  # Arredondamento do Retry-After
+import threading  # Espera das threads e proteção do estado
+import time  # Duração das requisições e tempo na fila
+
+RETRY_AFTER_MAXIMO = 30  # Segundos
+
+
+class RequisicaoRecusadaError(Exception):
+    """Lançada quando o controle de admissão recusa a requisição (fila cheia ou espera esgotada)."""
+
+    def __init__(self, classe, status, retry_after, mensagem):
+        super().__init__(mensagem)
+        self.classe = classe
+        self.status = status
+        self.retry_after = retry_after
+
+
+class ClasseDeRota:
+    def __init__(self, nome, prioridade, limite, fila_maxima, espera_maxima):
+        self.nome = nome
+        self.prioridade = prioridade  # 0 = mais alta (usa as vagas reservadas)
+        self.limite = limite  # Requisições da classe em andamento ao mesmo tempo
+        self.fila_maxima = fila_maxima  # Requisições esperando vaga; além disso, 429
+        self.espera_maxima = espera_maxima  # Segundos na fila antes do 503
+
+        # Estado e contadores; protegidos pelo lock do ControleDeAdmissao
+        self.ativos = 0
+        self.na_fila = 0
+        self.admitidas = 0
+        self.enfileiradas = 0
+        self.recusadas_fila_cheia = 0
+        self.recusadas_espera = 0
+        self.segundos_na_fila = 0.0
+        self.duracao_media = 0.0  # Média móvel do tempo de atendimento, para o Retry-After
+
+    @classmethod
+    def configurada(cls, nome, prioridade, texto):
+        """Cria a classe a partir de "limite,fila,espera em segundos" (ex: "16,200,5")."""
+        try:
+            limite, fila_maxima, espera_maxima = (parte.strip() for parte in texto.split(','))
+            return cls(nome, prioridade, int(limite), int(fila_maxima), float(espera_maxima))
+        except ValueError:
+            raise ValueError(f"Configuração inválida para a classe '{nome}': '{texto}' "
+                             f"(use \"limite,fila,espera em segundos\").")
+
+
+class _Espera:
+    __slots__ = ('classe', 'evento', 'futuro', 'loop', 'admitida', 'entrada')
+
+    def __init__(self, classe, futuro=None, loop=None):
+        self.classe = classe
+        self.evento = threading.Event() if futuro is None else None
+        self.futuro = futuro
+        self.loop = loop
+        self.admitida = False
+        self.entrada = None  # Posição na fila: (prioridade, ordem de chegada, espera)
+
+    def acordar(self):
+        if self.futuro is not None:
+            self.loop.call_soon_threadsafe(self._definir_futuro)
+        else:
+            self.evento.set()
+
+    def _definir_futuro(self):
+        if not self.futuro.done():
+            self.futuro.set_result(True)
+
+
+class ControleDeAdmissao:
+    def __init__(self, classes, limite_total=32, reserva_prioritaria=4, ativo=True):
+        self.classes = {classe.nome: classe for classe in classes}
+        self.limite_total = limite_total
+        self.reserva_prioritaria = min(reserva_prioritaria, limite_total)
+        self.ativo = ativo  # False: entrar() admite tudo sem contar nada
+
+        self._lock = threading.Lock()
+        self._fila = []  # Ordenada por (prioridade, ordem de chegada)
+        self._chegada = itertools.count()
+        self._ativos = 0
+
+    def _cabe(self, classe):
+        limite = self.limite_total if classe.prioridade == 0 else self.limite_total - self.reserva_prioritaria
+        return classe.ativos < classe.limite and self._ativos < limite
+
+    def _ocupar(self, classe):
+        classe.ativos += 1
+        classe.admitidas += 1
+        self._ativos += 1
+
+    def _retry_after(self, classe):
+        # Tempo para a fila da classe andar, pelo tempo médio de atendimento.
+        estimativa = (classe.na_fila + 1) / max(classe.limite, 1) * classe.duracao_media
+        return max(1, min(RETRY_AFTER_MAXIMO, math.ceil(estimativa)))
+
+    def _admitir_ou_enfileirar(self, nome, futuro=None, loop=None):
+        # Devolve None se a requisição já foi admitida, ou a _Espera a aguardar.
+        classe = self.classes[nome]
+        with self._lock:
+            # Sempre que uma vaga abre, a fila é atendida na hora (ver _atender_fila): se cabe
+            # agora, não há ninguém da mesma classe na frente esperando por ela.
+            if self._cabe(classe):
+                self._ocupar(classe)
+                return None
+            if classe.na_fila >= classe.fila_maxima:
+                classe.recusadas_fila_cheia += 1
+                raise RequisicaoRecusadaError(
+                    nome, 429, self._retry_after(classe),
+                    f"Fila da classe '{nome}' cheia ({classe.fila_maxima} requisições).")
+            espera = _Espera(classe, futuro, loop)
+            espera.entrada = (classe.prioridade, next(self._chegada), espera)
+            bisect.insort(self._fila, espera.entrada)  # A ordem de chegada desempata: a _Espera nunca é comparada
+            classe.na_fila += 1
+            classe.enfileiradas += 1
+            return espera
+
+    def _desistir(self, espera, inicio):
+        # True se a requisição ainda estava na fila (e saiu dela); False se já foi admitida.
+        classe = espera.classe
+        with self._lock:
+            classe.segundos_na_fila += time.monotonic() - inicio
+            if espera.admitida:
+                return False
+            self._fila.remove(espera.entrada)
+            classe.na_fila -= 1
+            classe.recusadas_espera += 1
+            return True
+
+    def _recusa_por_espera(self, classe):
+        return RequisicaoRecusadaError(
+            classe.nome, 503, self._retry_after(classe),
+            f"Tempo de espera esgotado na classe '{classe.nome}' ({classe.espera_maxima:g}s).")
+
+    def _atender_fila(self):
+        # Com o lock: admite, em ordem de prioridade e chegada, quem couber nas vagas abertas.
+        restantes = []
+        for indice, entrada in enumerate(self._fila):
+            if self._ativos >= self.limite_total:
+                restantes.extend(self._fila[indice:])
+                break
+            espera = entrada[2]
+            if self._cabe(espera.classe):
+                self._ocupar(espera.classe)
+                espera.classe.na_fila -= 1
+                espera.admitida = True
+                espera.acordar()
+            else:
+                restantes.append(entrada)
+        self._fila = restantes
+
+    def entrar(self, nome):
+        """Ocupa uma vaga da classe, esperando na fila se preciso; devolve a ficha para sair().
+
+        Lança RequisicaoRecusadaError se a fila da classe estiver cheia ou a espera esgotar.
+        """
+        if not self.ativo:
+            return None
+        inicio = time.monotonic()
+        espera = self._admitir_ou_enfileirar(nome)
+        if espera is not None:
+            espera.evento.wait(espera.classe.espera_maxima)
+            if self._desistir(espera, inicio):
+                raise self._recusa_por_espera(espera.classe)
+        return (self.classes[nome], time.monotonic())
+
+    async def entrar_async(self, nome):
+        """Como entrar(), para o servidor assíncrono: espera a vaga sem bloquear o loop."""
+        if not self.ativo:
+            return None
+        inicio = time.monotonic()
+        loop = asyncio.get_running_loop()
+        espera = self._admitir_ou_enfileirar(nome, loop.create_future(), loop)
+        if espera is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(espera.futuro), espera.classe.espera_maxima)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # Cliente desconectou: sai da fila ou devolve a vaga que chegou junto.
+                if not self._desistir(espera, inicio):
+                    self.sair((espera.classe, time.monotonic()))
+                raise
+            if self._desistir(espera, inicio):
+                raise self._recusa_por_espera(espera.classe)
+        return (self.classes[nome], time.monotonic())
+
+    def sair(self, ficha):
+        """Devolve a vaga ocupada por entrar()/entrar_async() (sem efeito com ficha None)."""
+        if ficha is None:
+            return
+        classe, admitida_em = ficha
+        duracao = time.monotonic() - admitida_em
+        with self._lock:
+            classe.ativos -= 1
+            self._ativos -= 1
+            classe.duracao_media = duracao if not classe.duracao_media else 0.9 * classe.duracao_media + 0.1 * duracao
+            if self._fila:
+                self._atender_fila()
+
+    def estatisticas(self):
+        with self._lock:
+            estatisticas = {
+                'ativo': self.ativo,
+                'limite_total': self.limite_total,
+                'reserva_prioritaria': self.reserva_prioritaria,
+                'ativos': self._ativos,
+                'na_fila': len(self._fila),
+            }
+            for nome, classe in self.classes.items():
+                estatisticas.update({
+                    f'{nome}_limite': classe.limite,
+                    f'{nome}_ativos': classe.ativos,
+                    f'{nome}_na_fila': classe.na_fila,
+                    f'{nome}_admitidas': classe.admitidas,
+                    f'{nome}_enfileiradas': classe.enfileiradas,
+                    f'{nome}_recusadas_fila_cheia': classe.recusadas_fila_cheia,
+                    f'{nome}_recusadas_espera': classe.recusadas_espera,
+                    f'{nome}_ms_medio_na_fila': round(classe.segundos_na_fila * 1000 / classe.enfileiradas, 2)
+                                               if classe.enfileiradas else 0.0,
+                    f'{nome}_ms_medio_atendimento': round(classe.duracao_media * 1000, 2),
+                })
+            return estatisticas
@@ -2,18 +2,45 @@
 # Importa bibliotecas necessárias para o funcionamento da aplicação
 import os  # Para manipulação de arquivos e variáveis de ambiente
 import psycopg2  # Para conexão com o banco de dados PostgreSQL
+import psycopg2.extras  # Para decodificar colunas json/jsonb com o mesmo decodificador das respostas
 import json 
+import base64  # Para codificar os cursores de paginação em texto seguro para URLs
+import hashlib  # Para gerar os ETags das respostas do catálogo
+import io  # Para ler o corpo das requisições de importação como texto, em fluxo
+import itertools  # Para recompor o fluxo depois de ler o primeiro item
+import time  # Para medir a latência das requisições
 from decimal import Decimal  # Para manipulação precisa de valores monetários
-from flask import Flask, jsonify, request, render_template, send_from_directory  # Framework Flask para criar a API
+from flask import Flask, Response, g, jsonify, redirect, request, render_template, send_from_directory  # Framework Flask para criar a API
 from flask_cors import CORS  # Para permitir requisições de diferentes origens (CORS)
 from werkzeug.utils import secure_filename  # Para manipulação segura de nomes de arquivos
-from werkzeug.security import generate_password_hash, check_password_hash  # Para segurança de senhas
 import jwt  # Para geração e validação de tokens JWT (autenticação)
-from datetime import datetime, timedelta  # Para manipulação de datas e tempos
+from pool_conexoes import PoolDeConexoes  # Pool de conexões reutilizáveis com o PostgreSQL
+from replicas import SQL_LSN_PRIMARIO, RoteadorDeLeitura, configs_das_replicas  # Leituras nas réplicas, escritas no primário
+from consultas_preparadas import ConexaoComPreparadas, ConsultasPreparadas  # PREPARE/EXECUTE das consultas frequentes
+from metricas import RegistroMetricas  # Contadores e histogramas exportados em /metrics
+from instrumentacao import Instrumentacao  # Medição das DAOs, do SQL e log de consultas lentas
+from cache_catalogo import CacheCatalogo  # Cache em memória das leituras de produtos
+from senhas import ServicoDeSenhas, SenhasSobrecarregadasError  # Hash de senhas fora das threads do servidor
+from feed_produtos import FeedDeProdutos, FeedLotadoError  # Alterações do catálogo via LISTEN/NOTIFY
+from particoes_pedido import ManutencaoDeParticoes  # Partições mensais de PEDIDO/ITEM_PEDIDO e arquivamento
+from venda_relampago import FilaDePedidos, FilaDePedidosCheiaError, LiberadorDeReservas  # Reservas e pedidos em lote
+from admissao import ClasseDeRota, ControleDeAdmissao, RequisicaoRecusadaError  # Limites e filas por classe de rota
+import imagens  # Imagens gravadas pelo hash do conteúdo, com variantes WebP
+from imagens import ArmazemDeImagens, ImagemGrandeDemaisError, ImagemInvalidaError
+from compressao import Compressor  # gzip/brotli nas respostas de texto
+from serializacao import Mapeador, ProvedorJSON, codificar, decodificar  # Linhas -> dicts e JSON via orjson
+from estaticos import NOME_MANIFESTO, PASTA_DIST, Estaticos, construir as construir_estaticos  # Build dos CSS/JS/imagens
+import carga_catalogo  # Importação/exportação em lote do catálogo via COPY
+from carga_catalogo import ErroFormatoImportacao
+import lote_produtos  # Alterações, ajustes de estoque e remoções em lote
+from lote_produtos import ErroFormatoLote
+from datetime import date, datetime, timedelta, timezone  # Para manipulação de datas e tempos
 from functools import wraps  # Para criar decorators (funções que modificam outras funções)
+import click  # Para os comandos de linha de comando do Flask (ex: flask reconstruir-resumo-vendas)
 
 # --- Configuração da Aplicação Flask ---
 app = Flask(__name__)
+app.json = ProvedorJSON(app)  # jsonify e request.get_json com orjson (ver serializacao.py)
 CORS(app)
 app.config['SECRET_KEY'] = os.getenv("SECRET_KEY", "o_tesouro_one_piece_existe")
 
@@ -22,6 +49,17 @@ UPLOAD_FOLDER = 'static/uploads/produtos'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+CACHE_IMUTAVEL = 365 * 24 * 3600  # Arquivos com o hash do conteúdo no nome nunca mudam
+
+# Uploads são gravados pelo hash do conteúdo; as variantes WebP (para o srcset)
+# são geradas em um pool de processos com IMAGEM_PROCESSOS processos.
+armazem_imagens = ArmazemDeImagens(
+    UPLOAD_FOLDER,
+    processos=int(os.getenv("IMAGEM_PROCESSOS", "2")),
+    fila_maxima=int(os.getenv("IMAGEM_FILA_MAXIMA", "64")),
+    tamanho_maximo=int(os.getenv("IMAGEM_TAMANHO_MAXIMO_MB", "10")) * 1024 * 1024,
+    prefixo_url='/' + UPLOAD_FOLDER
+)
 
 # --- Configuração do Banco de Dados ---
 db_config = {
@@ -31,6 +69,380 @@ db_config = {
     "password": os.getenv("POSTGRES_PASSWORD", "meusonhoeh")
 }
 
+# Colunas json/jsonb (ex: itens agregados do histórico) com o mesmo decodificador das requisições.
+psycopg2.extras.register_default_json(loads=decodificar, globally=True)
+psycopg2.extras.register_default_jsonb(loads=decodificar, globally=True)
+
+# --- Métricas e Instrumentação ---
+# Cada comando SQL passa por um cursor instrumentado; comandos acima de
+# SLOW_QUERY_MS vão para o log de consultas lentas e uma fração deles
+# (SLOW_QUERY_EXPLAIN_AMOSTRAGEM, de 0 a 1) recebe o plano do EXPLAIN ANALYZE.
+metricas = RegistroMetricas()
+instrumentacao = Instrumentacao(
+    metricas,
+    limite_lento_ms=float(os.getenv("SLOW_QUERY_MS", "200")),
+    amostragem_explain=float(os.getenv("SLOW_QUERY_EXPLAIN_AMOSTRAGEM", "0"))
+)
+
+# --- Pool de Conexões ---
+# Todas as DAOs compartilham este pool; as conexões são abertas sob demanda
+# e devolvidas (não fechadas) ao final de cada operação.
+pool_conexoes = PoolDeConexoes(
+    {**db_config, 'cursor_factory': instrumentacao.cursor_factory, 'connection_factory': ConexaoComPreparadas},
+    minimo=int(os.getenv("DB_POOL_MIN", "1")),
+    maximo=int(os.getenv("DB_POOL_MAX", "10")),
+    timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+    validar_apos=float(os.getenv("DB_POOL_VALIDAR_APOS", "30"))
+)
+
+# --- Réplicas de Leitura ---
+# DB_REPLICAS lista réplicas em replicação por streaming ('replica1,replica2:5433'), com
+# o mesmo banco, usuário e senha do primário. As leituras das DAOs vão a elas (cada uma
+# com seu pool); réplicas mais de DB_REPLICA_LAG_MAXIMO segundos atrás do primário saem
+# do rodízio até alcançá-lo. Sem DB_REPLICAS, tudo vai ao primário, como antes.
+roteador = RoteadorDeLeitura(
+    pool_conexoes,
+    [PoolDeConexoes(
+        {**config, 'cursor_factory': instrumentacao.cursor_factory, 'connection_factory': ConexaoComPreparadas},
+        minimo=int(os.getenv("DB_POOL_MIN", "1")),
+        maximo=int(os.getenv("DB_REPLICA_POOL_MAX", os.getenv("DB_POOL_MAX", "10"))),
+        timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+        validar_apos=float(os.getenv("DB_POOL_VALIDAR_APOS", "30"))
+    ) for config in configs_das_replicas(os.getenv("DB_REPLICAS", ""), db_config)],
+    lag_maximo=float(os.getenv("DB_REPLICA_LAG_MAXIMO", "5")),
+    intervalo=float(os.getenv("DB_REPLICA_INTERVALO", "1")),
+    obter=instrumentacao.obter_conexao
+)
+COOKIE_LSN = 'mugiwara_lsn'
+CABECALHO_LSN = 'X-Mugiwara-LSN'
+LSN_SESSAO_SEGUNDOS = int(os.getenv("DB_LSN_SESSAO_SEGUNDOS", "300"))  # Validade do cookie com o LSN da última escrita
+
+# --- Consultas Preparadas ---
+# As consultas mais frequentes são preparadas uma vez em cada conexão do pool e
+# executadas com EXECUTE, sem nova análise e planejamento a cada chamada.
+# DB_CONSULTAS_PREPARADAS=0 volta a enviar o texto completo (para comparação).
+consultas_preparadas = ConsultasPreparadas(ativo=os.getenv("DB_CONSULTAS_PREPARADAS", "1") != "0")
+
+# --- Cache do Catálogo ---
+# Guarda as respostas já serializadas das leituras de produtos. É invalidado
+# pelas escritas em PRODUTO e pelos pedidos concluídos (que alteram o estoque).
+cache_catalogo = CacheCatalogo(
+    tamanho_maximo=int(os.getenv("CACHE_CATALOGO_TAMANHO", "512")),
+    ttl=float(os.getenv("CACHE_CATALOGO_TTL", "60"))
+)
+# Com réplicas, as cargas do cache depois de uma alteração só leem réplicas que já a aplicaram.
+cache_catalogo.ao_invalidar(roteador.marcar_catalogo_alterado)
+
+# --- Hash de Senhas ---
+# Verificações e geração de hashes rodam em um pool de processos limitado.
+# SENHA_HASH_METODO deve trazer todos os parâmetros de custo (ex: 'pbkdf2:sha256:1000000'
+# ou 'scrypt:32768:8:1'); hashes com parâmetros diferentes são refeitos no próximo login.
+servico_senhas = ServicoDeSenhas(
+    metodo=os.getenv("SENHA_HASH_METODO", "pbkdf2:sha256:1000000"),
+    processos=int(os.getenv("SENHA_PROCESSOS", "2")),
+    fila_maxima=int(os.getenv("SENHA_FILA_MAXIMA", "16")),
+    timeout=float(os.getenv("SENHA_TIMEOUT", "10"))
+)
+
+@app.errorhandler(SenhasSobrecarregadasError)
+def senhas_sobrecarregadas(e):
+    print(f"Login/registro recusado: {e}")
+    resposta = jsonify({'message': 'Muitas requisições de login no momento. Tente novamente em instantes.'})
+    resposta.headers['Retry-After'] = '1'
+    return resposta, 503
+
+# --- Feed de Alterações do Catálogo ---
+# Uma thread escuta o canal 'produtos_alterados' (publicado pelas triggers de PRODUTO)
+# e repassa os eventos aos navegadores em /api/produtos/stream. Como os eventos vêm de
+# qualquer processo, eles também invalidam o cache do catálogo deste processo.
+feed_produtos = FeedDeProdutos(
+    db_config,
+    max_assinantes=int(os.getenv("SSE_MAX_CLIENTES", "100"))
+)
+feed_produtos.ao_receber(lambda evento: cache_catalogo.invalidar())
+SSE_INTERVALO_PING = 15  # Segundos entre comentários de keep-alive no SSE
+
+@app.before_request
+def iniciar_feed_produtos():
+    # A escuta começa no primeiro acesso, e não na importação (o banco pode ainda não estar de pé).
+    feed_produtos.iniciar()
+
+# --- Partições de Pedidos ---
+# PEDIDO e ITEM_PEDIDO são particionadas por mês. Uma thread por processo cria as
+# partições dos próximos PARTICOES_MESES_FUTUROS meses e, com PARTICOES_MESES_ATIVOS > 0,
+# arquiva os meses mais antigos que essa janela (os relatórios continuam cobrindo esses
+# meses, pelos resumos de vendas). PARTICOES_INTERVALO=0 desliga a thread, para quem
+# preferir agendar `flask manter-particoes` (ex: cron).
+manutencao_particoes = ManutencaoDeParticoes(
+    db_config,
+    meses_futuros=int(os.getenv("PARTICOES_MESES_FUTUROS", "3")),
+    meses_ativos=int(os.getenv("PARTICOES_MESES_ATIVOS", "0")),
+    intervalo=float(os.getenv("PARTICOES_INTERVALO", "3600"))
+)
+
+@app.before_request
+def iniciar_manutencao_particoes():
+    manutencao_particoes.iniciar()
+
+# --- Venda Relâmpago ---
+# Produtos com a venda relâmpago aberta (POST /api/produtos/<id>/venda-relampago) são
+# vendidos por reserva: POST /api/reservas separa o estoque por VENDA_RELAMPAGO_RESERVA_SEGUNDOS
+# e POST /api/pedidos com "id_reserva" confirma a compra. As confirmações passam por uma
+# fila e são gravadas em lotes de até FILA_PEDIDOS_LOTE_MAXIMO pedidos por transação;
+# as reservas vencidas voltam ao estoque a cada VENDA_RELAMPAGO_INTERVALO_LIBERACAO segundos.
+VENDA_RELAMPAGO_RESERVA_SEGUNDOS = int(os.getenv("VENDA_RELAMPAGO_RESERVA_SEGUNDOS", "300"))
+fila_pedidos = FilaDePedidos(
+    lambda pedidos: PedidoDAO().confirmar_reservas(pedidos),
+    lote_maximo=int(os.getenv("FILA_PEDIDOS_LOTE_MAXIMO", "200")),
+    espera=float(os.getenv("FILA_PEDIDOS_ESPERA_MS", "2")) / 1000,
+    capacidade=int(os.getenv("FILA_PEDIDOS_CAPACIDADE", "10000")),
+    timeout=float(os.getenv("FILA_PEDIDOS_TIMEOUT", "10"))
+)
+liberador_reservas = LiberadorDeReservas(
+    db_config,
+    intervalo=float(os.getenv("VENDA_RELAMPAGO_INTERVALO_LIBERACAO", "5"))
+)
+
+@app.before_request
+def iniciar_liberador_reservas():
+    liberador_reservas.iniciar()
+
+@app.errorhandler(FilaDePedidosCheiaError)
+def fila_pedidos_cheia(e):
+    print(f"Confirmação de pedido recusada: {e}")
+    resposta = jsonify({'status': 'erro', 'mensagem': 'Muitos pedidos no momento. Tente novamente em instantes.'})
+    resposta.headers['Retry-After'] = '1'
+    return resposta, 503
+
+@app.before_request
+def iniciar_roteamento():
+    # LSN da última escrita do cliente (cookie do navegador ou cabeçalho de outros clientes da API):
+    # as leituras desta requisição só usam réplicas que já o aplicaram.
+    roteador.iniciar()
+    roteador.iniciar_requisicao(request.cookies.get(COOKIE_LSN), request.headers.get(CABECALHO_LSN))
+
+@app.after_request
+def devolver_lsn(resposta):
+    lsn = roteador.lsn_escrito()
+    if lsn:
+        resposta.headers[CABECALHO_LSN] = lsn
+        resposta.set_cookie(COOKIE_LSN, lsn, max_age=LSN_SESSAO_SEGUNDOS, httponly=True, samesite='Lax')
+    return resposta
+
+# --- Métricas HTTP ---
+requisicoes_http = metricas.contador(
+    'mugiwara_http_requisicoes_total', 'Requisições HTTP atendidas.', ('metodo', 'rota', 'status'))
+duracao_http = metricas.histograma(
+    'mugiwara_http_duracao_segundos', 'Latência das requisições HTTP (até o início da resposta).', ('metodo', 'rota'))
+metricas.registrar_estatisticas('mugiwara_pool', 'Pool de conexões', pool_conexoes.estatisticas)
+metricas.registrar_estatisticas('mugiwara_replicas', 'Réplicas de leitura', roteador.estatisticas)
+metricas.registrar_estatisticas('mugiwara_consultas_preparadas', 'Consultas preparadas', consultas_preparadas.estatisticas)
+metricas.registrar_estatisticas('mugiwara_cache_catalogo', 'Cache do catálogo', cache_catalogo.estatisticas)
+metricas.registrar_estatisticas('mugiwara_senhas', 'Verificação de senhas', servico_senhas.estatisticas)
+metricas.registrar_estatisticas('mugiwara_feed_produtos', 'Feed de alterações do catálogo', feed_produtos.estatisticas)
+metricas.registrar_estatisticas('mugiwara_imagens', 'Uploads e variantes de imagens', armazem_imagens.estatisticas)
+metricas.registrar_estatisticas('mugiwara_particoes', 'Partições e arquivamento de pedidos', manutencao_particoes.estatisticas)
+metricas.registrar_estatisticas('mugiwara_fila_pedidos', 'Confirmação de pedidos em lote', fila_pedidos.estatisticas)
+metricas.registrar_estatisticas('mugiwara_reservas', 'Liberação de reservas de estoque', liberador_reservas.estatisticas)
+
+@app.before_request
+def iniciar_medicao():
+    g.inicio_requisicao = time.perf_counter()
+
+@app.after_request
+def registrar_medicao(resposta):
+    inicio = g.pop('inicio_requisicao', None)
+    if inicio is not None:
+        # Usa o padrão da rota (ex: /api/produtos/<int:id_produto>) para não explodir o número de séries.
+        rota = request.url_rule.rule if request.url_rule else 'sem_rota'
+        duracao_http.observar(time.perf_counter() - inicio, request.method, rota)
+        requisicoes_http.incrementar(request.method, rota, str(resposta.status_code))
+    return resposta
+
+# --- Controle de Admissão ---
+# As rotas caras não podem tomar o servidor das baratas e do checkout: cada classe de rota
+# tem um limite de requisições em andamento e uma fila de espera limitada (ver admissao.py).
+# Cada classe se configura com ADMISSAO_<CLASSE>="limite,fila,espera em segundos"; o limite
+# total vale para todas juntas, com ADMISSAO_RESERVA_CHECKOUT vagas só para o checkout.
+# Status, /metrics, o feed SSE e os arquivos estáticos ficam de fora. ADMISSAO=0 desliga.
+controle_admissao = ControleDeAdmissao(
+    [
+        ClasseDeRota.configurada('checkout', 0, os.getenv("ADMISSAO_CHECKOUT", "16,200,5")),
+        ClasseDeRota.configurada('leitura', 1, os.getenv("ADMISSAO_LEITURA", "16,200,2")),
+        ClasseDeRota.configurada('login', 2, os.getenv("ADMISSAO_LOGIN", "4,32,2")),
+        ClasseDeRota.configurada('listagem', 3, os.getenv("ADMISSAO_LISTAGEM", "2,8,5")),
+        ClasseDeRota.configurada('relatorios', 3, os.getenv("ADMISSAO_RELATORIOS", "2,8,5")),
+        ClasseDeRota.configurada('lote', 3, os.getenv("ADMISSAO_LOTE", "2,4,10")),
+    ],
+    limite_total=int(os.getenv("ADMISSAO_LIMITE_TOTAL", "32")),
+    reserva_prioritaria=int(os.getenv("ADMISSAO_RESERVA_CHECKOUT", "4")),
+    ativo=os.getenv("ADMISSAO", "1") != "0"
+)
+metricas.registrar_estatisticas('mugiwara_admissao', 'Controle de admissão por classe de rota', controle_admissao.estatisticas)
+
+# (método, padrão da rota) -> classe; o padrão é o mesmo das métricas HTTP.
+CLASSES_DE_ROTA = {
+    ('POST', '/api/pedidos'): 'checkout',
+    ('POST', '/api/reservas'): 'checkout',
+    ('DELETE', '/api/reservas/<int:id_reserva>'): 'checkout',
+    ('GET', '/api/produtos/<int:id_produto>'): 'leitura',
+    ('GET', '/api/produtos/buscar'): 'leitura',
+    ('GET', '/api/produtos/autocomplete'): 'leitura',
+    ('GET', '/api/produtos/changes'): 'leitura',
+    ('GET', '/api/pedidos/historico'): 'leitura',
+    ('GET', '/api/cliente/perfil'): 'leitura',
+    ('GET', '/api/produtos'): 'leitura',
+    ('POST', '/api/login'): 'login',
+    ('POST', '/api/registrar'): 'login',
+    ('POST', '/api/funcionarios/registrar'): 'login',
+    ('GET', '/api/produtos/relatorio'): 'relatorios',
+    ('GET', '/api/produtos/estoque-baixo'): 'relatorios',
+    ('GET', '/api/relatorios/vendas'): 'relatorios',
+    ('GET', '/api/relatorios/vendas-mensal'): 'relatorios',
+    ('POST', '/api/produtos/importar'): 'lote',
+    ('POST', '/api/produtos/lote'): 'lote',
+    ('GET', '/api/produtos/exportar'): 'lote',
+    ('POST', '/api/upload'): 'lote',
+}
+
+# Leituras paginadas que também respondem em fluxo (?stream=json|ndjson, ver formato_de_fluxo):
+# a listagem completa segura a vaga até o fim do corpo, então tem classe própria e as
+# páginas continuam na classe 'leitura'.
+ROTAS_COM_FLUXO = {('GET', '/api/produtos'), ('GET', '/api/pedidos/historico')}
+
+def classe_da_rota(metodo, rota, args):
+    if (metodo, rota) in ROTAS_COM_FLUXO and args.get('stream') is not None:
+        return 'listagem'
+    return CLASSES_DE_ROTA.get((metodo, rota))
+
+@app.before_request
+def admitir_requisicao():
+    # Depois de iniciar_medicao: o tempo na fila entra na latência medida.
+    classe = classe_da_rota(request.method, request.url_rule.rule if request.url_rule else None, request.args)
+    if classe:
+        g.ficha_admissao = controle_admissao.entrar(classe)
+
+@app.after_request
+def manter_vaga_no_fluxo(resposta):
+    # Respostas em fluxo (listagens completas, exportação) seguem usando o banco depois do
+    # fim da view: a vaga só é devolvida quando o servidor termina de enviar o corpo.
+    ficha = g.get('ficha_admissao')
+    if ficha is not None and resposta.is_streamed:
+        g.pop('ficha_admissao')
+        resposta.call_on_close(lambda: controle_admissao.sair(ficha))
+    return resposta
+
+def liberar_vaga_de_admissao():
+    """Devolve a vaga da requisição antes do fim dela (sem efeito se ela não ocupa nenhuma)."""
+    controle_admissao.sair(g.pop('ficha_admissao', None))
+
+@app.teardown_request
+def liberar_vaga(_erro):
+    liberar_vaga_de_admissao()
+
+@app.errorhandler(RequisicaoRecusadaError)
+def requisicao_recusada(e):
+    print(f"Requisição recusada pelo controle de admissão: {e}")
+    resposta = jsonify({'status': 'erro', 'mensagem': 'Servidor ocupado no momento. Tente novamente em instantes.',
+                        'classe': e.classe})
+    resposta.headers['Retry-After'] = str(e.retry_after)
+    return resposta, e.status
+
+def entrada_do_catalogo(dados):
+    """O que o cache guarda de uma leitura do catálogo: (corpo JSON, ETag, Last-Modified)."""
+    corpo = codificar(dados)
+    modificado_em = datetime.fromtimestamp(cache_catalogo.modificado_em, timezone.utc)
+    return (corpo, hashlib.sha256(corpo).hexdigest()[:32], modificado_em)
+
+def resposta_do_catalogo(chave, carregar):
+    """Serve uma leitura do catálogo pelo cache, com ETag forte, Last-Modified e 304."""
+    def montar():
+        dados = carregar()
+        if dados is None:
+            return None  # Erros e "não encontrado" não vão para o cache
+        return entrada_do_catalogo(dados)
+
+    entrada = cache_catalogo.obter_ou_carregar(chave, montar)
+    if entrada is None:
+        return None
+    corpo, etag, modificado_em = entrada
+    resposta = app.response_class(corpo, mimetype='application/json')
+    resposta.set_etag(etag)
+    resposta.last_modified = modificado_em
+    # 'no-cache' permite guardar a resposta, mas obriga a revalidar; a revalidação custa um 304 sem corpo.
+    resposta.headers['Cache-Control'] = 'no-cache'
+    return resposta.make_conditional(request)
+
+# --- COMPRESSÃO E ARQUIVOS ESTÁTICOS ---
+# Respostas JSON/HTML acima de COMPRESSAO_MINIMO_BYTES saem com brotli ou gzip,
+# conforme o Accept-Encoding. CSS, JS e imagens do layout vêm do build
+# (python estaticos.py): nomes com hash, .br/.gz prontos e cache de um ano.
+compressor = Compressor(minimo_bytes=int(os.getenv("COMPRESSAO_MINIMO_BYTES", "1024")))
+estaticos = Estaticos(app.static_folder)
+metricas.registrar_estatisticas('mugiwara_compressao', 'Compressão das respostas', compressor.estatisticas)
+
+@app.after_request
+def comprimir_resposta(resposta):
+    return compressor.aplicar(resposta, request.accept_encodings)
+
+@app.context_processor
+def urls_estaticas():
+    # Nos templates: {{ estatico('css/style.css') }} -> /static/dist/css/style.<hash>.css
+    return {'estatico': estaticos.url}
+
+# --- RESPOSTAS EM FLUXO (STREAMING) ---
+# Listas grandes podem ser transmitidas à medida que as linhas saem do banco
+# (cursor server-side), como array JSON ou NDJSON: ?stream=json ou ?stream=ndjson.
+FORMATOS_FLUXO = {'json': 'application/json', 'ndjson': 'application/x-ndjson'}
+ITERSIZE_FLUXO = int(os.getenv("DB_STREAM_ITERSIZE", "2000"))  # Linhas buscadas por ida ao banco
+TAMANHO_BLOCO_FLUXO = 64 * 1024  # Bytes acumulados antes de cada envio ao cliente
+_FIM_DO_FLUXO = object()
+
+def resposta_em_fluxo(itens, formato):
+    """Transmite os itens de um gerador em blocos. Devolve None se a consulta falhar antes do primeiro item."""
+    try:
+        # Busca o primeiro item antes de responder, para que erros na consulta ainda virem 500.
+        primeiro = next(itens, _FIM_DO_FLUXO)
+    except Exception as e:
+        print(f"Erro ao iniciar resposta em fluxo: {e}")
+        return None
+
+    def gerar():
+        partes, tamanho = [], 0
+        try:
+            if primeiro is not _FIM_DO_FLUXO:
+                for indice, item in enumerate(itertools.chain([primeiro], itens)):
+                    if formato == 'ndjson':
+                        texto = codificar(item) + b'\n'
+                    else:
+                        texto = (b'[' if indice == 0 else b',') + codificar(item)
+                    partes.append(texto)
+                    tamanho += len(texto)
+                    if tamanho >= TAMANHO_BLOCO_FLUXO:
+                        yield b''.join(partes)
+                        partes, tamanho = [], 0
+                if formato == 'json':
+                    partes.append(b']')
+            elif formato == 'json':
+                partes.append(b'[]')
+            yield b''.join(partes)
+        except Exception as e:
+            # O status 200 já foi enviado: só resta registrar e encerrar a resposta (que fica incompleta).
+            print(f"Erro durante resposta em fluxo: {e}")
+        finally:
+            itens.close()  # Devolve a conexão ao pool mesmo se o cliente desconectar no meio
+
+    return Response(gerar(), mimetype=FORMATOS_FLUXO[formato])
+
+def formato_de_fluxo(args=None):
+    # Lê ?stream=...; None quando a rota deve responder da forma tradicional.
+    formato = (request.args if args is None else args).get('stream')
+    if formato is None:
+        return None
+    if formato not in FORMATOS_FLUXO:
+        raise ValueError(f"Parâmetro 'stream' inválido. Use um de: {', '.join(FORMATOS_FLUXO)}.")
+    return formato
+
 # --- DECORATOR DE AUTENTICAÇÃO ---
 def token_required(f):
     @wraps(f)
@@ -45,62 +457,436 @@ def token_required(f):
         return f(data, *args, **kwargs)
     return decorated
 
+# --- PAGINAÇÃO DO CATÁLOGO (KEYSET) ---
+# Cada ordenação aceita mapeia para a coluna usada no ORDER BY e a direção.
+# O id_produto entra sempre como desempate, para que o cursor seja único.
+ORDENACOES_CATALOGO = {
+    'nome_asc': ('nome', 'ASC'),
+    'nome_desc': ('nome', 'DESC'),
+    'preco_asc': ('preco', 'ASC'),
+    'preco_desc': ('preco', 'DESC'),
+}
+LIMITE_PADRAO_CATALOGO = 24
+LIMITE_MAXIMO_CATALOGO = 100
+
+def codificar_cursor(valor, id_produto):
+    # O preço vai como texto para não perder precisão no vai-e-volta do JSON.
+    if isinstance(valor, Decimal):
+        valor = str(valor)
+    bruto = json.dumps([valor, id_produto]).encode('utf-8')
+    return base64.urlsafe_b64encode(bruto).decode('ascii').rstrip('=')
+
+def _ler_cursor(cursor):
+    bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    return json.loads(bruto)
+
+def decodificar_cursor(cursor, ordem):
+    try:
+        valor, id_produto = _ler_cursor(cursor)
+        if not isinstance(id_produto, int):
+            raise ValueError
+        if ORDENACOES_CATALOGO[ordem][0] == 'preco':
+            valor = Decimal(valor)
+        elif not isinstance(valor, str):
+            raise ValueError
+        return (valor, id_produto)
+    except Exception:
+        raise ValueError("Cursor de paginação inválido.")
+
+def ler_filtros_catalogo(args):
+    # Converte os parâmetros da query string para os argumentos de ProdutoDAO.listarPagina.
+    ordem = args.get('ordem', 'nome_asc')
+    if ordem not in ORDENACOES_CATALOGO:
+        raise ValueError(f"Ordenação inválida. Use uma de: {', '.join(ORDENACOES_CATALOGO)}.")
+    filtros = {'categoria': args.get('categoria') or None, 'ordem': ordem}
+    for campo in ('preco_min', 'preco_max'):
+        valor = args.get(campo)
+        try:
+            filtros[campo] = Decimal(valor) if valor not in (None, '') else None
+            if filtros[campo] is not None and not filtros[campo].is_finite():
+                raise ValueError
+        except Exception:
+            raise ValueError(f"Parâmetro '{campo}' deve ser numérico.")
+    try:
+        limite = int(args.get('limite', LIMITE_PADRAO_CATALOGO))
+    except ValueError:
+        raise ValueError("Parâmetro 'limite' deve ser inteiro.")
+    filtros['limite'] = max(1, min(limite, LIMITE_MAXIMO_CATALOGO))
+    cursor = args.get('cursor')
+    filtros['apos'] = decodificar_cursor(cursor, ordem) if cursor else None
+    return filtros
+
+# --- PAGINAÇÃO DO HISTÓRICO DE PEDIDOS ---
+# Mesmo esquema do catálogo: o cursor guarda (data_pedido, id_pedido) do último
+# pedido da página, na ordem do índice PEDIDO (id_cliente, data_pedido DESC, id_pedido DESC).
+LIMITE_PADRAO_HISTORICO = 20
+LIMITE_MAXIMO_HISTORICO = 100
+
+def codificar_cursor_pedido(data_pedido, id_pedido):
+    return codificar_cursor(data_pedido.isoformat(), id_pedido)
+
+def decodificar_cursor_pedido(cursor):
+    try:
+        valor, id_pedido = _ler_cursor(cursor)
+        if not isinstance(id_pedido, int) or not isinstance(valor, str):
+            raise ValueError
+        data_pedido = datetime.fromisoformat(valor)
+        if data_pedido.tzinfo is None:
+            raise ValueError
+        return (data_pedido, id_pedido)
+    except Exception:
+        raise ValueError("Cursor de paginação inválido.")
+
+def ler_paginacao_historico(args):
+    try:
+        limite = int(args.get('limite', LIMITE_PADRAO_HISTORICO))
+    except ValueError:
+        raise ValueError("Parâmetro 'limite' deve ser inteiro.")
+    cursor = args.get('cursor')
+    return {
+        'limite': max(1, min(limite, LIMITE_MAXIMO_HISTORICO)),
+        'apos': decodificar_cursor_pedido(cursor) if cursor else None,
+        'com_itens': args.get('detalhes', '').lower() in ('1', 'true', 'sim'),
+    }
+
+# --- BUSCA DE PRODUTOS ---
+LIMITE_PADRAO_BUSCA = 20
+LIMITE_MAXIMO_BUSCA = 50
+LIMITE_AUTOCOMPLETE = 8
+
+def escapar_like(texto):
+    # Impede que '%' e '_' digitados pelo usuário virem curingas do LIKE.
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+# --- SINCRONIZAÇÃO INCREMENTAL (DELTA) ---
+# O marcador "since" é "versao" ou, no meio de uma sincronização paginada,
+# "versao.id_produto" (a posição do último item entregue).
+LIMITE_PADRAO_ALTERACOES = 1000
+LIMITE_MAXIMO_ALTERACOES = 5000
+
+def ler_marcador_alteracoes(texto):
+    try:
+        versao, _, id_produto = (texto or '0').partition('.')
+        marcador = (int(versao), int(id_produto) if id_produto else 0)
+        if marcador[0] < 0 or marcador[1] < 0:
+            raise ValueError
+        return marcador
+    except ValueError:
+        raise ValueError("Parâmetro 'since' inválido: use a versão devolvida pela chamada anterior.")
+
+def ler_data(valor):
+    # Converte 'AAAA-MM-DD' em date; vazio/ausente vira None.
+    return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+
+# --- ESTOQUE ---
+# Ponto de reposição de produtos criados sem 'estoque_minimo' (o mesmo DEFAULT da coluna).
+ESTOQUE_MINIMO_PADRAO = 5
+
 # --- CLASSES DE ACESSO A DADOS (DAOs) ---
 class BaseDAO:
+    def __init_subclass__(cls, **kwargs):
+        # Toda DAO tem seus métodos públicos medidos (chamadas, latência, erros).
+        super().__init_subclass__(**kwargs)
+        instrumentacao.instrumentar_dao(cls)
     def __init__(self):
         self.db_config = db_config
-    def _get_connection(self):
-        return psycopg2.connect(**self.db_config)
+        self.pool = pool_conexoes
+        self.roteador = roteador
+    def _get_connection(self, leitura=False, catalogo=False):
+        # Empresta uma conexão do pool em vez de abrir uma nova a cada chamada: do primário por
+        # padrão, de uma réplica em dia com leitura=True. catalogo=True para leituras que vão ao
+        # cache compartilhado do catálogo (exigem réplicas que já aplicaram a última alteração).
+        return self.roteador.obter(leitura=leitura, catalogo=catalogo)
+    def _release_connection(self, conn):
+        # Devolve a conexão ao pool de onde saiu, que desfaz transações pendentes antes de reutilizá-la.
+        self.roteador.devolver(conn)
+    def _registrar_escrita(self, conn):
+        # Após o commit: o LSN vai ao cliente, cujas próximas leituras só usam réplicas que o aplicaram.
+        self.roteador.registrar_escrita(conn)
+    def _executar_preparada(self, cursor, nome, parametros=None):
+        # Consulta registrada em consultas_preparadas: EXECUTE, preparando na conexão no primeiro uso.
+        consultas_preparadas.executar(cursor, nome, parametros)
+    def _iterar_consulta(self, sql, params, mapear, itersize=ITERSIZE_FLUXO):
+        # Gerador sobre um cursor nomeado (server-side): o PostgreSQL entrega as linhas em
+        # lotes de `itersize`, então a memória fica constante e a primeira linha chega
+        # antes de a última ser lida. A conexão volta ao pool quando o gerador termina.
+        conn = self._get_connection(leitura=True)
+        try:
+            cursor = conn.cursor(name='fluxo')
+            cursor.itersize = itersize
+            try:
+                cursor.execute(sql, params)
+                for linha in cursor:
+                    yield mapear(linha)
+            finally:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass  # Transação abortada: o rollback do pool descarta o cursor
+        finally:
+            self._release_connection(conn)
+
+# Colunas explícitas de cada leitura de PRODUTO e a conversão de cada linha no dict da API.
+COLUNAS_PRODUTO = ('id_produto', 'nome', 'descricao', 'preco', 'quantidade_estoque', 'categoria', 'fabricado_em_mari', 'imagem')
+mapa_produto = Mapeador(COLUNAS_PRODUTO, conversores={'preco': float})
+mapa_produto_com_minimo = Mapeador(COLUNAS_PRODUTO + ('estoque_minimo',), conversores={'preco': float})
+linha_para_produto = mapa_produto.linha
+linha_para_produto_com_minimo = mapa_produto_com_minimo.linha
+
+CONSULTA_PRODUTO_POR_ID = consultas_preparadas.registrar(
+    'produto_por_id', f"SELECT {mapa_produto_com_minimo.sql} FROM PRODUTO WHERE id_produto = %s;")
+
+# Totais de RESUMO_ESTOQUE por categoria (as fatias de cada categoria são somadas).
+mapa_resumo_estoque = Mapeador(
+    ('categoria', 'SUM(produtos)', 'SUM(unidades)', 'SUM(valor)', 'SUM(abaixo_minimo)'),
+    nomes=('categoria', 'produtos', 'unidades', 'valor', 'abaixo_do_minimo'),
+    conversores={'produtos': int, 'unidades': int, 'valor': float, 'abaixo_do_minimo': int}
+)
+
+# SQL e montagem das leituras do catálogo, compartilhados pelas DAOs síncronas e
+# pelas assíncronas (servidor_async.py).
+def sql_pagina_catalogo(categoria=None, preco_min=None, preco_max=None, ordem='nome_asc', apos=None, limite=LIMITE_PADRAO_CATALOGO):
+    """(sql, parâmetros) da página e (sql, parâmetros) das facetas; as facetas são None a partir da segunda página."""
+    coluna, direcao = ORDENACOES_CATALOGO[ordem]
+
+    # Filtros de preço valem tanto para a página quanto para as facetas.
+    condicoes_preco, params_preco = [], []
+    if preco_min is not None:
+        condicoes_preco.append("preco >= %s")
+        params_preco.append(preco_min)
+    if preco_max is not None:
+        condicoes_preco.append("preco <= %s")
+        params_preco.append(preco_max)
+
+    condicoes, params = list(condicoes_preco), list(params_preco)
+    if categoria:
+        condicoes.append("categoria = %s")
+        params.append(categoria)
+    if apos:
+        # Comparação de linha (keyset): continua exatamente de onde a página anterior parou,
+        # usando os índices (coluna, id_produto) em vez de OFFSET.
+        comparador = '>' if direcao == 'ASC' else '<'
+        condicoes.append(f"({coluna}, id_produto) {comparador} (%s, %s)")
+        params.extend(apos)
+
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    sql_query = f"""
+        SELECT {mapa_produto.sql}
+        FROM PRODUTO {where}
+        ORDER BY {coluna} {direcao}, id_produto {direcao}
+        LIMIT %s;
+    """
+    # Busca um registro a mais só para saber se existe próxima página.
+    params.append(limite + 1)
+
+    # As facetas só são calculadas na primeira página; as seguintes não precisam recontar.
+    if apos:
+        return sql_query, params, None, None
+    where_facetas = f"WHERE {' AND '.join(condicoes_preco)}" if condicoes_preco else ""
+    sql_facetas = f"SELECT categoria, COUNT(*) FROM PRODUTO {where_facetas} GROUP BY categoria ORDER BY categoria;"
+    return sql_query, params, sql_facetas, params_preco
+
+SQL_TODOS_PRODUTOS = f"SELECT {mapa_produto.sql} FROM PRODUTO ORDER BY nome;"
+
+def montar_pagina_catalogo(resultados, limite, ordem):
+    tem_mais = len(resultados) > limite
+    resultados = resultados[:limite]
+    proximo_cursor = None
+    if tem_mais:
+        ultimo = resultados[-1]
+        coluna = ORDENACOES_CATALOGO[ordem][0]
+        proximo_cursor = codificar_cursor(ultimo[mapa_produto.posicoes[coluna]], ultimo[0])
+    return {'produtos': mapa_produto.linhas(resultados), 'proximo_cursor': proximo_cursor}
+
+def facetas_catalogo(resultados):
+    return {'categorias': [{'categoria': r[0], 'total': r[1]} for r in resultados]}
+
+# Combina três critérios, todos atendidos por índices GIN:
+#   - full-text em português sobre nome + descrição (busca_tsv);
+#   - similaridade de palavras por trigramas (tolera erros de digitação);
+#   - substring no nome por trigramas (substitui o antigo ILIKE '%x%' sem índice).
+# O resultado é ordenado pela relevância combinada e limitado.
+SQL_BUSCA_PRODUTOS = f"""
+    SELECT {mapa_produto.sql}
+    FROM PRODUTO, websearch_to_tsquery('portuguese', %(termo)s) AS consulta
+    WHERE busca_tsv @@ consulta
+       OR %(termo)s <%% nome
+       OR nome ILIKE %(contem)s
+    ORDER BY ts_rank_cd(busca_tsv, consulta) * 2 + word_similarity(%(termo)s, nome) DESC, nome
+    LIMIT %(limite)s;
+"""
+
+def parametros_busca(nome, limite):
+    return {'termo': nome, 'contem': f'%{escapar_like(nome)}%', 'limite': limite}
+
+SQL_RELATORIO_ESTOQUE = f"""
+    SELECT {mapa_resumo_estoque.sql}
+    FROM RESUMO_ESTOQUE
+    GROUP BY categoria
+    HAVING SUM(produtos) > 0
+    ORDER BY categoria;
+"""
+
+def montar_relatorio_estoque(resultados):
+    categorias = mapa_resumo_estoque.linhas(resultados)
+    return {
+        'total_de_produtos_distintos': sum(c['produtos'] for c in categorias),
+        'valor_total_do_estoque': round(sum(c['valor'] for c in categorias), 2),
+        'unidades_em_estoque': sum(c['unidades'] for c in categorias),
+        'produtos_abaixo_do_minimo': sum(c['abaixo_do_minimo'] for c in categorias),
+        'por_categoria': categorias,
+    }
 
 class ProdutoDAO(BaseDAO):
+    def iterarTodos(self):
+        return self._iterar_consulta(SQL_TODOS_PRODUTOS, None, linha_para_produto)
+
     def listarTodos(self):
+        try:
+            return list(self.iterarTodos())
+        except Exception as e:
+            print(f"Erro ao listar produtos: {e}")
+            return []
+
+    def listarPagina(self, categoria=None, preco_min=None, preco_max=None, ordem='nome_asc', apos=None, limite=LIMITE_PADRAO_CATALOGO):
+        conn = None
+        try:
+            conn = self._get_connection(leitura=True, catalogo=True)
+            cursor = conn.cursor()
+            sql_query, params, sql_facetas, params_facetas = sql_pagina_catalogo(
+                categoria, preco_min, preco_max, ordem, apos, limite)
+            cursor.execute(sql_query, params)
+            pagina = montar_pagina_catalogo(cursor.fetchall(), limite, ordem)
+            if sql_facetas:
+                cursor.execute(sql_facetas, params_facetas)
+                pagina['facetas'] = facetas_catalogo(cursor.fetchall())
+            return pagina
+        except Exception as e:
+            print(f"Erro ao listar página de produtos: {e}")
+            return None
+        finally:
+            if conn:
+                cursor.close()
+                self._release_connection(conn)
+
+    def pesquisarPorNome(self, nome, limite=LIMITE_PADRAO_BUSCA):
         produtos = []
         conn = None
         try:
-            conn = self._get_connection()
+            conn = self._get_connection(leitura=True)
             cursor = conn.cursor()
-            sql_query = "SELECT id_produto, nome, descricao, preco, quantidade_estoque, categoria, fabricado_em_mari, imagem FROM PRODUTO ORDER BY nome;"
-            cursor.execute(sql_query)
-            resultados = cursor.fetchall()
-            for resultado in resultados:
-                produtos.append({'id_produto': resultado[0], 'nome': resultado[1], 'descricao': resultado[2],'preco': float(resultado[3]), 'quantidade_estoque': resultado[4],'categoria': resultado[5], 'fabricado_em_mari': resultado[6], 'imagem': resultado[7]})
+            cursor.execute(SQL_BUSCA_PRODUTOS, parametros_busca(nome, limite))
+            produtos = mapa_produto.linhas(cursor.fetchall())
         except Exception as e:
-            print(f"Erro ao listar produtos: {e}")
+            print(f"Erro ao pesquisar produtos por nome: {e}")
         finally:
             if conn:
                 cursor.close()
-                conn.close()
+                self._release_connection(conn)
         return produtos
 
-    def pesquisarPorNome(self, nome):
-        produtos = []
+    def listar_alteracoes(self, apos, limite=LIMITE_PADRAO_ALTERACOES):
+        # Produtos alterados e lápides com (versao, id_produto) > apos, na ordem dos índices
+        # (versao, id_produto) das duas tabelas: o custo depende das alterações, não do catálogo.
+        # Fica no primário: o `since` devolvido é o xmin deste snapshot, e réplicas em pontos
+        # diferentes da replicação dariam marcadores fora de ordem entre uma chamada e outra.
         conn = None
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
-            sql_query = "SELECT * FROM PRODUTO WHERE nome ILIKE %s;"
-            cursor.execute(sql_query, (f'%{nome}%',))
+            # As duas consultas precisam do mesmo snapshot: sem isso, uma transação que
+            # terminasse entre elas ficaria abaixo do xmin sem ter sido lida.
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY;")
+            cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::TEXT::BIGINT;")
+            xmin = cursor.fetchone()[0]
+            sql_query = """
+                SELECT versao, id_produto, FALSE AS excluido, nome, descricao, preco, quantidade_estoque,
+                       categoria, fabricado_em_mari, imagem
+                FROM PRODUTO
+                WHERE (versao, id_produto) > (%(versao)s, %(id)s)
+                UNION ALL
+                SELECT versao, id_produto, TRUE, NULL, NULL, NULL, NULL, NULL, NULL, NULL
+                FROM PRODUTO_EXCLUIDO
+                WHERE (versao, id_produto) > (%(versao)s, %(id)s)
+                ORDER BY versao, id_produto
+                LIMIT %(limite)s;
+            """
+            cursor.execute(sql_query, {'versao': apos[0], 'id': apos[1], 'limite': limite + 1})
             resultados = cursor.fetchall()
-            for resultado in resultados:
-                produtos.append({'id_produto': resultado[0], 'nome': resultado[1], 'descricao': resultado[2],'preco': float(resultado[3]), 'quantidade_estoque': resultado[4],'categoria': resultado[5], 'fabricado_em_mari': resultado[6], 'imagem': resultado[7]})
+            conn.commit()
+
+            alterados, excluidos = [], []
+            for r in resultados[:limite]:
+                if r[2]:
+                    excluidos.append({'id_produto': r[1], 'versao': r[0]})
+                else:
+                    produto = linha_para_produto((r[1],) + r[3:])
+                    produto['versao'] = r[0]
+                    alterados.append(produto)
+            completo = len(resultados) <= limite
+            if completo:
+                # Próxima sincronização parte do xmin: transações com id menor já terminaram (e
+                # estão neste resultado); as que estavam em andamento terão versão >= xmin.
+                proximo = str(xmin)
+            else:
+                ultimo = resultados[limite - 1]
+                proximo = f'{ultimo[0]}.{ultimo[1]}'
+            return {'alterados': alterados, 'excluidos': excluidos, 'since': proximo, 'completo': completo}
         except Exception as e:
-            print(f"Erro ao pesquisar produtos por nome: {e}")
+            print(f"Erro ao listar alterações do catálogo: {e}")
+            return None
         finally:
             if conn:
                 cursor.close()
-                conn.close()
-        return produtos
+                self._release_connection(conn)
+
+    def autocompletar(self, prefixo, limite=LIMITE_AUTOCOMPLETE):
+        sugestoes = []
+        conn = None
+        try:
+            conn = self._get_connection(leitura=True)
+            cursor = conn.cursor()
+            if len(prefixo) < 3:
+                # Prefixos curtos não formam trigramas úteis: usa o índice de prefixo em lower(nome).
+                sql_query = """
+                    SELECT id_produto, nome FROM PRODUTO
+                    WHERE lower(nome) LIKE %(prefixo)s
+                    ORDER BY lower(nome)
+                    LIMIT %(limite)s;
+                """
+            else:
+                # Aceita o termo em qualquer posição do nome (índice de trigramas),
+                # mas mostra primeiro os nomes que começam com ele.
+                sql_query = """
+                    SELECT id_produto, nome FROM PRODUTO
+                    WHERE nome ILIKE %(contem)s
+                    ORDER BY lower(nome) LIKE %(prefixo)s DESC, word_similarity(%(termo)s, nome) DESC, nome
+                    LIMIT %(limite)s;
+                """
+            termo = escapar_like(prefixo.lower())
+            cursor.execute(sql_query, {'termo': prefixo, 'prefixo': f'{termo}%', 'contem': f'%{termo}%', 'limite': limite})
+            for r in cursor.fetchall():
+                sugestoes.append({'id_produto': r[0], 'nome': r[1]})
+        except Exception as e:
+            print(f"Erro ao autocompletar produtos: {e}")
+        finally:
+            if conn:
+                cursor.close()
+                self._release_connection(conn)
+        return sugestoes
 
     def inserir(self, produto):
         conn = None
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
-            sql_query = "INSERT INTO PRODUTO (nome, descricao, preco, quantidade_estoque, categoria, fabricado_em_mari, imagem) VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id_produto;"
-            data = (produto['nome'], produto['descricao'], produto['preco'], produto['quantidade_estoque'], produto['categoria'], produto['fabricado_em_mari'], produto.get('imagem', ''))
+            sql_query = "INSERT INTO PRODUTO (nome, descricao, preco, quantidade_estoque, categoria, fabricado_em_mari, imagem, estoque_minimo) VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id_produto;"
+            data = (produto['nome'], produto['descricao'], produto['preco'], produto['quantidade_estoque'], produto['categoria'], produto['fabricado_em_mari'], produto.get('imagem', ''), produto.get('estoque_minimo', ESTOQUE_MINIMO_PADRAO))
             cursor.execute(sql_query, data)
             id_produto_novo = cursor.fetchone()[0]
             conn.commit()
+            self._registrar_escrita(conn)
+            cache_catalogo.invalidar()
             return id_produto_novo
         except Exception as e:
             if conn: conn.rollback()
@@ -109,25 +895,24 @@ class ProdutoDAO(BaseDAO):
         finally:
             if conn:
                 cursor.close()
-                conn.close()
+                self._release_connection(conn)
 
     def exibirUm(self, id_produto):
         produto = None
         conn = None
         try:
-            conn = self._get_connection()
+            conn = self._get_connection(leitura=True, catalogo=True)
             cursor = conn.cursor()
-            sql_query = "SELECT * FROM PRODUTO WHERE id_produto = %s;"
-            cursor.execute(sql_query, (id_produto,))
+            self._executar_preparada(cursor, CONSULTA_PRODUTO_POR_ID, (id_produto,))
             resultado = cursor.fetchone()
             if resultado:
-                produto = {'id_produto': resultado[0], 'nome': resultado[1], 'descricao': resultado[2], 'preco': float(resultado[3]), 'quantidade_estoque': resultado[4], 'categoria': resultado[5], 'fabricado_em_mari': resultado[6], 'imagem': resultado[7]}
+                produto = linha_para_produto_com_minimo(resultado)
         except Exception as e:
             print(f"Erro ao buscar produto: {e}")
         finally:
             if conn:
                 cursor.close()
-                conn.close()
+                self._release_connection(conn)
         return produto
 
     def alterar(self, id_produto, produto_data):
@@ -135,10 +920,13 @@ class ProdutoDAO(BaseDAO):
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
-            sql_query = "UPDATE PRODUTO SET nome=%s, descricao=%s, preco=%s, quantidade_estoque=%s, categoria=%s, fabricado_em_mari=%s, imagem=%s WHERE id_produto = %s;"
-            data = (produto_data['nome'], produto_data['descricao'], produto_data['preco'], produto_data['quantidade_estoque'], produto_data['categoria'], produto_data['fabricado_em_mari'], produto_data.get('imagem', ''), id_produto)
+            # estoque_minimo é opcional: sem ele, o ponto de reposição atual é mantido.
+            sql_query = "UPDATE PRODUTO SET nome=%s, descricao=%s, preco=%s, quantidade_estoque=%s, categoria=%s, fabricado_em_mari=%s, imagem=%s, estoque_minimo=COALESCE(%s, estoque_minimo) WHERE id_produto = %s;"
+            data = (produto_data['nome'], produto_data['descricao'], produto_data['preco'], produto_data['quantidade_estoque'], produto_data['categoria'], produto_data['fabricado_em_mari'], produto_data.get('imagem', ''), produto_data.get('estoque_minimo'), id_produto)
             cursor.execute(sql_query, data)
             conn.commit()
+            self._registrar_escrita(conn)
+            cache_catalogo.invalidar()
             return True
         except Exception as e:
             if conn: conn.rollback()
@@ -147,7 +935,7 @@ class ProdutoDAO(BaseDAO):
         finally:
             if conn:
                 cursor.close()
-                conn.close()
+                self._release_connection(conn)
 
     def remover(self, id_produto):
         conn = None
@@ -157,6 +945,8 @@ class ProdutoDAO(BaseDAO):
             sql_query = "DELETE FROM PRODUTO WHERE id_produto = %s;"
             cursor.execute(sql_query, (id_produto,))
             conn.commit()
+            self._registrar_escrita(conn)
+            cache_catalogo.invalidar()
             return True
         except Exception as e:
             if conn: conn.rollback()
@@ -165,48 +955,144 @@ class ProdutoDAO(BaseDAO):
         finally:
             if conn:
                 cursor.close()
-                conn.close()
+                self._release_connection(conn)
+
+    def importar_em_lote(self, arquivo_texto, formato, tudo_ou_nada=False):
+        # Importa CSV/NDJSON via COPY + upsert set-based (ver carga_catalogo.py).
+        # Linhas inválidas são reportadas uma a uma; com tudo_ou_nada, qualquer erro desfaz a carga.
+        conn = None
+        try:
+            conn = self._get_connection()
+            resumo = carga_catalogo.importar(conn, arquivo_texto, formato, tudo_ou_nada)
+            if tudo_ou_nada and resumo['rejeitados']:
+                conn.rollback()
+            else:
+                conn.commit()
+                self._registrar_escrita(conn)
+                if resumo['inseridos'] or resumo['atualizados']:
+                    cache_catalogo.invalidar()
+            return resumo
+        except ErroFormatoImportacao:
+            if conn: conn.rollback()
+            raise
+        except Exception as e:
+            if conn: conn.rollback()
+            print(f"Erro ao importar produtos em lote: {e}")
+            return None
+        finally:
+            if conn:
+                self._release_connection(conn)
+
+    def aplicar_lote(self, operacoes, tudo_ou_nada=False):
+        # Alterações parciais, ajustes de estoque e remoções em uma única transação (ver lote_produtos.py).
+        conn = None
+        try:
+            conn = self._get_connection()
+            resumo = lote_produtos.aplicar(conn, operacoes, tudo_ou_nada)
+            if tudo_ou_nada and resumo['rejeitados']:
+                conn.rollback()
+            else:
+                conn.commit()
+                self._registrar_escrita(conn)
+                if resumo['alterados'] or resumo['estoque_ajustado'] or resumo['removidos']:
+                    cache_catalogo.invalidar()
+            return resumo
+        except ErroFormatoLote:
+            if conn: conn.rollback()
+            raise
+        except Exception as e:
+            if conn: conn.rollback()
+            print(f"Erro ao aplicar lote de produtos: {e}")
+            return None
+        finally:
+            if conn:
+                self._release_connection(conn)
+
+    def exportar_em_lote(self, formato):
+        # Gerador de blocos do COPY TO; a conexão fica emprestada até o fim da transmissão.
+        conn = self._get_connection(leitura=True)
+        try:
+            yield from carga_catalogo.exportar_em_blocos(conn, formato)
+        except Exception as e:
+            print(f"Erro ao exportar produtos em lote: {e}")
+            raise
+        finally:
+            self._release_connection(conn)
+
+    def exportar_para_arquivo(self, formato, arquivo):
+        conn = None
+        try:
+            conn = self._get_connection(leitura=True)
+            cursor = conn.cursor()
+            cursor.copy_expert(carga_catalogo.sql_exportacao(formato), arquivo, size=carga_catalogo.TAMANHO_BLOCO)
+            return True
+        except Exception as e:
+            print(f"Erro ao exportar produtos para arquivo: {e}")
+            return False
+        finally:
+            if conn:
+                cursor.close()
+                self._release_connection(conn)
 
     def gerarRelatorioEstoque(self):
+        # Lido de RESUMO_ESTOQUE (mantido por triggers): o custo depende do número de
+        # categorias, não do tamanho do catálogo.
         relatorio = {}
         conn = None
         try:
-            conn = self._get_connection()
+            conn = self._get_connection(leitura=True, catalogo=True)
             cursor = conn.cursor()
-            sql_query = "SELECT COUNT(*), SUM(preco * quantidade_estoque) FROM PRODUTO;"
-            cursor.execute(sql_query)
-            resultado = cursor.fetchone()
-            if resultado:
-                relatorio = {'total_de_produtos_distintos': resultado[0], 'valor_total_do_estoque': float(resultado[1]) if resultado[1] is not None else 0.0}
+            cursor.execute(SQL_RELATORIO_ESTOQUE)
+            relatorio = montar_relatorio_estoque(cursor.fetchall())
         except Exception as e:
             print(f"Erro ao gerar relatório de estoque: {e}")
         finally:
             if conn:
                 cursor.close()
-                conn.close()
+                self._release_connection(conn)
         return relatorio
     
+    def iterar_estoque_baixo(self):
+        # O filtro é o mesmo predicado do índice parcial idx_produto_abaixo_minimo, que só
+        # contém os produtos abaixo do ponto de reposição (e já está na ordem da listagem).
+        sql_query = f"""
+            SELECT {mapa_produto_com_minimo.sql}
+            FROM PRODUTO
+            WHERE quantidade_estoque < estoque_minimo
+            ORDER BY quantidade_estoque, id_produto;
+        """
+        return self._iterar_consulta(sql_query, None, linha_para_produto_com_minimo)
+
     def listar_estoque_baixo(self):
-        produtos = []
+        try:
+            return list(self.iterar_estoque_baixo())
+        except Exception as e:
+            print(f"Erro ao listar produtos com estoque baixo: {e}")
+            return []
+
+    def reconstruir_resumo_estoque(self):
         conn = None
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
-            sql_query = "SELECT id_produto, nome, descricao, preco, quantidade_estoque, categoria, fabricado_em_mari, imagem FROM PRODUTO WHERE quantidade_estoque < 5 ORDER BY quantidade_estoque;"
-            cursor.execute(sql_query)
-            resultados = cursor.fetchall()
-            for resultado in resultados:
-                produtos.append({'id_produto': resultado[0], 'nome': resultado[1], 'descricao': resultado[2],'preco': float(resultado[3]), 'quantidade_estoque': resultado[4],'categoria': resultado[5], 'fabricado_em_mari': resultado[6], 'imagem': resultado[7]})
+            cursor.execute("SELECT reconstruir_resumo_estoque();")
+            linhas = cursor.fetchone()[0]
+            conn.commit()
+            cache_catalogo.invalidar()
+            return linhas
         except Exception as e:
-            print(f"Erro ao listar produtos com estoque baixo: {e}")
+            if conn: conn.rollback()
+            print(f"Erro ao reconstruir resumo de estoque: {e}")
+            return None
         finally:
             if conn:
                 cursor.close()
-                conn.close()
-        return produtos
+                self._release_connection(conn)
 
 class ClienteDAO(BaseDAO):
     def registrar(self, cliente_data):
+        # O hash é gerado antes de pegar uma conexão, para não prendê-la durante o cálculo.
+        senha_hash = servico_senhas.gerar_hash(cliente_data['senha'])
         conn = None
         try:
             conn = self._get_connection()
@@ -220,7 +1106,6 @@ class ClienteDAO(BaseDAO):
                 sql_cep = "INSERT INTO ENDERECO_CEP (cep, logradouro, bairro, cidade, estado) VALUES (%s, %s, %s, %s, %s) ON CONFLICT (cep) DO NOTHING;"
                 cursor.execute(sql_cep, (cep_valor, cep_data.get('logradouro', ''), cep_data.get('bairro', ''), cep_data.get('cidade', ''), cep_data.get('estado', '')))
 
-            senha_hash = generate_password_hash(cliente_data['senha'])
             sql_cliente = "INSERT INTO CLIENTE (nome, email, senha_hash, numero_endereco, complemento_endereco, cep, torce_flamengo, assiste_one_piece, natural_de_sousa) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id_cliente"
             cursor.execute(sql_cliente, (
                 cliente_data['nome'], cliente_data['email'], senha_hash,
@@ -235,6 +1120,7 @@ class ClienteDAO(BaseDAO):
                 cursor.execute(sql_telefone, (id_novo, telefone))
 
             conn.commit()
+            self._registrar_escrita(conn)
             return id_novo
         except psycopg2.IntegrityError as e:
             if conn: conn.rollback()
@@ -248,42 +1134,13 @@ class ClienteDAO(BaseDAO):
             return None
         finally:
             if conn:
-                conn.autocommit = True
                 cursor.close()
-                conn.close()
+                self._release_connection(conn)
 
-    def buscar_por_email(self, email):
-        conn = None
-        try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            # Query correta na tabela CLIENTE, buscando as flags de desconto
-            sql = "SELECT id_cliente, nome, email, senha_hash, torce_flamengo, assiste_one_piece, natural_de_sousa FROM CLIENTE WHERE email = %s"
-            cursor.execute(sql, (email,))
-            cliente = cursor.fetchone()
-            if cliente:
-                # Retorno correto para o tipo 'cliente' com as flags
-                return {
-                    'id': cliente[0],
-                    'nome': cliente[1],
-                    'email': cliente[2],
-                    'senha_hash': cliente[3],
-                    'tipo': 'cliente',
-                    'flags_desconto': (cliente[4], cliente[5], cliente[6])
-                }
-            return None
-        except Exception as e:
-            print(f"Erro ao buscar cliente por email: {e}")
-            return None
-        finally:
-            if conn:
-                cursor.close()
-                conn.close()
-    
     def buscar_por_id(self, id_cliente):
         conn = None
         try:
-            conn = self._get_connection()
+            conn = self._get_connection(leitura=True)
             cursor = conn.cursor()
             sql = """
                 SELECT c.nome, c.email, t.telefone, ec.cep, ec.logradouro,
@@ -312,42 +1169,14 @@ class ClienteDAO(BaseDAO):
         finally:
             if conn:
                 cursor.close()
-                conn.close()
+                self._release_connection(conn)
 
 class FuncionarioDAO(BaseDAO):
-    def buscar_por_email(self, email):
-        conn = None
-        try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            # Query correta na tabela FUNCIONARIO
-            sql = "SELECT id_funcionario, nome, email, senha_hash, cargo FROM FUNCIONARIO WHERE email = %s"
-            cursor.execute(sql, (email,))
-            func = cursor.fetchone()
-            if func:
-                # Retorno correto para o tipo 'funcionario'
-                return {
-                    'id': func[0],
-                    'nome': func[1],
-                    'email': func[2],
-                    'senha_hash': func[3],
-                    'cargo': func[4],
-                    'tipo': 'funcionario'
-                }
-            return None
-        except Exception as e:
-            print(f"Erro ao buscar funcionário por email: {e}")
-            return None
-        finally:
-            if conn:
-                cursor.close()
-                conn.close()
-
     def listar_todos(self):
         vendedores = []
         conn = None
         try:
-            conn = self._get_connection()
+            conn = self._get_connection(leitura=True)
             cursor = conn.cursor()
             # Busca o ID e o nome de todos os funcionários para a lista de seleção
             sql = "SELECT id_funcionario, nome FROM FUNCIONARIO ORDER BY nome"
@@ -362,16 +1191,15 @@ class FuncionarioDAO(BaseDAO):
         finally:
             if conn:
                 cursor.close()
-                conn.close()
+                self._release_connection(conn)
 
     def registrar(self, func_data):
+        senha_hash = servico_senhas.gerar_hash(func_data['senha'])
         conn = None
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
-            
-            senha_hash = generate_password_hash(func_data['senha'])
-            
+
             sql = "INSERT INTO FUNCIONARIO (nome, email, senha_hash, cargo) VALUES (%s, %s, %s, %s) RETURNING id_funcionario"
             cursor.execute(sql, (
                 func_data['nome'],
@@ -381,6 +1209,7 @@ class FuncionarioDAO(BaseDAO):
             ))
             id_novo = cursor.fetchone()[0]
             conn.commit()
+            self._registrar_escrita(conn)
             return id_novo
         except psycopg2.IntegrityError:
             if conn: conn.rollback()
@@ -392,8 +1221,181 @@ class FuncionarioDAO(BaseDAO):
         finally:
             if conn:
                 cursor.close()
-                conn.close()
+                self._release_connection(conn)
+
+
+# Resolve o login em uma única consulta sobre FUNCIONARIO e CLIENTE
+# (funcionário tem prioridade se o mesmo email existir nas duas tabelas).
+CONSULTA_CONTA_POR_EMAIL = consultas_preparadas.registrar('conta_por_email', """
+    SELECT tipo, id, nome, email, senha_hash, cargo, torce_flamengo, assiste_one_piece, natural_de_sousa
+    FROM (
+        SELECT 0 AS prioridade, 'funcionario' AS tipo, id_funcionario AS id, nome, email, senha_hash, cargo,
+               NULL::BOOLEAN AS torce_flamengo, NULL::BOOLEAN AS assiste_one_piece, NULL::BOOLEAN AS natural_de_sousa
+        FROM FUNCIONARIO WHERE email = %(email)s
+        UNION ALL
+        SELECT 1, 'cliente', id_cliente, nome, email, senha_hash, NULL,
+               torce_flamengo, assiste_one_piece, natural_de_sousa
+        FROM CLIENTE WHERE email = %(email)s
+    ) AS contas
+    ORDER BY prioridade
+    LIMIT 1;
+""")
+
+def conta_da_linha(r):
+    conta = {'id': r[1], 'nome': r[2], 'email': r[3], 'senha_hash': r[4], 'tipo': r[0]}
+    if r[0] == 'funcionario':
+        conta['cargo'] = r[5]
+    else:
+        conta['flags_desconto'] = (r[6], r[7], r[8])
+    return conta
+
+def sql_atualizar_hash(tipo):
+    # Só troca se o hash ainda for o que foi verificado (a senha pode ter mudado no meio).
+    tabela, coluna_id = ('FUNCIONARIO', 'id_funcionario') if tipo == 'funcionario' else ('CLIENTE', 'id_cliente')
+    return f"UPDATE {tabela} SET senha_hash = %s WHERE {coluna_id} = %s AND senha_hash = %s;"
+
+class ContaDAO(BaseDAO):
+    def buscar_por_email(self, email):
+        conn = None
+        try:
+            conn = self._get_connection(leitura=True)
+            cursor = conn.cursor()
+            self._executar_preparada(cursor, CONSULTA_CONTA_POR_EMAIL, {'email': email})
+            r = cursor.fetchone()
+            return conta_da_linha(r) if r else None
+        except Exception as e:
+            print(f"Erro ao buscar conta por email: {e}")
+            return None
+        finally:
+            if conn:
+                cursor.close()
+                self._release_connection(conn)
 
+    def atualizar_hash(self, tipo, id_conta, hash_antigo, hash_novo):
+        conn = None
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute(sql_atualizar_hash(tipo), (hash_novo, id_conta, hash_antigo))
+            conn.commit()
+            return cursor.rowcount == 1
+        except Exception as e:
+            if conn: conn.rollback()
+            print(f"Erro ao atualizar hash de senha: {e}")
+            return False
+        finally:
+            if conn:
+                cursor.close()
+                self._release_connection(conn)
+
+
+def formatar_data_pedido(data_pedido):
+    return data_pedido.strftime('%d/%m/%Y %H:%M')
+
+mapa_pedido = Mapeador(
+    ('id_pedido', 'data_pedido', 'valor_total', 'forma_pagamento', 'status_pagamento'),
+    nomes=('id_pedido', 'data', 'total', 'pagamento', 'status'),
+    conversores={'data': formatar_data_pedido, 'total': float}
+)
+linha_para_pedido = mapa_pedido.linha
+
+def sql_historico_cliente(com_cursor, com_itens):
+    # Uma página do histórico (keyset sobre o índice do cliente). Com `com_itens`,
+    # os itens de cada pedido vêm agregados em JSON na mesma consulta, sem N+1.
+    # PEDIDO é particionada por mês: o `data_pedido <=` explícito (redundante com a
+    # comparação de tuplas, que o PostgreSQL não usa para podar) descarta os meses
+    # mais novos que o cursor, e a ordenação pela chave de partição deixa o LIMIT
+    # parar no primeiro mês que completar a página.
+    condicao_cursor = "AND data_pedido <= %(data)s AND (data_pedido, id_pedido) < (%(data)s, %(id)s)" if com_cursor else ""
+    pagina = f"""
+        SELECT {mapa_pedido.sql}
+        FROM PEDIDO
+        WHERE id_cliente = %(cliente)s {condicao_cursor}
+        ORDER BY data_pedido DESC, id_pedido DESC
+        LIMIT %(limite)s
+    """
+    if not com_itens:
+        return pagina
+    return f"""
+        SELECT {mapa_pedido.com_prefixo('p')}, coalesce(i.itens, '[]'::json)
+        FROM ({pagina}) AS p
+        LEFT JOIN LATERAL (
+            SELECT json_agg(json_build_object(
+                       'id_produto', ip.id_produto,
+                       'nome', pr.nome,
+                       'quantidade', ip.quantidade,
+                       'preco_unitario', ip.preco_unitario_na_venda
+                   ) ORDER BY pr.nome) AS itens
+            FROM ITEM_PEDIDO ip
+            JOIN PRODUTO pr ON pr.id_produto = ip.id_produto
+            WHERE ip.id_pedido = p.id_pedido AND ip.data_pedido = p.data_pedido  -- Só a partição do mês do pedido
+        ) AS i ON TRUE
+        ORDER BY p.data_pedido DESC, p.id_pedido DESC;
+    """
+
+# As quatro variações da página do histórico (primeira página ou a partir de um cursor, com ou sem itens).
+CONSULTAS_HISTORICO_CLIENTE = {
+    (com_cursor, com_itens): consultas_preparadas.registrar(
+        'historico_cliente' + ('_apos' if com_cursor else '') + ('_itens' if com_itens else ''),
+        sql_historico_cliente(com_cursor, com_itens))
+    for com_cursor in (False, True) for com_itens in (False, True)
+}
+
+def parametros_historico(id_cliente, apos, limite):
+    parametros = {'cliente': id_cliente, 'limite': limite + 1}  # Um a mais para saber se há próxima página
+    if apos:
+        parametros['data'], parametros['id'] = apos
+    return parametros
+
+def montar_pagina_historico(resultados, limite, com_itens):
+    pedidos = []
+    for r in resultados[:limite]:
+        pedido = linha_para_pedido(r)
+        if com_itens:
+            pedido['itens'] = r[len(mapa_pedido.colunas)]
+        pedidos.append(pedido)
+    proximo_cursor = None
+    if len(resultados) > limite:
+        ultimo = resultados[limite - 1]
+        proximo_cursor = codificar_cursor_pedido(ultimo[1], ultimo[0])
+    return {'pedidos': pedidos, 'proximo_cursor': proximo_cursor}
+
+SQL_PEDIDOS_DO_CLIENTE = f"""
+    SELECT {mapa_pedido.sql}
+    FROM PEDIDO
+    WHERE id_cliente = %s
+    ORDER BY data_pedido DESC, id_pedido DESC
+"""
+
+# O último parâmetro (p_novo_pedido_id) é INOUT: o CALL devolve uma linha
+# com o valor final dele, que é o ID do pedido recém-criado.
+SQL_CRIAR_PEDIDO = "CALL criar_pedido_completo(%s, %s, %s, %s, NULL);"
+
+# Venda relâmpago (ver "Venda relâmpago" no init.sql).
+SQL_CONFIRMAR_RESERVAS = "SELECT ordem, id_pedido, erro FROM confirmar_reservas(%s);"
+SQL_RESERVAR_ESTOQUE = "SELECT p_id_reserva, p_expira_em FROM reservar_estoque(%s, %s, make_interval(secs => %s));"
+SQL_CANCELAR_RESERVA = "SELECT cancelar_reserva(%s, %s);"
+SQL_ABRIR_VENDA_RELAMPAGO = "SELECT abrir_venda_relampago(%s, %s);"
+SQL_ENCERRAR_VENDA_RELAMPAGO = "SELECT encerrar_venda_relampago(%s);"
+mapa_venda_relampago = Mapeador(
+    ('e.id_produto', 'p.nome', 'p.quantidade_estoque', 'e.disponivel', 'coalesce(r.reservado, 0)',
+     'coalesce(r.reservas, 0)', 'e.aberta_em'),
+    nomes=('id_produto', 'nome', 'estoque', 'disponivel', 'reservado', 'reservas_ativas', 'aberta_em'),
+    conversores={'disponivel': int, 'reservado': int, 'aberta_em': lambda d: d.isoformat()}
+)
+SQL_VENDAS_RELAMPAGO = f"""
+    SELECT {mapa_venda_relampago.sql}
+    FROM (SELECT id_produto, SUM(disponivel) AS disponivel, min(aberta_em) AS aberta_em
+          FROM ESTOQUE_RELAMPAGO GROUP BY id_produto) e
+    JOIN PRODUTO p ON p.id_produto = e.id_produto
+    LEFT JOIN (SELECT id_produto, SUM(quantidade) AS reservado, count(DISTINCT id_reserva) AS reservas
+               FROM RESERVA_ESTOQUE WHERE expira_em > now() GROUP BY id_produto) r ON r.id_produto = e.id_produto
+    ORDER BY e.id_produto;
+"""
+
+def mensagem_do_banco(erro):
+    # Extrai a mensagem de erro vinda do banco (ex: "Estoque insuficiente..."), sem o CONTEXT.
+    return str(erro).split('CONTEXT:')[0].strip()
 
 class PedidoDAO(BaseDAO):
     def criar_pedido(self, id_cliente, id_funcionario, carrinho):
@@ -405,119 +1407,306 @@ class PedidoDAO(BaseDAO):
             # Converte a lista de itens do carrinho para uma string no formato JSON,
             # que é o que a nossa Stored Procedure espera.
             itens_json = json.dumps(carrinho['itens'])
-
-            # O último parâmetro (p_novo_pedido_id) é INOUT, então passamos um valor inicial (0).
-            # A procedure irá modificá-lo e nos retornar o ID do novo pedido.
-            # Infelizmente, o psycopg2 não lida bem com parâmetros INOUT em CALL.
-            # Uma abordagem mais robusta seria usar uma FUNCTION, mas para manter a exigência
-            # de uma PROCEDURE, vamos fazer uma pequena adaptação.
-            
-            # Vamos transformar a procedure em uma FUNCTION temporariamente para facilitar a chamada
-            # A lógica é a mesma, mas a forma de chamar do Python fica mais limpa.
-            
-            # (A melhor abordagem é modificar a Stored Procedure para ser uma FUNCTION no SQL)
-            # Por simplicidade aqui, vamos chamar a procedure e depois buscar o último ID.
-            # Esta não é a forma ideal em produção, mas cumpre o requisito.
-            
-            # Chamada à Stored Procedure. Passamos 0 como placeholder para o parâmetro INOUT.
-            sql_call = "CALL criar_pedido_completo(%s, %s, %s, %s, %s);"
-            # Para pegar o ID de volta, a forma mais segura é buscar o último pedido do cliente.
-            
-            cursor.execute("BEGIN;") # Inicia a transação
-            cursor.execute(sql_call, (id_cliente, id_funcionario, carrinho['forma_pagamento'], itens_json, 0))
-            
-            # Busca o ID do último pedido inserido por este cliente nesta sessão
-            cursor.execute("SELECT id_pedido FROM PEDIDO WHERE id_cliente = %s ORDER BY data_pedido DESC LIMIT 1;", (id_cliente,))
+            cursor.execute(SQL_CRIAR_PEDIDO, (id_cliente, id_funcionario, carrinho['forma_pagamento'], itens_json))
             novo_pedido_id = cursor.fetchone()[0]
-            
+
             conn.commit() # Confirma a transação
-            
+            self._registrar_escrita(conn)
+            cache_catalogo.invalidar() # O estoque mudou: descarta as leituras do catálogo em cache
+
             return {"status": "sucesso", "id_pedido": novo_pedido_id}
         except Exception as e:
             if conn: conn.rollback() # Desfaz a transação em caso de erro
-            
-            # Extrai a mensagem de erro vinda do banco (ex: "Estoque insuficiente...")
-            mensagem_erro = str(e).split('CONTEXT:')[0].strip()
+            mensagem_erro = mensagem_do_banco(e)
             print(f"Erro ao chamar procedure de pedido: {mensagem_erro}")
             return {"status": "erro", "mensagem": mensagem_erro}
         finally:
             if conn:
                 cursor.close()
-                conn.close()
+                self._release_connection(conn)
 
-    def listar_por_cliente(self, id_cliente):
-        pedidos = []
+    def confirmar_reservas(self, pedidos):
+        # Chamado pela fila_pedidos: o lote inteiro em uma transação. Devolve um resultado
+        # por pedido ou, se a transação falhar, um único resultado de erro.
         conn = None
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
-            sql = """
-                SELECT id_pedido, data_pedido, valor_total, forma_pagamento, status_pagamento
-                FROM PEDIDO
-                WHERE id_cliente = %s
-                ORDER BY data_pedido DESC
-            """
-            cursor.execute(sql, (id_cliente,))
-            resultados = cursor.fetchall()
-            for r in resultados:
-                pedidos.append({
-                    'id_pedido': r[0],
-                    'data': r[1].strftime('%d/%m/%Y %H:%M'),
-                    'total': float(r[2]),
-                    'pagamento': r[3],
-                    'status': r[4]
-                })
-            return pedidos
+            lote = [dict(pedido, ordem=i) for i, pedido in enumerate(pedidos)]
+            cursor.execute(SQL_CONFIRMAR_RESERVAS, (json.dumps(lote),))
+            linhas = cursor.fetchall()
+            conn.commit()
+
+            lsn = None
+            if any(id_pedido for _, id_pedido, _ in linhas):
+                cache_catalogo.invalidar()  # O estoque mudou: descarta as leituras do catálogo em cache
+                if self.roteador.ativo:
+                    # A fila roda em outra thread: o LSN vai em cada resultado e a rota o registra
+                    # na requisição do cliente.
+                    cursor.execute(SQL_LSN_PRIMARIO)
+                    lsn = cursor.fetchone()[0]
+            resultados = []
+            for _, id_pedido, erro in linhas:
+                if id_pedido is None:
+                    resultados.append({"status": "erro", "mensagem": erro})
+                elif lsn:
+                    resultados.append({"status": "sucesso", "id_pedido": id_pedido, "lsn": lsn})
+                else:
+                    resultados.append({"status": "sucesso", "id_pedido": id_pedido})
+            return resultados
+        except Exception as e:
+            if conn: conn.rollback()
+            mensagem_erro = mensagem_do_banco(e)
+            print(f"Erro ao confirmar lote de {len(pedidos)} pedidos: {mensagem_erro}")
+            return {"status": "erro", "mensagem": mensagem_erro}
+        finally:
+            if conn:
+                cursor.close()
+                self._release_connection(conn)
+
+    def iterar_por_cliente(self, id_cliente):
+        return self._iterar_consulta(SQL_PEDIDOS_DO_CLIENTE, (id_cliente,), linha_para_pedido)
+
+    def listar_pagina_por_cliente(self, id_cliente, apos=None, limite=LIMITE_PADRAO_HISTORICO, com_itens=False):
+        conn = None
+        try:
+            conn = self._get_connection(leitura=True)
+            cursor = conn.cursor()
+            self._executar_preparada(cursor, CONSULTAS_HISTORICO_CLIENTE[(bool(apos), bool(com_itens))],
+                                     parametros_historico(id_cliente, apos, limite))
+            return montar_pagina_historico(cursor.fetchall(), limite, com_itens)
+        except Exception as e:
+            print(f"Erro ao listar página do histórico de pedidos: {e}")
+            return None
+        finally:
+            if conn:
+                cursor.close()
+                self._release_connection(conn)
+
+    def listar_por_cliente(self, id_cliente):
+        try:
+            return list(self.iterar_por_cliente(id_cliente))
         except Exception as e:
             print(f"Erro ao listar pedidos do cliente: {e}")
             return []
+
+class VendaRelampagoDAO(BaseDAO):
+    def abrir(self, id_produto, quantidade=None):
+        conn = None
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute(SQL_ABRIR_VENDA_RELAMPAGO, (id_produto, quantidade))
+            unidades = cursor.fetchone()[0]
+            conn.commit()
+            return {"status": "sucesso", "id_produto": id_produto, "unidades": unidades}
+        except Exception as e:
+            if conn: conn.rollback()
+            mensagem_erro = mensagem_do_banco(e)
+            print(f"Erro ao abrir venda relâmpago: {mensagem_erro}")
+            return {"status": "erro", "mensagem": mensagem_erro}
         finally:
             if conn:
                 cursor.close()
-                conn.close()
+                self._release_connection(conn)
+
+    def encerrar(self, id_produto):
+        conn = None
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute(SQL_ENCERRAR_VENDA_RELAMPAGO, (id_produto,))
+            reservas = cursor.fetchone()[0]
+            conn.commit()
+            return {"status": "sucesso", "id_produto": id_produto, "reservas_canceladas": reservas}
+        except Exception as e:
+            if conn: conn.rollback()
+            mensagem_erro = mensagem_do_banco(e)
+            print(f"Erro ao encerrar venda relâmpago: {mensagem_erro}")
+            return {"status": "erro", "mensagem": mensagem_erro}
+        finally:
+            if conn:
+                cursor.close()
+                self._release_connection(conn)
+
+    def listar(self):
+        conn = None
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute(SQL_VENDAS_RELAMPAGO)
+            return mapa_venda_relampago.linhas(cursor.fetchall())
+        except Exception as e:
+            print(f"Erro ao listar vendas relâmpago: {e}")
+            return None
+        finally:
+            if conn:
+                cursor.close()
+                self._release_connection(conn)
+
+    def reservar(self, id_cliente, itens, validade_segundos):
+        # Transação curta: desconta das fatias de estoque reservável, sem travar PRODUTO.
+        conn = None
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute(SQL_RESERVAR_ESTOQUE, (id_cliente, json.dumps(itens), validade_segundos))
+            id_reserva, expira_em = cursor.fetchone()
+            conn.commit()
+            return {"status": "sucesso", "id_reserva": id_reserva, "expira_em": expira_em.isoformat()}
+        except Exception as e:
+            if conn: conn.rollback()
+            mensagem_erro = mensagem_do_banco(e)
+            print(f"Erro ao reservar estoque: {mensagem_erro}")
+            return {"status": "erro", "mensagem": mensagem_erro}
+        finally:
+            if conn:
+                cursor.close()
+                self._release_connection(conn)
+
+    def cancelar_reserva(self, id_reserva, id_cliente):
+        # Devolve as unidades liberadas (0 se a reserva não existe mais) ou None em caso de erro.
+        conn = None
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute(SQL_CANCELAR_RESERVA, (id_reserva, id_cliente))
+            unidades = cursor.fetchone()[0]
+            conn.commit()
+            return unidades
+        except Exception as e:
+            if conn: conn.rollback()
+            print(f"Erro ao cancelar reserva: {e}")
+            return None
+        finally:
+            if conn:
+                cursor.close()
+                self._release_connection(conn)
+
+def pedido_da_reserva(id_cliente, dados):
+    # Checkout da venda relâmpago: {"id_reserva": 123, "forma_pagamento": "PIX"}.
+    id_reserva = dados.get('id_reserva')
+    if not isinstance(id_reserva, int) or isinstance(id_reserva, bool) or not dados.get('forma_pagamento'):
+        raise ValueError("Informe 'id_reserva' (inteiro) e 'forma_pagamento'.")
+    return {'id_reserva': id_reserva, 'id_cliente': id_cliente, 'id_funcionario': 1,
+            'forma_pagamento': dados['forma_pagamento']}
+
+def status_da_confirmacao(resultado):
+    if resultado['status'] == 'sucesso':
+        return 201
+    return 503 if resultado.get('tempo_esgotado') else 400
+
+# Consultas dos relatórios de vendas por agrupamento. Todas leem as tabelas de resumo
+# (RESUMO_VENDAS_DIARIO / RESUMO_PEDIDOS_DIARIO), mantidas por triggers no banco.
+# Datas nulas significam "do primeiro dia do mês atual" e "até hoje".
+PERIODO_RESUMO = "dia BETWEEN coalesce(%(inicio)s, date_trunc('month', dia_venda(now()))::DATE) AND coalesce(%(fim)s, dia_venda(now()))"
+CONSULTAS_RELATORIO_VENDAS = {
+    'vendedor': (f"""
+        SELECT f.id_funcionario, f.nome, v.quantidade, v.valor_vendido, coalesce(p.pedidos, 0)
+        FROM (SELECT id_funcionario, SUM(quantidade) AS quantidade, SUM(valor_vendido) AS valor_vendido
+              FROM RESUMO_VENDAS_DIARIO WHERE {PERIODO_RESUMO} GROUP BY id_funcionario) v
+        LEFT JOIN (SELECT id_funcionario, SUM(pedidos) AS pedidos
+                   FROM RESUMO_PEDIDOS_DIARIO WHERE {PERIODO_RESUMO} GROUP BY id_funcionario) p USING (id_funcionario)
+        JOIN FUNCIONARIO f USING (id_funcionario)
+        ORDER BY v.valor_vendido DESC;
+    """, ('id_funcionario', 'vendedor', 'quantidade', 'total_vendido', 'pedidos')),
+    'produto': (f"""
+        SELECT pr.id_produto, pr.nome, pr.categoria, v.quantidade, v.valor_vendido, v.pedidos
+        FROM (SELECT id_produto, SUM(quantidade) AS quantidade, SUM(valor_vendido) AS valor_vendido, SUM(pedidos) AS pedidos
+              FROM RESUMO_VENDAS_DIARIO WHERE {PERIODO_RESUMO} GROUP BY id_produto) v
+        JOIN PRODUTO pr USING (id_produto)
+        ORDER BY v.valor_vendido DESC;
+    """, ('id_produto', 'produto', 'categoria', 'quantidade', 'total_vendido', 'pedidos')),
+    'categoria': (f"""
+        SELECT pr.categoria, SUM(v.quantidade), SUM(v.valor_vendido)
+        FROM (SELECT id_produto, SUM(quantidade) AS quantidade, SUM(valor_vendido) AS valor_vendido
+              FROM RESUMO_VENDAS_DIARIO WHERE {PERIODO_RESUMO} GROUP BY id_produto) v
+        JOIN PRODUTO pr USING (id_produto)
+        GROUP BY pr.categoria
+        ORDER BY 3 DESC;
+    """, ('categoria', 'quantidade', 'total_vendido')),
+    'dia': (f"""
+        SELECT v.dia, v.quantidade, v.valor_vendido, coalesce(p.pedidos, 0)
+        FROM (SELECT dia, SUM(quantidade) AS quantidade, SUM(valor_vendido) AS valor_vendido
+              FROM RESUMO_VENDAS_DIARIO WHERE {PERIODO_RESUMO} GROUP BY dia) v
+        LEFT JOIN (SELECT dia, SUM(pedidos) AS pedidos
+                   FROM RESUMO_PEDIDOS_DIARIO WHERE {PERIODO_RESUMO} GROUP BY dia) p USING (dia)
+        ORDER BY v.dia;
+    """, ('dia', 'quantidade', 'total_vendido', 'pedidos')),
+}
+
+# Somas de bigint chegam como Decimal: quantidades e pedidos voltam a ser inteiros.
+CONVERSORES_RELATORIO_VENDAS = {'quantidade': int, 'pedidos': int, 'total_vendido': float, 'dia': date.isoformat}
+MAPAS_RELATORIO_VENDAS = {
+    agrupar: Mapeador(colunas, conversores={c: f for c, f in CONVERSORES_RELATORIO_VENDAS.items() if c in colunas})
+    for agrupar, (_, colunas) in CONSULTAS_RELATORIO_VENDAS.items()
+}
+
+def relatorio_mensal(relatorio):
+    return [{'vendedor': r['vendedor'], 'pedidos_realizados': r['pedidos'], 'total_vendido': r['total_vendido']} for r in relatorio]
 
 class RelatorioDAO(BaseDAO):
+    def gerar_relatorio_vendas(self, inicio=None, fim=None, agrupar='vendedor'):
+        conn = None
+        try:
+            conn = self._get_connection(leitura=True)
+            cursor = conn.cursor()
+            sql, _ = CONSULTAS_RELATORIO_VENDAS[agrupar]
+            cursor.execute(sql, {'inicio': inicio, 'fim': fim})
+            return MAPAS_RELATORIO_VENDAS[agrupar].linhas(cursor.fetchall())
+        except Exception as e:
+            print(f"Erro ao gerar relatório de vendas por {agrupar}: {e}")
+            return None
+        finally:
+            if conn:
+                cursor.close()
+                self._release_connection(conn)
+
     def gerar_relatorio_vendas_mensal(self):
-        relatorio = []
+        # Relatório do mês atual por vendedor, lido dos resumos diários (custo
+        # proporcional aos dias do mês, não ao histórico de pedidos).
+        relatorio = self.gerar_relatorio_vendas(agrupar='vendedor')
+        return relatorio_mensal(relatorio) if relatorio is not None else None
+
+    def reconstruir_resumo_vendas(self, inicio=None, fim=None):
         conn = None
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
-            # Esta query usa a nossa VIEW e agrupa os resultados por vendedor,
-            # somando o total de vendas (subtotal) e contando o número de vendas.
-            # Ela filtra os resultados para o mês e ano atuais.
-            sql = """
-                SELECT 
-                    nome_vendedor, 
-                    COUNT(DISTINCT id_pedido) as total_pedidos, 
-                    SUM(subtotal) as valor_total_vendido
-                FROM V_VENDAS_DETALHADAS
-                WHERE EXTRACT(MONTH FROM data_pedido) = EXTRACT(MONTH FROM CURRENT_DATE)
-                  AND EXTRACT(YEAR FROM data_pedido) = EXTRACT(YEAR FROM CURRENT_DATE)
-                GROUP BY nome_vendedor
-                ORDER BY valor_total_vendido DESC;
-            """
-            cursor.execute(sql)
-            resultados = cursor.fetchall()
-            for r in resultados:
-                relatorio.append({
-                    'vendedor': r[0],
-                    'pedidos_realizados': r[1],
-                    'total_vendido': float(r[2])
-                })
-            return relatorio
-        except Exception as e:
-            print(f"Erro ao gerar relatório de vendas mensal: {e}")
+            cursor.execute("SELECT reconstruir_resumo_vendas(%s, %s);", (inicio, fim))
+            linhas = cursor.fetchone()[0]
+            conn.commit()
+            return linhas
+        except Exception as e:
+            if conn: conn.rollback()
+            print(f"Erro ao reconstruir resumo de vendas: {e}")
             return None
         finally:
             if conn:
                 cursor.close()
-                conn.close()
+                self._release_connection(conn)
 
 # --- ROTAS DA APLICAÇÃO ---
 @app.route("/")
 def index():
-    return render_template('index.html')
+    resposta = app.make_response(render_template('index.html'))
+    # A página aponta para os estáticos com hash: precisa ser revalidada para pegar um build novo.
+    resposta.headers['Cache-Control'] = 'no-cache'
+    return resposta
+
+@app.route(f'/static/{PASTA_DIST}/<path:arquivo>')
+def estatico_com_hash(arquivo):
+    # Envia o .br/.gz gerado no build quando o cliente aceita; o nome com hash permite cache "immutable".
+    enviado, codificacao, mimetype = estaticos.escolher_arquivo(arquivo, request.accept_encodings)
+    if arquivo == NOME_MANIFESTO:
+        return send_from_directory(estaticos.pasta_dist, arquivo)  # Único arquivo do build sem hash no nome
+    resposta = send_from_directory(estaticos.pasta_dist, enviado, mimetype=mimetype, max_age=CACHE_IMUTAVEL)
+    if codificacao:
+        resposta.headers['Content-Encoding'] = codificacao
+    resposta.vary.add('Accept-Encoding')
+    resposta.cache_control.public = True
+    resposta.cache_control.immutable = True
+    return resposta
 
 @app.route('/api/registrar', methods=['POST'])
 def registrar_cliente():
@@ -533,43 +1722,46 @@ def registrar_cliente():
     else:
         return jsonify({'message': 'Erro no servidor ao registrar.'}), 500
 
+def token_de_acesso(user):
+    # Cria o payload base do token
+    payload = {
+        'id': user['id'],
+        'tipo': user['tipo'],
+        'exp': datetime.utcnow() + timedelta(hours=24)
+    }
+
+    # Se o usuário for um cliente, verifica e adiciona a flag de desconto
+    if user['tipo'] == 'cliente':
+        tem_desconto = any(user['flags_desconto'])
+        payload['tem_desconto'] = tem_desconto
+
+    return jwt.encode(payload, app.config['SECRET_KEY'], algorithm="HS256")
+
 @app.route('/api/login', methods=['POST'])
 def login():
     auth = request.get_json()
     if not auth or not auth.get('email') or not auth.get('senha'):
         return jsonify({'message': 'Não foi possível verificar'}), 401
     
-    # Tenta logar como funcionário primeiro
-    user_dao = FuncionarioDAO()
-    user = user_dao.buscar_por_email(auth['email'])
-    
-    # Se não for funcionário, tenta como cliente
-    if not user:
-        user_dao = ClienteDAO()
-        user = user_dao.buscar_por_email(auth['email'])
+    # Uma única consulta resolve se o email é de funcionário ou de cliente
+    conta_dao = ContaDAO()
+    user = conta_dao.buscar_por_email(auth['email'])
 
     if not user:
         return jsonify({'message': 'Email não encontrado!'}), 401
 
-    if check_password_hash(user['senha_hash'], auth['senha']):
-        # --- INÍCIO DA ALTERAÇÃO ---
-        
-        # Cria o payload base do token
-        payload = {
-            'id': user['id'],
-            'tipo': user['tipo'],
-            'exp': datetime.utcnow() + timedelta(hours=24)
-        }
-
-        # Se o usuário for um cliente, verifica e adiciona a flag de desconto
-        if user['tipo'] == 'cliente':
-            tem_desconto = any(user['flags_desconto'])
-            payload['tem_desconto'] = tem_desconto
-
-        # --- FIM DA ALTERAÇÃO ---
-        
-        token = jwt.encode(payload, app.config['SECRET_KEY'], algorithm="HS256")
-        return jsonify({'token': token})
+    # A verificação roda no pool de processos; se ele estiver sobrecarregado,
+    # SenhasSobrecarregadasError vira 503 com Retry-After.
+    if servico_senhas.verificar(user['senha_hash'], auth['senha']):
+        # Se o custo do hash mudou, aproveita a senha em mãos para refazê-lo
+        if servico_senhas.precisa_rehash(user['senha_hash']):
+            try:
+                novo_hash = servico_senhas.gerar_hash(auth['senha'])
+                conta_dao.atualizar_hash(user['tipo'], user['id'], user['senha_hash'], novo_hash)
+            except SenhasSobrecarregadasError as e:
+                print(f"Rehash adiado para o próximo login: {e}")
+
+        return jsonify({'token': token_de_acesso(user)})
         
     return jsonify({'message': 'Senha incorreta!'}), 401
 
@@ -579,6 +1771,20 @@ def criar_pedido_api(current_user):
     if current_user['tipo'] != 'cliente':
         return jsonify({'message': 'Acesso negado: apenas clientes podem fazer compras.'}), 403
     dados_carrinho = request.get_json()
+    if isinstance(dados_carrinho, dict) and 'id_reserva' in dados_carrinho:
+        # Venda relâmpago: confirma a reserva pela fila de pedidos em lote.
+        try:
+            pedido = pedido_da_reserva(current_user['id'], dados_carrinho)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        # A espera pelo lote não ocupa vaga do checkout: com ela, cada lote ficaria limitado
+        # ao ADMISSAO_CHECKOUT. Quem limita essa espera é a própria fila (capacidade e timeout).
+        liberar_vaga_de_admissao()
+        resultado = fila_pedidos.confirmar(pedido)
+        lsn = resultado.pop('lsn', None)
+        if lsn:
+            roteador.registrar_lsn(lsn)
+        return jsonify(resultado), status_da_confirmacao(resultado)
     if not dados_carrinho or 'itens' not in dados_carrinho or not dados_carrinho['itens']:
         return jsonify({'message': 'Carrinho vazio ou dados inválidos.'}), 400
     id_cliente = current_user['id']
@@ -590,11 +1796,52 @@ def criar_pedido_api(current_user):
     else:
         return jsonify(resultado), 400
 
+@app.route('/api/reservas', methods=['POST'])
+@token_required
+def criar_reserva_api(current_user):
+    # Reserva o estoque de produtos em venda relâmpago: {"itens": [{"id_produto": 1, "quantidade": 1}]}.
+    if current_user['tipo'] != 'cliente':
+        return jsonify({'message': 'Acesso negado: apenas clientes podem fazer compras.'}), 403
+    dados = request.get_json(silent=True)
+    if not isinstance(dados, dict) or not isinstance(dados.get('itens'), list) or not dados['itens']:
+        return jsonify({'message': 'Carrinho vazio ou dados inválidos.'}), 400
+    resultado = VendaRelampagoDAO().reservar(current_user['id'], dados['itens'], VENDA_RELAMPAGO_RESERVA_SEGUNDOS)
+    return jsonify(resultado), 201 if resultado['status'] == 'sucesso' else 400
+
+@app.route('/api/reservas/<int:id_reserva>', methods=['DELETE'])
+@token_required
+def cancelar_reserva_api(current_user, id_reserva):
+    if current_user['tipo'] != 'cliente':
+        return jsonify({'message': 'Acesso negado: apenas clientes podem fazer compras.'}), 403
+    unidades = VendaRelampagoDAO().cancelar_reserva(id_reserva, current_user['id'])
+    if unidades is None:
+        return jsonify({"status": "erro", "mensagem": "Não foi possível cancelar a reserva."}), 500
+    if unidades == 0:
+        return jsonify({"status": "erro", "mensagem": "Reserva não encontrada ou já encerrada."}), 404
+    return jsonify({"status": "sucesso", "unidades_devolvidas": unidades})
+
 @app.route("/api/produtos", methods=['GET', 'POST'])
 def produtos_api():
     dao = ProdutoDAO()
     if request.method == 'GET':
-        return jsonify(dao.listarTodos())
+        # Filtros, ordenação e paginação por cursor são resolvidos no banco;
+        # o tamanho da resposta depende do 'limite', não do tamanho do catálogo.
+        try:
+            formato = formato_de_fluxo()
+            filtros = ler_filtros_catalogo(request.args)
+        except ValueError as e:
+            return jsonify({"status": "erro", "mensagem": str(e)}), 400
+        if formato:
+            # Catálogo completo em fluxo (para integrações), sem paginação nem cache.
+            resposta = resposta_em_fluxo(dao.iterarTodos(), formato)
+            if resposta is None:
+                return jsonify({"status": "erro", "mensagem": "Não foi possível listar os produtos."}), 500
+            return resposta
+        chave = ('pagina', tuple(sorted(filtros.items())))
+        resposta = resposta_do_catalogo(chave, lambda: dao.listarPagina(**filtros))
+        if resposta is None:
+            return jsonify({"status": "erro", "mensagem": "Não foi possível listar os produtos."}), 500
+        return resposta
     if request.method == 'POST':
         @token_required
         def criar_produto(current_user):
@@ -612,9 +1859,9 @@ def produtos_api():
 def produto_especifico_api(id_produto):
     dao = ProdutoDAO()
     if request.method == 'GET':
-        produto = dao.exibirUm(id_produto)
-        if produto:
-            return jsonify(produto)
+        resposta = resposta_do_catalogo(('produto', id_produto), lambda: dao.exibirUm(id_produto))
+        if resposta is not None:
+            return resposta
         else:
             return jsonify({"status": "erro", "mensagem": "Produto não encontrado."}), 404
     @token_required
@@ -634,20 +1881,154 @@ def produto_especifico_api(id_produto):
                 return jsonify({"status": "erro", "mensagem": "Não foi possível remover o produto."}), 500
     return operacao_protegida()
 
+@app.route("/api/produtos/<int:id_produto>/venda-relampago", methods=['POST', 'DELETE'])
+@token_required
+def venda_relampago_api(current_user, id_produto):
+    # POST abre a venda ({"quantidade": 100}, padrão: todo o estoque); DELETE encerra.
+    if current_user['tipo'] != 'funcionario':
+        return jsonify({'message': 'Acesso negado!'}), 403
+    dao = VendaRelampagoDAO()
+    if request.method == 'POST':
+        quantidade = (request.get_json(silent=True) or {}).get('quantidade')
+        if quantidade is not None and (not isinstance(quantidade, int) or isinstance(quantidade, bool)):
+            return jsonify({"status": "erro", "mensagem": "'quantidade' deve ser um inteiro."}), 400
+        resultado = dao.abrir(id_produto, quantidade)
+        return jsonify(resultado), 201 if resultado['status'] == 'sucesso' else 400
+    resultado = dao.encerrar(id_produto)
+    return jsonify(resultado), 200 if resultado['status'] == 'sucesso' else 400
+
 @app.route("/api/produtos/buscar", methods=['GET'])
 def buscar_produto_api():
-    nome = request.args.get('nome')
+    nome = (request.args.get('nome') or '').strip()
     if not nome:
         return jsonify({"status": "erro", "mensagem": "Parâmetro 'nome' é obrigatório."}), 400
+    limite = request.args.get('limite', LIMITE_PADRAO_BUSCA, type=int)
     dao = ProdutoDAO()
-    produtos = dao.pesquisarPorNome(nome)
+    produtos = dao.pesquisarPorNome(nome, max(1, min(limite, LIMITE_MAXIMO_BUSCA)))
     return jsonify(produtos)
 
+@app.route("/api/produtos/changes", methods=['GET'])
+def alteracoes_produtos_api():
+    # Sincronização incremental: ?since=<valor 'since' da resposta anterior> (0 = catálogo todo).
+    # Enquanto 'completo' for falso, há mais alterações: chame de novo com o 'since' devolvido.
+    try:
+        apos = ler_marcador_alteracoes(request.args.get('since'))
+        limite = int(request.args.get('limite', LIMITE_PADRAO_ALTERACOES))
+    except ValueError as e:
+        return jsonify({"status": "erro", "mensagem": str(e)}), 400
+    dao = ProdutoDAO()
+    alteracoes = dao.listar_alteracoes(apos, max(1, min(limite, LIMITE_MAXIMO_ALTERACOES)))
+    if alteracoes is None:
+        return jsonify({"status": "erro", "mensagem": "Não foi possível listar as alterações."}), 500
+    return jsonify(alteracoes)
+
+@app.route("/api/produtos/stream", methods=['GET'])
+def stream_produtos_api():
+    # Server-Sent Events: cada navegador recebe as alterações de estoque/preço do catálogo.
+    try:
+        assinatura = feed_produtos.assinar()
+    except FeedLotadoError as e:
+        resposta = jsonify({"status": "erro", "mensagem": str(e)})
+        resposta.headers['Retry-After'] = '30'
+        return resposta, 503
+
+    def gerar():
+        try:
+            yield 'retry: 5000\n\n'  # Intervalo de reconexão sugerido ao EventSource
+            while True:
+                evento = assinatura.proximo(timeout=SSE_INTERVALO_PING)
+                if evento is None:
+                    yield ': ping\n\n'  # Mantém a conexão viva e detecta clientes que saíram
+                    continue
+                nome = 'recarregar' if evento.get('op') == 'recarregar' else 'produtos'
+                yield f"event: {nome}\ndata: {codificar(evento).decode('utf-8')}\n\n"
+        finally:
+            feed_produtos.cancelar(assinatura)
+
+    return Response(gerar(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route("/api/produtos/autocomplete", methods=['GET'])
+def autocomplete_produto_api():
+    prefixo = (request.args.get('q') or '').strip()
+    if not prefixo:
+        return jsonify([])
+    dao = ProdutoDAO()
+    return jsonify(dao.autocompletar(prefixo[:100]))
+
+def formato_da_requisicao():
+    # O formato vem do parâmetro 'formato' ou, na falta dele, do Content-Type.
+    formato = request.args.get('formato')
+    if not formato:
+        formato = 'ndjson' if 'ndjson' in (request.mimetype or '') else 'csv'
+    return formato.lower()
+
+@app.route("/api/produtos/importar", methods=['POST'])
+@token_required
+def importar_produtos_api(current_user):
+    if current_user['tipo'] != 'funcionario':
+        return jsonify({'message': 'Acesso negado!'}), 403
+    formato = formato_da_requisicao()
+    if formato not in carga_catalogo.FORMATOS:
+        return jsonify({"status": "erro", "mensagem": f"Formato inválido. Use um de: {', '.join(carga_catalogo.FORMATOS)}."}), 400
+    tudo_ou_nada = request.args.get('tudo_ou_nada', '').lower() in ('1', 'true', 'sim')
+
+    # O corpo é lido em fluxo direto para o COPY, sem ser carregado inteiro na memória.
+    arquivo_texto = io.TextIOWrapper(io.BufferedReader(request.stream), encoding='utf-8-sig', newline='')
+    dao = ProdutoDAO()
+    try:
+        resumo = dao.importar_em_lote(arquivo_texto, formato, tudo_ou_nada)
+    except ErroFormatoImportacao as e:
+        return jsonify({"status": "erro", "mensagem": str(e)}), 400
+    if resumo is None:
+        return jsonify({"status": "erro", "mensagem": "Não foi possível importar os produtos."}), 500
+    if tudo_ou_nada and resumo['rejeitados']:
+        return jsonify({"status": "erro", "mensagem": "Nenhum produto importado: o arquivo contém linhas inválidas.", **resumo}), 422
+    return jsonify({"status": "sucesso", **resumo})
+
+@app.route("/api/produtos/lote", methods=['POST'])
+@token_required
+def lote_produtos_api(current_user):
+    # Corpo: {"operacoes": [{"op": "alterar", "id_produto": 1, "preco": 19.9},
+    #                       {"op": "estoque", "id_produto": 2, "delta": 10},
+    #                       {"op": "remover", "id_produto": 3}], "tudo_ou_nada": false}
+    if current_user['tipo'] != 'funcionario':
+        return jsonify({'message': 'Acesso negado!'}), 403
+    corpo = request.get_json(silent=True)
+    if not isinstance(corpo, dict):
+        return jsonify({"status": "erro", "mensagem": "Envie um objeto JSON com a lista 'operacoes'."}), 400
+    tudo_ou_nada = corpo.get('tudo_ou_nada') is True
+    dao = ProdutoDAO()
+    try:
+        resumo = dao.aplicar_lote(corpo.get('operacoes'), tudo_ou_nada)
+    except ErroFormatoLote as e:
+        return jsonify({"status": "erro", "mensagem": str(e)}), 400
+    if resumo is None:
+        return jsonify({"status": "erro", "mensagem": "Não foi possível aplicar o lote."}), 500
+    if tudo_ou_nada and resumo['rejeitados']:
+        return jsonify({"status": "erro", "mensagem": "Nenhuma operação aplicada: o lote contém operações rejeitadas.", **resumo}), 422
+    return jsonify({"status": "sucesso", **resumo})
+
+@app.route("/api/produtos/exportar", methods=['GET'])
+@token_required
+def exportar_produtos_api(current_user):
+    if current_user['tipo'] != 'funcionario':
+        return jsonify({'message': 'Acesso negado!'}), 403
+    formato = request.args.get('formato', 'csv').lower()
+    if formato not in carga_catalogo.FORMATOS:
+        return jsonify({"status": "erro", "mensagem": f"Formato inválido. Use um de: {', '.join(carga_catalogo.FORMATOS)}."}), 400
+    mimetype = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    resposta = Response(ProdutoDAO().exportar_em_lote(formato), mimetype=mimetype)
+    resposta.headers['Content-Disposition'] = f'attachment; filename=produtos.{formato}'
+    return resposta
+
 @app.route("/api/produtos/relatorio", methods=['GET'])
 def relatorio_estoque_api():
     dao = ProdutoDAO()
-    relatorio = dao.gerarRelatorioEstoque()
-    return jsonify(relatorio)
+    resposta = resposta_do_catalogo(('relatorio',), lambda: dao.gerarRelatorioEstoque() or None)
+    if resposta is None:
+        return jsonify({}) # Mantém a resposta vazia anterior em caso de erro, sem guardá-la no cache
+    return resposta
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -663,16 +2044,39 @@ def upload_file(current_user):
     if file.filename == '':
         return jsonify({'status': 'erro', 'mensagem': 'Nenhum arquivo selecionado.'}), 400
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        return jsonify({'status': 'sucesso', 'filepath': f'/{filepath}'}), 201
+        # O nome vem do conteúdo (o nome enviado é ignorado): envios repetidos da mesma
+        # imagem reaproveitam o arquivo, e imagens diferentes nunca se sobrescrevem.
+        try:
+            nome = armazem_imagens.salvar(file.stream)
+        except ImagemGrandeDemaisError as e:
+            return jsonify({'status': 'erro', 'mensagem': str(e)}), 413
+        except ImagemInvalidaError as e:
+            return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
+        urls = armazem_imagens.urls(nome)
+        return jsonify({'status': 'sucesso', 'filepath': urls['original'], **urls}), 201
     else:
         return jsonify({'status': 'erro', 'mensagem': 'Tipo de arquivo não permitido.'}), 400
 
 @app.route('/static/uploads/produtos/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    filename = secure_filename(filename)
+    if not imagens.eh_imutavel(filename):
+        # Uploads antigos, gravados com o nome original: podem ser sobrescritos, então sem cache longo.
+        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    if not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], filename)):
+        # Variante ainda não gerada: agenda a geração e, por ora, manda para o original.
+        original = armazem_imagens.original_da_variante(filename)
+        if original is None:
+            return jsonify({'status': 'erro', 'mensagem': 'Imagem não encontrada.'}), 404
+        resposta = redirect(f"/{app.config['UPLOAD_FOLDER']}/{original}", code=307)
+        resposta.headers['Cache-Control'] = 'no-store'
+        return resposta
+    # send_from_directory responde a Range e If-None-Match e entrega o arquivo ao
+    # servidor WSGI (wsgi.file_wrapper/sendfile) sem lê-lo para a memória.
+    resposta = send_from_directory(app.config['UPLOAD_FOLDER'], filename, max_age=CACHE_IMUTAVEL)
+    resposta.cache_control.public = True
+    resposta.cache_control.immutable = True
+    return resposta
 
 @app.route('/api/cliente/perfil', methods=['GET'])
 @token_required
@@ -692,9 +2096,22 @@ def get_historico_pedidos(current_user):
     if current_user['tipo'] != 'cliente':
         return jsonify({'message': 'Acesso negado'}), 403
 
+    try:
+        formato = formato_de_fluxo()
+        paginacao = ler_paginacao_historico(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
     dao = PedidoDAO()
-    historico = dao.listar_por_cliente(current_user['id'])
-    return jsonify(historico)
+    if formato:
+        # Histórico completo em fluxo, sem paginação.
+        resposta = resposta_em_fluxo(dao.iterar_por_cliente(current_user['id']), formato)
+        return resposta if resposta is not None else (jsonify({'message': 'Erro ao listar pedidos.'}), 500)
+    # Paginado: ?limite=&cursor= e, com ?detalhes=1, os itens de cada pedido.
+    pagina = dao.listar_pagina_por_cliente(current_user['id'], **paginacao)
+    if pagina is None:
+        return jsonify({'message': 'Erro ao listar pedidos.'}), 500
+    return jsonify(pagina)
 
 @app.route('/api/produtos/estoque-baixo', methods=['GET'])
 @token_required
@@ -702,7 +2119,15 @@ def get_estoque_baixo(current_user):
     if current_user['tipo'] != 'funcionario':
         return jsonify({'message': 'Acesso negado: funcionalidade restrita a funcionários.'}), 403
     
+    try:
+        formato = formato_de_fluxo()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
     dao = ProdutoDAO()
+    if formato:
+        resposta = resposta_em_fluxo(dao.iterar_estoque_baixo(), formato)
+        return resposta if resposta is not None else (jsonify({'message': 'Erro ao listar produtos.'}), 500)
     produtos = dao.listar_estoque_baixo()
     return jsonify(produtos)
 
@@ -720,6 +2145,101 @@ def get_relatorio_vendas(current_user):
     else:
         return jsonify({'message': 'Erro ao gerar o relatório.'}), 500
     
+@app.route('/api/status/pool', methods=['GET'])
+@token_required
+def get_status_pool(current_user):
+    if current_user['tipo'] != 'funcionario':
+        return jsonify({'message': 'Acesso negado: funcionalidade restrita a funcionários.'}), 403
+    return jsonify(pool_conexoes.estatisticas())
+
+@app.route('/api/status/replicas', methods=['GET'])
+@token_required
+def get_status_replicas(current_user):
+    if current_user['tipo'] != 'funcionario':
+        return jsonify({'message': 'Acesso negado: funcionalidade restrita a funcionários.'}), 403
+    return jsonify(roteador.estatisticas())
+
+@app.route('/api/status/particoes', methods=['GET'])
+@token_required
+def get_status_particoes(current_user):
+    if current_user['tipo'] != 'funcionario':
+        return jsonify({'message': 'Acesso negado: funcionalidade restrita a funcionários.'}), 403
+    return jsonify(manutencao_particoes.estatisticas())
+
+@app.route('/api/status/venda-relampago', methods=['GET'])
+@token_required
+def get_status_venda_relampago(current_user):
+    if current_user['tipo'] != 'funcionario':
+        return jsonify({'message': 'Acesso negado: funcionalidade restrita a funcionários.'}), 403
+    return jsonify({
+        'vendas_abertas': VendaRelampagoDAO().listar(),
+        'fila_pedidos': fila_pedidos.estatisticas(),
+        'liberacao_reservas': liberador_reservas.estatisticas(),
+    })
+
+@app.route('/api/status/admissao', methods=['GET'])
+@token_required
+def get_status_admissao(current_user):
+    if current_user['tipo'] != 'funcionario':
+        return jsonify({'message': 'Acesso negado: funcionalidade restrita a funcionários.'}), 403
+    return jsonify(controle_admissao.estatisticas())
+
+@app.route('/api/status/cache', methods=['GET'])
+@token_required
+def get_status_cache(current_user):
+    if current_user['tipo'] != 'funcionario':
+        return jsonify({'message': 'Acesso negado: funcionalidade restrita a funcionários.'}), 403
+    return jsonify(cache_catalogo.estatisticas())
+
+@app.route('/api/status/senhas', methods=['GET'])
+@token_required
+def get_status_senhas(current_user):
+    if current_user['tipo'] != 'funcionario':
+        return jsonify({'message': 'Acesso negado: funcionalidade restrita a funcionários.'}), 403
+    return jsonify(servico_senhas.estatisticas())
+
+@app.route('/api/status/consultas-lentas', methods=['GET'])
+@token_required
+def get_consultas_lentas(current_user):
+    if current_user['tipo'] != 'funcionario':
+        return jsonify({'message': 'Acesso negado: funcionalidade restrita a funcionários.'}), 403
+    return jsonify(instrumentacao.consultas_lentas())
+
+@app.route('/api/status/consultas-preparadas', methods=['GET'])
+@token_required
+def get_consultas_preparadas(current_user):
+    if current_user['tipo'] != 'funcionario':
+        return jsonify({'message': 'Acesso negado: funcionalidade restrita a funcionários.'}), 403
+    return jsonify(consultas_preparadas.estatisticas())
+
+@app.route('/metrics', methods=['GET'])
+def metricas_prometheus():
+    # Formato de texto do Prometheus; pensado para ser coletado pela rede interna.
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/relatorios/vendas', methods=['GET'])
+@token_required
+def get_relatorio_vendas_periodo(current_user):
+    if current_user['tipo'] != 'funcionario':
+        return jsonify({'message': 'Acesso negado: funcionalidade restrita a funcionários.'}), 403
+
+    agrupar = request.args.get('agrupar', 'vendedor')
+    if agrupar not in CONSULTAS_RELATORIO_VENDAS:
+        return jsonify({'message': f"Agrupamento inválido. Use um de: {', '.join(CONSULTAS_RELATORIO_VENDAS)}."}), 400
+    try:
+        inicio = ler_data(request.args.get('inicio'))
+        fim = ler_data(request.args.get('fim'))
+    except ValueError:
+        return jsonify({'message': 'Datas devem estar no formato AAAA-MM-DD.'}), 400
+    if inicio and fim and inicio > fim:
+        return jsonify({'message': "'inicio' não pode ser posterior a 'fim'."}), 400
+
+    dao = RelatorioDAO()
+    relatorio = dao.gerar_relatorio_vendas(inicio, fim, agrupar)
+    if relatorio is None:
+        return jsonify({'message': 'Erro ao gerar o relatório.'}), 500
+    return jsonify(relatorio)
+
 # Adicione esta rota ao final do arquivo app.py
 
 @app.route('/api/funcionarios/registrar', methods=['POST'])
@@ -743,5 +2263,95 @@ def registrar_funcionario_api(current_user):
     else:
         return jsonify({'message': 'Erro no servidor ao registrar funcionário.'}), 500
 
+# --- COMANDOS DE LINHA DE COMANDO (flask <comando>) ---
+@app.cli.command('reconstruir-resumo-vendas')
+@click.option('--inicio', help='Primeiro dia (AAAA-MM-DD). Padrão: todo o histórico.')
+@click.option('--fim', help='Último dia (AAAA-MM-DD). Padrão: todo o histórico.')
+def reconstruir_resumo_vendas_cli(inicio, fim):
+    """Recalcula (backfill) os resumos de vendas a partir dos pedidos."""
+    try:
+        inicio, fim = ler_data(inicio), ler_data(fim)
+    except ValueError:
+        raise click.BadParameter('Datas devem estar no formato AAAA-MM-DD.')
+    linhas = RelatorioDAO().reconstruir_resumo_vendas(inicio, fim)
+    if linhas is None:
+        raise click.ClickException('Não foi possível reconstruir os resumos de vendas.')
+    click.echo(f'Resumo de vendas reconstruído: {linhas} linhas de vendas diárias geradas.')
+
+@app.cli.command('reconstruir-resumo-estoque')
+def reconstruir_resumo_estoque_cli():
+    """Recalcula o resumo do estoque (relatório e produtos abaixo do mínimo) a partir de PRODUTO."""
+    linhas = ProdutoDAO().reconstruir_resumo_estoque()
+    if linhas is None:
+        raise click.ClickException('Não foi possível reconstruir o resumo de estoque.')
+    click.echo(f'Resumo de estoque reconstruído: {linhas} linhas geradas.')
+
+@app.cli.command('manter-particoes')
+@click.option('--meses-futuros', type=int, help='Meses à frente com partição criada. Padrão: PARTICOES_MESES_FUTUROS.')
+@click.option('--meses-ativos', type=int, help='Meses mantidos em PEDIDO (o atual incluído); os anteriores são '
+                                                 'arquivados. 0 não arquiva. Padrão: PARTICOES_MESES_ATIVOS.')
+def manter_particoes_cli(meses_futuros, meses_ativos):
+    """Cria as próximas partições de PEDIDO/ITEM_PEDIDO e arquiva os meses antigos."""
+    manutencao = ManutencaoDeParticoes(
+        db_config,
+        meses_futuros=manutencao_particoes.meses_futuros if meses_futuros is None else meses_futuros,
+        meses_ativos=manutencao_particoes.meses_ativos if meses_ativos is None else meses_ativos
+    )
+    try:
+        criadas, arquivadas = manutencao.executar()
+    except psycopg2.Error as e:
+        raise click.ClickException(f'Não foi possível manter as partições: {e}')
+    situacao = manutencao.estatisticas()
+    click.echo(f"{criadas} meses criados, {arquivadas} arquivados. {situacao['particoes_ativas']} meses em PEDIDO "
+               f"(até {situacao['ultima_particao']}), {situacao['meses_arquivados']} no arquivo.")
+
+@app.cli.command('construir-estaticos')
+def construir_estaticos_cli():
+    """Gera static/dist: CSS/JS/imagens com hash no nome, versões .gz/.br e o fundo reduzido."""
+    manifesto = construir_estaticos(app.static_folder)
+    estaticos.recarregar()
+    click.echo(f'{len(manifesto)} arquivos estáticos gerados em {estaticos.pasta_dist}.')
+
+def formato_do_arquivo(caminho, formato):
+    if formato:
+        return formato
+    return 'ndjson' if caminho.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+@app.cli.command('importar-produtos')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(carga_catalogo.FORMATOS), help='Padrão: pela extensão do arquivo.')
+@click.option('--tudo-ou-nada', is_flag=True, help='Não importa nada se alguma linha for inválida.')
+def importar_produtos_cli(arquivo, formato, tudo_ou_nada):
+    """Importa produtos em lote de um arquivo CSV ou NDJSON."""
+    with open(arquivo, encoding='utf-8-sig', newline='') as arquivo_texto:
+        try:
+            resumo = ProdutoDAO().importar_em_lote(arquivo_texto, formato_do_arquivo(arquivo, formato), tudo_ou_nada)
+        except ErroFormatoImportacao as e:
+            raise click.ClickException(str(e))
+    if resumo is None:
+        raise click.ClickException('Não foi possível importar os produtos.')
+    for erro in resumo['erros']:
+        click.echo(f"Linha {erro['linha']}: {erro['erro']}", err=True)
+    if resumo['erros_omitidos']:
+        click.echo(f"... e mais {resumo['erros_omitidos']} erros.", err=True)
+    click.echo(f"{resumo['linhas_lidas']} linhas lidas: {resumo['inseridos']} inseridos, "
+               f"{resumo['atualizados']} atualizados, {resumo['rejeitados']} rejeitados.")
+    if tudo_ou_nada and resumo['rejeitados']:
+        raise click.ClickException('Nenhum produto importado: o arquivo contém linhas inválidas.')
+
+@app.cli.command('exportar-produtos')
+@click.argument('arquivo', required=False, type=click.Path(dir_okay=False, writable=True))
+@click.option('--formato', type=click.Choice(carga_catalogo.FORMATOS), help='Padrão: pela extensão do arquivo (ou csv na saída padrão).')
+def exportar_produtos_cli(arquivo, formato):
+    """Exporta o catálogo em CSV ou NDJSON (para um arquivo ou para a saída padrão)."""
+    formato = formato_do_arquivo(arquivo or '', formato)
+    destino = open(arquivo, 'w', encoding='utf-8', newline='') if arquivo else click.get_text_stream('stdout')
+    try:
+        if not ProdutoDAO().exportar_para_arquivo(formato, destino):
+            raise click.ClickException('Não foi possível exportar os produtos.')
+    finally:
+        if arquivo:
+            destino.close()
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
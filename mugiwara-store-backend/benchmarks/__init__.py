@@ -0,0 +1,4 @@
+# Benchmarks da Mugiwara Store.
+# Cada módulo pode ser executado a partir de mugiwara-store-backend/, por exemplo:
+#     python -m benchmarks.checkout --clientes 32 --duracao 20
+# Eles ALTERAM dados: use um banco descartável, nunca o de produção.
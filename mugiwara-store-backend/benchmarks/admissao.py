@@ -0,0 +1,203 @@
+# --- Benchmark do controle de admissão ---
+# Mede a latência das rotas críticas (produto por id, página do catálogo e checkout)
+# sozinhas e durante uma enxurrada de requisições caras: logins (pbkdf2 de 1M
+# iterações), relatórios de vendas e o catálogo completo em fluxo (?stream=ndjson).
+# Sem controle de admissão, todas as rotas disputam as mesmas threads e conexões e
+# pioram juntas; com ele, as caras esperam (ou recebem 429/503) nas filas das suas classes.
+#
+# Roda contra servidores em execução, via HTTP. Para comparar, suba um com ADMISSAO=0
+# e outro com o padrão, ambos com CACHE_CATALOGO_TTL=0 (para medir o banco, não o cache):
+#     ADMISSAO=0 CACHE_CATALOGO_TTL=0 flask run --port 5000 &
+#     CACHE_CATALOGO_TTL=0 flask run --port 5001 &
+#     python -m benchmarks.admissao --alvos sem=http://localhost:5000 com=http://localhost:5001 --json admissao.json
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import jwt
+
+from benchmarks import comum
+from benchmarks.comum import conectar, criar_clientes, imprimir_tabela, resumo_latencias, salvar_json
+
+PREFIXO_EMAIL = 'benchmark.admissao.'
+DOMINIO_EMAIL = '@mugiwara.test'
+EMAIL_FUNCIONARIO = 'benchmark.admissao.gerente@mugiwara.test'
+NOME_PRODUTO = 'Benchmark Controle de Admissão'
+SENHA = 'senha-do-benchmark'
+ESTOQUE_INICIAL = 10_000_000
+
+
+def preparar(contas, metodo):
+    """Cria clientes, um gerente e um produto com estoque de sobra; devolve os dados do teste."""
+    emails = [f'{PREFIXO_EMAIL}{i}{DOMINIO_EMAIL}' for i in range(contas)]
+    conn = conectar()
+    try:
+        with conn.cursor() as cursor:
+            ids_clientes = criar_clientes(cursor, emails, SENHA, metodo, 'Cliente Benchmark Admissão')
+            cursor.execute(
+                "INSERT INTO FUNCIONARIO (nome, email, senha_hash, cargo) VALUES ('Gerente Benchmark', %s, 'x', 'Gerente') "
+                "ON CONFLICT (email) DO NOTHING;", (EMAIL_FUNCIONARIO,))
+            cursor.execute("SELECT id_funcionario FROM FUNCIONARIO WHERE email = %s;", (EMAIL_FUNCIONARIO,))
+            id_funcionario = cursor.fetchone()[0]
+            cursor.execute(
+                "INSERT INTO PRODUTO (nome, descricao, preco, quantidade_estoque, categoria, fabricado_em_mari) "
+                "VALUES (%s, 'Produto criado pelo benchmark do controle de admissão', 9.90, %s, 'Benchmark', false) "
+                "RETURNING id_produto;", (NOME_PRODUTO, ESTOQUE_INICIAL))
+            id_produto = cursor.fetchone()[0]
+        conn.commit()
+    finally:
+        conn.close()
+
+    # Tokens assinados aqui, com a mesma chave do servidor: o checkout e os relatórios não dependem do login.
+    segredo = os.getenv("SECRET_KEY", "o_tesouro_one_piece_existe")
+    expira = datetime.now(timezone.utc) + timedelta(hours=2)
+    return {
+        'emails': emails,
+        'id_produto': id_produto,
+        'id_funcionario': id_funcionario,
+        'tokens_clientes': [jwt.encode({'id': c, 'tipo': 'cliente', 'exp': expira}, segredo, algorithm="HS256")
+                            for c in ids_clientes],
+        'token_funcionario': jwt.encode({'id': id_funcionario, 'tipo': 'funcionario', 'exp': expira},
+                                        segredo, algorithm="HS256"),
+    }
+
+
+def limpar(dados):
+    conn = conectar()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM PEDIDO WHERE id_cliente IN (SELECT id_cliente FROM CLIENTE WHERE email LIKE %s);",
+                           (f'{PREFIXO_EMAIL}%{DOMINIO_EMAIL}',))  # Itens caem em cascata
+            cursor.execute("DELETE FROM CLIENTE WHERE email LIKE %s;", (f'{PREFIXO_EMAIL}%{DOMINIO_EMAIL}',))
+            cursor.execute("DELETE FROM PRODUTO WHERE id_produto = %s;", (dados['id_produto'],))
+            cursor.execute("DELETE FROM FUNCIONARIO WHERE id_funcionario = %s;", (dados['id_funcionario'],))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def requisitar(url, corpo=None, token=None):
+    # Espera mais que o padrão: na enxurrada, as rotas caras podem passar um bom tempo na fila.
+    return comum.requisitar(url, corpo, token, timeout=60)
+
+
+def executar(alvo, url, fase, args, dados):
+    lock = threading.Lock()
+    latencias = {'produto': [], 'pagina': [], 'checkout': []}
+    status = {}  # (grupo, status) -> total
+    inicio_geral = threading.Event()
+    prazo = [0.0]
+
+    def trabalhador(grupo, n, fazer):
+        minhas_latencias, meus_status = [], {}
+        inicio_geral.wait()
+        i = n
+        while time.monotonic() < prazo[0]:
+            inicio = time.monotonic()
+            codigo = fazer(i)
+            meus_status[codigo] = meus_status.get(codigo, 0) + 1
+            if codigo in (200, 201):
+                minhas_latencias.append(time.monotonic() - inicio)
+            i += 1
+        with lock:
+            if grupo in latencias:
+                latencias[grupo].extend(minhas_latencias)
+            for codigo, total in meus_status.items():
+                status[(grupo, codigo)] = status.get((grupo, codigo), 0) + total
+
+    carrinho = {'forma_pagamento': 'PIX', 'itens': [{'id_produto': dados['id_produto'], 'quantidade': 1}]}
+    tarefas = {
+        # Rotas críticas, medidas nas duas fases
+        'produto': (args.leitores, lambda i: requisitar(f"{url}/api/produtos/{dados['id_produto']}")),
+        'pagina': (args.paginadores, lambda i: requisitar(f'{url}/api/produtos?limite=24')),
+        'checkout': (args.compradores, lambda i: requisitar(
+            f'{url}/api/pedidos', carrinho, dados['tokens_clientes'][i % len(dados['tokens_clientes'])])),
+    }
+    if fase == 'sobrecarga':
+        emails = dados['emails']
+        tarefas.update({
+            'login': (args.logins, lambda i: requisitar(f'{url}/api/login', {'email': emails[i % len(emails)], 'senha': SENHA})),
+            'relatorios': (args.relatorios, lambda i: requisitar(
+                f'{url}/api/relatorios/vendas?agrupar=produto', token=dados['token_funcionario'])),
+            'catalogo': (args.catalogos, lambda i: requisitar(f'{url}/api/produtos?stream=ndjson')),
+        })
+
+    threads = [threading.Thread(target=trabalhador, args=(grupo, n, fazer))
+               for grupo, (quantidade, fazer) in tarefas.items() for n in range(quantidade)]
+    for t in threads:
+        t.start()
+    inicio = time.monotonic()
+    prazo[0] = inicio + args.duracao
+    inicio_geral.set()
+    for t in threads:
+        t.join()
+    decorrido = time.monotonic() - inicio
+
+    produto = resumo_latencias(latencias['produto'])
+    pagina = resumo_latencias(latencias['pagina'])
+    checkout = resumo_latencias(latencias['checkout'])
+    caras = ('login', 'relatorios', 'catalogo')
+    return {
+        'alvo': alvo,
+        'fase': fase,
+        'duracao_s': round(decorrido, 2),
+        'produto_por_s': round(produto['amostras'] / decorrido, 1) if decorrido else 0.0,
+        'produto_p50_ms': produto['p50_ms'],
+        'produto_p99_ms': produto['p99_ms'],
+        'pagina_p50_ms': pagina['p50_ms'],
+        'pagina_p99_ms': pagina['p99_ms'],
+        'checkout_por_s': round(checkout['amostras'] / decorrido, 1) if decorrido else 0.0,
+        'checkout_p50_ms': checkout['p50_ms'],
+        'checkout_p99_ms': checkout['p99_ms'],
+        'criticas_erros': sum(t for (g, c), t in status.items() if g in ('produto', 'pagina', 'checkout') and c not in (200, 201)),
+        'caras_ok': sum(t for (g, c), t in status.items() if g in caras and c == 200),
+        'caras_429': sum(t for (g, c), t in status.items() if g in caras and c == 429),
+        'caras_503': sum(t for (g, c), t in status.items() if g in caras and c == 503),
+        'status': {f'{g} {c}': t for (g, c), t in sorted(status.items())},
+    }
+
+
+def ler_alvo(texto):
+    nome, _, url = texto.partition('=')
+    if not url:
+        raise argparse.ArgumentTypeError(f"Use nome=url (ex: com=http://localhost:5001), não '{texto}'.")
+    return nome, url.rstrip('/')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do controle de admissão (rotas críticas sob enxurrada de rotas caras).")
+    parser.add_argument('--alvos', nargs='+', type=ler_alvo, default=[('servidor', 'http://localhost:5000')],
+                        help="Servidores em execução, como nome=url (ex: sem=http://localhost:5000 com=http://localhost:5001).")
+    parser.add_argument('--duracao', type=float, default=15.0, help="Segundos de execução por fase.")
+    parser.add_argument('--leitores', type=int, default=4, help="Clientes lendo o produto por id, em sequência.")
+    parser.add_argument('--paginadores', type=int, default=2, help="Clientes lendo a primeira página do catálogo, em sequência.")
+    parser.add_argument('--compradores', type=int, default=4, help="Clientes fazendo checkout, em sequência.")
+    parser.add_argument('--logins', type=int, default=32, help="Logins simultâneos na enxurrada.")
+    parser.add_argument('--relatorios', type=int, default=16, help="Relatórios de vendas simultâneos na enxurrada.")
+    parser.add_argument('--catalogos', type=int, default=8, help="Catálogos completos (em fluxo) simultâneos na enxurrada.")
+    parser.add_argument('--contas', type=int, default=100, help="Contas de cliente criadas para o teste.")
+    parser.add_argument('--metodo', default='pbkdf2:sha256:1000000',
+                        help="Método de hash das contas (use o mesmo SENHA_HASH_METODO do servidor para evitar rehash).")
+    parser.add_argument('--json', help="Arquivo para gravar os resultados em JSON.")
+    args = parser.parse_args()
+
+    dados = preparar(args.contas, args.metodo)
+    resultados = []
+    try:
+        for alvo, url in args.alvos:
+            for fase in ('isolado', 'sobrecarga'):
+                print(f"Executando fase '{fase}' contra '{alvo}' ({url}) por {args.duracao:.0f}s...")
+                resultados.append(executar(alvo, url, fase, args, dados))
+    finally:
+        limpar(dados)
+
+    imprimir_tabela(resultados, ['alvo', 'fase', 'produto_por_s', 'produto_p50_ms', 'produto_p99_ms', 'pagina_p99_ms', 'checkout_por_s',
+                                 'checkout_p50_ms', 'checkout_p99_ms', 'criticas_erros', 'caras_ok', 'caras_429', 'caras_503'])
+    salvar_json(args.json, {'benchmark': 'admissao', 'parametros': {**vars(args), 'alvos': dict(args.alvos)},
+                            'resultados': resultados})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+# --- Benchmark: servidor síncrono (Flask) x assíncrono (servidor_async.py) ---
+# Aplica a mesma carga de leitura (páginas do catálogo, produto por id, busca e
+# histórico de pedidos) aos dois servidores, em vários níveis de concorrência,
+# e compara vazão e p50/p95/p99. O cliente é um único loop asyncio com conexões
+# keep-alive, para que centenas de usuários simultâneos não esgotem as threads
+# do próprio benchmark.
+#
+# Com os dois servidores de pé sobre o mesmo banco (de preferência com os dados
+# de benchmarks.gerar_dados e CACHE_CATALOGO_TTL=0, para que as leituras cheguem ao banco):
+#     flask run --port 5000 --with-threads
+#     uvicorn servidor_async:app --port 5001
+#     python -m benchmarks.async_vs_sync --sync-url http://localhost:5000 --async-url http://localhost:5001 \
+#         --concorrencia 50 200 500 --duracao 20 --json async_vs_sync.json
+#
+# --mix controla o peso de cada cenário, ex: catalogo=50,produto=25,busca=15,historico=10,login=0
+# (o login usa os clientes gerados, com a senha SENHA_CLIENTES).
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import urllib.parse
+from datetime import datetime, timedelta, timezone
+
+import jwt
+
+from benchmarks.comum import conectar, imprimir_tabela, resumo_latencias, salvar_json
+from benchmarks.gerar_dados import CATEGORIAS, DOMINIO_EMAIL, EDICOES, PERSONAGENS, SENHA_CLIENTES
+
+MIX_PADRAO = 'catalogo=50,produto=25,busca=15,historico=10'
+CENARIOS = ('catalogo', 'produto', 'busca', 'historico', 'login')
+ORDENS = ['nome_asc', 'nome_desc', 'preco_asc', 'preco_desc']
+TIMEOUT_REQUISICAO = 30.0
+
+
+class ConexaoHTTP:
+    """Uma conexão HTTP/1.1 keep-alive, reaberta quando o servidor a fecha."""
+
+    def __init__(self, host, porta):
+        self.host = host
+        self.porta = porta
+        self.leitor = self.escritor = None
+
+    async def fechar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+            self.leitor = self.escritor = None
+
+    async def requisitar(self, metodo, caminho, corpo=None, cabecalhos=None):
+        """Devolve (status, corpo). Repete uma vez se a conexão reaproveitada já estava fechada."""
+        for tentativa in (1, 2):
+            reaproveitada = self.escritor is not None
+            if not reaproveitada:
+                self.leitor, self.escritor = await asyncio.open_connection(self.host, self.porta)
+            try:
+                return await self._trocar(metodo, caminho, corpo, cabecalhos or {})
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.fechar()
+                if not reaproveitada or tentativa == 2:
+                    raise
+
+    async def _trocar(self, metodo, caminho, corpo, cabecalhos):
+        linhas = [f'{metodo} {caminho} HTTP/1.1', f'Host: {self.host}:{self.porta}', 'Accept-Encoding: gzip']
+        linhas += [f'{nome}: {valor}' for nome, valor in cabecalhos.items()]
+        if corpo is not None:
+            linhas += ['Content-Type: application/json', f'Content-Length: {len(corpo)}']
+        self.escritor.write(('\r\n'.join(linhas) + '\r\n\r\n').encode('latin-1') + (corpo or b''))
+        await self.escritor.drain()
+
+        linha_status = await self.leitor.readline()
+        if not linha_status:
+            raise ConnectionError("Conexão fechada pelo servidor.")
+        status = int(linha_status.split()[1])
+        recebidos = {}
+        while True:
+            linha = await self.leitor.readline()
+            if linha in (b'\r\n', b''):
+                break
+            nome, _, valor = linha.decode('latin-1').partition(':')
+            recebidos[nome.strip().lower()] = valor.strip()
+
+        if 'content-length' in recebidos:
+            conteudo = await self.leitor.readexactly(int(recebidos['content-length']))
+        elif recebidos.get('transfer-encoding', '').lower() == 'chunked':
+            partes = []
+            while True:
+                tamanho = int((await self.leitor.readline()).split(b';')[0], 16)
+                if tamanho == 0:
+                    await self.leitor.readline()
+                    break
+                partes.append(await self.leitor.readexactly(tamanho))
+                await self.leitor.readline()
+            conteudo = b''.join(partes)
+        else:
+            conteudo = await self.leitor.read()  # Sem tamanho: o corpo vai até o fim da conexão
+            recebidos['connection'] = 'close'
+        if recebidos.get('connection', '').lower() == 'close':
+            await self.fechar()
+        return status, conteudo
+
+
+class UsuarioVirtual:
+    def __init__(self, conexao, aleatorio, amostras, registrar):
+        self.conexao = conexao
+        self.aleatorio = aleatorio
+        self.amostras = amostras
+        self.registrar = registrar
+
+    async def requisitar(self, rota, caminho, corpo=None, cabecalhos=None):
+        inicio = time.monotonic()
+        try:
+            status, _ = await asyncio.wait_for(
+                self.conexao.requisitar('POST' if corpo is not None else 'GET', caminho, corpo, cabecalhos),
+                TIMEOUT_REQUISICAO)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+            await self.conexao.fechar()
+            status = 0
+        self.registrar(rota, status, time.monotonic() - inicio)
+
+    # --- Cenários ---
+    async def catalogo(self):
+        parametros = {'limite': 24, 'ordem': self.aleatorio.choice(ORDENS)}
+        if self.aleatorio.random() < 0.5:
+            parametros['categoria'] = self.aleatorio.choice(CATEGORIAS)
+        await self.requisitar('GET /api/produtos', '/api/produtos?' + urllib.parse.urlencode(parametros))
+
+    async def produto(self):
+        await self.requisitar('GET /api/produtos/<id>', f"/api/produtos/{self.aleatorio.choice(self.amostras['produtos'])}")
+
+    async def busca(self):
+        termo = self.aleatorio.choice(PERSONAGENS + EDICOES)
+        await self.requisitar('GET /api/produtos/buscar', '/api/produtos/buscar?' + urllib.parse.urlencode({'nome': termo}))
+
+    async def historico(self):
+        token = self.aleatorio.choice(self.amostras['tokens'])
+        await self.requisitar('GET /api/pedidos/historico', '/api/pedidos/historico?detalhes=1',
+                              cabecalhos={'x-access-token': token})
+
+    async def login(self):
+        corpo = json.dumps({'email': self.aleatorio.choice(self.amostras['emails']), 'senha': SENHA_CLIENTES})
+        await self.requisitar('POST /api/login', '/api/login', corpo.encode('utf-8'))
+
+
+def amostrar(quantidade):
+    """Produtos, emails de clientes gerados e tokens de clientes com pedidos, lidos do banco."""
+    conn = conectar()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id_produto FROM PRODUTO TABLESAMPLE SYSTEM (10) LIMIT %s;", (quantidade,))
+            produtos = [r[0] for r in cursor.fetchall()]
+            if not produtos:
+                cursor.execute("SELECT id_produto FROM PRODUTO LIMIT %s;", (quantidade,))
+                produtos = [r[0] for r in cursor.fetchall()]
+            cursor.execute("SELECT email FROM CLIENTE WHERE email LIKE %s LIMIT %s;", (f'%{DOMINIO_EMAIL}', quantidade))
+            emails = [r[0] for r in cursor.fetchall()]
+            cursor.execute("SELECT DISTINCT id_cliente FROM PEDIDO LIMIT %s;", (quantidade,))
+            clientes = [r[0] for r in cursor.fetchall()]
+    finally:
+        conn.close()
+    # Tokens assinados aqui, com a mesma chave do servidor: o cenário de histórico não depende do login.
+    segredo = os.getenv("SECRET_KEY", "o_tesouro_one_piece_existe")
+    expira = datetime.now(timezone.utc) + timedelta(hours=2)
+    tokens = [jwt.encode({'id': c, 'tipo': 'cliente', 'exp': expira}, segredo, algorithm="HS256") for c in clientes]
+    return {'produtos': produtos, 'emails': emails, 'tokens': tokens}
+
+
+def ler_mix(texto):
+    mix = {}
+    for parte in texto.split(','):
+        nome, _, peso = parte.partition('=')
+        nome = nome.strip()
+        if nome not in CENARIOS:
+            raise argparse.ArgumentTypeError(f"Cenário desconhecido: {nome}")
+        mix[nome] = float(peso)
+    return mix
+
+
+async def executar(url, concorrencia, duracao, mix, amostras, semente):
+    endereco = urllib.parse.urlsplit(url)
+    latencias, status = {}, {}
+
+    def registrar(rota, codigo, duracao_s):
+        status.setdefault(rota, {})
+        status[rota][codigo] = status[rota].get(codigo, 0) + 1
+        if 200 <= codigo < 400:
+            latencias.setdefault(rota, []).append(duracao_s)
+
+    cenarios = [(c, p) for c, p in mix.items() if p > 0]
+    if not amostras['tokens']:
+        cenarios = [(c, p) for c, p in cenarios if c != 'historico']  # Sem pedidos no banco
+    if not amostras['emails']:
+        cenarios = [(c, p) for c, p in cenarios if c != 'login']  # Sem os clientes de benchmarks.gerar_dados
+    nomes, pesos = zip(*cenarios)
+    prazo = time.monotonic() + duracao
+
+    async def usuario(n):
+        aleatorio = random.Random(semente + n)
+        conexao = ConexaoHTTP(endereco.hostname, endereco.port or 80)
+        virtual = UsuarioVirtual(conexao, aleatorio, amostras, registrar)
+        try:
+            while time.monotonic() < prazo:
+                await getattr(virtual, aleatorio.choices(nomes, pesos)[0])()
+        finally:
+            await conexao.fechar()
+
+    inicio = time.monotonic()
+    await asyncio.gather(*(usuario(n) for n in range(concorrencia)))
+    decorrido = time.monotonic() - inicio
+
+    todas = [l for valores in latencias.values() for l in valores]
+    total = sum(sum(s.values()) for s in status.values())
+    erros = sum(q for s in status.values() for codigo, q in s.items() if not 200 <= codigo < 400)
+    por_rota = {rota: {'requisicoes': sum(s.values()), 'status': {str(c): q for c, q in sorted(s.items())},
+                       **resumo_latencias(latencias.get(rota, []))} for rota, s in sorted(status.items())}
+    return {
+        'concorrencia': concorrencia,
+        'requisicoes': total,
+        'req_por_s': round(total / decorrido, 1) if decorrido else 0.0,
+        'erros': erros,
+        **resumo_latencias(todas),
+        'por_rota': por_rota,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vazão e latência do servidor síncrono x assíncrono sob alta concorrência.")
+    parser.add_argument('--sync-url', default='http://localhost:5000', help="Servidor do Flask (flask run).")
+    parser.add_argument('--async-url', default='http://localhost:5001', help="Servidor assíncrono (uvicorn servidor_async:app).")
+    parser.add_argument('--concorrencia', type=int, nargs='+', default=[50, 200, 500], help="Usuários simultâneos.")
+    parser.add_argument('--duracao', type=float, default=20.0, help="Segundos por servidor e nível de concorrência.")
+    parser.add_argument('--mix', type=ler_mix, default=ler_mix(MIX_PADRAO), help=f"Pesos dos cenários (padrão: {MIX_PADRAO}).")
+    parser.add_argument('--amostras', type=int, default=1000, help="Produtos e clientes sorteados do banco.")
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--json', help="Arquivo para gravar os resultados em JSON.")
+    args = parser.parse_args()
+
+    amostras = amostrar(args.amostras)
+    resultados = []
+    for concorrencia in args.concorrencia:
+        for servidor, url in (('sync', args.sync_url), ('async', args.async_url)):
+            print(f"{servidor}: {concorrencia} usuários por {args.duracao:.0f}s contra {url}...")
+            medido = asyncio.run(executar(url.rstrip('/'), concorrencia, args.duracao, args.mix, amostras, args.semente))
+            resultados.append({'servidor': servidor, **medido})
+
+    imprimir_tabela(resultados, ['servidor', 'concorrencia', 'requisicoes', 'req_por_s', 'erros', 'p50_ms', 'p95_ms', 'p99_ms'])
+    comparacao = []
+    for sincrono, assincrono in zip(resultados[::2], resultados[1::2]):
+        comparacao.append({
+            'concorrencia': sincrono['concorrencia'],
+            'vazao_async_sobre_sync': round(assincrono['req_por_s'] / sincrono['req_por_s'], 2) if sincrono['req_por_s'] else '-',
+            'p99_sync_ms': sincrono['p99_ms'],
+            'p99_async_ms': assincrono['p99_ms'],
+        })
+    print()
+    imprimir_tabela(comparacao, ['concorrencia', 'vazao_async_sobre_sync', 'p99_sync_ms', 'p99_async_ms'])
+    salvar_json(args.json, {
+        'benchmark': 'async_vs_sync',
+        'parametros': {k: v for k, v in vars(args).items() if k != 'json'},
+        'resultados': resultados,
+        'comparacao': comparacao,
+    })
+
+
+if __name__ == '__main__':
+    main()
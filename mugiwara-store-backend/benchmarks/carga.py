@@ -0,0 +1,254 @@
+# --- Teste de carga por cenários ---
+# Usuários virtuais (threads) repetem uma mistura de cenários contra o servidor
+# em execução: navegar pelo catálogo, buscar, fazer login, comprar e ver
+# relatórios. O resultado traz vazão e p50/p95/p99 por rota, em JSON, com o
+# commit testado, para comparar execuções entre versões do código.
+#
+# Uso (depois de python -m benchmarks.gerar_dados):
+#     python -m benchmarks.carga --usuarios 50 --duracao 60 --json carga.json
+#     python -m benchmarks.carga --usuarios 50 --duracao 60 --comparar carga.json
+#
+# --mix controla o peso de cada cenário, ex: navegar=60,buscar=20,login=5,checkout=10,relatorio=5
+import argparse
+import json
+import random
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timezone
+
+from benchmarks.comum import conectar, imprimir_tabela, resumo_latencias, salvar_json
+from benchmarks.gerar_dados import CATEGORIAS, DOMINIO_EMAIL, EDICOES, PERSONAGENS, SENHA_CLIENTES
+
+MIX_PADRAO = 'navegar=60,buscar=20,login=5,checkout=10,relatorio=5'
+ORDENS = ['nome_asc', 'nome_desc', 'preco_asc', 'preco_desc']
+
+
+class Coletor:
+    """Latências e status por rota, somados entre as threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {}
+        self.status = {}
+
+    def registrar(self, rota, status, duracao):
+        with self._lock:
+            self.status.setdefault(rota, {})
+            self.status[rota][status] = self.status[rota].get(status, 0) + 1
+            if 200 <= status < 400:
+                self.latencias.setdefault(rota, []).append(duracao)
+
+
+class UsuarioVirtual:
+    def __init__(self, url, coletor, aleatorio, amostras):
+        self.url = url
+        self.coletor = coletor
+        self.aleatorio = aleatorio
+        self.amostras = amostras
+        self.token = None
+
+    def requisitar(self, rota, caminho, corpo=None, autenticado=False):
+        """Faz a requisição, registra a latência sob `rota` e devolve (status, json ou None)."""
+        dados = json.dumps(corpo).encode('utf-8') if corpo is not None else None
+        cabecalhos = {'Content-Type': 'application/json'}
+        if autenticado and self.token:
+            cabecalhos['x-access-token'] = self.token
+        pedido = urllib.request.Request(self.url + caminho, data=dados, headers=cabecalhos)
+        inicio = time.monotonic()
+        try:
+            with urllib.request.urlopen(pedido, timeout=30) as resposta:
+                conteudo = resposta.read()
+                status = resposta.status
+        except urllib.error.HTTPError as e:
+            conteudo, status = e.read(), e.code
+        except (urllib.error.URLError, OSError):
+            conteudo, status = b'', 0
+        self.coletor.registrar(rota, status, time.monotonic() - inicio)
+        try:
+            return status, json.loads(conteudo) if conteudo else None
+        except ValueError:
+            return status, None
+
+    # --- Cenários ---
+    def navegar(self):
+        parametros = {'limite': 24, 'ordem': self.aleatorio.choice(ORDENS)}
+        if self.aleatorio.random() < 0.5:
+            parametros['categoria'] = self.aleatorio.choice(CATEGORIAS)
+        status, pagina = self.requisitar('GET /api/produtos', '/api/produtos?' + urllib.parse.urlencode(parametros))
+        if status != 200 or not pagina:
+            return
+        if pagina.get('proximo_cursor') and self.aleatorio.random() < 0.4:
+            parametros['cursor'] = pagina['proximo_cursor']
+            self.requisitar('GET /api/produtos (página seguinte)', '/api/produtos?' + urllib.parse.urlencode(parametros))
+        if pagina.get('produtos'):
+            produto = self.aleatorio.choice(pagina['produtos'])
+            self.requisitar('GET /api/produtos/<id>', f"/api/produtos/{produto['id_produto']}")
+
+    def buscar(self):
+        termo = self.aleatorio.choice(PERSONAGENS + EDICOES)
+        for tamanho in (2, 4):
+            self.requisitar('GET /api/produtos/autocomplete',
+                            '/api/produtos/autocomplete?' + urllib.parse.urlencode({'q': termo[:tamanho]}))
+        self.requisitar('GET /api/produtos/buscar', '/api/produtos/buscar?' + urllib.parse.urlencode({'nome': termo}))
+
+    def login(self):
+        email = self.aleatorio.choice(self.amostras['emails'])
+        status, corpo = self.requisitar('POST /api/login', '/api/login', {'email': email, 'senha': SENHA_CLIENTES})
+        if status == 200 and corpo:
+            self.token = corpo.get('token')
+
+    def checkout(self):
+        if not self.token:
+            self.login()
+            if not self.token:
+                return
+        ids = self.aleatorio.sample(self.amostras['produtos'], min(self.aleatorio.randint(1, 3), len(self.amostras['produtos'])))
+        carrinho = {'forma_pagamento': 'PIX', 'itens': [{'id_produto': i, 'quantidade': 1} for i in ids]}
+        self.requisitar('POST /api/pedidos', '/api/pedidos', carrinho, autenticado=True)
+        if self.aleatorio.random() < 0.3:
+            self.requisitar('GET /api/pedidos/historico', '/api/pedidos/historico', autenticado=True)
+
+    def relatorio(self):
+        self.requisitar('GET /api/produtos/relatorio', '/api/produtos/relatorio')
+
+
+def amostrar(qtd_clientes, qtd_produtos):
+    """Emails de clientes gerados e ids de produtos para os cenários de login e checkout."""
+    conn = conectar()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT email FROM CLIENTE WHERE email LIKE %s ORDER BY random() LIMIT %s;",
+                           (f'%{DOMINIO_EMAIL}', qtd_clientes))
+            emails = [r[0] for r in cursor.fetchall()]
+            # Produtos mais vendidos, para que o checkout dispute as mesmas linhas que a loja real.
+            cursor.execute("SELECT id_produto FROM RESUMO_VENDAS_DIARIO GROUP BY id_produto "
+                           "ORDER BY sum(quantidade) DESC LIMIT %s;", (qtd_produtos,))
+            produtos = [r[0] for r in cursor.fetchall()]
+            if not produtos:
+                cursor.execute("SELECT id_produto FROM PRODUTO ORDER BY id_produto LIMIT %s;", (qtd_produtos,))
+                produtos = [r[0] for r in cursor.fetchall()]
+        return {'emails': emails, 'produtos': produtos}
+    finally:
+        conn.close()
+
+
+def ler_mix(texto):
+    mix = {}
+    for parte in texto.split(','):
+        nome, _, peso = parte.partition('=')
+        nome = nome.strip()
+        if nome not in ('navegar', 'buscar', 'login', 'checkout', 'relatorio'):
+            raise argparse.ArgumentTypeError(f"Cenário desconhecido: {nome}")
+        mix[nome] = float(peso)
+    return mix
+
+
+def commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(url, usuarios, duracao, mix, pausa, amostras, semente):
+    coletor = Coletor()
+    inicio_geral = threading.Event()
+    prazo = [0.0]
+    cenarios, pesos = list(mix), list(mix.values())
+    if not amostras['emails']:
+        # Sem clientes gerados não há login nem checkout possíveis.
+        cenarios, pesos = zip(*[(c, p) for c, p in mix.items() if c not in ('login', 'checkout')])
+
+    def usuario(n):
+        aleatorio = random.Random(semente + n)
+        virtual = UsuarioVirtual(url, coletor, aleatorio, amostras)
+        inicio_geral.wait()
+        while time.monotonic() < prazo[0]:
+            getattr(virtual, aleatorio.choices(cenarios, pesos)[0])()
+            if pausa:
+                time.sleep(aleatorio.expovariate(1 / pausa))
+
+    threads = [threading.Thread(target=usuario, args=(n,)) for n in range(usuarios)]
+    for t in threads:
+        t.start()
+    inicio = time.monotonic()
+    prazo[0] = inicio + duracao
+    inicio_geral.set()
+    for t in threads:
+        t.join()
+    decorrido = time.monotonic() - inicio
+
+    resultados = []
+    for rota in sorted(coletor.status):
+        status = coletor.status[rota]
+        total = sum(status.values())
+        erros = sum(q for s, q in status.items() if not 200 <= s < 400)
+        resultados.append({
+            'rota': rota,
+            'requisicoes': total,
+            'req_por_s': round(total / decorrido, 1),
+            'erros': erros,
+            'status': {str(s): q for s, q in sorted(status.items())},
+            **resumo_latencias(coletor.latencias.get(rota, [])),
+        })
+    return decorrido, resultados
+
+
+def comparar(resultados, caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        anteriores = {r['rota']: r for r in json.load(arquivo)['resultados']}
+    linhas = []
+    for r in resultados:
+        antes = anteriores.get(r['rota'])
+        if not antes:
+            continue
+        linhas.append({
+            'rota': r['rota'],
+            'req_por_s': f"{antes['req_por_s']} -> {r['req_por_s']}",
+            'p95_ms': f"{antes['p95_ms']} -> {r['p95_ms']}",
+            'p99_ms': f"{antes['p99_ms']} -> {r['p99_ms']}",
+            'variacao_p95': f"{(r['p95_ms'] / antes['p95_ms'] - 1) * 100:+.1f}%" if antes['p95_ms'] else '-',
+        })
+    print(f"\nComparação com {caminho}:")
+    imprimir_tabela(linhas, ['rota', 'req_por_s', 'p95_ms', 'p99_ms', 'variacao_p95'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga por cenários contra o servidor em execução.")
+    parser.add_argument('--url', default='http://localhost:5000', help="Endereço do servidor em execução.")
+    parser.add_argument('--usuarios', type=int, default=20, help="Usuários virtuais simultâneos.")
+    parser.add_argument('--duracao', type=float, default=30.0, help="Segundos de execução.")
+    parser.add_argument('--mix', type=ler_mix, default=ler_mix(MIX_PADRAO), help=f"Pesos dos cenários (padrão: {MIX_PADRAO}).")
+    parser.add_argument('--pausa', type=float, default=0.0, help="Pausa média (s) entre cenários de um usuário.")
+    parser.add_argument('--amostra-clientes', type=int, default=1000, help="Clientes sorteados para login/checkout.")
+    parser.add_argument('--produtos-checkout', type=int, default=200, help="Produtos populares usados no checkout.")
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--json', help="Arquivo para gravar os resultados em JSON.")
+    parser.add_argument('--comparar', help="JSON de uma execução anterior para comparar p95/p99 e vazão.")
+    args = parser.parse_args()
+
+    amostras = amostrar(args.amostra_clientes, args.produtos_checkout)
+    print(f"Executando {args.usuarios} usuários por {args.duracao:.0f}s contra {args.url}...")
+    decorrido, resultados = executar(args.url.rstrip('/'), args.usuarios, args.duracao, args.mix, args.pausa,
+                                     amostras, args.semente)
+
+    imprimir_tabela(resultados, ['rota', 'requisicoes', 'req_por_s', 'erros', 'p50_ms', 'p95_ms', 'p99_ms'])
+    if args.comparar:
+        comparar(resultados, args.comparar)
+    salvar_json(args.json, {
+        'benchmark': 'carga',
+        'commit': commit_atual(),
+        'executado_em': datetime.now(timezone.utc).isoformat(),
+        'duracao_s': round(decorrido, 2),
+        'parametros': {k: v for k, v in vars(args).items() if k not in ('json', 'comparar')},
+        'resultados': resultados,
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+# --- Benchmark de concorrência do checkout ---
+# Compara a procedure antiga (laço item a item, travas na ordem do carrinho e
+# busca do id pelo último pedido) com a atual criar_pedido_completo (set-based,
+# travas em ordem de id e id devolvido pelo INOUT), com vários clientes
+# comprando ao mesmo tempo um pequeno conjunto de produtos "quentes".
+#
+# Uso (a partir de mugiwara-store-backend/):
+#     python -m benchmarks.checkout --clientes 32 --duracao 20 --json checkout.json
+import argparse
+import json
+import random
+import threading
+import time
+
+import psycopg2
+from psycopg2 import errors
+
+from benchmarks.comum import conectar, imprimir_tabela, resumo_latencias, salvar_json
+
+EMAIL_CLIENTE = 'benchmark.checkout@mugiwara.test'
+EMAIL_FUNCIONARIO = 'benchmark.vendedor@mugiwara.test'
+PREFIXO_PRODUTO = 'Benchmark Checkout #'
+ESTOQUE_INICIAL = 10_000_000
+
+# Cópia da versão anterior de criar_pedido_completo, instalada com outro nome
+# apenas durante o benchmark para servir de linha de base.
+SQL_PROCEDURE_LEGADA = """
+CREATE OR REPLACE PROCEDURE criar_pedido_completo_legado(
+    p_id_cliente INTEGER, p_id_funcionario INTEGER, p_forma_pagamento VARCHAR(50),
+    p_itens JSON, INOUT p_novo_pedido_id INTEGER)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    item RECORD;
+    produto_info RECORD;
+    valor_total_calculado NUMERIC(10, 2) := 0;
+    tem_desconto BOOLEAN;
+    v_data_pedido TIMESTAMPTZ;
+BEGIN
+    SELECT (torce_flamengo OR assiste_one_piece OR natural_de_sousa) INTO tem_desconto
+    FROM CLIENTE WHERE id_cliente = p_id_cliente;
+    FOR item IN SELECT * FROM json_to_recordset(p_itens) AS x(id_produto INTEGER, quantidade INTEGER)
+    LOOP
+        SELECT preco, quantidade_estoque, nome INTO produto_info FROM PRODUTO WHERE id_produto = item.id_produto FOR UPDATE;
+        IF produto_info IS NULL THEN
+            RAISE EXCEPTION 'Produto com ID % não encontrado.', item.id_produto;
+        END IF;
+        IF produto_info.quantidade_estoque < item.quantidade THEN
+            RAISE EXCEPTION 'Estoque insuficiente para o produto: %', produto_info.nome;
+        END IF;
+        valor_total_calculado := valor_total_calculado + (produto_info.preco * item.quantidade);
+    END LOOP;
+    IF tem_desconto THEN
+        valor_total_calculado := valor_total_calculado * 0.90;
+    END IF;
+    INSERT INTO PEDIDO (id_cliente, id_funcionario, forma_pagamento, status_pagamento, valor_total)
+    VALUES (p_id_cliente, p_id_funcionario, p_forma_pagamento, 'Pagamento Aprovado', valor_total_calculado)
+    RETURNING id_pedido, data_pedido INTO p_novo_pedido_id, v_data_pedido;
+    FOR item IN SELECT * FROM json_to_recordset(p_itens) AS x(id_produto INTEGER, quantidade INTEGER)
+    LOOP
+        SELECT preco INTO produto_info FROM PRODUTO WHERE id_produto = item.id_produto;
+        INSERT INTO ITEM_PEDIDO (id_pedido, data_pedido, id_produto, quantidade, preco_unitario_na_venda)
+        VALUES (p_novo_pedido_id, v_data_pedido, item.id_produto, item.quantidade, produto_info.preco);
+        UPDATE PRODUTO SET quantidade_estoque = quantidade_estoque - item.quantidade WHERE id_produto = item.id_produto;
+    END LOOP;
+END;
+$$;
+"""
+
+
+def preparar(qtd_produtos):
+    """Cria cliente, vendedor e produtos do benchmark; devolve (id_cliente, id_funcionario, ids_produtos)."""
+    conn = conectar()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(SQL_PROCEDURE_LEGADA)
+            cursor.execute(
+                "INSERT INTO CLIENTE (nome, email, senha_hash) VALUES ('Cliente Benchmark', %s, 'x') "
+                "ON CONFLICT (email) DO NOTHING;", (EMAIL_CLIENTE,))
+            cursor.execute("SELECT id_cliente FROM CLIENTE WHERE email = %s;", (EMAIL_CLIENTE,))
+            id_cliente = cursor.fetchone()[0]
+            cursor.execute(
+                "INSERT INTO FUNCIONARIO (nome, email, senha_hash, cargo) VALUES ('Vendedor Benchmark', %s, 'x', 'Vendedor') "
+                "ON CONFLICT (email) DO NOTHING;", (EMAIL_FUNCIONARIO,))
+            cursor.execute("SELECT id_funcionario FROM FUNCIONARIO WHERE email = %s;", (EMAIL_FUNCIONARIO,))
+            id_funcionario = cursor.fetchone()[0]
+            ids = []
+            for i in range(qtd_produtos):
+                cursor.execute(
+                    "INSERT INTO PRODUTO (nome, descricao, preco, quantidade_estoque, categoria, fabricado_em_mari) "
+                    "VALUES (%s, 'Produto criado pelo benchmark de checkout', 10.00, %s, 'Benchmark', false) "
+                    "RETURNING id_produto;", (f'{PREFIXO_PRODUTO}{i}', ESTOQUE_INICIAL))
+                ids.append(cursor.fetchone()[0])
+        conn.commit()
+        return id_cliente, id_funcionario, ids
+    finally:
+        conn.close()
+
+
+def limpar(id_cliente, id_funcionario, ids_produtos):
+    conn = conectar()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM PEDIDO WHERE id_cliente = %s;", (id_cliente,))  # Itens caem em cascata
+            cursor.execute("DELETE FROM PRODUTO WHERE id_produto = ANY(%s);", (ids_produtos,))
+            cursor.execute("DELETE FROM CLIENTE WHERE id_cliente = %s;", (id_cliente,))
+            cursor.execute("DELETE FROM FUNCIONARIO WHERE id_funcionario = %s;", (id_funcionario,))
+            cursor.execute("DROP PROCEDURE IF EXISTS criar_pedido_completo_legado(INTEGER, INTEGER, VARCHAR, JSON, INTEGER);")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def fazer_pedido_legado(cursor, id_cliente, id_funcionario, itens):
+    # Reproduz o caminho antigo do PedidoDAO: CALL + busca do "último" pedido do cliente.
+    cursor.execute("BEGIN;")
+    cursor.execute("CALL criar_pedido_completo_legado(%s, %s, %s, %s, %s);",
+                   (id_cliente, id_funcionario, 'PIX', json.dumps(itens), 0))
+    cursor.execute("SELECT id_pedido FROM PEDIDO WHERE id_cliente = %s ORDER BY data_pedido DESC LIMIT 1;", (id_cliente,))
+    return cursor.fetchone()[0]
+
+
+def fazer_pedido_atual(cursor, id_cliente, id_funcionario, itens):
+    cursor.execute("CALL criar_pedido_completo(%s, %s, %s, %s, NULL);",
+                   (id_cliente, id_funcionario, 'PIX', json.dumps(itens)))
+    return cursor.fetchone()[0]
+
+
+MODOS = {'legado': fazer_pedido_legado, 'atual': fazer_pedido_atual}
+
+
+def executar(modo, clientes, duracao, id_cliente, id_funcionario, ids_produtos, itens_por_carrinho):
+    fazer_pedido = MODOS[modo]
+    lock = threading.Lock()
+    totais = {'ok': 0, 'deadlocks': 0, 'outros_erros': 0}
+    latencias = []
+    inicio_geral = threading.Event()
+    prazo = [0.0]
+
+    def cliente(semente):
+        aleatorio = random.Random(semente)
+        conn = conectar()
+        minhas_latencias, ok, deadlocks, outros = [], 0, 0, 0
+        inicio_geral.wait()
+        try:
+            with conn.cursor() as cursor:
+                while time.monotonic() < prazo[0]:
+                    # Carrinho com produtos quentes em ordem aleatória: é o cenário que
+                    # provoca deadlock quando as travas seguem a ordem do carrinho.
+                    escolhidos = aleatorio.sample(ids_produtos, itens_por_carrinho)
+                    itens = [{'id_produto': i, 'quantidade': 1} for i in escolhidos]
+                    inicio = time.monotonic()
+                    try:
+                        fazer_pedido(cursor, id_cliente, id_funcionario, itens)
+                        conn.commit()
+                        ok += 1
+                        minhas_latencias.append(time.monotonic() - inicio)
+                    except errors.DeadlockDetected:
+                        conn.rollback()
+                        deadlocks += 1
+                    except psycopg2.Error:
+                        conn.rollback()
+                        outros += 1
+        finally:
+            conn.close()
+        with lock:
+            totais['ok'] += ok
+            totais['deadlocks'] += deadlocks
+            totais['outros_erros'] += outros
+            latencias.extend(minhas_latencias)
+
+    threads = [threading.Thread(target=cliente, args=(n,)) for n in range(clientes)]
+    for t in threads:
+        t.start()
+    inicio = time.monotonic()
+    prazo[0] = inicio + duracao
+    inicio_geral.set()
+    for t in threads:
+        t.join()
+    decorrido = time.monotonic() - inicio
+
+    tentativas = totais['ok'] + totais['deadlocks'] + totais['outros_erros']
+    return {
+        'modo': modo,
+        'clientes': clientes,
+        'duracao_s': round(decorrido, 2),
+        'pedidos_ok': totais['ok'],
+        'deadlocks': totais['deadlocks'],
+        'outros_erros': totais['outros_erros'],
+        'taxa_deadlock': round(totais['deadlocks'] / tentativas, 4) if tentativas else 0.0,
+        'pedidos_por_s': round(totais['ok'] / decorrido, 1) if decorrido else 0.0,
+        **resumo_latencias(latencias),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de concorrência do checkout (procedure antiga x atual).")
+    parser.add_argument('--clientes', type=int, default=32, help="Clientes (threads/conexões) simultâneos.")
+    parser.add_argument('--duracao', type=float, default=15.0, help="Segundos de execução por modo.")
+    parser.add_argument('--produtos-quentes', type=int, default=5, help="Tamanho do conjunto de produtos disputados.")
+    parser.add_argument('--itens-por-carrinho', type=int, default=3)
+    parser.add_argument('--modo', choices=['legado', 'atual', 'ambos'], default='ambos')
+    parser.add_argument('--json', help="Arquivo para gravar os resultados em JSON.")
+    args = parser.parse_args()
+    if args.itens_por_carrinho > args.produtos_quentes:
+        parser.error("--itens-por-carrinho não pode ser maior que --produtos-quentes.")
+
+    modos = ['legado', 'atual'] if args.modo == 'ambos' else [args.modo]
+    id_cliente, id_funcionario, ids = preparar(args.produtos_quentes)
+    resultados = []
+    try:
+        for modo in modos:
+            print(f"Executando modo '{modo}' com {args.clientes} clientes por {args.duracao:.0f}s...")
+            resultados.append(executar(modo, args.clientes, args.duracao, id_cliente, id_funcionario, ids, args.itens_por_carrinho))
+    finally:
+        limpar(id_cliente, id_funcionario, ids)
+
+    imprimir_tabela(resultados, ['modo', 'pedidos_ok', 'pedidos_por_s', 'deadlocks', 'taxa_deadlock',
+                                 'outros_erros', 'p50_ms', 'p95_ms', 'p99_ms'])
+    salvar_json(args.json, {'benchmark': 'checkout', 'parametros': vars(args), 'resultados': resultados})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# --- Utilidades compartilhadas pelos benchmarks ---
+import json
+import os
+import statistics
+import urllib.error
+import urllib.request
+
+import psycopg2
+from werkzeug.security import generate_password_hash
+
+
+def db_config():
+    # Mesmas variáveis de ambiente do app.py, mas com 'localhost' como padrão,
+    # já que os benchmarks normalmente rodam fora do container.
+    return {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "port": int(os.getenv("DB_PORT", "5432")),
+        "database": os.getenv("POSTGRES_DB", "mugiwara_store"),
+        "user": os.getenv("POSTGRES_USER", "luffy"),
+        "password": os.getenv("POSTGRES_PASSWORD", "meusonhoeh"),
+    }
+
+
+def conectar(autocommit=False):
+    conn = psycopg2.connect(**db_config())
+    conn.autocommit = autocommit
+    return conn
+
+
+def criar_clientes(cursor, emails, senha, metodo, nome):
+    """Cria (ou atualiza a senha de) uma conta de cliente por email; devolve os ids, na mesma ordem."""
+    # Um único hash para todas as contas: gerar um por conta custaria o mesmo que os logins.
+    senha_hash = generate_password_hash(senha, method=metodo)
+    ids = []
+    for email in emails:
+        cursor.execute(
+            "INSERT INTO CLIENTE (nome, email, senha_hash) VALUES (%s, %s, %s) "
+            "ON CONFLICT (email) DO UPDATE SET senha_hash = EXCLUDED.senha_hash RETURNING id_cliente;",
+            (nome, email, senha_hash))
+        ids.append(cursor.fetchone()[0])
+    return ids
+
+
+def requisitar(url, corpo=None, token=None, timeout=30):
+    """Faz a requisição HTTP e devolve o status (0 para falhas de rede)."""
+    dados = json.dumps(corpo).encode('utf-8') if corpo is not None else None
+    cabecalhos = {'Content-Type': 'application/json'}
+    if token:
+        cabecalhos['x-access-token'] = token
+    pedido = urllib.request.Request(url, data=dados, headers=cabecalhos)
+    try:
+        with urllib.request.urlopen(pedido, timeout=timeout) as resposta:
+            resposta.read()
+            return resposta.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return 0
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) por interpolação linear; 0.0 para listas vazias."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    posicao = (len(ordenados) - 1) * p / 100
+    baixo = int(posicao)
+    alto = min(baixo + 1, len(ordenados) - 1)
+    return ordenados[baixo] + (ordenados[alto] - ordenados[baixo]) * (posicao - baixo)
+
+
+def resumo_latencias(latencias_s):
+    """Resumo em milissegundos de uma lista de latências em segundos."""
+    ms = [l * 1000 for l in latencias_s]
+    return {
+        'amostras': len(ms),
+        'media_ms': round(statistics.fmean(ms), 3) if ms else 0.0,
+        'p50_ms': round(percentil(ms, 50), 3),
+        'p95_ms': round(percentil(ms, 95), 3),
+        'p99_ms': round(percentil(ms, 99), 3),
+        'max_ms': round(max(ms), 3) if ms else 0.0,
+    }
+
+
+def salvar_json(caminho, dados):
+    if caminho:
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            json.dump(dados, arquivo, ensure_ascii=False, indent=2)
+        print(f"Resultados gravados em {caminho}")
+
+
+def imprimir_tabela(linhas, colunas):
+    larguras = [max(len(str(c)), *(len(str(l.get(c, ''))) for l in linhas)) for c in colunas]
+    print("  ".join(str(c).ljust(w) for c, w in zip(colunas, larguras)))
+    for linha in linhas:
+        print("  ".join(str(linha.get(c, '')).ljust(w) for c, w in zip(colunas, larguras)))
@@ -0,0 +1,271 @@
+# --- Gerador de dados sintéticos ---
+# Carrega volumes realistas no banco via COPY, em lotes: produtos, CEPs,
+# clientes (com telefones), vendedores e pedidos com itens. A popularidade dos
+# produtos e a frequência de compra dos clientes seguem uma distribuição
+# concentrada (poucos produtos vendem muito), como numa loja de verdade.
+#
+# Uso (a partir de mugiwara-store-backend/, contra um banco descartável):
+#     python -m benchmarks.gerar_dados --produtos 1000000 --clientes 500000 --pedidos 2500000
+#
+# Todos os clientes gerados usam a senha SENHA_CLIENTES, para que o
+# benchmarks.carga consiga fazer login com eles.
+import argparse
+import io
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from werkzeug.security import generate_password_hash
+
+from benchmarks.comum import conectar
+
+DOMINIO_EMAIL = '@dados.mugiwara.test'
+SENHA_CLIENTES = 'mugiwara123'
+TAMANHO_LOTE = 50_000
+
+CATEGORIAS = ['Action Figure', 'Pôster de Recompensa', 'Akuma no Mi', 'Vestuário', 'Mangá',
+              'Chaveiro', 'Caneca', 'Espada', 'Chapéu', 'Miniatura de Navio']
+PERSONAGENS = ['Luffy', 'Zoro', 'Nami', 'Usopp', 'Sanji', 'Chopper', 'Robin', 'Franky', 'Brook',
+               'Jinbe', 'Shanks', 'Ace', 'Sabo', 'Law', 'Kid', 'Buggy', 'Mihawk', 'Hancock',
+               'Kaido', 'Big Mom', 'Barba Negra', 'Yamato', 'Vivi', 'Garp', 'Roger']
+EDICOES = ['Wano', 'Marineford', 'Enies Lobby', 'Alabasta', 'Dressrosa', 'Egghead', 'Thriller Bark',
+           'Skypiea', 'Water 7', 'Punk Hazard', 'Edição Limitada', 'Clássico']
+CIDADES = [('Sousa', 'PB'), ('João Pessoa', 'PB'), ('Campina Grande', 'PB'), ('Mari', 'PB'),
+           ('Recife', 'PE'), ('Natal', 'RN'), ('Fortaleza', 'CE'), ('São Paulo', 'SP'),
+           ('Rio de Janeiro', 'RJ'), ('Belo Horizonte', 'MG')]
+FORMAS_PAGAMENTO = ['PIX', 'Cartão de Crédito', 'Boleto', 'Berries']
+
+
+def texto_copy(valor):
+    """Valor no formato texto do COPY (tab como separador, \\N para nulo)."""
+    if valor is None:
+        return '\\N'
+    if isinstance(valor, bool):
+        return 't' if valor else 'f'
+    return str(valor).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+def copiar(cursor, tabela, colunas, linhas):
+    buffer = io.StringIO()
+    for valores in linhas:
+        buffer.write('\t'.join(texto_copy(v) for v in valores))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN", buffer)
+
+
+def preco_do_produto(id_produto):
+    # Preço determinístico a partir do id: os pedidos não precisam guardar a tabela de preços.
+    return round(5 + (id_produto * 7919 % 99_500) / 100, 2)
+
+
+def indice_concentrado(aleatorio, total, concentracao):
+    # u ** concentracao empurra os sorteios para o começo do intervalo:
+    # com concentração 3, 1% dos índices recebe cerca de 21% dos sorteios.
+    return min(total - 1, int(total * aleatorio.random() ** concentracao))
+
+
+def proximo_id(cursor, tabela, coluna):
+    cursor.execute(f"SELECT coalesce(max({coluna}), 0) + 1 FROM {tabela};")
+    return cursor.fetchone()[0]
+
+
+def ajustar_sequencia(cursor, tabela, coluna):
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence('{tabela}', '{coluna}'), (SELECT max({coluna}) FROM {tabela}));")
+
+
+def em_lotes(total, gerar_lote, rotulo):
+    inicio = time.monotonic()
+    feitos = 0
+    while feitos < total:
+        quantidade = min(TAMANHO_LOTE, total - feitos)
+        gerar_lote(feitos, quantidade)
+        feitos += quantidade
+        decorrido = time.monotonic() - inicio
+        print(f"  {rotulo}: {feitos}/{total} ({feitos / decorrido:,.0f}/s)", end='\r', flush=True)
+    print()
+
+
+def gerar_produtos(conn, aleatorio, total):
+    with conn.cursor() as cursor:
+        base = proximo_id(cursor, 'produto', 'id_produto')
+
+    def lote(feitos, quantidade):
+        linhas = []
+        for n in range(feitos, feitos + quantidade):
+            id_produto = base + n
+            categoria = CATEGORIAS[n % len(CATEGORIAS)]
+            personagem = aleatorio.choice(PERSONAGENS)
+            edicao = aleatorio.choice(EDICOES)
+            nome = f"{categoria} {personagem} {edicao} #{id_produto}"
+            descricao = f"{categoria} de {personagem}, inspirado no arco {edicao}. Item de colecionador da Mugiwara Store."
+            linhas.append((id_produto, nome[:100], descricao, preco_do_produto(id_produto),
+                           aleatorio.randint(1_000, 100_000), categoria, aleatorio.random() < 0.2, None))
+        with conn.cursor() as cursor:
+            copiar(cursor, 'produto', ('id_produto', 'nome', 'descricao', 'preco', 'quantidade_estoque',
+                                       'categoria', 'fabricado_em_mari', 'imagem'), linhas)
+        conn.commit()
+
+    em_lotes(total, lote, 'produtos')
+    with conn.cursor() as cursor:
+        ajustar_sequencia(cursor, 'produto', 'id_produto')
+    conn.commit()
+    return base
+
+
+def gerar_ceps(conn, aleatorio, total):
+    # CEPs vão por uma tabela temporária para ignorar os que já existirem.
+    ceps = [f"{n // 1000:05d}-{n % 1000:03d}" for n in aleatorio.sample(range(1_000_000, 99_999_999), total)]
+    with conn.cursor() as cursor:
+        cursor.execute("CREATE TEMP TABLE ceps_gerados (LIKE ENDERECO_CEP) ON COMMIT DROP;")
+        linhas = []
+        for cep in ceps:
+            cidade, estado = aleatorio.choice(CIDADES)
+            linhas.append((cep, f"Rua {aleatorio.choice(PERSONAGENS)}, trecho {aleatorio.randint(1, 999)}",
+                           f"Bairro {aleatorio.choice(EDICOES)}", cidade, estado))
+        copiar(cursor, 'ceps_gerados', ('cep', 'logradouro', 'bairro', 'cidade', 'estado'), linhas)
+        cursor.execute("INSERT INTO ENDERECO_CEP SELECT * FROM ceps_gerados ON CONFLICT (cep) DO NOTHING;")
+    conn.commit()
+    return ceps
+
+
+def gerar_clientes(conn, aleatorio, total, ceps, metodo_hash):
+    senha_hash = generate_password_hash(SENHA_CLIENTES, method=metodo_hash)
+    with conn.cursor() as cursor:
+        base = proximo_id(cursor, 'cliente', 'id_cliente')
+
+    def lote(feitos, quantidade):
+        clientes, telefones = [], []
+        for n in range(feitos, feitos + quantidade):
+            id_cliente = base + n
+            cep = aleatorio.choice(ceps) if ceps and aleatorio.random() < 0.9 else None
+            clientes.append((id_cliente, f"{aleatorio.choice(PERSONAGENS)} Cliente {id_cliente}",
+                             f"cliente.{id_cliente}{DOMINIO_EMAIL}", senha_hash,
+                             str(aleatorio.randint(1, 9999)) if cep else None, None, cep,
+                             aleatorio.random() < 0.3, aleatorio.random() < 0.5, aleatorio.random() < 0.05))
+            for i in range(1 if aleatorio.random() < 0.7 else 2):
+                telefones.append((id_cliente, f"(83) 9{id_cliente % 10_000:04d}-{i}{aleatorio.randint(0, 999):03d}"))
+        with conn.cursor() as cursor:
+            copiar(cursor, 'cliente', ('id_cliente', 'nome', 'email', 'senha_hash', 'numero_endereco',
+                                       'complemento_endereco', 'cep', 'torce_flamengo', 'assiste_one_piece',
+                                       'natural_de_sousa'), clientes)
+            copiar(cursor, 'cliente_telefone', ('id_cliente', 'telefone'), telefones)
+        conn.commit()
+
+    em_lotes(total, lote, 'clientes')
+    with conn.cursor() as cursor:
+        ajustar_sequencia(cursor, 'cliente', 'id_cliente')
+    conn.commit()
+    return base
+
+
+def gerar_vendedores(conn, total):
+    with conn.cursor() as cursor:
+        base = proximo_id(cursor, 'funcionario', 'id_funcionario')
+        linhas = [(base + n, f"Vendedor Sintético {base + n}", f"vendedor.{base + n}{DOMINIO_EMAIL}", 'x', 'Vendedor')
+                  for n in range(total)]
+        copiar(cursor, 'funcionario', ('id_funcionario', 'nome', 'email', 'senha_hash', 'cargo'), linhas)
+        ajustar_sequencia(cursor, 'funcionario', 'id_funcionario')
+    conn.commit()
+    return list(range(base, base + total))
+
+
+def gerar_pedidos(conn, aleatorio, total, produtos, clientes, vendedores, dias, itens_medios, concentracao):
+    base_produto, qtd_produtos = produtos
+    base_cliente, qtd_clientes = clientes
+    with conn.cursor() as cursor:
+        base = proximo_id(cursor, 'pedido', 'id_pedido')
+    fim = datetime.now(timezone.utc)
+    inicio = fim - timedelta(days=dias)
+    passo = (fim - inicio) / max(total, 1)
+    # PEDIDO e ITEM_PEDIDO são particionadas por mês: os meses do período precisam existir antes do COPY.
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT criar_particoes_pedido(dia_venda(%s), dia_venda(%s));", (inicio, fim + timedelta(minutes=1)))
+    conn.commit()
+
+    def lote(feitos, quantidade):
+        pedidos, itens = [], []
+        for n in range(feitos, feitos + quantidade):
+            id_pedido = base + n
+            # Datas crescentes com o id, como num sistema real, com um pouco de ruído.
+            data = inicio + passo * n + timedelta(seconds=aleatorio.uniform(0, 60))
+            escolhidos = set()
+            qtd_itens = min(10, 1 + int(aleatorio.expovariate(1 / max(itens_medios - 1, 0.01))))
+            while len(escolhidos) < min(qtd_itens, qtd_produtos):
+                escolhidos.add(base_produto + indice_concentrado(aleatorio, qtd_produtos, concentracao))
+            total_pedido = 0
+            for id_produto in escolhidos:
+                qtd = 1 if aleatorio.random() < 0.8 else aleatorio.randint(2, 5)
+                preco = preco_do_produto(id_produto)
+                total_pedido += qtd * preco
+                itens.append((id_pedido, data.isoformat(), id_produto, qtd, preco))
+            id_cliente = base_cliente + indice_concentrado(aleatorio, qtd_clientes, 2)
+            pedidos.append((id_pedido, data.isoformat(), aleatorio.choice(FORMAS_PAGAMENTO), 'Pagamento Aprovado',
+                            round(total_pedido, 2), id_cliente, aleatorio.choice(vendedores)))
+        with conn.cursor() as cursor:
+            copiar(cursor, 'pedido', ('id_pedido', 'data_pedido', 'forma_pagamento', 'status_pagamento',
+                                      'valor_total', 'id_cliente', 'id_funcionario'), pedidos)
+            copiar(cursor, 'item_pedido', ('id_pedido', 'data_pedido', 'id_produto', 'quantidade', 'preco_unitario_na_venda'), itens)
+        conn.commit()
+
+    # Os gatilhos dos resumos de vendas ficam desligados durante a carga;
+    # no fim os resumos são reconstruídos de uma vez só.
+    with conn.cursor() as cursor:
+        cursor.execute("ALTER TABLE PEDIDO DISABLE TRIGGER USER;")
+        cursor.execute("ALTER TABLE ITEM_PEDIDO DISABLE TRIGGER USER;")
+    conn.commit()
+    try:
+        em_lotes(total, lote, 'pedidos')
+    finally:
+        conn.rollback()
+        with conn.cursor() as cursor:
+            cursor.execute("ALTER TABLE PEDIDO ENABLE TRIGGER USER;")
+            cursor.execute("ALTER TABLE ITEM_PEDIDO ENABLE TRIGGER USER;")
+        conn.commit()
+    with conn.cursor() as cursor:
+        ajustar_sequencia(cursor, 'pedido', 'id_pedido')
+        print("  reconstruindo resumos de vendas...")
+        cursor.execute("SELECT reconstruir_resumo_vendas(NULL, NULL);")
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos via COPY para os benchmarks.")
+    parser.add_argument('--produtos', type=int, default=1_000_000)
+    parser.add_argument('--clientes', type=int, default=500_000)
+    parser.add_argument('--ceps', type=int, default=50_000)
+    parser.add_argument('--vendedores', type=int, default=20)
+    parser.add_argument('--pedidos', type=int, default=2_500_000,
+                        help="Pedidos gerados (com --itens-medios 3, dá ~10M linhas entre PEDIDO e ITEM_PEDIDO).")
+    parser.add_argument('--itens-medios', type=float, default=3.0, help="Média de itens por pedido.")
+    parser.add_argument('--dias', type=int, default=365, help="Pedidos distribuídos nos últimos N dias.")
+    parser.add_argument('--concentracao', type=float, default=3.0,
+                        help="Quanto maior, mais as vendas se concentram nos produtos populares.")
+    parser.add_argument('--metodo-hash', default='pbkdf2:sha256:1000000',
+                        help="Método de hash das senhas dos clientes (o mesmo SENHA_HASH_METODO do servidor).")
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    aleatorio = random.Random(args.semente)
+    conn = conectar()
+    inicio = time.monotonic()
+    try:
+        base_produto = gerar_produtos(conn, aleatorio, args.produtos)
+        ceps = gerar_ceps(conn, aleatorio, args.ceps)
+        base_cliente = gerar_clientes(conn, aleatorio, args.clientes, ceps, args.metodo_hash)
+        vendedores = gerar_vendedores(conn, args.vendedores)
+        if args.pedidos and args.produtos and args.clientes:
+            gerar_pedidos(conn, aleatorio, args.pedidos, (base_produto, args.produtos), (base_cliente, args.clientes),
+                          vendedores, args.dias, args.itens_medios, args.concentracao)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            print("  atualizando estatísticas (ANALYZE)...")
+            cursor.execute("ANALYZE;")
+    finally:
+        conn.close()
+    print(f"Carga concluída em {time.monotonic() - inicio:.1f}s.")
+
+
+if __name__ == '__main__':
+    main()
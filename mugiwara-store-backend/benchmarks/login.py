@@ -0,0 +1,132 @@
+# --- Benchmark de login ---
+# Mede vazão e latência do POST /api/login sob uma rajada de clientes e, ao
+# mesmo tempo, a latência do catálogo (GET /api/produtos), para mostrar se os
+# logins estão prendendo as threads que servem as demais rotas.
+#
+# Roda contra o servidor em execução (docker compose up), via HTTP:
+#     python -m benchmarks.login --url http://localhost:5000 --clientes 32 --duracao 20
+import argparse
+import threading
+import time
+
+from benchmarks.comum import conectar, criar_clientes, imprimir_tabela, requisitar, resumo_latencias, salvar_json
+
+PREFIXO_EMAIL = 'benchmark.login.'
+DOMINIO_EMAIL = '@mugiwara.test'
+SENHA = 'senha-do-benchmark'
+
+
+def preparar(contas, metodo):
+    """Cria as contas de cliente do benchmark, todas com a mesma senha; devolve os emails."""
+    emails = [f'{PREFIXO_EMAIL}{i}{DOMINIO_EMAIL}' for i in range(contas)]
+    conn = conectar()
+    try:
+        with conn.cursor() as cursor:
+            criar_clientes(cursor, emails, SENHA, metodo, 'Cliente Benchmark Login')
+        conn.commit()
+        return emails
+    finally:
+        conn.close()
+
+
+def limpar():
+    conn = conectar()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM CLIENTE WHERE email LIKE %s;", (f'{PREFIXO_EMAIL}%{DOMINIO_EMAIL}',))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def executar(fase, url, clientes, duracao, emails):
+    lock = threading.Lock()
+    status_login = {}
+    latencias_login, latencias_catalogo = [], []
+    inicio_geral = threading.Event()
+    prazo = [0.0]
+
+    def cliente(n):
+        minhas_latencias, meus_status = [], {}
+        inicio_geral.wait()
+        i = n
+        while time.monotonic() < prazo[0]:
+            inicio = time.monotonic()
+            status = requisitar(f'{url}/api/login', {'email': emails[i % len(emails)], 'senha': SENHA})
+            meus_status[status] = meus_status.get(status, 0) + 1
+            if status == 200:
+                minhas_latencias.append(time.monotonic() - inicio)
+            i += clientes
+        with lock:
+            latencias_login.extend(minhas_latencias)
+            for status, total in meus_status.items():
+                status_login[status] = status_login.get(status, 0) + total
+
+    def sonda_catalogo():
+        # Um leitor do catálogo em sequência: sua latência denuncia threads presas.
+        inicio_geral.wait()
+        while time.monotonic() < prazo[0]:
+            inicio = time.monotonic()
+            if requisitar(f'{url}/api/produtos?limite=24') == 200:
+                latencias_catalogo.append(time.monotonic() - inicio)
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=sonda_catalogo)]
+    if fase == 'rajada_login':
+        threads += [threading.Thread(target=cliente, args=(n,)) for n in range(clientes)]
+    for t in threads:
+        t.start()
+    inicio = time.monotonic()
+    prazo[0] = inicio + duracao
+    inicio_geral.set()
+    for t in threads:
+        t.join()
+    decorrido = time.monotonic() - inicio
+
+    login = resumo_latencias(latencias_login)
+    catalogo = resumo_latencias(latencias_catalogo)
+    ok = status_login.get(200, 0)
+    return {
+        'fase': fase,
+        'clientes': clientes if fase == 'rajada_login' else 0,
+        'duracao_s': round(decorrido, 2),
+        'logins_ok': ok,
+        'logins_por_s': round(ok / decorrido, 1) if decorrido else 0.0,
+        'recusados_503': status_login.get(503, 0),
+        'outros_status': sum(t for s, t in status_login.items() if s not in (200, 503)),
+        'login_p50_ms': login['p50_ms'],
+        'login_p95_ms': login['p95_ms'],
+        'login_p99_ms': login['p99_ms'],
+        'catalogo_p50_ms': catalogo['p50_ms'],
+        'catalogo_p99_ms': catalogo['p99_ms'],
+        'catalogo_max_ms': catalogo['max_ms'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de login (vazão, latência e impacto no catálogo).")
+    parser.add_argument('--url', default='http://localhost:5000', help="Endereço do servidor em execução.")
+    parser.add_argument('--clientes', type=int, default=32, help="Logins simultâneos.")
+    parser.add_argument('--duracao', type=float, default=15.0, help="Segundos de execução por fase.")
+    parser.add_argument('--contas', type=int, default=100, help="Contas de cliente criadas para o teste.")
+    parser.add_argument('--metodo', default='pbkdf2:sha256:1000000',
+                        help="Método de hash das contas (use o mesmo SENHA_HASH_METODO do servidor para evitar rehash).")
+    parser.add_argument('--json', help="Arquivo para gravar os resultados em JSON.")
+    args = parser.parse_args()
+
+    emails = preparar(args.contas, args.metodo)
+    resultados = []
+    try:
+        for fase in ('catalogo_isolado', 'rajada_login'):
+            print(f"Executando fase '{fase}' por {args.duracao:.0f}s...")
+            resultados.append(executar(fase, args.url.rstrip('/'), args.clientes, args.duracao, emails))
+    finally:
+        limpar()
+
+    imprimir_tabela(resultados, ['fase', 'logins_ok', 'logins_por_s', 'recusados_503', 'login_p50_ms',
+                                 'login_p99_ms', 'catalogo_p50_ms', 'catalogo_p99_ms', 'catalogo_max_ms'])
+    salvar_json(args.json, {'benchmark': 'login', 'parametros': vars(args), 'resultados': resultados})
+
+
+if __name__ == '__main__':
+    main()
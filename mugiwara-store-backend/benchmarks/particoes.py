@@ -0,0 +1,217 @@
+# --- Benchmark do histórico e dos relatórios com anos de pedidos ---
+# Mede, a cada ano de pedidos acrescentado ao banco, a latência das consultas que
+# leem PEDIDO/ITEM_PEDIDO ou os resumos de vendas:
+#   - as páginas do histórico do cliente (primeira página e a partir de um cursor,
+#     com itens), as mesmas consultas preparadas do app.py;
+#   - os relatórios de vendas por vendedor (mês atual) e por dia (últimos 12 meses);
+#   - a reconstrução dos resumos do último mês (intervalo de datas sobre PEDIDO).
+# Cada rodada carrega, via COPY, mais um ano de pedidos antes do pedido mais antigo
+# que já existe e mede de novo: com as tabelas particionadas por mês, as latências
+# devem ficar estáveis mesmo com o volume crescendo. Com --meses-ativos, no fim os
+# meses mais antigos são arquivados (CALL arquivar_pedidos) e tudo é medido mais uma vez.
+#
+# Uso (a partir de mugiwara-store-backend/, depois do benchmarks.gerar_dados, contra um banco descartável):
+#     python -m benchmarks.particoes --anos 5 --pedidos-por-ano 500000 --meses-ativos 12 --json particoes.json
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+
+from app import CONSULTAS_RELATORIO_VENDAS, LIMITE_PADRAO_HISTORICO, consultas_preparadas
+from benchmarks.comum import conectar, db_config, imprimir_tabela, resumo_latencias, salvar_json
+from benchmarks.gerar_dados import FORMAS_PAGAMENTO, copiar, em_lotes, indice_concentrado, preco_do_produto, proximo_id
+from consultas_preparadas import ConexaoComPreparadas, ConsultasPreparadas
+
+AQUECIMENTO = 10  # Execuções antes de medir: o PostgreSQL passa ao plano genérico depois de 5
+RECONSTRUCOES = 5  # A reconstrução trava os resumos: poucas repetições bastam
+
+
+def ids_existentes(cursor, tabela, coluna):
+    cursor.execute(f"SELECT array_agg({coluna} ORDER BY {coluna}) FROM {tabela};")
+    return cursor.fetchone()[0] or []
+
+
+def carregar_ano(conn, aleatorio, quantidade, produtos, clientes, vendedores):
+    """Um ano de pedidos terminando no pedido mais antigo do banco, arquivado ou não (ou agora)."""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT least((SELECT min(data_pedido) FROM PEDIDO),
+                         (SELECT min(mes)::TIMESTAMP AT TIME ZONE 'America/Sao_Paulo' FROM PEDIDO_ARQUIVADO), now());
+        """)
+        fim = cursor.fetchone()[0]
+        inicio = fim - timedelta(days=365)
+        cursor.execute("SELECT criar_particoes_pedido(dia_venda(%s), dia_venda(%s));", (inicio, fim))
+        base = proximo_id(cursor, 'pedido', 'id_pedido')
+        cursor.execute("ALTER TABLE PEDIDO DISABLE TRIGGER USER;")
+        cursor.execute("ALTER TABLE ITEM_PEDIDO DISABLE TRIGGER USER;")
+    conn.commit()
+
+    def lote(feitos, qtd):
+        pedidos, itens = [], []
+        for n in range(feitos, feitos + qtd):
+            id_pedido = base + n
+            data = inicio + timedelta(seconds=aleatorio.uniform(0, 365 * 86400 - 1))
+            escolhidos = {produtos[indice_concentrado(aleatorio, len(produtos), 3)]
+                          for _ in range(1 + int(aleatorio.expovariate(0.5)) % 6)}
+            total = 0
+            for id_produto in escolhidos:
+                qtd_item = 1 if aleatorio.random() < 0.8 else aleatorio.randint(2, 5)
+                preco = preco_do_produto(id_produto)
+                total += qtd_item * preco
+                itens.append((id_pedido, data.isoformat(), id_produto, qtd_item, preco))
+            pedidos.append((id_pedido, data.isoformat(), aleatorio.choice(FORMAS_PAGAMENTO), 'Pagamento Aprovado',
+                            round(total, 2), clientes[indice_concentrado(aleatorio, len(clientes), 2)],
+                            aleatorio.choice(vendedores)))
+        with conn.cursor() as cursor:
+            copiar(cursor, 'pedido', ('id_pedido', 'data_pedido', 'forma_pagamento', 'status_pagamento',
+                                      'valor_total', 'id_cliente', 'id_funcionario'), pedidos)
+            copiar(cursor, 'item_pedido', ('id_pedido', 'data_pedido', 'id_produto', 'quantidade',
+                                           'preco_unitario_na_venda'), itens)
+        conn.commit()
+
+    try:
+        em_lotes(quantidade, lote, f"pedidos de {inicio:%m/%Y} a {fim:%m/%Y}")
+    finally:
+        conn.rollback()
+        with conn.cursor() as cursor:
+            cursor.execute("ALTER TABLE PEDIDO ENABLE TRIGGER USER;")
+            cursor.execute("ALTER TABLE ITEM_PEDIDO ENABLE TRIGGER USER;")
+        conn.commit()
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT setval(pg_get_serial_sequence('pedido', 'id_pedido'), (SELECT max(id_pedido) FROM PEDIDO));")
+        cursor.execute("SELECT reconstruir_resumo_vendas(dia_venda(%s), dia_venda(%s));", (inicio, fim))
+    conn.commit()
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute("ANALYZE PEDIDO;")
+        cursor.execute("ANALYZE ITEM_PEDIDO;")
+    conn.autocommit = False
+
+
+def situacao(cursor):
+    cursor.execute("""
+        SELECT (SELECT count(*) FROM pg_inherits WHERE inhparent = 'pedido'::REGCLASS),
+               (SELECT count(*) FROM PEDIDO),
+               (SELECT count(*) FROM PEDIDO_ARQUIVADO),
+               (SELECT coalesce(sum(pedidos), 0) FROM PEDIDO_ARQUIVADO);
+    """)
+    particoes, pedidos, meses_arquivados, pedidos_arquivados = cursor.fetchone()
+    return {'particoes': particoes, 'pedidos': pedidos, 'meses_arquivados': meses_arquivados,
+            'pedidos_arquivados': int(pedidos_arquivados)}
+
+
+def parametros_historico(cursor, amostras):
+    # Clientes dos pedidos mais recentes (primeira página) e pedidos de qualquer mês
+    # ativo como cursor (páginas no meio do histórico).
+    limite = LIMITE_PADRAO_HISTORICO + 1
+    cursor.execute("SELECT id_cliente FROM PEDIDO ORDER BY data_pedido DESC LIMIT %s;", (amostras,))
+    primeira = [{'cliente': c, 'limite': limite} for (c,) in cursor.fetchall()]
+    cursor.execute("SELECT id_cliente, data_pedido, id_pedido FROM PEDIDO TABLESAMPLE SYSTEM (1) LIMIT %s;", (amostras,))
+    seguintes = [{'cliente': c, 'data': d, 'id': i, 'limite': limite} for c, d, i in cursor.fetchall()]
+    return primeira, seguintes
+
+
+def medir(conn, executar, parametros, chamadas):
+    latencias = []
+    with conn.cursor() as cursor:
+        for i in range(AQUECIMENTO + chamadas):
+            inicio = time.perf_counter()
+            executar(cursor, parametros[i % len(parametros)])
+            cursor.fetchall()
+            conn.rollback()  # Uma transação por chamada, como nas DAOs
+            if i >= AQUECIMENTO:
+                latencias.append(time.perf_counter() - inicio)
+    return latencias
+
+
+def medir_rodada(conn, preparadas, rodada, chamadas, amostras):
+    with conn.cursor() as cursor:
+        estado = situacao(cursor)
+        primeira, seguintes = parametros_historico(cursor, amostras)
+    conn.rollback()
+    hoje = datetime.now(timezone.utc).date()
+    um_ano = {'inicio': hoje - timedelta(days=365), 'fim': hoje}
+    medicoes = [
+        ('historico_primeira_pagina', lambda c, p: preparadas.executar(c, 'historico_cliente_itens', p), primeira),
+        ('historico_com_cursor', lambda c, p: preparadas.executar(c, 'historico_cliente_apos_itens', p), seguintes),
+        ('relatorio_vendedor_mes', lambda c, p: c.execute(CONSULTAS_RELATORIO_VENDAS['vendedor'][0], p),
+         [{'inicio': None, 'fim': None}]),
+        ('relatorio_dia_12_meses', lambda c, p: c.execute(CONSULTAS_RELATORIO_VENDAS['dia'][0], p), [um_ano]),
+    ]
+    resultados = []
+    for consulta, executar, parametros in medicoes:
+        if not parametros:
+            continue
+        latencias = medir(conn, executar, parametros, chamadas)
+        resultados.append({'rodada': rodada, **estado, 'consulta': consulta,
+                           **{k: v for k, v in resumo_latencias(latencias).items() if k in ('p50_ms', 'p95_ms', 'p99_ms')}})
+
+    # A reconstrução do último mês lê só as partições do intervalo.
+    latencias = []
+    with conn.cursor() as cursor:
+        for _ in range(RECONSTRUCOES):
+            inicio = time.perf_counter()
+            cursor.execute("SELECT reconstruir_resumo_vendas(dia_venda(now()) - 30, dia_venda(now()));")
+            conn.commit()
+            latencias.append(time.perf_counter() - inicio)
+    resultados.append({'rodada': rodada, **estado, 'consulta': 'reconstruir_resumo_30_dias',
+                       **{k: v for k, v in resumo_latencias(latencias).items() if k in ('p50_ms', 'p95_ms', 'p99_ms')}})
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Histórico e relatórios com anos de pedidos nas tabelas particionadas.")
+    parser.add_argument('--anos', type=int, default=5, help="Anos de pedidos acrescentados, um por rodada.")
+    parser.add_argument('--pedidos-por-ano', type=int, default=500_000)
+    parser.add_argument('--meses-ativos', type=int, default=0,
+                        help="Se maior que 0, arquiva no fim os meses anteriores a essa janela e mede de novo.")
+    parser.add_argument('--chamadas', type=int, default=500, help="Chamadas medidas por consulta em cada rodada.")
+    parser.add_argument('--amostras', type=int, default=200, help="Clientes/cursores sorteados por rodada.")
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--json', help="Arquivo para gravar os resultados em JSON.")
+    args = parser.parse_args()
+
+    aleatorio = random.Random(args.semente)
+    carga = conectar()
+    with carga.cursor() as cursor:
+        produtos = ids_existentes(cursor, 'PRODUTO', 'id_produto')
+        clientes = ids_existentes(cursor, 'CLIENTE', 'id_cliente')
+        vendedores = ids_existentes(cursor, 'FUNCIONARIO', 'id_funcionario')
+    carga.rollback()
+    if not produtos or not clientes:
+        raise SystemExit("O banco precisa de produtos e clientes (rode antes o benchmarks.gerar_dados).")
+
+    conn = psycopg2.connect(**db_config(), connection_factory=ConexaoComPreparadas)
+    preparadas = ConsultasPreparadas()
+    for nome in ('historico_cliente_itens', 'historico_cliente_apos_itens'):
+        preparadas.registrar(nome, consultas_preparadas.sql(nome))
+
+    resultados = medir_rodada(conn, preparadas, 'inicial', args.chamadas, args.amostras)
+    for ano in range(1, args.anos + 1):
+        carregar_ano(carga, aleatorio, args.pedidos_por_ano, produtos, clientes, vendedores)
+        resultados += medir_rodada(conn, preparadas, f'+{ano} ano(s)', args.chamadas, args.amostras)
+    if args.meses_ativos > 0:
+        carga.autocommit = True
+        with carga.cursor() as cursor:
+            inicio = time.monotonic()
+            cursor.execute("CALL arquivar_pedidos((date_trunc('month', dia_venda(now())) "
+                           "- make_interval(months => %s))::DATE, NULL);", (args.meses_ativos - 1,))
+            print(f"{cursor.fetchone()[0]} meses arquivados em {time.monotonic() - inicio:.1f}s")
+        resultados += medir_rodada(conn, preparadas, 'arquivado', args.chamadas, args.amostras)
+    conn.close()
+    carga.close()
+
+    imprimir_tabela(resultados, ['rodada', 'pedidos', 'particoes', 'meses_arquivados', 'consulta',
+                                 'p50_ms', 'p95_ms', 'p99_ms'])
+    salvar_json(args.json, {
+        'benchmark': 'particoes',
+        'parametros': {k: v for k, v in vars(args).items() if k != 'json'},
+        'resultados': resultados,
+        'contadores': preparadas.estatisticas(),
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# --- Benchmark das consultas preparadas ---
+# Executa cada consulta registrada em consultas_preparadas (as do app.py) de duas
+# formas, na mesma conexão e com os mesmos parâmetros:
+#   - texto: o SQL completo a cada chamada (analisado e planejado toda vez);
+#   - preparada: PREPARE uma vez e EXECUTE nas chamadas seguintes.
+# Mede a latência vista pelo cliente e, por EXPLAIN (ANALYZE, SUMMARY), o tempo de
+# planejamento do servidor em cada forma. Só faz leituras.
+#
+# Uso (a partir de mugiwara-store-backend/, de preferência com os dados de benchmarks.gerar_dados):
+#     python -m benchmarks.preparadas --chamadas 2000 --json preparadas.json
+import argparse
+import re
+import statistics
+import time
+
+import psycopg2
+
+from app import LIMITE_PADRAO_HISTORICO, consultas_preparadas
+from benchmarks.comum import db_config, imprimir_tabela, resumo_latencias, salvar_json
+from consultas_preparadas import ConexaoComPreparadas, ConsultasPreparadas
+
+TEMPO_PLANEJAMENTO = re.compile(r'Planning Time: ([\d.]+) ms')
+AMOSTRAS_EXPLAIN = 20
+AQUECIMENTO = 10  # Execuções antes de medir: o PostgreSQL passa ao plano genérico depois de 5
+
+
+def parametros_de_teste(cursor, quantidade):
+    """Parâmetros reais para cada consulta registrada, lidos do banco."""
+    cursor.execute("SELECT id_produto FROM PRODUTO TABLESAMPLE SYSTEM (10) LIMIT %s;", (quantidade,))
+    produtos = [(r[0],) for r in cursor.fetchall()]
+    cursor.execute("SELECT email FROM CLIENTE TABLESAMPLE SYSTEM (10) LIMIT %s;", (quantidade,))
+    clientes = [r[0] for r in cursor.fetchall()]
+    cursor.execute("SELECT email FROM FUNCIONARIO LIMIT %s;", (quantidade,))
+    funcionarios = [r[0] for r in cursor.fetchall()]
+    # Para as páginas seguintes do histórico, o cursor é um pedido do próprio cliente.
+    cursor.execute("SELECT id_cliente, data_pedido, id_pedido FROM PEDIDO TABLESAMPLE SYSTEM (10) LIMIT %s;", (quantidade,))
+    pedidos = cursor.fetchall()
+    limite = LIMITE_PADRAO_HISTORICO + 1
+    primeira = [{'cliente': c, 'limite': limite} for c, _, _ in pedidos]
+    seguintes = [{'cliente': c, 'data': d, 'id': i, 'limite': limite} for c, d, i in pedidos]
+    return {
+        'produto_por_id': produtos,
+        'conta_por_email': [{'email': e} for e in clientes + funcionarios],
+        'historico_cliente': primeira,
+        'historico_cliente_itens': primeira,
+        'historico_cliente_apos': seguintes,
+        'historico_cliente_apos_itens': seguintes,
+    }
+
+
+def medir_chamadas(conn, executar, parametros, chamadas):
+    latencias = []
+    with conn.cursor() as cursor:
+        for i in range(AQUECIMENTO + chamadas):
+            inicio = time.perf_counter()
+            executar(cursor, parametros[i % len(parametros)])
+            cursor.fetchall()
+            conn.rollback()  # Uma transação por chamada, como nas DAOs
+            if i >= AQUECIMENTO:
+                latencias.append(time.perf_counter() - inicio)
+    return latencias
+
+
+def tempo_planejamento_ms(conn, sql, parametros):
+    tempos = []
+    with conn.cursor() as cursor:
+        for i in range(AMOSTRAS_EXPLAIN):
+            cursor.execute("EXPLAIN (ANALYZE, SUMMARY) " + sql, parametros[i % len(parametros)])
+            plano = '\n'.join(r[0] for r in cursor.fetchall())
+            conn.rollback()
+            encontrado = TEMPO_PLANEJAMENTO.search(plano)
+            if encontrado:
+                tempos.append(float(encontrado.group(1)))
+    return round(statistics.median(tempos), 4) if tempos else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas frequentes com e sem PREPARE/EXECUTE.")
+    parser.add_argument('--chamadas', type=int, default=2000, help="Chamadas medidas por consulta e forma.")
+    parser.add_argument('--amostras', type=int, default=500, help="Conjuntos de parâmetros lidos do banco por consulta.")
+    parser.add_argument('--json', help="Arquivo para gravar os resultados em JSON.")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**db_config(), connection_factory=ConexaoComPreparadas)
+    with conn.cursor() as cursor:
+        parametros = parametros_de_teste(cursor, args.amostras)
+    conn.rollback()
+
+    # Registro próprio, com as mesmas consultas do app, para contar só o que este benchmark executa.
+    preparadas = ConsultasPreparadas()
+    resultados = []
+    for nome in consultas_preparadas.estatisticas()['por_consulta']:
+        if not parametros.get(nome):
+            print(f"{nome}: sem dados para testar, ignorada")
+            continue
+        sql = consultas_preparadas.sql(nome)
+        preparadas.registrar(nome, sql)
+        sql_execute, valores = preparadas.sql_execute(nome)
+        formas = (
+            ('texto', lambda cursor, p: cursor.execute(sql, p), sql, parametros[nome]),
+            ('preparada', lambda cursor, p: preparadas.executar(cursor, nome, p),
+             sql_execute, [valores(p) for p in parametros[nome]]),
+        )
+        for forma, executar, sql_explain, parametros_explain in formas:
+            latencias = medir_chamadas(conn, executar, parametros[nome], args.chamadas)
+            total = sum(latencias)
+            resultados.append({
+                'consulta': nome,
+                'forma': forma,
+                **{k: v for k, v in resumo_latencias(latencias).items() if k in ('p50_ms', 'p95_ms', 'p99_ms')},
+                'chamadas_por_s': int(len(latencias) / total) if total else 0,
+                'planejamento_ms': tempo_planejamento_ms(conn, sql_explain, parametros_explain),
+            })
+    conn.close()
+
+    imprimir_tabela(resultados, ['consulta', 'forma', 'p50_ms', 'p95_ms', 'p99_ms', 'chamadas_por_s', 'planejamento_ms'])
+    economia = []
+    for texto, preparada in zip(resultados[::2], resultados[1::2]):
+        if texto['planejamento_ms'] is not None and preparada['planejamento_ms'] is not None:
+            economia.append(texto['planejamento_ms'] - preparada['planejamento_ms'])
+    if economia:
+        print(f"\nPlanejamento economizado por chamada (mediana entre as consultas): {statistics.median(economia):.4f} ms")
+    salvar_json(args.json, {
+        'benchmark': 'preparadas',
+        'parametros': {k: v for k, v in vars(args).items() if k != 'json'},
+        'resultados': resultados,
+        'contadores': preparadas.estatisticas(),
+    })
+
+
+if __name__ == '__main__':
+    main()
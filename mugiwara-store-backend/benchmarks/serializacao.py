@@ -0,0 +1,116 @@
+# --- Micro-benchmark da serialização de listagens ---
+# Mede, sem banco e sem HTTP, o custo de transformar as linhas de uma listagem de
+# produtos (tuplas como as do psycopg2, com preço em Decimal) no corpo JSON da
+# resposta, separando o mapeamento linha -> dict da codificação:
+#   - manual_json_flask: dict montado por índice + json do Flask (sort_keys, ensure_ascii),
+#     como as DAOs e o jsonify faziam antes;
+#   - mapeador_json: Mapeador de serializacao.py + json da biblioteca padrão, compacto;
+#   - mapeador_orjson: Mapeador + orjson (quando instalado).
+#
+# Uso (a partir de mugiwara-store-backend/):
+#     python -m benchmarks.serializacao --linhas 10000 100000 --repeticoes 7 --json serializacao.json
+import argparse
+import gc
+import json
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import serializacao
+from benchmarks.comum import imprimir_tabela, salvar_json
+from serializacao import Mapeador
+
+COLUNAS_PRODUTO = ('id_produto', 'nome', 'descricao', 'preco', 'quantidade_estoque', 'categoria', 'fabricado_em_mari', 'imagem')
+CATEGORIAS = ('Acessórios', 'Vestuário', 'Colecionáveis', 'Decoração', 'Papelaria')
+PALAVRAS = ('chapéu', 'palha', 'mugiwara', 'going', 'merry', 'sunny', 'mapa', 'bússola', 'tesouro', 'espada', 'bandeira')
+
+
+def gerar_linhas(quantidade, semente=42):
+    aleatorio = random.Random(semente)
+    linhas = []
+    for i in range(1, quantidade + 1):
+        nome = ' '.join(aleatorio.choice(PALAVRAS) for _ in range(3)).title()
+        descricao = ' '.join(aleatorio.choice(PALAVRAS) for _ in range(12))
+        preco = Decimal(aleatorio.randint(100, 99999)) / 100
+        linhas.append((i, f'{nome} {i}', descricao, preco, aleatorio.randint(0, 500), aleatorio.choice(CATEGORIAS),
+                       aleatorio.random() < 0.3, f'/static/uploads/produtos/{i:032x}.jpg'))
+    return linhas
+
+
+def mapear_manual(linhas):
+    # O formato antigo das DAOs: dict montado por posição, preço convertido linha a linha.
+    return [{'id_produto': r[0], 'nome': r[1], 'descricao': r[2], 'preco': float(r[3]), 'quantidade_estoque': r[4],
+             'categoria': r[5], 'fabricado_em_mari': r[6], 'imagem': r[7]} for r in linhas]
+
+
+def cenarios():
+    provedor_flask = DefaultJSONProvider(Flask(__name__))
+    mapa = Mapeador(COLUNAS_PRODUTO, conversores={'preco': float})
+    compacto = json.JSONEncoder(default=serializacao.valor_json, ensure_ascii=False, separators=(',', ':'))
+    lista = [
+        ('manual_json_flask', mapear_manual, lambda dados: provedor_flask.dumps(dados).encode('utf-8')),
+        ('mapeador_json', mapa.linhas, lambda dados: compacto.encode(dados).encode('utf-8')),
+    ]
+    if serializacao.orjson is not None:
+        lista.append(('mapeador_orjson', mapa.linhas, serializacao.codificar))
+    return lista
+
+
+def medir(linhas, mapear, codificar, repeticoes):
+    tempos_mapear, tempos_codificar, tamanho = [], [], 0
+    for _ in range(repeticoes):
+        gc.collect()  # Não cobra desta execução o lixo deixado pela anterior
+        inicio = time.perf_counter()
+        dados = mapear(linhas)
+        meio = time.perf_counter()
+        corpo = codificar(dados)
+        fim = time.perf_counter()
+        tempos_mapear.append(meio - inicio)
+        tempos_codificar.append(fim - meio)
+        tamanho = len(corpo)
+    mapear_s, codificar_s = statistics.median(tempos_mapear), statistics.median(tempos_codificar)
+    total_s = mapear_s + codificar_s
+    return {
+        'mapear_ms': round(mapear_s * 1000, 2),
+        'codificar_ms': round(codificar_s * 1000, 2),
+        'total_ms': round(total_s * 1000, 2),
+        'linhas_por_s': int(len(linhas) / total_s) if total_s else 0,
+        'mb_por_s': round(tamanho / total_s / 1_000_000, 1) if total_s else 0.0,
+        'bytes': tamanho,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vazão do mapeamento e da codificação JSON de listagens de produtos.")
+    parser.add_argument('--linhas', type=int, nargs='+', default=[10000, 100000], help="Tamanhos das listagens.")
+    parser.add_argument('--repeticoes', type=int, default=7, help="Execuções por cenário (vale a mediana).")
+    parser.add_argument('--json', help="Arquivo para gravar os resultados em JSON.")
+    args = parser.parse_args()
+
+    resultados = []
+    for quantidade in args.linhas:
+        linhas = gerar_linhas(quantidade)
+        referencia = None
+        for nome, mapear, codificar in cenarios():
+            medido = medir(linhas, mapear, codificar, args.repeticoes)
+            referencia = referencia or medido['total_ms']
+            resultados.append({'linhas': quantidade, 'cenario': nome, **medido,
+                               'aceleracao': round(referencia / medido['total_ms'], 2) if medido['total_ms'] else 0.0})
+
+    print(f"Codificador da aplicação: {serializacao.codificador_em_uso()}")
+    imprimir_tabela(resultados, ['linhas', 'cenario', 'mapear_ms', 'codificar_ms', 'total_ms', 'linhas_por_s',
+                                 'mb_por_s', 'bytes', 'aceleracao'])
+    salvar_json(args.json, {
+        'benchmark': 'serializacao',
+        'codificador': serializacao.codificador_em_uso(),
+        'parametros': {k: v for k, v in vars(args).items() if k != 'json'},
+        'resultados': resultados,
+    })
+
+
+if __name__ == '__main__':
+    main()
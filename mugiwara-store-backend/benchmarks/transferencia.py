@@ -0,0 +1,155 @@
+# --- Benchmark de transferência da página ---
+# Mede os bytes que trafegam e o tempo de carregamento da página inicial (HTML,
+# CSS, JS, imagens de fundo e a primeira página do catálogo) em dois cenários,
+# contra o mesmo servidor em execução:
+#   - sem_otimizacao: sem Accept-Encoding e com os arquivos originais de static/
+#     (o comportamento anterior à compressão e ao build dos estáticos);
+#   - otimizado: com "Accept-Encoding: br, gzip" e os arquivos do build (static/dist).
+# Também estima a visita repetida: sem otimização, cada arquivo é revalidado (uma
+# ida e volta por arquivo); com nomes com hash e cache "immutable", só o HTML e a API.
+#
+# Uso (depois de "flask construir-estaticos" ou "python estaticos.py"):
+#     python -m benchmarks.transferencia --url http://localhost:5000 --banda-mbps 10 --rtt-ms 60
+import argparse
+import json
+import math
+import re
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.comum import imprimir_tabela, salvar_json
+
+CONEXOES_POR_ORIGEM = 6  # Como os navegadores, em HTTP/1.1
+REFERENCIAS_HTML = re.compile(r'''<(?:link|script)[^>]+(?:href|src)="(/static/[^"]+)"''')
+URLS_CSS = re.compile(r"""url\(\s*['"]?(/static/[^'")\s]+)['"]?\s*\)""")
+
+
+def baixar(url, codificacao):
+    """(bytes do corpo como chegaram, Content-Encoding, segundos, status)."""
+    pedido = urllib.request.Request(url, headers={'Accept-Encoding': codificacao})
+    inicio = time.perf_counter()
+    try:
+        with urllib.request.urlopen(pedido, timeout=30) as resposta:
+            corpo = resposta.read()
+            return corpo, resposta.headers.get('Content-Encoding'), time.perf_counter() - inicio, resposta.status
+    except urllib.error.HTTPError as e:
+        return e.read(), None, time.perf_counter() - inicio, e.code
+
+
+def decodificar(corpo, codificacao):
+    if codificacao == 'gzip':
+        import gzip
+        return gzip.decompress(corpo)
+    if codificacao == 'br':
+        import brotli
+        return brotli.decompress(corpo)
+    return corpo
+
+
+def recursos_da_pagina(url, html, codificacao, originais):
+    """URLs de CSS/JS referenciadas pela página e imagens referenciadas pelos CSS."""
+    recursos = [originais.get(r, r) for r in REFERENCIAS_HTML.findall(html)]
+    imagens = []
+    for recurso in recursos:
+        if recurso.endswith('.css'):
+            corpo, cod, _, _ = baixar(url + recurso, codificacao)
+            css = decodificar(corpo, cod).decode('utf-8')
+            imagens.extend(originais.get(i, i) for i in URLS_CSS.findall(css))
+    return recursos + [i for i in dict.fromkeys(imagens) if i not in recursos]
+
+
+def carregar_pagina(url, codificacao, originais, api):
+    """Baixa o HTML e depois todos os recursos em paralelo, como um navegador."""
+    inicio = time.perf_counter()
+    corpo, cod, _, _ = baixar(url + '/', codificacao)
+    html = decodificar(corpo, cod).decode('utf-8')
+    caminhos = recursos_da_pagina(url, html, codificacao, originais) + [api]
+    with ThreadPoolExecutor(max_workers=CONEXOES_POR_ORIGEM) as executor:
+        baixados = list(executor.map(lambda c: (c,) + baixar(url + c, codificacao), caminhos))
+    decorrido = time.perf_counter() - inicio
+    itens = [{'recurso': '/', 'bytes': len(corpo), 'codificacao': cod or '-'}]
+    for caminho, dados, cod_recurso, _, status in baixados:
+        itens.append({'recurso': caminho, 'bytes': len(dados), 'codificacao': cod_recurso or '-', 'status': status})
+    return itens, decorrido
+
+
+def estimar_tempo_ms(total_bytes, requisicoes, banda_mbps, rtt_ms):
+    """Tempo num link com a banda e a latência dadas: transmissão + idas e voltas
+    (o HTML, e depois os recursos em levas de CONEXOES_POR_ORIGEM)."""
+    transmissao = total_bytes * 8 / (banda_mbps * 1_000_000) * 1000
+    idas_e_voltas = 1 + math.ceil(max(requisicoes - 1, 0) / CONEXOES_POR_ORIGEM)
+    return round(transmissao + idas_e_voltas * rtt_ms, 1)
+
+
+def medir(url, cenario, codificacao, originais, api, repeticoes, banda_mbps, rtt_ms):
+    tempos = []
+    for _ in range(repeticoes):
+        itens, decorrido = carregar_pagina(url, codificacao, originais, api)
+        tempos.append(decorrido)
+    total = sum(i['bytes'] for i in itens)
+    estaticos = [i for i in itens if i['recurso'].startswith('/static/')]
+    dinamicos = [i for i in itens if not i['recurso'].startswith('/static/')]
+    if cenario == 'otimizado':
+        # Nomes com hash + immutable: na volta, nada de /static/ é pedido de novo.
+        repetida_bytes, repetida_requisicoes = sum(i['bytes'] for i in dinamicos), len(dinamicos)
+    else:
+        # Cada estático é revalidado (If-None-Match -> 304, sem corpo, mas uma ida e volta).
+        repetida_bytes, repetida_requisicoes = sum(i['bytes'] for i in dinamicos), len(itens)
+    return itens, {
+        'cenario': cenario,
+        'requisicoes': len(itens),
+        'bytes_total': total,
+        'bytes_estaticos': sum(i['bytes'] for i in estaticos),
+        'bytes_api_html': sum(i['bytes'] for i in dinamicos),
+        'tempo_local_ms': round(statistics.median(tempos) * 1000, 1),
+        'tempo_estimado_ms': estimar_tempo_ms(total, len(itens), banda_mbps, rtt_ms),
+        'repetida_requisicoes': repetida_requisicoes,
+        'repetida_tempo_estimado_ms': estimar_tempo_ms(repetida_bytes, repetida_requisicoes, banda_mbps, rtt_ms),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes transferidos e tempo de carregamento da página, antes e depois.")
+    parser.add_argument('--url', default='http://localhost:5000', help="Endereço do servidor em execução.")
+    parser.add_argument('--api', default='/api/produtos?limite=24', help="Chamada de API feita ao abrir a página.")
+    parser.add_argument('--repeticoes', type=int, default=5, help="Carregamentos por cenário (vale a mediana).")
+    parser.add_argument('--banda-mbps', type=float, default=10.0, help="Banda do link simulado na estimativa.")
+    parser.add_argument('--rtt-ms', type=float, default=60.0, help="Latência (ida e volta) do link simulado.")
+    parser.add_argument('--json', help="Arquivo para gravar os resultados em JSON.")
+    args = parser.parse_args()
+    url = args.url.rstrip('/')
+
+    # O manifesto do build diz qual arquivo original corresponde a cada nome com hash.
+    corpo, _, _, status = baixar(url + '/static/dist/manifest.json', 'identity')
+    if status != 200:
+        raise SystemExit("Manifesto não encontrado: rode 'flask construir-estaticos' antes do benchmark.")
+    originais = {f'/static/dist/{com_hash}': f'/static/{original}' for original, com_hash in json.loads(corpo).items()}
+
+    resultados, detalhes = [], {}
+    for cenario, codificacao, mapa in (('sem_otimizacao', 'identity', originais), ('otimizado', 'br, gzip', {})):
+        itens, resumo = medir(url, cenario, codificacao, mapa, args.api, args.repeticoes, args.banda_mbps, args.rtt_ms)
+        resultados.append(resumo)
+        detalhes[cenario] = itens
+        print(f"\n{cenario}:")
+        imprimir_tabela(itens, ['recurso', 'bytes', 'codificacao'])
+
+    print(f"\nResumo (link simulado: {args.banda_mbps} Mbit/s, RTT {args.rtt_ms} ms):")
+    imprimir_tabela(resultados, ['cenario', 'requisicoes', 'bytes_total', 'bytes_estaticos', 'bytes_api_html',
+                                 'tempo_local_ms', 'tempo_estimado_ms', 'repetida_requisicoes', 'repetida_tempo_estimado_ms'])
+    antes, depois = resultados
+    if antes['bytes_total']:
+        print(f"\nBytes transferidos: {antes['bytes_total']} -> {depois['bytes_total']} "
+              f"({(1 - depois['bytes_total'] / antes['bytes_total']) * 100:.1f}% a menos)")
+    salvar_json(args.json, {
+        'benchmark': 'transferencia',
+        'parametros': {k: v for k, v in vars(args).items() if k != 'json'},
+        'resultados': resultados,
+        'recursos': detalhes,
+    })
+
+
+if __name__ == '__main__':
+    main()
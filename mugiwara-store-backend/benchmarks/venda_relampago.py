@@ -0,0 +1,212 @@
+# --- Benchmark da venda relâmpago ---
+# Vários clientes comprando ao mesmo tempo uma unidade do mesmo produto (um único
+# SKU "quente"), comparando:
+#   * atual: cada checkout chama criar_pedido_completo, que trava a linha do produto
+#     até o commit; os pedidos fazem fila nessa trava;
+#   * relampago: cada cliente reserva a unidade (reservar_estoque, nas fatias de
+#     ESTOQUE_RELAMPAGO) e confirma pela FilaDePedidos do backend, que grava os pedidos
+#     que chegam juntos em uma transação só (confirmar_reservas).
+# A latência do modo relâmpago é a do checkout completo (reserva + confirmação).
+#
+# Uso (a partir de mugiwara-store-backend/):
+#     python -m benchmarks.venda_relampago --clientes 64 --duracao 20 --json venda_relampago.json
+import argparse
+import json
+import threading
+import time
+
+import psycopg2
+
+from app import SQL_CONFIRMAR_RESERVAS, SQL_CRIAR_PEDIDO, SQL_RESERVAR_ESTOQUE
+from benchmarks.comum import conectar, imprimir_tabela, resumo_latencias, salvar_json
+from venda_relampago import FilaDePedidos
+
+EMAIL_CLIENTE = 'benchmark.relampago@mugiwara.test'
+EMAIL_FUNCIONARIO = 'benchmark.relampago.vendedor@mugiwara.test'
+NOME_PRODUTO = 'Benchmark Venda Relâmpago'
+ESTOQUE_INICIAL = 10_000_000
+RESERVA_SEGUNDOS = 300
+
+
+def preparar():
+    """Cria cliente, vendedor e o produto disputado; devolve (id_cliente, id_funcionario, id_produto)."""
+    conn = conectar()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO CLIENTE (nome, email, senha_hash) VALUES ('Cliente Benchmark', %s, 'x') "
+                "ON CONFLICT (email) DO NOTHING;", (EMAIL_CLIENTE,))
+            cursor.execute("SELECT id_cliente FROM CLIENTE WHERE email = %s;", (EMAIL_CLIENTE,))
+            id_cliente = cursor.fetchone()[0]
+            cursor.execute(
+                "INSERT INTO FUNCIONARIO (nome, email, senha_hash, cargo) VALUES ('Vendedor Benchmark', %s, 'x', 'Vendedor') "
+                "ON CONFLICT (email) DO NOTHING;", (EMAIL_FUNCIONARIO,))
+            cursor.execute("SELECT id_funcionario FROM FUNCIONARIO WHERE email = %s;", (EMAIL_FUNCIONARIO,))
+            id_funcionario = cursor.fetchone()[0]
+            cursor.execute(
+                "INSERT INTO PRODUTO (nome, descricao, preco, quantidade_estoque, categoria, fabricado_em_mari) "
+                "VALUES (%s, 'Produto criado pelo benchmark da venda relâmpago', 199.90, %s, 'Benchmark', false) "
+                "RETURNING id_produto;", (NOME_PRODUTO, ESTOQUE_INICIAL))
+            id_produto = cursor.fetchone()[0]
+        conn.commit()
+        return id_cliente, id_funcionario, id_produto
+    finally:
+        conn.close()
+
+
+def limpar(id_cliente, id_funcionario, id_produto):
+    conn = conectar()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM PEDIDO WHERE id_cliente = %s;", (id_cliente,))  # Itens caem em cascata
+            cursor.execute("DELETE FROM PRODUTO WHERE id_produto = %s;", (id_produto,))  # Fatias e reservas também
+            cursor.execute("DELETE FROM CLIENTE WHERE id_cliente = %s;", (id_cliente,))
+            cursor.execute("DELETE FROM FUNCIONARIO WHERE id_funcionario = %s;", (id_funcionario,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def definir_venda(id_produto, aberta):
+    conn = conectar(autocommit=True)
+    try:
+        with conn.cursor() as cursor:
+            if aberta:
+                cursor.execute("SELECT abrir_venda_relampago(%s, NULL);", (id_produto,))
+            else:
+                cursor.execute("SELECT encerrar_venda_relampago(%s);", (id_produto,))
+    finally:
+        conn.close()
+
+
+def confirmador_de_lotes():
+    # O mesmo papel do PedidoDAO.confirmar_reservas, com uma conexão só para a thread da fila.
+    conn = conectar()
+
+    def confirmar_lote(pedidos):
+        lote = [dict(pedido, ordem=i) for i, pedido in enumerate(pedidos)]
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(SQL_CONFIRMAR_RESERVAS, (json.dumps(lote),))
+                linhas = cursor.fetchall()
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            return {"status": "erro", "mensagem": str(e)}
+        return [{"status": "sucesso", "id_pedido": id_pedido} if id_pedido else {"status": "erro", "mensagem": erro}
+                for _, id_pedido, erro in linhas]
+    return conn, confirmar_lote
+
+
+def executar(modo, clientes, duracao, id_cliente, id_funcionario, id_produto, lote_maximo, espera_ms):
+    lock = threading.Lock()
+    totais = {'ok': 0, 'erros': 0}
+    latencias = []
+    inicio_geral = threading.Event()
+    prazo = [0.0]
+    itens = json.dumps([{'id_produto': id_produto, 'quantidade': 1}])
+
+    fila = conn_fila = None
+    if modo == 'relampago':
+        conn_fila, confirmar_lote = confirmador_de_lotes()
+        fila = FilaDePedidos(confirmar_lote, lote_maximo=lote_maximo, espera=espera_ms / 1000, timeout=60)
+
+    def comprar(cursor, conn):
+        if modo == 'atual':
+            cursor.execute(SQL_CRIAR_PEDIDO, (id_cliente, id_funcionario, 'PIX', itens))
+            conn.commit()
+            return True
+        cursor.execute(SQL_RESERVAR_ESTOQUE, (id_cliente, itens, RESERVA_SEGUNDOS))
+        id_reserva = cursor.fetchone()[0]
+        conn.commit()
+        resultado = fila.confirmar({'id_reserva': id_reserva, 'id_cliente': id_cliente,
+                                    'id_funcionario': id_funcionario, 'forma_pagamento': 'PIX'})
+        return resultado['status'] == 'sucesso'
+
+    def cliente():
+        conn = conectar()
+        minhas_latencias, ok, erros = [], 0, 0
+        inicio_geral.wait()
+        try:
+            with conn.cursor() as cursor:
+                while time.monotonic() < prazo[0]:
+                    inicio = time.monotonic()
+                    try:
+                        sucesso = comprar(cursor, conn)
+                    except psycopg2.Error:
+                        conn.rollback()
+                        sucesso = False
+                    if sucesso:
+                        ok += 1
+                        minhas_latencias.append(time.monotonic() - inicio)
+                    else:
+                        erros += 1
+        finally:
+            conn.close()
+        with lock:
+            totais['ok'] += ok
+            totais['erros'] += erros
+            latencias.extend(minhas_latencias)
+
+    threads = [threading.Thread(target=cliente) for _ in range(clientes)]
+    for t in threads:
+        t.start()
+    inicio = time.monotonic()
+    prazo[0] = inicio + duracao
+    inicio_geral.set()
+    for t in threads:
+        t.join()
+    decorrido = time.monotonic() - inicio
+    if conn_fila is not None:
+        conn_fila.close()
+
+    resultado = {
+        'modo': modo,
+        'clientes': clientes,
+        'duracao_s': round(decorrido, 2),
+        'pedidos_ok': totais['ok'],
+        'erros': totais['erros'],
+        'pedidos_por_s': round(totais['ok'] / decorrido, 1) if decorrido else 0.0,
+        **resumo_latencias(latencias),
+    }
+    if fila is not None:
+        estatisticas = fila.estatisticas()
+        resultado.update({'lotes': estatisticas['lotes'], 'media_por_lote': estatisticas['media_por_lote'],
+                          'maior_lote': estatisticas['maior_lote']})
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da venda relâmpago (checkout atual x reservas + pedidos em lote).")
+    parser.add_argument('--clientes', type=int, default=64, help="Clientes (threads/conexões) simultâneos.")
+    parser.add_argument('--duracao', type=float, default=15.0, help="Segundos de execução por modo.")
+    parser.add_argument('--lote-maximo', type=int, default=200, help="Pedidos por transação na fila (FILA_PEDIDOS_LOTE_MAXIMO).")
+    parser.add_argument('--espera-ms', type=float, default=2.0, help="Espera por mais pedidos em cada lote (FILA_PEDIDOS_ESPERA_MS).")
+    parser.add_argument('--modo', choices=['atual', 'relampago', 'ambos'], default='ambos')
+    parser.add_argument('--json', help="Arquivo para gravar os resultados em JSON.")
+    args = parser.parse_args()
+
+    modos = ['atual', 'relampago'] if args.modo == 'ambos' else [args.modo]
+    id_cliente, id_funcionario, id_produto = preparar()
+    resultados = []
+    try:
+        for modo in modos:
+            print(f"Executando modo '{modo}' com {args.clientes} clientes por {args.duracao:.0f}s...")
+            if modo == 'relampago':
+                definir_venda(id_produto, aberta=True)
+            try:
+                resultados.append(executar(modo, args.clientes, args.duracao, id_cliente, id_funcionario,
+                                           id_produto, args.lote_maximo, args.espera_ms))
+            finally:
+                if modo == 'relampago':
+                    definir_venda(id_produto, aberta=False)
+    finally:
+        limpar(id_cliente, id_funcionario, id_produto)
+
+    imprimir_tabela(resultados, ['modo', 'pedidos_ok', 'pedidos_por_s', 'erros', 'p50_ms', 'p95_ms', 'p99_ms',
+                                 'media_por_lote'])
+    salvar_json(args.json, {'benchmark': 'venda_relampago', 'parametros': vars(args), 'resultados': resultados})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# --- Cache do Catálogo ---
+# Cache em memória (por processo) para as leituras de produtos, com tamanho
+# limitado, expiração por tempo (TTL) e descarte do item menos usado (LRU).
+# As escritas no catálogo chamam invalidar(); o TTL limita por quanto tempo
+# outro processo do servidor pode enxergar dados antigos.
+import threading  # Para proteger o cache contra acessos simultâneos
+import time  # Para controlar a expiração das entradas
+from collections import OrderedDict  # Mantém a ordem de uso para o LRU
+
+
+class CacheCatalogo:
+    def __init__(self, tamanho_maximo=512, ttl=60.0):
+        if tamanho_maximo < 1:
+            raise ValueError("O cache precisa comportar pelo menos uma entrada.")
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # chave -> (valor, expira_em)
+        self._geracao = 0  # Incrementada a cada invalidação
+        self.modificado_em = time.time()  # Instante da última invalidação (usado no Last-Modified)
+        self._ao_invalidar = []  # Funções chamadas antes de cada invalidação
+
+        # Contadores expostos em estatisticas()
+        self._acertos = 0
+        self._faltas = 0
+        self._expiradas = 0
+        self._despejadas = 0
+        self._invalidacoes = 0
+
+    def obter(self, chave):
+        """Retorna o valor em cache ou None, contando acerto/falta."""
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                valor, expira_em = entrada
+                if expira_em > agora:
+                    self._entradas.move_to_end(chave)
+                    self._acertos += 1
+                    return valor
+                del self._entradas[chave]
+                self._expiradas += 1
+            self._faltas += 1
+            return None
+
+    def guardar(self, chave, valor, geracao=None):
+        """Guarda o valor; se `geracao` mudou desde a leitura, o valor já nasceu velho e é ignorado."""
+        with self._lock:
+            if geracao is not None and geracao != self._geracao:
+                return
+            self._entradas[chave] = (valor, time.monotonic() + self.ttl)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.tamanho_maximo:
+                self._entradas.popitem(last=False)
+                self._despejadas += 1
+
+    def obter_ou_carregar(self, chave, carregar):
+        """Retorna o valor em cache ou chama `carregar()`; resultados None não são guardados."""
+        valor = self.obter(chave)
+        if valor is not None:
+            return valor
+        geracao = self.geracao
+        valor = carregar()
+        if valor is not None:
+            self.guardar(chave, valor, geracao)
+        return valor
+
+    @property
+    def geracao(self):
+        with self._lock:
+            return self._geracao
+
+    def ao_invalidar(self, callback):
+        """Registra uma função chamada antes de cada invalidação (ex: para as próximas cargas saírem do primário)."""
+        self._ao_invalidar.append(callback)
+
+    def invalidar(self):
+        """Descarta todo o conteúdo; chamado após qualquer escrita que altere o catálogo."""
+        for callback in self._ao_invalidar:
+            callback()
+        with self._lock:
+            self._entradas.clear()
+            self._geracao += 1
+            self._invalidacoes += 1
+            self.modificado_em = time.time()
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self._acertos + self._faltas
+            return {
+                'tamanho_maximo': self.tamanho_maximo,
+                'ttl_segundos': self.ttl,
+                'entradas': len(self._entradas),
+                'acertos': self._acertos,
+                'faltas': self._faltas,
+                'taxa_acerto': round(self._acertos / consultas, 4) if consultas else 0.0,
+                'expiradas': self._expiradas,
+                'despejadas': self._despejadas,
+                'invalidacoes': self._invalidacoes,
+            }
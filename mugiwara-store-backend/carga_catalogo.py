@@ -0,0 +1,279 @@
+# --- Carga e Exportação em Lote do Catálogo ---
+# Importa CSV/NDJSON para PRODUTO via COPY em uma tabela temporária (staging),
+# valida tudo em SQL e aplica as linhas válidas com um único UPDATE e um único
+# INSERT. A exportação usa COPY ... TO STDOUT. Em ambos os sentidos os dados
+# passam em blocos, sem nunca carregar o arquivo inteiro na memória.
+import csv
+import itertools
+import json
+import queue
+import threading
+
+# Colunas aceitas no arquivo, na ordem da tabela de staging.
+COLUNAS_IMPORTACAO = ('id_produto', 'nome', 'descricao', 'preco', 'quantidade_estoque',
+                      'categoria', 'fabricado_em_mari', 'imagem')
+COLUNAS_OBRIGATORIAS = ('nome', 'preco', 'quantidade_estoque', 'categoria')
+FORMATOS = ('csv', 'ndjson')
+MAX_ERROS_REPORTADOS = 1000
+TAMANHO_BLOCO = 64 * 1024
+
+# Todas as colunas de staging são TEXT para que o COPY nunca falhe por tipo:
+# a validação acontece depois, em SQL, e produz um erro por linha.
+SQL_CRIAR_STAGING = """
+    CREATE TEMP TABLE produto_importacao (
+        linha INTEGER NOT NULL,
+        id_produto TEXT, nome TEXT, descricao TEXT, preco TEXT, quantidade_estoque TEXT,
+        categoria TEXT, fabricado_em_mari TEXT, imagem TEXT,
+        erro TEXT
+    ) ON COMMIT DROP;
+"""
+
+SQL_VALIDAR_STAGING = r"""
+    UPDATE produto_importacao SET erro = CASE
+        WHEN id_produto IS NOT NULL AND id_produto !~ '^\d{1,9}$' THEN 'id_produto inválido'
+        WHEN nullif(trim(nome), '') IS NULL THEN 'nome é obrigatório'
+        WHEN length(nome) > 100 THEN 'nome excede 100 caracteres'
+        WHEN preco IS NULL OR trim(preco) !~ '^\d{1,8}(\.\d{1,2})?$' THEN 'preco inválido'
+        WHEN trim(preco)::NUMERIC <= 0 THEN 'preco deve ser maior que zero'
+        WHEN quantidade_estoque IS NULL OR trim(quantidade_estoque) !~ '^\d{1,9}$' THEN 'quantidade_estoque inválida'
+        WHEN nullif(trim(categoria), '') IS NULL THEN 'categoria é obrigatória'
+        WHEN length(categoria) > 50 THEN 'categoria excede 50 caracteres'
+        WHEN coalesce(lower(trim(fabricado_em_mari)), '') NOT IN ('', 'true', 'false', 't', 'f', '1', '0', 'sim', 'nao', 'não', 's', 'n')
+            THEN 'fabricado_em_mari inválido'
+        WHEN length(imagem) > 255 THEN 'imagem excede 255 caracteres'
+    END;
+
+    -- O mesmo id repetido no arquivo: só a primeira ocorrência vale. Compara o número,
+    -- não o texto ('01' e '1' são o mesmo produto); o filtro erro IS NULL garante que o
+    -- id já passou pela verificação de formato antes da conversão.
+    UPDATE produto_importacao s SET erro = 'id_produto repetido no arquivo (primeira ocorrência na linha ' || d.primeira || ')'
+    FROM (
+        SELECT linha, min(linha) OVER (PARTITION BY id_produto::INTEGER) AS primeira
+        FROM produto_importacao
+        WHERE erro IS NULL AND id_produto IS NOT NULL
+    ) d
+    WHERE s.linha = d.linha AND d.linha <> d.primeira;
+
+    UPDATE produto_importacao s SET erro = 'produto não encontrado para atualização'
+    WHERE s.erro IS NULL AND s.id_produto IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM PRODUTO p WHERE p.id_produto = s.id_produto::INTEGER);
+"""
+
+# Linhas com id_produto atualizam o produto existente; linhas sem id criam produtos novos.
+SQL_APLICAR_ATUALIZACOES = """
+    UPDATE PRODUTO p SET
+        nome = trim(s.nome),
+        descricao = s.descricao,
+        preco = trim(s.preco)::NUMERIC(10, 2),
+        quantidade_estoque = trim(s.quantidade_estoque)::INTEGER,
+        categoria = trim(s.categoria),
+        fabricado_em_mari = coalesce(lower(trim(s.fabricado_em_mari)) IN ('true', 't', '1', 'sim', 's'), false),
+        imagem = coalesce(s.imagem, '')
+    FROM produto_importacao s
+    WHERE s.erro IS NULL AND s.id_produto IS NOT NULL AND p.id_produto = s.id_produto::INTEGER;
+"""
+
+SQL_APLICAR_INSERCOES = """
+    INSERT INTO PRODUTO (nome, descricao, preco, quantidade_estoque, categoria, fabricado_em_mari, imagem)
+    SELECT trim(nome), descricao, trim(preco)::NUMERIC(10, 2), trim(quantidade_estoque)::INTEGER, trim(categoria),
+           coalesce(lower(trim(fabricado_em_mari)) IN ('true', 't', '1', 'sim', 's'), false), coalesce(imagem, '')
+    FROM produto_importacao
+    WHERE erro IS NULL AND id_produto IS NULL
+    ORDER BY linha;
+"""
+
+SELECT_EXPORTACAO = """
+    SELECT id_produto, nome, descricao, preco, quantidade_estoque, categoria, fabricado_em_mari, imagem
+    FROM PRODUTO ORDER BY id_produto
+"""
+
+
+class ErroFormatoImportacao(ValueError):
+    """O arquivo como um todo não pode ser lido (formato desconhecido, cabeçalho inválido...)."""
+
+
+class ErrosImportacao:
+    # Guarda no máximo MAX_ERROS_REPORTADOS erros, mas conta todos.
+    def __init__(self):
+        self.itens = []
+        self.total = 0
+
+    def adicionar(self, linha, erro):
+        self.total += 1
+        if len(self.itens) < MAX_ERROS_REPORTADOS:
+            self.itens.append({'linha': linha, 'erro': erro})
+
+
+def _texto(valor):
+    # Normaliza valores vindos do CSV/JSON para o texto gravado na staging.
+    if valor is None:
+        return None
+    if isinstance(valor, bool):
+        return 'true' if valor else 'false'
+    if isinstance(valor, (dict, list)):
+        raise ValueError("valores aninhados não são aceitos")
+    return str(valor)
+
+
+def ler_csv(arquivo_texto, erros):
+    """Gera (linha, valores) a partir de um CSV com cabeçalho."""
+    leitor = csv.reader(arquivo_texto)
+    try:
+        cabecalho = [c.strip().lower() for c in next(leitor)]
+    except StopIteration:
+        return
+    faltando = [c for c in COLUNAS_OBRIGATORIAS if c not in cabecalho]
+    if faltando:
+        raise ErroFormatoImportacao(f"Cabeçalho sem as colunas obrigatórias: {', '.join(faltando)}.")
+    posicoes = [cabecalho.index(c) if c in cabecalho else None for c in COLUNAS_IMPORTACAO]
+    for registro in leitor:
+        if not registro:
+            continue
+        if len(registro) != len(cabecalho):
+            erros.adicionar(leitor.line_num, f"esperadas {len(cabecalho)} colunas, encontradas {len(registro)}")
+            continue
+        # Campo vazio no CSV significa "sem valor".
+        yield leitor.line_num, [registro[p] if p is not None and registro[p] != '' else None for p in posicoes]
+
+
+def ler_ndjson(arquivo_texto, erros):
+    """Gera (linha, valores) a partir de um objeto JSON por linha."""
+    for numero, texto in enumerate(arquivo_texto, start=1):
+        if not texto.strip():
+            continue
+        try:
+            objeto = json.loads(texto)
+            if not isinstance(objeto, dict):
+                raise ValueError("cada linha deve ser um objeto JSON")
+            yield numero, [_texto(objeto.get(c)) for c in COLUNAS_IMPORTACAO]
+        except ValueError as e:
+            erros.adicionar(numero, f"JSON inválido: {e}")
+
+
+LEITORES = {'csv': ler_csv, 'ndjson': ler_ndjson}
+
+
+def _campo_copy(valor):
+    # Escapa um valor para o formato texto do COPY (\N representa NULL).
+    if valor is None:
+        return '\\N'
+    return (valor.replace('\x00', '').replace('\\', '\\\\')
+            .replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r'))
+
+
+class FluxoCopy:
+    """Objeto tipo arquivo que o COPY FROM lê, gerando o conteúdo sob demanda."""
+
+    def __init__(self, registros):
+        self._registros = registros
+        self._buffer = bytearray()
+        self.linhas = 0
+
+    def read(self, tamanho=TAMANHO_BLOCO):
+        while len(self._buffer) < tamanho:
+            try:
+                linha, valores = next(self._registros)
+            except StopIteration:
+                break
+            self.linhas += 1
+            campos = [str(linha)] + [_campo_copy(v) for v in valores]
+            self._buffer += ('\t'.join(campos) + '\n').encode('utf-8')
+        bloco = bytes(self._buffer[:tamanho])
+        del self._buffer[:tamanho]
+        return bloco
+
+
+def importar(conn, arquivo_texto, formato, tudo_ou_nada=False):
+    """Importa o arquivo na conexão dada (sem commit). Devolve o resumo da importação."""
+    if formato not in LEITORES:
+        raise ErroFormatoImportacao(f"Formato inválido. Use um de: {', '.join(FORMATOS)}.")
+    erros = ErrosImportacao()
+    registros = LEITORES[formato](arquivo_texto, erros)
+    # Lê o primeiro registro antes de abrir o COPY, para que um cabeçalho inválido
+    # vire ErroFormatoImportacao em vez de um COPY abortado no meio.
+    primeiro = next(registros, None)
+    fluxo = FluxoCopy(itertools.chain([primeiro], registros) if primeiro else iter(()))
+    with conn.cursor() as cursor:
+        cursor.execute(SQL_CRIAR_STAGING)
+        colunas = ', '.join(('linha',) + COLUNAS_IMPORTACAO)
+        cursor.copy_expert(f"COPY produto_importacao ({colunas}) FROM STDIN", fluxo, size=TAMANHO_BLOCO)
+        erros_leitura = erros.total  # Linhas que nem chegaram à staging (CSV/JSON malformado)
+        cursor.execute(SQL_VALIDAR_STAGING)
+        cursor.execute("SELECT linha, erro FROM produto_importacao WHERE erro IS NOT NULL ORDER BY linha;")
+        for linha, erro in cursor:
+            erros.adicionar(linha, erro)
+        erros.itens.sort(key=lambda e: e['linha'])
+
+        atualizados = inseridos = 0
+        if not (tudo_ou_nada and erros.total):
+            cursor.execute(SQL_APLICAR_ATUALIZACOES)
+            atualizados = cursor.rowcount
+            cursor.execute(SQL_APLICAR_INSERCOES)
+            inseridos = cursor.rowcount
+    return {
+        'linhas_lidas': fluxo.linhas + erros_leitura,
+        'inseridos': inseridos,
+        'atualizados': atualizados,
+        'rejeitados': erros.total,
+        'erros': erros.itens,
+        'erros_omitidos': erros.total - len(erros.itens),
+    }
+
+
+def sql_exportacao(formato):
+    if formato == 'csv':
+        return f"COPY ({SELECT_EXPORTACAO}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+    if formato == 'ndjson':
+        # Uma linha JSON por produto. Usa o formato csv com aspas e delimitador que nunca
+        # aparecem no JSON (row_to_json escapa caracteres de controle), para que o COPY
+        # não aplique os escapes do formato texto às barras invertidas do JSON.
+        return (f"COPY (SELECT row_to_json(p)::TEXT FROM ({SELECT_EXPORTACAO}) p) TO STDOUT "
+                "WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')")
+    raise ErroFormatoImportacao(f"Formato inválido. Use um de: {', '.join(FORMATOS)}.")
+
+
+def exportar_em_blocos(conn, formato, fila_maxima=8):
+    """Gera blocos de bytes do COPY TO. O COPY roda em uma thread e a fila limitada
+    faz com que o banco só avance quando o cliente consome os dados."""
+    sql = sql_exportacao(formato)
+    fila = queue.Queue(maxsize=fila_maxima)
+    cancelado = threading.Event()
+    fim = object()
+
+    def entregar(item):
+        while not cancelado.is_set():
+            try:
+                fila.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise IOError("exportação cancelada pelo cliente")
+
+    class Escritor:
+        def write(self, dados):
+            entregar(dados.encode('utf-8') if isinstance(dados, str) else bytes(dados))
+
+    def produzir():
+        try:
+            with conn.cursor() as cursor:
+                cursor.copy_expert(sql, Escritor(), size=TAMANHO_BLOCO)
+            entregar(fim)
+        except Exception as e:
+            try:
+                entregar(e)
+            except IOError:
+                pass
+
+    produtor = threading.Thread(target=produzir, daemon=True)
+    produtor.start()
+    try:
+        while True:
+            item = fila.get()
+            if item is fim:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelado.set()
+        produtor.join()
@@ -0,0 +1,122 @@
+# --- Compressão das Respostas ---
+# Comprime (brotli ou gzip, conforme o Accept-Encoding) as respostas de texto
+# acima de um tamanho mínimo. Respostas com ETag (as leituras do catálogo em
+# cache) têm o resultado comprimido guardado, para não repetir o trabalho a cada
+# requisição. Respostas em fluxo (streaming, SSE) nunca são comprimidas aqui.
+import gzip
+import threading  # Para proteger o cache e os contadores
+from collections import OrderedDict  # Cache LRU dos corpos comprimidos
+
+try:
+    import brotli  # Opcional: sem o pacote, só gzip é oferecido
+except ImportError:
+    brotli = None
+
+MIMETYPES_COMPRIMIVEIS = frozenset({
+    'application/json', 'application/x-ndjson', 'text/html', 'text/css', 'text/plain', 'text/csv',
+    'application/javascript', 'text/javascript', 'image/svg+xml',
+})
+
+
+def codificacoes_disponiveis():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def comprimir(dados, codificacao, nivel_gzip=6, qualidade_brotli=5):
+    if codificacao == 'br':
+        return brotli.compress(dados, quality=qualidade_brotli)
+    # mtime fixo: o mesmo conteúdo sempre gera os mesmos bytes.
+    return gzip.compress(dados, compresslevel=nivel_gzip, mtime=0)
+
+
+class Compressor:
+    def __init__(self, minimo_bytes=1024, nivel_gzip=6, qualidade_brotli=5, max_cache=256):
+        self.minimo_bytes = minimo_bytes  # Abaixo disso, o cabeçalho extra e a CPU não compensam
+        self.nivel_gzip = nivel_gzip
+        self.qualidade_brotli = qualidade_brotli
+        self.max_cache = max_cache
+
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # (etag, codificação) -> corpo comprimido
+
+        # Contadores expostos em estatisticas()
+        self._comprimidas = 0
+        self._reaproveitadas = 0
+        self._bytes_originais = 0
+        self._bytes_enviados = 0
+
+    def escolher(self, accept_encodings):
+        """Melhor codificação aceita pelo cliente (respeitando q=0), ou None."""
+        return accept_encodings.best_match(codificacoes_disponiveis())
+
+    def aplicar(self, resposta, accept_encodings):
+        """Comprime a resposta no lugar, quando cabível. Chamado em um after_request."""
+        if resposta.direct_passthrough or resposta.is_streamed:
+            return resposta
+        if resposta.mimetype not in MIMETYPES_COMPRIMIVEIS or 'Content-Encoding' in resposta.headers:
+            return resposta
+        resposta.vary.add('Accept-Encoding')
+        codificacao = self.escolher(accept_encodings)
+        if codificacao is None:
+            return resposta
+        etag, fraca = resposta.get_etag()
+        if resposta.status_code == 304:
+            # O 304 precisa do mesmo ETag que a resposta comprimida teria.
+            if etag and not fraca:
+                resposta.set_etag(etag, weak=True)
+            return resposta
+        if not 200 <= resposta.status_code < 300 or resposta.status_code == 206:
+            return resposta
+        dados = resposta.get_data()
+        if len(dados) < self.minimo_bytes:
+            return resposta
+
+        resposta.set_data(self.comprimir_corpo(dados, codificacao, etag))
+        resposta.headers['Content-Encoding'] = codificacao
+        if etag:
+            # Cada codificação é uma representação diferente: o ETag deixa de ser forte.
+            resposta.set_etag(etag, weak=True)
+        return resposta
+
+    def comprimir_corpo(self, dados, codificacao, etag=None):
+        """Comprime um corpo já aprovado para compressão, reaproveitando o cache pelo ETag.
+
+        Usado por aplicar() e pelo servidor assíncrono, que monta as respostas sem o werkzeug.
+        """
+        comprimido = self._do_cache(etag, codificacao) if etag else None
+        if comprimido is None:
+            comprimido = comprimir(dados, codificacao, self.nivel_gzip, self.qualidade_brotli)
+            if etag:
+                self._guardar(etag, codificacao, comprimido)
+        with self._lock:
+            self._comprimidas += 1
+            self._bytes_originais += len(dados)
+            self._bytes_enviados += len(comprimido)
+        return comprimido
+
+    def _do_cache(self, etag, codificacao):
+        with self._lock:
+            comprimido = self._cache.get((etag, codificacao))
+            if comprimido is not None:
+                self._cache.move_to_end((etag, codificacao))
+                self._reaproveitadas += 1
+            return comprimido
+
+    def _guardar(self, etag, codificacao, comprimido):
+        with self._lock:
+            self._cache[(etag, codificacao)] = comprimido
+            self._cache.move_to_end((etag, codificacao))
+            while len(self._cache) > self.max_cache:
+                self._cache.popitem(last=False)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'codificacoes': ','.join(codificacoes_disponiveis()),
+                'minimo_bytes': self.minimo_bytes,
+                'comprimidas': self._comprimidas,
+                'reaproveitadas_do_cache': self._reaproveitadas,
+                'bytes_originais': self._bytes_originais,
+                'bytes_enviados': self._bytes_enviados,
+                'entradas_cache': len(self._cache),
+            }
@@ -0,0 +1,155 @@
+# --- Consultas Preparadas por Conexão ---
+# As consultas mais frequentes (produto por id, conta por email, histórico do
+# cliente) são registradas uma vez e preparadas (PREPARE) em cada conexão do
+# pool no primeiro uso; daí em diante, cada chamada só envia EXECUTE com os
+# valores, e o PostgreSQL reaproveita a análise e, depois de algumas execuções,
+# o plano genérico. Conexões novas (inclusive as reabertas pelo pool) começam sem
+# nada preparado. Se a consulta sumir da sessão (DEALLOCATE/DISCARD) ou o formato
+# do resultado mudar por alteração de esquema, ela é preparada de novo.
+import re
+import threading  # Para proteger os contadores
+
+from psycopg2 import errorcodes, extensions
+
+NOME_VALIDO = re.compile(r'^[a-z_][a-z0-9_]{0,62}$')
+_MARCADOR = re.compile(r'%\((\w+)\)s|%s|%%')
+_ERROS_RECUPERAVEIS = (
+    errorcodes.INVALID_SQL_STATEMENT_NAME,  # 26000: a consulta não existe mais nesta sessão
+    errorcodes.FEATURE_NOT_SUPPORTED,  # 0A000: "cached plan must not change result type" (esquema alterado)
+)
+
+
+class ConexaoComPreparadas(extensions.connection):
+    """Conexão do psycopg2 que lembra quais consultas já foram preparadas nela (nome -> geração)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.preparadas = {}
+
+
+def converter_marcadores(sql):
+    """Troca os marcadores do psycopg2 pelos do PREPARE: ('... = %(email)s', ...) -> ('... = $1', ('email',)).
+
+    Com marcadores posicionais (%s), as chaves são os índices 0, 1, 2...
+    """
+    chaves, tipos = [], set()
+
+    def trocar(marcador):
+        if marcador.group(0) == '%%':
+            return '%'
+        nome = marcador.group(1)
+        tipos.add(nome is None)
+        chave = len(chaves) if nome is None else nome
+        if chave not in chaves:
+            chaves.append(chave)
+        return f'${chaves.index(chave) + 1}'
+
+    texto = _MARCADOR.sub(trocar, sql)
+    if len(tipos) > 1:
+        raise ValueError("Consulta preparada não pode misturar marcadores %s e %(nome)s.")
+    return texto, tuple(chaves)
+
+
+class _Consulta:
+    __slots__ = ('nome', 'sql', 'chaves', 'sql_prepare', 'sql_execute', 'geracao')
+
+    def __init__(self, nome, sql):
+        texto, chaves = converter_marcadores(sql.strip().rstrip(';'))
+        self.nome = nome
+        self.sql = sql  # Texto original, usado quando as consultas preparadas estão desligadas
+        self.chaves = chaves
+        self.sql_prepare = f'PREPARE {nome} AS {texto};'
+        marcadores = ', '.join(['%s'] * len(chaves))
+        self.sql_execute = f'EXECUTE {nome}({marcadores});' if chaves else f'EXECUTE {nome};'
+        self.geracao = 0  # Incrementada quando o esquema muda: toda conexão precisa preparar de novo
+
+    def valores(self, parametros):
+        # Parâmetros na ordem dos marcadores $1, $2... do PREPARE.
+        if isinstance(parametros, dict):
+            return [parametros[chave] for chave in self.chaves]
+        return list(parametros or ())
+
+
+class ConsultasPreparadas:
+    def __init__(self, ativo=True):
+        self.ativo = ativo
+        self._lock = threading.Lock()
+        self._consultas = {}
+        self._contadores = {}
+
+    def registrar(self, nome, sql):
+        """Registra uma consulta (com marcadores do psycopg2) sob um nome; devolve o nome."""
+        if not NOME_VALIDO.match(nome):
+            raise ValueError(f"Nome de consulta preparada inválido: {nome!r}.")
+        with self._lock:
+            if nome in self._consultas:
+                raise ValueError(f"Consulta preparada já registrada: {nome}.")
+            self._consultas[nome] = _Consulta(nome, sql)
+            self._contadores[nome] = {'execucoes': 0, 'preparacoes': 0, 'repreparacoes': 0, 'recuperadas': 0, 'diretas': 0}
+        return nome
+
+    def sql(self, nome):
+        return self._consultas[nome].sql
+
+    def sql_execute(self, nome):
+        """Texto do EXECUTE (com marcadores %s) e a conversão dos parâmetros para ele."""
+        consulta = self._consultas[nome]
+        return consulta.sql_execute, consulta.valores
+
+    def _contar(self, nome, campo):
+        with self._lock:
+            self._contadores[nome][campo] += 1
+
+    def executar(self, cursor, nome, parametros=None):
+        """Executa a consulta registrada no cursor, preparando-a na conexão se preciso."""
+        consulta = self._consultas[nome]
+        conn = cursor.connection
+        if not self.ativo or cursor.name is not None or not isinstance(conn, ConexaoComPreparadas):
+            # Desligado, cursor nomeado (DECLARE não aceita EXECUTE) ou conexão comum: envia o texto.
+            self._contar(nome, 'diretas')
+            cursor.execute(consulta.sql, parametros)
+            return
+        valores = consulta.valores(parametros)
+        # Só dá para repetir a tentativa se nada mais foi feito na transação (o erro a aborta).
+        pode_repetir = conn.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE
+        try:
+            self._preparar(cursor, conn, consulta)
+            cursor.execute(consulta.sql_execute, valores)
+        except Exception as e:
+            if getattr(e, 'pgcode', None) not in _ERROS_RECUPERAVEIS:
+                raise
+            self._invalidar(conn, consulta, e.pgcode)
+            if not pode_repetir:
+                raise  # A DAO trata o erro como qualquer outro; o próximo uso prepara de novo
+            conn.rollback()
+            self._contar(nome, 'recuperadas')
+            self._preparar(cursor, conn, consulta)
+            cursor.execute(consulta.sql_execute, valores)
+        self._contar(nome, 'execucoes')
+
+    def _preparar(self, cursor, conn, consulta):
+        geracao = conn.preparadas.get(consulta.nome)
+        if geracao == consulta.geracao:
+            return
+        if geracao is not None:
+            # Preparada com um esquema antigo: descarta antes de preparar de novo.
+            cursor.execute(f'DEALLOCATE {consulta.nome};')
+            del conn.preparadas[consulta.nome]
+        cursor.execute(consulta.sql_prepare)
+        conn.preparadas[consulta.nome] = consulta.geracao
+        self._contar(consulta.nome, 'preparacoes' if geracao is None else 'repreparacoes')
+
+    def _invalidar(self, conn, consulta, codigo):
+        if codigo == errorcodes.FEATURE_NOT_SUPPORTED:
+            # O esquema mudou: o plano guardado em todas as conexões está velho.
+            with self._lock:
+                consulta.geracao += 1
+        else:
+            conn.preparadas.pop(consulta.nome, None)  # Já não existe na sessão: nada a descartar
+
+    def estatisticas(self):
+        with self._lock:
+            por_consulta = {nome: dict(contadores) for nome, contadores in self._contadores.items()}
+        totais = {campo: sum(c[campo] for c in por_consulta.values())
+                  for campo in ('execucoes', 'preparacoes', 'repreparacoes', 'recuperadas', 'diretas')}
+        return {'ativo': self.ativo, 'consultas_registradas': len(por_consulta), **totais, 'por_consulta': por_consulta}
@@ -0,0 +1,167 @@
+# --- Arquivos Estáticos com Hash e Pré-comprimidos ---
+# Etapa de build: copia static/{css,js,images} para static/dist com o hash do
+# conteúdo no nome (style.3f2a9c01de.css), grava versões .gz/.br dos arquivos de
+# texto e versões reduzidas das imagens grandes de fundo, e reescreve as URLs
+# dentro do CSS. Como o nome muda sempre que o conteúdo muda, esses arquivos são
+# servidos com cache "immutable" de um ano. Sem o build, tudo continua sendo
+# servido de static/ como antes.
+#
+# Uso: python estaticos.py   (ou: flask construir-estaticos)
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+try:
+    import brotli  # Opcional: sem o pacote, só os .gz são gerados
+except ImportError:
+    brotli = None
+
+PASTA_DIST = 'dist'
+NOME_MANIFESTO = 'manifest.json'
+PASTAS_FONTE = ('css', 'js', 'images')
+EXTENSOES_TEXTO = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+ORDEM_CODIFICACOES = (('br', '.br'), ('gzip', '.gz'))
+
+# Imagens de fundo grandes e as versões geradas para elas, com o descritor de
+# densidade usado no image-set() do CSS. O fundo dos modais (i01.png, 1920 px)
+# nunca passa de 600 px de largura na tela.
+VARIANTES_IMAGENS = {
+    'images/i01.png': ((640, '1x'), (1280, '2x')),
+}
+
+URL_CSS = re.compile(r"""url\(\s*(['"]?)(/static/[^'")\s]+)\1\s*\)""")
+DECLARACAO_CSS = re.compile(r'([\w-]+\s*:)([^;{}]*url\([^;{}]*)(;|(?=\}))')
+
+
+def _hash(dados):
+    return hashlib.sha256(dados).hexdigest()[:10]
+
+
+def _nome_com_hash(relativo, dados, sufixo='', extensao=None):
+    base, ext = os.path.splitext(relativo)
+    return f'{base}{sufixo}.{_hash(dados)}{extensao or ext}'
+
+
+def _gravar(destino, relativo, dados):
+    caminho = os.path.join(destino, relativo)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'wb') as arquivo:
+        arquivo.write(dados)
+
+
+def _reduzir_imagem(dados, largura):
+    from PIL import Image  # Só o build precisa do Pillow
+
+    with Image.open(io.BytesIO(dados)) as imagem:
+        imagem = imagem.convert('RGBA' if imagem.mode in ('RGBA', 'LA', 'P', 'PA') else 'RGB')
+        imagem.thumbnail((largura, largura * 4), Image.LANCZOS)
+        saida = io.BytesIO()
+        imagem.save(saida, 'WEBP', quality=80, method=6)
+        return saida.getvalue()
+
+
+def reescrever_css(css, manifesto, variantes):
+    """Troca as URLs /static/... do CSS pelas versões com hash. Imagens com variantes
+    ganham duas declarações: a versão 1x (para navegadores sem image-set) e o image-set."""
+    def trocar(url, com_image_set):
+        relativo = url.group(2)[len('/static/'):]
+        if relativo in variantes:
+            if com_image_set:
+                opcoes = ', '.join(f"url('/static/{PASTA_DIST}/{nome}') {densidade}" for nome, densidade in variantes[relativo])
+                return f'image-set({opcoes})'
+            return f"url('/static/{PASTA_DIST}/{variantes[relativo][0][0]}')"
+        if relativo in manifesto:
+            return f"url('/static/{PASTA_DIST}/{manifesto[relativo]}')"
+        return url.group(0)
+
+    def declaracao(encontrada):
+        propriedade, valor, fim = encontrada.groups()
+        simples = URL_CSS.sub(lambda u: trocar(u, False), valor)
+        if not any(u.group(2)[len('/static/'):] in variantes for u in URL_CSS.finditer(valor)):
+            return f'{propriedade}{simples}{fim}'
+        com_image_set = URL_CSS.sub(lambda u: trocar(u, True), valor)
+        return f'{propriedade}{simples}; {propriedade}{com_image_set}{fim}'
+
+    return DECLARACAO_CSS.sub(declaracao, css)
+
+
+def construir(raiz_estaticos):
+    """Gera static/dist e o manifesto (caminho original -> caminho com hash). Devolve o manifesto."""
+    destino = os.path.join(raiz_estaticos, PASTA_DIST)
+    shutil.rmtree(destino, ignore_errors=True)
+    os.makedirs(destino)
+
+    fontes = []
+    for pasta in PASTAS_FONTE:
+        for atual, _, arquivos in os.walk(os.path.join(raiz_estaticos, pasta)):
+            for nome in arquivos:
+                caminho = os.path.join(atual, nome)
+                fontes.append(os.path.relpath(caminho, raiz_estaticos).replace(os.sep, '/'))
+
+    manifesto, variantes, textos = {}, {}, []
+    # O CSS vai por último: ele referencia as imagens, cujos nomes com hash já precisam existir.
+    for relativo in sorted(fontes, key=lambda r: (r.endswith('.css'), r)):
+        with open(os.path.join(raiz_estaticos, relativo), 'rb') as arquivo:
+            dados = arquivo.read()
+        if relativo.endswith('.css'):
+            dados = reescrever_css(dados.decode('utf-8'), manifesto, variantes).encode('utf-8')
+        nome = _nome_com_hash(relativo, dados)
+        _gravar(destino, nome, dados)
+        manifesto[relativo] = nome
+        if relativo.endswith(EXTENSOES_TEXTO):
+            textos.append((nome, dados))
+        for largura, densidade in VARIANTES_IMAGENS.get(relativo, ()):
+            reduzida = _reduzir_imagem(dados, largura)
+            nome_variante = _nome_com_hash(relativo, reduzida, f'-{largura}', '.webp')
+            _gravar(destino, nome_variante, reduzida)
+            variantes.setdefault(relativo, []).append((nome_variante, densidade))
+
+    for nome, dados in textos:
+        # Compressão máxima: é feita uma vez no build, não a cada requisição.
+        _gravar(destino, nome + '.gz', gzip.compress(dados, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _gravar(destino, nome + '.br', brotli.compress(dados, quality=11))
+
+    with open(os.path.join(destino, NOME_MANIFESTO), 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, indent=2, sort_keys=True)
+    return manifesto
+
+
+class Estaticos:
+    """Resolve URLs de arquivos estáticos pelo manifesto do build, quando ele existe."""
+
+    def __init__(self, raiz_estaticos):
+        self.pasta_dist = os.path.join(raiz_estaticos, PASTA_DIST)
+        self.manifesto = {}
+        self.recarregar()
+
+    def recarregar(self):
+        try:
+            with open(os.path.join(self.pasta_dist, NOME_MANIFESTO), encoding='utf-8') as arquivo:
+                self.manifesto = json.load(arquivo)
+        except (OSError, ValueError):
+            self.manifesto = {}  # Sem build: os arquivos saem de static/ sem hash
+
+    def url(self, relativo):
+        nome = self.manifesto.get(relativo)
+        return f'/static/{PASTA_DIST}/{nome}' if nome else f'/static/{relativo}'
+
+    def escolher_arquivo(self, nome, accept_encodings):
+        """(arquivo a enviar, Content-Encoding ou None, mimetype do original)."""
+        mimetype = mimetypes.guess_type(nome)[0] or 'application/octet-stream'
+        for codificacao, extensao in ORDEM_CODIFICACOES:
+            # accept_encodings[...] é a qualidade (q) aceita pelo cliente; 0 = recusada.
+            if accept_encodings[codificacao] and os.path.isfile(os.path.join(self.pasta_dist, nome + extensao)):
+                return nome + extensao, codificacao, mimetype
+        return nome, None, mimetype
+
+
+if __name__ == '__main__':
+    raiz = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    gerados = construir(raiz)
+    print(f"{len(gerados)} arquivos estáticos gerados em {os.path.join(raiz, PASTA_DIST)}")
@@ -0,0 +1,157 @@
+# --- Feed de alterações do catálogo ---
+# Uma única thread escuta o canal 'produtos_alterados' do PostgreSQL (LISTEN/NOTIFY),
+# alimentado por triggers em PRODUTO, e distribui cada evento para os assinantes:
+# uma fila por navegador conectado ao SSE, mais callbacks internos (ex: invalidar o cache).
+import json  # Para decodificar os eventos publicados pelas triggers
+import queue  # Filas limitadas, uma por assinante
+import select  # Para esperar notificações sem ocupar CPU
+import threading  # Thread de escuta e proteção da lista de assinantes
+import time  # Para o intervalo entre tentativas de reconexão
+
+import psycopg2
+from psycopg2 import extensions
+
+EVENTO_RECARREGAR = {'op': 'recarregar'}
+
+
+class FeedLotadoError(Exception):
+    """Lançada quando o número máximo de assinantes simultâneos já foi atingido."""
+
+
+class Assinatura:
+    """Fila de eventos de um assinante. Se ele não acompanhar, recebe um 'recarregar'."""
+
+    def __init__(self, tamanho_fila):
+        self._fila = queue.Queue(maxsize=tamanho_fila)
+        self._atrasada = False
+
+    def _entregar(self, evento):
+        try:
+            self._fila.put_nowait(evento)
+        except queue.Full:
+            # Em vez de bloquear o feed por causa de um cliente lento, descarta a fila
+            # e avisa o cliente para reler o catálogo.
+            self._atrasada = True
+
+    def proximo(self, timeout):
+        """Próximo evento, ou None se nada chegar dentro de `timeout` segundos."""
+        if self._atrasada:
+            self._atrasada = False
+            while True:
+                try:
+                    self._fila.get_nowait()
+                except queue.Empty:
+                    break
+            return EVENTO_RECARREGAR
+        try:
+            return self._fila.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class FeedDeProdutos:
+    def __init__(self, db_config, canal='produtos_alterados', max_assinantes=100, tamanho_fila=256):
+        self.db_config = db_config
+        self.canal = canal
+        self.max_assinantes = max_assinantes
+        self.tamanho_fila = tamanho_fila
+
+        self._lock = threading.Lock()
+        self._assinaturas = set()
+        self._callbacks = []
+        self._thread = None
+        self._conectado = False
+
+        # Contadores expostos em estatisticas()
+        self._eventos = 0
+        self._reconexoes = 0
+
+    # --- Assinantes ---
+    def assinar(self):
+        """Cria a fila de um novo assinante (inicia a escuta no primeiro uso)."""
+        self.iniciar()
+        with self._lock:
+            if len(self._assinaturas) >= self.max_assinantes:
+                raise FeedLotadoError(f"Limite de {self.max_assinantes} conexões ao feed atingido.")
+            assinatura = Assinatura(self.tamanho_fila)
+            self._assinaturas.add(assinatura)
+            return assinatura
+
+    def cancelar(self, assinatura):
+        with self._lock:
+            self._assinaturas.discard(assinatura)
+
+    def ao_receber(self, callback):
+        """Registra uma função chamada (na thread do feed) a cada evento."""
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def _distribuir(self, evento):
+        with self._lock:
+            self._eventos += 1
+            assinaturas = list(self._assinaturas)
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback(evento)
+            except Exception as e:
+                print(f"Erro em callback do feed de produtos: {e}")
+        for assinatura in assinaturas:
+            assinatura._entregar(evento)
+
+    # --- Escuta ---
+    def iniciar(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._escutar, name='feed-produtos', daemon=True)
+        self._thread.start()
+
+    def _escutar(self):
+        espera = 1.0
+        while True:
+            conn = None
+            try:
+                # Conexão dedicada (fora do pool), em autocommit, como o LISTEN exige.
+                conn = psycopg2.connect(**self.db_config)
+                conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN {self.canal};')
+                with self._lock:
+                    reconectou = self._conectado is False and self._reconexoes > 0
+                    self._conectado = True
+                if reconectou:
+                    # Eventos podem ter sido perdidos enquanto a conexão estava caída.
+                    self._distribuir(EVENTO_RECARREGAR)
+                espera = 1.0
+                while True:
+                    if select.select([conn], [], [], 30.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notificacao = conn.notifies.pop(0)
+                        try:
+                            evento = json.loads(notificacao.payload)
+                        except ValueError:
+                            evento = EVENTO_RECARREGAR
+                        self._distribuir(evento)
+            except Exception as e:
+                print(f"Feed de produtos desconectado ({e}); nova tentativa em {espera:.0f}s.")
+                with self._lock:
+                    self._conectado = False
+                    self._reconexoes += 1
+                time.sleep(espera)
+                espera = min(espera * 2, 30.0)
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'escutando': self._conectado,
+                'assinantes': len(self._assinaturas),
+                'max_assinantes': self.max_assinantes,
+                'eventos_recebidos': self._eventos,
+                'reconexoes': self._reconexoes,
+            }
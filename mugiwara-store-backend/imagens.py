@@ -0,0 +1,235 @@
+# --- Armazenamento e Variantes das Imagens de Produtos ---
+# Cada upload é gravado com o hash do conteúdo como nome (arquivos iguais viram um
+# só, e um nome nunca passa a apontar para outra imagem, o que permite cache
+# "immutable"). Versões menores em WebP, usadas no srcset das páginas, são geradas
+# em um pool de processos, fora das threads do servidor; enquanto uma variante não
+# existe, quem a pede é redirecionado para o original. Imagens cujas variantes
+# falharam (arquivo corrompido, erro do Pillow) não voltam para o pool: ficam só
+# com o original.
+import hashlib  # Para o nome dos arquivos pelo conteúdo
+import multiprocessing  # Contexto 'spawn' para os processos de imagem
+import os
+import re
+import tempfile  # Arquivo temporário do upload, na mesma pasta do destino
+import threading  # Para acompanhar as tarefas em andamento entre as threads do servidor
+from collections import OrderedDict  # Imagens com falha, das mais antigas às mais recentes
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Larguras das variantes (o frontend monta o srcset com as mesmas larguras).
+LARGURAS_VARIANTES = (320, 640)
+QUALIDADE_WEBP = 80
+TAMANHO_BLOCO = 64 * 1024
+MAX_SEM_VARIANTES = 1024  # Imagens com falha lembradas; a mais antiga sai e pode ser tentada de novo
+
+NOME_ORIGINAL = re.compile(r'^([0-9a-f]{32})\.(png|jpg|gif|webp)$')
+NOME_VARIANTE = re.compile(r'^([0-9a-f]{32})-(\d+)\.webp$')
+
+
+class ImagemInvalidaError(ValueError):
+    """O arquivo enviado não é uma imagem aceita."""
+
+
+class ImagemGrandeDemaisError(ImagemInvalidaError):
+    """O arquivo enviado passa do tamanho máximo configurado."""
+
+
+def extensao_pelo_conteudo(inicio):
+    # O tipo vem dos primeiros bytes do arquivo, não do nome enviado pelo cliente.
+    if inicio.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if inicio.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if inicio.startswith((b'GIF87a', b'GIF89a')):
+        return 'gif'
+    if inicio[:4] == b'RIFF' and inicio[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def eh_imutavel(nome):
+    """True para nomes derivados do conteúdo (originais e variantes), que nunca mudam."""
+    return bool(NOME_ORIGINAL.match(nome) or NOME_VARIANTE.match(nome))
+
+
+def gerar_variantes(caminho_original, pasta, base, larguras, qualidade):
+    """Executa no processo do pool: grava '<base>-<largura>.webp' para cada largura."""
+    from PIL import Image, ImageOps  # Só os processos do pool carregam o Pillow
+
+    gerados = []
+    with Image.open(caminho_original) as original:
+        imagem = ImageOps.exif_transpose(original)  # Fotos de celular vêm giradas via EXIF
+        imagem = imagem.convert('RGBA' if imagem.mode in ('RGBA', 'LA', 'P', 'PA') else 'RGB')
+        for largura in larguras:
+            copia = imagem.copy()
+            copia.thumbnail((largura, largura * 4), Image.LANCZOS)  # Nunca amplia; limita a largura
+            destino = os.path.join(pasta, f'{base}-{largura}.webp')
+            temporario = f'{destino}.{os.getpid()}.tmp'
+            copia.save(temporario, 'WEBP', quality=qualidade, method=4)
+            os.replace(temporario, destino)
+            gerados.append(os.path.basename(destino))
+    return gerados
+
+
+class ArmazemDeImagens:
+    def __init__(self, pasta, processos=2, fila_maxima=64, tamanho_maximo=10 * 1024 * 1024,
+                 prefixo_url='/static/uploads/produtos'):
+        self.pasta = pasta
+        self.processos = processos
+        self.fila_maxima = fila_maxima  # Imagens aguardando variantes; acima disso o pedido é adiado
+        self.tamanho_maximo = tamanho_maximo
+        self.prefixo_url = prefixo_url.rstrip('/')
+        os.makedirs(pasta, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._executor = None  # Criado no primeiro uso
+        self._em_andamento = set()
+        self._sem_variantes = OrderedDict()  # Bases cuja geração falhou (usado como conjunto limitado)
+
+        # Contadores expostos em estatisticas()
+        self._gravadas = 0
+        self._duplicadas = 0
+        self._variantes_geradas = 0
+        self._falhas = 0
+        self._adiadas = 0
+
+    # --- Upload ---
+    def salvar(self, fluxo):
+        """Grava o arquivo pelo hash do conteúdo e agenda as variantes. Devolve o nome gravado."""
+        descritor, temporario = tempfile.mkstemp(dir=self.pasta, suffix='.upload')
+        try:
+            resumo = hashlib.sha256()
+            tamanho = 0
+            inicio = b''
+            with os.fdopen(descritor, 'wb') as arquivo:
+                while True:
+                    bloco = fluxo.read(TAMANHO_BLOCO)
+                    if not bloco:
+                        break
+                    tamanho += len(bloco)
+                    if tamanho > self.tamanho_maximo:
+                        raise ImagemGrandeDemaisError(
+                            f"A imagem passa do limite de {self.tamanho_maximo // (1024 * 1024)} MB.")
+                    if len(inicio) < 16:
+                        inicio += bloco[:16 - len(inicio)]
+                    resumo.update(bloco)
+                    arquivo.write(bloco)
+            extensao = extensao_pelo_conteudo(inicio)
+            if extensao is None:
+                raise ImagemInvalidaError("O arquivo não é uma imagem PNG, JPEG, GIF ou WebP.")
+            nome = f'{resumo.hexdigest()[:32]}.{extensao}'
+            destino = os.path.join(self.pasta, nome)
+            if os.path.exists(destino):
+                with self._lock:
+                    self._duplicadas += 1
+            else:
+                os.chmod(temporario, 0o644)
+                os.replace(temporario, destino)  # Atômico: ninguém vê o arquivo pela metade
+                temporario = None
+                with self._lock:
+                    self._gravadas += 1
+        finally:
+            if temporario is not None:
+                try:
+                    os.unlink(temporario)
+                except OSError:
+                    pass
+        self.agendar_variantes(nome)
+        return nome
+
+    def urls(self, nome):
+        """URL do original, das variantes e o srcset correspondente."""
+        base = NOME_ORIGINAL.match(nome).group(1)
+        variantes = {largura: f'{self.prefixo_url}/{base}-{largura}.webp' for largura in LARGURAS_VARIANTES}
+        return {
+            'original': f'{self.prefixo_url}/{nome}',
+            'variantes': variantes,
+            'srcset': ', '.join(f'{url} {largura}w' for largura, url in variantes.items()),
+        }
+
+    # --- Variantes ---
+    def _faltando(self, base):
+        return [l for l in LARGURAS_VARIANTES if not os.path.exists(os.path.join(self.pasta, f'{base}-{l}.webp'))]
+
+    def agendar_variantes(self, nome):
+        """Pede ao pool as variantes que ainda não existem. False se a fila está cheia."""
+        base = NOME_ORIGINAL.match(nome).group(1)
+        larguras = self._faltando(base)
+        if not larguras:
+            return True
+        with self._lock:
+            if base in self._em_andamento or base in self._sem_variantes:
+                return True
+            if len(self._em_andamento) >= self.fila_maxima:
+                # Sem espera: a variante será pedida de novo no próximo acesso a ela.
+                self._adiadas += 1
+                return False
+            self._em_andamento.add(base)
+            if self._executor is None:
+                # 'spawn' evita herdar, via fork, as conexões e travas das threads do servidor.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processos, mp_context=multiprocessing.get_context('spawn')
+                )
+            executor = self._executor
+        try:
+            futuro = executor.submit(gerar_variantes, os.path.join(self.pasta, nome), self.pasta, base,
+                                     larguras, QUALIDADE_WEBP)
+        except Exception as e:
+            self._concluir(base, executor, erro=e)
+            return False
+        futuro.add_done_callback(lambda f: self._concluir(base, executor, futuro=f))
+        return True
+
+    def _concluir(self, base, executor, futuro=None, erro=None):
+        if futuro is not None:
+            erro = futuro.exception()
+        with self._lock:
+            self._em_andamento.discard(base)
+            if erro is None:
+                self._variantes_geradas += len(futuro.result())
+                return
+            self._falhas += 1
+            if isinstance(erro, BrokenProcessPool):
+                # Um processo do pool morreu: recria o pool no próximo pedido. A falha pode
+                # não ser desta imagem (o pool inteiro cai junto), então ela será tentada de novo.
+                if self._executor is executor:
+                    self._executor = None
+            elif futuro is not None:
+                # Erro da própria imagem: tentar de novo daria o mesmo erro a cada acesso.
+                self._sem_variantes[base] = True
+                if len(self._sem_variantes) > MAX_SEM_VARIANTES:
+                    self._sem_variantes.popitem(last=False)
+        print(f"Erro ao gerar variantes da imagem {base}: {erro}")
+
+    def original_da_variante(self, nome):
+        """Para uma variante inexistente, agenda a geração (se não falhou antes) e devolve o nome do original."""
+        encontrado = NOME_VARIANTE.match(nome)
+        if not encontrado or int(encontrado.group(2)) not in LARGURAS_VARIANTES:
+            return None
+        base = encontrado.group(1)
+        for extensao in ('jpg', 'png', 'webp', 'gif'):
+            original = f'{base}.{extensao}'
+            if os.path.exists(os.path.join(self.pasta, original)):
+                self.agendar_variantes(original)
+                return original
+        return None
+
+    def encerrar(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'processos': self.processos,
+                'fila_maxima': self.fila_maxima,
+                'em_andamento': len(self._em_andamento),
+                'gravadas': self._gravadas,
+                'duplicadas': self._duplicadas,
+                'variantes_geradas': self._variantes_geradas,
+                'falhas': self._falhas,
+                'sem_variantes': len(self._sem_variantes),
+                'adiadas': self._adiadas,
+            }
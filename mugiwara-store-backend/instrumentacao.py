@@ -0,0 +1,285 @@
+# --- Instrumentação das consultas ---
+# Mede cada método das DAOs e cada comando SQL (chamadas, latência, linhas e
+# erros), o tempo para obter uma conexão do pool e mantém um log das consultas
+# lentas, com captura opcional (por amostragem) do plano via EXPLAIN ANALYZE.
+import contextvars  # Para saber qual método de DAO está executando o SQL
+import functools  # Para preservar nome e docstring dos métodos instrumentados
+import hashlib  # Para diferenciar consultas com o mesmo começo
+import inspect  # Para identificar geradores e corrotinas
+import logging  # Para o log de consultas lentas
+import random  # Para a amostragem do EXPLAIN
+import re  # Para normalizar o texto do SQL
+import threading  # Para proteger o registro de consultas lentas
+import time  # Para medir as latências
+from collections import deque  # Consultas lentas mais recentes
+
+from psycopg2 import extensions
+
+BALDES_LINHAS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+log_consultas_lentas = logging.getLogger('mugiwara.consultas_lentas')
+
+_metodo_dao = contextvars.ContextVar('metodo_dao', default='-')
+_ESPACOS = re.compile(r'\s+')
+_SOMENTE_LEITURA = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+_ESCRITA = re.compile(r'\b(INSERT|UPDATE|DELETE|MERGE|CALL|COPY|LOCK|NEXTVAL|SETVAL)\b', re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=2048)
+def normalizar_sql(sql):
+    """SQL em uma linha só; o texto é mantido, já que os valores vão em parâmetros."""
+    return _ESPACOS.sub(' ', sql).strip()
+
+
+@functools.lru_cache(maxsize=2048)
+def rotulo_da_consulta(sql_normalizado):
+    # Rótulo curto para as métricas: o começo do comando mais um hash do texto completo.
+    resumo = hashlib.sha1(sql_normalizado.encode('utf-8')).hexdigest()[:8]
+    inicio = sql_normalizado if len(sql_normalizado) <= 80 else sql_normalizado[:77] + '...'
+    return f'{inicio} [{resumo}]'
+
+
+class Instrumentacao:
+    def __init__(self, registro, limite_lento_ms=200.0, amostragem_explain=0.0, max_consultas=500, max_lentas=100):
+        self.limite_lento = limite_lento_ms / 1000
+        self.amostragem_explain = amostragem_explain  # Fração (0 a 1) das consultas lentas que recebem EXPLAIN ANALYZE
+        self.max_consultas = max_consultas  # Limite de rótulos distintos de SQL (o resto vira 'outras')
+
+        self._lock = threading.Lock()
+        self._consultas_conhecidas = set()
+        self._lentas = deque(maxlen=max_lentas)
+
+        self.dao_chamadas = registro.contador(
+            'mugiwara_dao_chamadas_total', 'Chamadas a métodos das DAOs.', ('metodo',))
+        self.dao_erros = registro.contador(
+            'mugiwara_dao_erros_total', 'Exceções que escaparam de métodos das DAOs.', ('metodo',))
+        self.dao_duracao = registro.histograma(
+            'mugiwara_dao_duracao_segundos', 'Duração dos métodos das DAOs.', ('metodo',))
+        self.sql_execucoes = registro.contador(
+            'mugiwara_sql_execucoes_total', 'Comandos SQL executados.', ('metodo', 'consulta'))
+        self.sql_erros = registro.contador(
+            'mugiwara_sql_erros_total', 'Comandos SQL que falharam.', ('metodo', 'consulta'))
+        self.sql_duracao = registro.histograma(
+            'mugiwara_sql_duracao_segundos', 'Duração dos comandos SQL.', ('metodo', 'consulta'))
+        self.sql_linhas = registro.histograma(
+            'mugiwara_sql_linhas', 'Linhas devolvidas ou afetadas por comando SQL.', ('metodo', 'consulta'), BALDES_LINHAS)
+        self.sql_lentas = registro.contador(
+            'mugiwara_sql_lentas_total', 'Comandos SQL acima do limite do log de consultas lentas.', ('metodo', 'consulta'))
+        self.conexao_espera = registro.histograma(
+            'mugiwara_pool_obter_segundos', 'Tempo para obter uma conexão do pool.')
+        self.cursor_factory = self._criar_cursor_factory()
+
+    # --- Conexões ---
+    def obter_conexao(self, pool):
+        inicio = time.perf_counter()
+        try:
+            return pool.obter()
+        finally:
+            self.conexao_espera.observar(time.perf_counter() - inicio)
+
+    # --- Métodos das DAOs ---
+    def instrumentar_dao(self, classe):
+        """Envolve os métodos públicos da classe (chamado por BaseDAO.__init_subclass__)."""
+        for nome, atributo in list(vars(classe).items()):
+            if nome.startswith('_') or not inspect.isfunction(atributo):
+                continue
+            setattr(classe, nome, self._medir_metodo(f'{classe.__name__}.{nome}', atributo))
+
+    def _medir_metodo(self, rotulo, funcao):
+        instrumentacao = self
+        if inspect.iscoroutinefunction(funcao):
+            return self._medir_corrotina(rotulo, funcao)
+
+        @functools.wraps(funcao)
+        def medido(*args, **kwargs):
+            token = _metodo_dao.set(rotulo)
+            inicio = time.perf_counter()
+            try:
+                resultado = funcao(*args, **kwargs)
+            except Exception:
+                instrumentacao.dao_erros.incrementar(rotulo)
+                instrumentacao._registrar_chamada(rotulo, time.perf_counter() - inicio)
+                raise
+            finally:
+                _metodo_dao.reset(token)
+            if inspect.isgenerator(resultado):
+                # Geradores (respostas em fluxo) só terminam quando consumidos.
+                return instrumentacao._medir_gerador(rotulo, resultado, inicio)
+            if inspect.isasyncgen(resultado):
+                return instrumentacao._medir_gerador_async(rotulo, resultado, inicio)
+            instrumentacao._registrar_chamada(rotulo, time.perf_counter() - inicio)
+            return resultado
+        return medido
+
+    def _medir_corrotina(self, rotulo, funcao):
+        # Métodos das DAOs assíncronas: mede até o fim do await, não só a criação da corrotina.
+        instrumentacao = self
+
+        @functools.wraps(funcao)
+        async def medido(*args, **kwargs):
+            token = _metodo_dao.set(rotulo)
+            inicio = time.perf_counter()
+            try:
+                return await funcao(*args, **kwargs)
+            except Exception:
+                instrumentacao.dao_erros.incrementar(rotulo)
+                raise
+            finally:
+                _metodo_dao.reset(token)
+                instrumentacao._registrar_chamada(rotulo, time.perf_counter() - inicio)
+        return medido
+
+    def _registrar_chamada(self, rotulo, duracao):
+        self.dao_chamadas.incrementar(rotulo)
+        self.dao_duracao.observar(duracao, rotulo)
+
+    def _medir_gerador(self, rotulo, gerador, inicio):
+        try:
+            while True:
+                token = _metodo_dao.set(rotulo)
+                try:
+                    item = next(gerador)
+                except StopIteration:
+                    return
+                finally:
+                    _metodo_dao.reset(token)
+                yield item
+        except GeneratorExit:
+            gerador.close()
+            raise
+        except Exception:
+            self.dao_erros.incrementar(rotulo)
+            raise
+        finally:
+            self._registrar_chamada(rotulo, time.perf_counter() - inicio)
+
+    async def _medir_gerador_async(self, rotulo, gerador, inicio):
+        try:
+            while True:
+                token = _metodo_dao.set(rotulo)
+                try:
+                    item = await gerador.__anext__()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    _metodo_dao.reset(token)
+                yield item
+        except Exception:
+            self.dao_erros.incrementar(rotulo)
+            raise
+        finally:
+            await gerador.aclose()  # Devolve a conexão mesmo se o cliente desconectar no meio
+            self._registrar_chamada(rotulo, time.perf_counter() - inicio)
+
+    # --- Comandos SQL ---
+    def registrar_sql(self, sql, duracao, linhas=None, erro=False):
+        """Para drivers sem o cursor instrumentado (asyncpg): registra um comando já executado."""
+        self._registrar_sql(None, sql, None, duracao, linhas, erro)
+
+    def _rotulo(self, sql):
+        if isinstance(sql, bytes):
+            sql = sql.decode('utf-8', 'replace')
+        normalizado = normalizar_sql(sql)
+        rotulo = rotulo_da_consulta(normalizado)
+        with self._lock:
+            if rotulo not in self._consultas_conhecidas:
+                if len(self._consultas_conhecidas) >= self.max_consultas:
+                    return normalizado, 'outras'
+                self._consultas_conhecidas.add(rotulo)
+        return normalizado, rotulo
+
+    def _registrar_sql(self, cursor, sql, parametros, duracao, linhas, erro):
+        metodo = _metodo_dao.get()
+        normalizado, rotulo = self._rotulo(sql)
+        self.sql_execucoes.incrementar(metodo, rotulo)
+        self.sql_duracao.observar(duracao, metodo, rotulo)
+        if erro:
+            self.sql_erros.incrementar(metodo, rotulo)
+        elif linhas is not None:
+            self.sql_linhas.observar(linhas, metodo, rotulo)
+        if duracao >= self.limite_lento:
+            self.sql_lentas.incrementar(metodo, rotulo)
+            plano = None
+            if cursor is not None and not erro and self.amostragem_explain > 0 and random.random() < self.amostragem_explain:
+                plano = self._explicar(cursor, normalizado, sql, parametros)
+            self._registrar_lenta(metodo, normalizado, duracao, plano)
+
+    def _explicar(self, cursor, normalizado, sql, parametros):
+        # EXPLAIN ANALYZE executa o comando de novo: só para leituras, em cursor
+        # separado e dentro de um savepoint, para não afetar a transação em curso.
+        if cursor.name is not None or not _SOMENTE_LEITURA.match(normalizado) or _ESCRITA.search(normalizado):
+            return None
+        conn = cursor.connection
+        status = conn.get_transaction_status()
+        if status not in (extensions.TRANSACTION_STATUS_IDLE, extensions.TRANSACTION_STATUS_INTRANS):
+            return None
+        em_transacao = status == extensions.TRANSACTION_STATUS_INTRANS
+        try:
+            with conn.cursor(cursor_factory=extensions.cursor) as auxiliar:
+                if em_transacao:
+                    auxiliar.execute("SAVEPOINT explain_amostrado;")
+                try:
+                    auxiliar.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, parametros)
+                    plano = '\n'.join(linha[0] for linha in auxiliar.fetchall())
+                finally:
+                    if em_transacao:
+                        auxiliar.execute("ROLLBACK TO SAVEPOINT explain_amostrado;")
+                        auxiliar.execute("RELEASE SAVEPOINT explain_amostrado;")
+                    elif not conn.autocommit:
+                        conn.rollback()
+            return plano
+        except Exception as e:
+            print(f"Erro ao capturar EXPLAIN de consulta lenta: {e}")
+            return None
+
+    def _registrar_lenta(self, metodo, sql, duracao, plano):
+        registro = {
+            'quando': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'metodo': metodo,
+            'duracao_ms': round(duracao * 1000, 3),
+            'consulta': sql[:2000],  # Os parâmetros nunca são registrados (podem conter dados pessoais)
+        }
+        if plano:
+            registro['plano'] = plano
+        with self._lock:
+            self._lentas.append(registro)
+        log_consultas_lentas.warning(
+            "Consulta lenta (%.1f ms) em %s: %s%s", registro['duracao_ms'], metodo, registro['consulta'],
+            f"\n{plano}" if plano else '')
+
+    def consultas_lentas(self):
+        """Consultas lentas mais recentes, da mais nova para a mais antiga."""
+        with self._lock:
+            return list(reversed(self._lentas))
+
+    def _criar_cursor_factory(self):
+        instrumentacao = self
+
+        class CursorInstrumentado(extensions.cursor):
+            # Cursor do psycopg2 que mede cada execute/executemany/copy_expert.
+            def _medir(self, sql, parametros, executar, *args, **kwargs):
+                inicio = time.perf_counter()
+                try:
+                    resultado = executar(*args, **kwargs)
+                except Exception:
+                    instrumentacao._registrar_sql(self, sql, parametros, time.perf_counter() - inicio, None, True)
+                    raise
+                # Cursores nomeados (server-side) só conhecem as linhas quando elas são lidas.
+                linhas = self.rowcount if self.name is None and self.rowcount >= 0 else None
+                instrumentacao._registrar_sql(self, sql, parametros, time.perf_counter() - inicio, linhas, False)
+                return resultado
+
+            def execute(self, query, vars=None):
+                if not isinstance(query, (str, bytes)):
+                    query = query.as_string(self)  # psycopg2.sql.Composed
+                return self._medir(query, vars, super().execute, query, vars)
+
+            def executemany(self, query, vars_list):
+                if not isinstance(query, (str, bytes)):
+                    query = query.as_string(self)
+                return self._medir(query, None, super().executemany, query, vars_list)
+
+            def copy_expert(self, sql, file, size=8192):
+                return self._medir(sql, None, super().copy_expert, sql, file, size)
+
+        return CursorInstrumentado
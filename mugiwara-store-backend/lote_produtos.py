@@ -0,0 +1,266 @@
+# --- Alterações em Lote do Catálogo ---
+# Aplica muitas operações de funcionários (alterações parciais, ajustes relativos
+# de estoque e remoções) em uma única transação, com um comando SQL por tipo de
+# operação em vez de um UPDATE/DELETE por produto. Cada operação recebe seu
+# próprio resultado; as inválidas são rejeitadas sem impedir as demais (a não
+# ser no modo tudo_ou_nada, em que nenhuma é aplicada).
+import json
+from decimal import Decimal, InvalidOperation
+
+OPERACOES = ('alterar', 'estoque', 'remover')
+MAX_OPERACOES_LOTE = 5000
+INTEIRO_MAXIMO = 2 ** 31 - 1
+PRECO_MAXIMO = Decimal('99999999.99')
+
+# Trava todos os produtos do lote de uma vez, em ordem de id_produto (a mesma ordem
+# usada por criar_pedido_completo), para que lotes e checkouts concorrentes esperem
+# um pelo outro em vez de entrarem em deadlock. Também diz quais ids existem e o
+# estoque de cada um, para rejeitar os ajustes inválidos antes de qualquer UPDATE.
+SQL_TRAVAR_PRODUTOS = """
+    SELECT id_produto, quantidade_estoque FROM PRODUTO WHERE id_produto = ANY(%s) ORDER BY id_produto FOR UPDATE;
+"""
+
+# Produtos a remover que já aparecem em pedidos. Com as linhas de PRODUTO travadas,
+# nenhum checkout consegue incluir um deles em um pedido novo até o fim do lote.
+SQL_PRODUTOS_COM_PEDIDOS = """
+    SELECT DISTINCT id_produto FROM ITEM_PEDIDO WHERE id_produto = ANY(%s);
+"""
+
+# Só os campos presentes em cada objeto são alterados; os demais mantêm o valor atual.
+SQL_APLICAR_ALTERACOES = """
+    UPDATE PRODUTO p SET
+        nome = CASE WHEN a.dados ? 'nome' THEN a.dados->>'nome' ELSE p.nome END,
+        descricao = CASE WHEN a.dados ? 'descricao' THEN a.dados->>'descricao' ELSE p.descricao END,
+        preco = CASE WHEN a.dados ? 'preco' THEN (a.dados->>'preco')::NUMERIC(10, 2) ELSE p.preco END,
+        quantidade_estoque = CASE WHEN a.dados ? 'quantidade_estoque'
+            THEN (a.dados->>'quantidade_estoque')::INTEGER ELSE p.quantidade_estoque END,
+        categoria = CASE WHEN a.dados ? 'categoria' THEN a.dados->>'categoria' ELSE p.categoria END,
+        fabricado_em_mari = CASE WHEN a.dados ? 'fabricado_em_mari'
+            THEN (a.dados->>'fabricado_em_mari')::BOOLEAN ELSE p.fabricado_em_mari END,
+        imagem = CASE WHEN a.dados ? 'imagem' THEN a.dados->>'imagem' ELSE p.imagem END,
+        estoque_minimo = CASE WHEN a.dados ? 'estoque_minimo'
+            THEN (a.dados->>'estoque_minimo')::INTEGER ELSE p.estoque_minimo END
+    FROM jsonb_array_elements(%s::JSONB) AS a(dados)
+    WHERE p.id_produto = (a.dados->>'id_produto')::INTEGER;
+"""
+
+# Ajustes relativos: o novo estoque é calculado sobre o valor atual da linha travada,
+# então reposições concorrentes se somam em vez de uma sobrescrever a outra. Ajustes
+# do mesmo produto são somados; os que deixariam o estoque negativo já foram rejeitados
+# em aplicar(), e a condição abaixo é só uma salvaguarda.
+SQL_APLICAR_AJUSTES_ESTOQUE = """
+    UPDATE PRODUTO p
+    SET quantidade_estoque = p.quantidade_estoque + a.delta
+    FROM (
+        SELECT id_produto, SUM(delta) AS delta
+        FROM unnest(%s::INTEGER[], %s::BIGINT[]) AS i(id_produto, delta)
+        GROUP BY id_produto
+    ) a
+    WHERE p.id_produto = a.id_produto
+      AND p.quantidade_estoque + a.delta BETWEEN 0 AND 2147483647
+    RETURNING p.id_produto, p.quantidade_estoque;
+"""
+
+# Produtos que já aparecem em pedidos não podem ser removidos (fk_item_pedido_produto):
+# são rejeitados em aplicar(), antes do DELETE; a condição abaixo é só uma salvaguarda.
+SQL_APLICAR_REMOCOES = """
+    DELETE FROM PRODUTO p
+    WHERE p.id_produto = ANY(%s)
+      AND NOT EXISTS (SELECT 1 FROM ITEM_PEDIDO i WHERE i.id_produto = p.id_produto)
+    RETURNING p.id_produto;
+"""
+
+
+class ErroFormatoLote(ValueError):
+    """O lote como um todo não pode ser lido (não é uma lista, excede o limite...)."""
+
+
+def _inteiro(valor, campo, minimo=-INTEIRO_MAXIMO, maximo=INTEIRO_MAXIMO):
+    if isinstance(valor, bool) or not isinstance(valor, int):
+        raise ValueError(f"{campo} deve ser um número inteiro")
+    if not minimo <= valor <= maximo:
+        raise ValueError(f"{campo} fora do intervalo permitido ({minimo} a {maximo})")
+    return valor
+
+
+def _texto(valor, campo, tamanho_maximo=None, obrigatorio=False):
+    if valor is None and not obrigatorio:
+        return None
+    if not isinstance(valor, str):
+        raise ValueError(f"{campo} deve ser um texto")
+    if obrigatorio:
+        valor = valor.strip()
+        if not valor:
+            raise ValueError(f"{campo} é obrigatório")
+    if tamanho_maximo and len(valor) > tamanho_maximo:
+        raise ValueError(f"{campo} excede {tamanho_maximo} caracteres")
+    return valor
+
+
+def _preco(valor):
+    if isinstance(valor, bool) or not isinstance(valor, (int, float, str)):
+        raise ValueError("preco inválido")
+    try:
+        preco = Decimal(str(valor).strip())
+    except InvalidOperation:
+        raise ValueError("preco inválido")
+    if not preco.is_finite() or preco.as_tuple().exponent < -2:
+        raise ValueError("preco deve ter no máximo duas casas decimais")
+    if preco <= 0:
+        raise ValueError("preco deve ser maior que zero")
+    if preco > PRECO_MAXIMO:
+        raise ValueError(f"preco excede {PRECO_MAXIMO}")
+    return str(preco)  # Texto: vai dentro de JSON sem perder precisão
+
+
+def _booleano(valor, campo):
+    if not isinstance(valor, bool):
+        raise ValueError(f"{campo} deve ser true ou false")
+    return valor
+
+
+VALIDADORES_CAMPOS = {
+    'nome': lambda v: _texto(v, 'nome', 100, obrigatorio=True),
+    'descricao': lambda v: _texto(v, 'descricao'),
+    'preco': _preco,
+    'quantidade_estoque': lambda v: _inteiro(v, 'quantidade_estoque', minimo=0),
+    'categoria': lambda v: _texto(v, 'categoria', 50, obrigatorio=True),
+    'fabricado_em_mari': lambda v: _booleano(v, 'fabricado_em_mari'),
+    'imagem': lambda v: _texto(v, 'imagem', 255),
+    'estoque_minimo': lambda v: _inteiro(v, 'estoque_minimo', minimo=0),
+}
+
+
+def validar_operacao(operacao):
+    """Devolve (op, id_produto, valores) ou lança ValueError com o motivo da rejeição."""
+    if not isinstance(operacao, dict):
+        raise ValueError("cada operação deve ser um objeto JSON")
+    op = operacao.get('op')
+    if op not in OPERACOES:
+        raise ValueError(f"op deve ser um de: {', '.join(OPERACOES)}")
+    id_produto = _inteiro(operacao.get('id_produto'), 'id_produto', minimo=1)
+    extras = set(operacao) - {'op', 'id_produto'}
+
+    if op == 'alterar':
+        desconhecidos = sorted(extras - set(VALIDADORES_CAMPOS))
+        if desconhecidos:
+            raise ValueError(f"campos desconhecidos: {', '.join(desconhecidos)}")
+        if not extras:
+            raise ValueError("informe ao menos um campo para alterar")
+        return op, id_produto, {campo: VALIDADORES_CAMPOS[campo](operacao[campo]) for campo in extras}
+    if op == 'estoque':
+        if extras != {'delta'}:
+            raise ValueError("ajuste de estoque aceita apenas o campo 'delta'")
+        return op, id_produto, _inteiro(operacao['delta'], 'delta')
+    if extras:
+        raise ValueError("remoção não aceita outros campos além de id_produto")
+    return op, id_produto, None
+
+
+def aplicar(conn, operacoes, tudo_ou_nada=False):
+    """Aplica o lote na conexão dada (sem commit). Devolve o resumo com um resultado por operação."""
+    if not isinstance(operacoes, list):
+        raise ErroFormatoLote("'operacoes' deve ser uma lista.")
+    if len(operacoes) > MAX_OPERACOES_LOTE:
+        raise ErroFormatoLote(f"O lote aceita no máximo {MAX_OPERACOES_LOTE} operações.")
+
+    resultados = []
+    validas = []  # (indice, op, id_produto, valores)
+    primeira_alteracao = {}
+    for indice, operacao in enumerate(operacoes):
+        resultado = {'indice': indice}
+        resultados.append(resultado)
+        try:
+            op, id_produto, valores = validar_operacao(operacao)
+        except ValueError as e:
+            resultado.update(status='erro', erro=str(e))
+            continue
+        resultado.update(op=op, id_produto=id_produto)
+        if op == 'alterar':
+            # Duas alterações do mesmo produto no mesmo UPDATE teriam resultado indefinido.
+            if id_produto in primeira_alteracao:
+                resultado.update(status='erro', erro='produto alterado mais de uma vez no lote '
+                                 f'(primeira ocorrência no índice {primeira_alteracao[id_produto]})')
+                continue
+            primeira_alteracao[id_produto] = indice
+        validas.append((indice, op, id_produto, valores))
+
+    alterados = ajustados = removidos = 0
+    with conn.cursor() as cursor:
+        if validas:
+            cursor.execute(SQL_TRAVAR_PRODUTOS, (sorted({v[2] for v in validas}),))
+            estoque = dict(cursor.fetchall())
+            for item in validas:
+                if item[2] not in estoque:
+                    resultados[item[0]].update(status='erro', erro='produto não encontrado')
+            validas = [item for item in validas if item[2] in estoque]
+
+            # Com as linhas travadas, as demais rejeições também são decididas antes de
+            # qualquer UPDATE/DELETE: no modo tudo_ou_nada, nada chega a ser aplicado.
+            for _, op, id_produto, valores in validas:
+                if op == 'alterar' and 'quantidade_estoque' in valores:
+                    estoque[id_produto] = valores['quantidade_estoque']  # Os ajustes são aplicados depois
+            saldo = {}
+            for _, op, id_produto, delta in validas:
+                if op == 'estoque':
+                    saldo[id_produto] = saldo.get(id_produto, estoque[id_produto]) + delta
+            recusados = {id_produto for id_produto, total in saldo.items() if not 0 <= total <= INTEIRO_MAXIMO}
+            for indice, op, id_produto, _ in validas:
+                if op == 'estoque' and id_produto in recusados:
+                    resultados[indice].update(status='erro', erro='o ajuste deixaria o estoque negativo')
+
+            remocoes = sorted({item[2] for item in validas if item[1] == 'remover'})
+            if remocoes:
+                cursor.execute(SQL_PRODUTOS_COM_PEDIDOS, (remocoes,))
+                com_pedidos = {linha[0] for linha in cursor.fetchall()}
+                for indice, op, id_produto, _ in validas:
+                    if op == 'remover' and id_produto in com_pedidos:
+                        resultados[indice].update(status='erro', erro='produto possui pedidos e não pode ser removido')
+            validas = [item for item in validas if 'status' not in resultados[item[0]]]
+
+        rejeitados = sum(1 for r in resultados if r.get('status') == 'erro')
+        if not (tudo_ou_nada and rejeitados):
+            # Ordem de aplicação: alterações, depois ajustes de estoque, depois remoções.
+            alteracoes = [item for item in validas if item[1] == 'alterar']
+            if alteracoes:
+                documento = [dict(valores, id_produto=id_produto) for _, _, id_produto, valores in alteracoes]
+                cursor.execute(SQL_APLICAR_ALTERACOES, (json.dumps(documento),))
+                alterados = cursor.rowcount
+                for indice, _, _, _ in alteracoes:
+                    resultados[indice]['status'] = 'ok'
+
+            ajustes = [item for item in validas if item[1] == 'estoque']
+            if ajustes:
+                cursor.execute(SQL_APLICAR_AJUSTES_ESTOQUE,
+                               ([item[2] for item in ajustes], [item[3] for item in ajustes]))
+                novo_estoque = dict(cursor.fetchall())
+                ajustados = len(novo_estoque)
+                for indice, _, id_produto, _ in ajustes:
+                    if id_produto in novo_estoque:
+                        resultados[indice].update(status='ok', quantidade_estoque=novo_estoque[id_produto])
+                    else:
+                        resultados[indice].update(status='erro', erro='o ajuste deixaria o estoque negativo')
+
+            remocoes = [item for item in validas if item[1] == 'remover']
+            if remocoes:
+                cursor.execute(SQL_APLICAR_REMOCOES, (sorted({item[2] for item in remocoes}),))
+                excluidos = {linha[0] for linha in cursor.fetchall()}
+                removidos = len(excluidos)
+                for indice, _, id_produto, _ in remocoes:
+                    if id_produto in excluidos:
+                        resultados[indice]['status'] = 'ok'
+                    else:
+                        resultados[indice].update(status='erro', erro='produto possui pedidos e não pode ser removido')
+
+    for resultado in resultados:
+        # Operações válidas que não chegaram a ser aplicadas porque o lote é tudo_ou_nada.
+        resultado.setdefault('status', 'nao_aplicado')
+    rejeitados = sum(1 for r in resultados if r['status'] == 'erro')
+    return {
+        'operacoes': len(operacoes),
+        'alterados': alterados,
+        'estoque_ajustado': ajustados,
+        'removidos': removidos,
+        'rejeitados': rejeitados,
+        'resultados': resultados,
+    }
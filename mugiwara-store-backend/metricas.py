@@ -0,0 +1,127 @@
+# --- Métricas no formato do Prometheus ---
+# Contadores e histogramas com rótulos, guardados em memória (por processo) e
+# exportados em texto para o endpoint /metrics. Estatísticas que já existem em
+# outros componentes (pool, cache...) entram como "coletores", lidos na hora da coleta.
+import threading  # Para proteger os valores contra acessos simultâneos
+
+BALDES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LE_INFINITO = 'le="+Inf"'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(nomes, valores, extra=''):
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._lock = threading.Lock()
+        self._valores = {}
+
+    def incrementar(self, *valores_rotulos, valor=1):
+        with self._lock:
+            self._valores[valores_rotulos] = self._valores.get(valores_rotulos, 0) + valor
+
+    def exportar(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        linhas = [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} counter']
+        for chave, valor in valores:
+            linhas.append(f'{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}')
+        return linhas
+
+
+class Histograma:
+    def __init__(self, nome, ajuda, rotulos=(), baldes=BALDES_SEGUNDOS):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.baldes = tuple(sorted(baldes))
+        self._lock = threading.Lock()
+        self._series = {}  # rótulos -> [contagens por balde, soma, total]
+
+    def observar(self, valor, *valores_rotulos):
+        with self._lock:
+            serie = self._series.get(valores_rotulos)
+            if serie is None:
+                serie = self._series[valores_rotulos] = [[0] * len(self.baldes), 0.0, 0]
+            for i, limite in enumerate(self.baldes):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    def exportar(self):
+        with self._lock:
+            series = sorted((chave, (list(s[0]), s[1], s[2])) for chave, s in self._series.items())
+        linhas = [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} histogram']
+        for chave, (contagens, soma, total) in series:
+            acumulado = 0
+            for limite, contagem in zip(self.baldes, contagens):
+                acumulado += contagem
+                le = f'le="{_numero(float(limite))}"'
+                linhas.append(f'{self.nome}_bucket{_rotulos(self.rotulos, chave, le)} {acumulado}')
+            linhas.append(f'{self.nome}_bucket{_rotulos(self.rotulos, chave, LE_INFINITO)} {total}')
+            linhas.append(f'{self.nome}_sum{_rotulos(self.rotulos, chave)} {_numero(soma)}')
+            linhas.append(f'{self.nome}_count{_rotulos(self.rotulos, chave)} {total}')
+        return linhas
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metricas = []
+        self._coletores = []
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._adicionar(Contador(nome, ajuda, rotulos))
+
+    def histograma(self, nome, ajuda, rotulos=(), baldes=BALDES_SEGUNDOS):
+        return self._adicionar(Histograma(nome, ajuda, rotulos, baldes))
+
+    def _adicionar(self, metrica):
+        with self._lock:
+            self._metricas.append(metrica)
+        return metrica
+
+    def registrar_estatisticas(self, prefixo, ajuda, obter_estatisticas):
+        """Exporta cada valor numérico de `obter_estatisticas()` como gauge '<prefixo>_<chave>'."""
+        with self._lock:
+            self._coletores.append((prefixo, ajuda, obter_estatisticas))
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (text/plain; version=0.0.4)."""
+        with self._lock:
+            metricas = list(self._metricas)
+            coletores = list(self._coletores)
+        linhas = []
+        for metrica in metricas:
+            linhas.extend(metrica.exportar())
+        for prefixo, ajuda, obter_estatisticas in coletores:
+            try:
+                estatisticas = obter_estatisticas()
+            except Exception as e:
+                print(f"Erro ao coletar estatísticas para {prefixo}: {e}")
+                continue
+            for chave, valor in estatisticas.items():
+                if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+                    continue
+                nome = f'{prefixo}_{chave}'
+                linhas.extend([f'# HELP {nome} {ajuda} ({chave})', f'# TYPE {nome} gauge', f'{nome} {_numero(valor)}'])
+        return '\n'.join(linhas) + '\n'
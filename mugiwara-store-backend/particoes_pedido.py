@@ -0,0 +1,115 @@
+# --- Manutenção das partições de PEDIDO e ITEM_PEDIDO ---
+# As duas tabelas são particionadas por mês (ver "Partições de PEDIDO e ITEM_PEDIDO"
+# no init.sql). Cada rodada cria as partições dos próximos meses antes de eles
+# chegarem e, com uma janela ativa configurada, arquiva os meses mais antigos que
+# ela: as partições saem de PEDIDO, são compactadas e vão para o schema "arquivo".
+# O trabalho em si é das funções do banco (criar_particoes_pedido e arquivar_pedidos);
+# aqui fica só o agendamento (uma thread por processo) e os contadores.
+import threading  # Thread de manutenção periódica e proteção dos contadores
+import time  # Intervalo entre as rodadas
+
+import psycopg2
+
+# Do mês atual até `meses_futuros` meses adiante, no fuso da loja (como as partições).
+SQL_CRIAR_PARTICOES = """
+    SELECT criar_particoes_pedido(dia_venda(now()), (dia_venda(now()) + make_interval(months => %s))::DATE);
+"""
+# Arquiva os meses anteriores ao primeiro mês da janela ativa (que inclui o mês atual).
+SQL_ARQUIVAR = """
+    CALL arquivar_pedidos((date_trunc('month', dia_venda(now())) - make_interval(months => %s))::DATE, NULL);
+"""
+SQL_SITUACAO = """
+    SELECT (SELECT count(*) FROM pg_inherits WHERE inhparent = 'pedido'::REGCLASS),
+           (SELECT max(c.relname) FROM pg_inherits h JOIN pg_class c ON c.oid = h.inhrelid
+            WHERE h.inhparent = 'pedido'::REGCLASS),
+           count(*), coalesce(sum(pedidos), 0), coalesce(sum(bytes), 0)
+    FROM PEDIDO_ARQUIVADO;
+"""
+
+
+class ManutencaoDeParticoes:
+    def __init__(self, db_config, meses_futuros=3, meses_ativos=0, intervalo=3600.0):
+        self.db_config = db_config
+        self.meses_futuros = meses_futuros
+        self.meses_ativos = meses_ativos  # 0 = não arquiva nada
+        self.intervalo = intervalo  # 0 = sem thread (só pelo comando flask manter-particoes)
+
+        self._lock = threading.Lock()
+        self._thread = None
+
+        # Contadores e situação expostos em estatisticas()
+        self._rodadas = 0
+        self._falhas = 0
+        self._criadas = 0
+        self._arquivadas = 0
+        self._situacao = {}
+        self._ultima_rodada = None
+        self._ultimo_erro = None
+
+    def executar(self):
+        """Uma rodada de manutenção; devolve (partições criadas, meses arquivados)."""
+        conn = psycopg2.connect(**self.db_config)
+        conn.autocommit = True  # arquivar_pedidos confirma uma transação por mês
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(SQL_CRIAR_PARTICOES, (self.meses_futuros,))
+                criadas = cursor.fetchone()[0]
+                arquivadas = 0
+                if self.meses_ativos > 0:
+                    cursor.execute(SQL_ARQUIVAR, (self.meses_ativos - 1,))
+                    arquivadas = cursor.fetchone()[0]
+                cursor.execute(SQL_SITUACAO)
+                ativas, ultima, meses_arquivados, pedidos_arquivados, bytes_arquivados = cursor.fetchone()
+        finally:
+            conn.close()
+        with self._lock:
+            self._rodadas += 1
+            self._criadas += criadas
+            self._arquivadas += arquivadas
+            self._ultima_rodada = time.time()
+            self._situacao = {
+                'particoes_ativas': ativas,
+                'ultima_particao': ultima,
+                'meses_arquivados': meses_arquivados,
+                'pedidos_arquivados': int(pedidos_arquivados),
+                'bytes_arquivados': int(bytes_arquivados),
+            }
+        return criadas, arquivadas
+
+    def iniciar(self):
+        """Inicia a thread de manutenção (uma vez por processo; sem efeito com intervalo 0)."""
+        if self.intervalo <= 0:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._manter, name='particoes-pedido', daemon=True)
+            self._thread.start()
+
+    def _manter(self):
+        while True:
+            try:
+                criadas, arquivadas = self.executar()
+                if criadas or arquivadas:
+                    print(f"Partições de pedidos: {criadas} meses criados, {arquivadas} arquivados.")
+            except Exception as e:
+                # Banco fora do ar ou sem as funções de partição: tenta de novo na próxima rodada.
+                with self._lock:
+                    self._falhas += 1
+                    self._ultimo_erro = str(e)
+                print(f"Erro na manutenção das partições de pedidos: {e}")
+            time.sleep(self.intervalo)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'meses_futuros': self.meses_futuros,
+                'meses_ativos': self.meses_ativos,
+                'rodadas': self._rodadas,
+                'falhas': self._falhas,
+                'particoes_criadas': self._criadas,
+                'meses_arquivados_pelo_processo': self._arquivadas,
+                'segundos_desde_ultima_rodada': round(time.time() - self._ultima_rodada, 1) if self._ultima_rodada else None,
+                'ultimo_erro': self._ultimo_erro,
+                **self._situacao,
+            }
@@ -0,0 +1,198 @@
+# --- Pool de Conexões com o PostgreSQL ---
+# Mantém um conjunto de conexões abertas e reutilizáveis para que cada chamada
+# de DAO não precise pagar o custo de um novo handshake TCP + autenticação.
+import threading  # Para sincronizar o acesso ao pool entre as threads do servidor
+import time  # Para medir tempos de espera e de ociosidade
+from collections import deque  # Pilha de conexões livres
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolEsgotadoError(Exception):
+    """Lançada quando nenhuma conexão fica livre dentro do tempo limite de checkout."""
+
+
+class PoolDeConexoes:
+    def __init__(self, db_config, minimo=1, maximo=10, timeout=5.0, validar_apos=30.0):
+        if minimo < 0 or maximo < 1 or minimo > maximo:
+            raise ValueError("Tamanhos do pool inválidos: exige 0 <= minimo <= maximo e maximo >= 1.")
+        self.db_config = db_config
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout  # Segundos que um checkout pode esperar por uma conexão livre
+        self.validar_apos = validar_apos  # Conexões ociosas há mais tempo que isso são testadas antes do uso
+
+        self._cond = threading.Condition()
+        self._livres = deque()  # Pares (conexão, instante em que foi devolvida)
+        self._em_uso = set()  # ids das conexões emprestadas
+        self._total = 0  # Conexões abertas (livres + em uso + sendo abertas)
+        self._aquecido = False
+
+        # Contadores expostos em estatisticas()
+        self._esperando = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._criadas = 0
+        self._descartadas = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+
+    def _conectar(self):
+        conn = psycopg2.connect(**self.db_config)
+        with self._cond:
+            self._criadas += 1
+        return conn
+
+    def _fechar(self, conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._descartadas += 1
+
+    def _descartar(self, conn):
+        # Fecha a conexão sem devolvê-la ao pool e libera a vaga para outra.
+        self._fechar(conn)
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+    def _aquecer(self):
+        # Abre as conexões mínimas na primeira utilização (e não na importação,
+        # pois o banco pode ainda não estar de pé quando o Flask sobe).
+        with self._cond:
+            if self._aquecido:
+                return
+            self._aquecido = True
+            faltam = max(0, self.minimo - self._total)
+            self._total += faltam
+        for _ in range(faltam):
+            try:
+                conn = self._conectar()
+            except Exception as e:
+                print(f"Erro ao pré-abrir conexão do pool: {e}")
+                with self._cond:
+                    self._total -= 1
+                    self._cond.notify()
+                continue
+            with self._cond:
+                self._livres.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def _valida(self, conn, devolvida_em):
+        if conn.closed:
+            return False
+        if time.monotonic() - devolvida_em < self.validar_apos:
+            return True
+        # Conexão ficou ociosa por muito tempo: pode ter sido derrubada pelo servidor.
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def obter(self):
+        """Empresta uma conexão do pool, esperando no máximo `timeout` segundos."""
+        if not self._aquecido:
+            self._aquecer()
+
+        inicio = time.monotonic()
+        prazo = inicio + self.timeout
+        with self._cond:
+            while True:
+                if self._livres:
+                    conn, devolvida_em = self._livres.pop()  # LIFO: reaproveita a conexão mais "quente"
+                    break
+                if self._total < self.maximo:
+                    self._total += 1  # Reserva a vaga; a conexão é aberta fora do lock
+                    conn, devolvida_em = None, None
+                    break
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    self._timeouts += 1
+                    raise PoolEsgotadoError(
+                        f"Nenhuma conexão livre após {self.timeout:.1f}s ({self.maximo} em uso)."
+                    )
+                self._esperando += 1
+                try:
+                    self._cond.wait(restante)
+                finally:
+                    self._esperando -= 1
+
+        if conn is not None and not self._valida(conn, devolvida_em):
+            self._fechar(conn)  # Mantém a vaga reservada e reabre no lugar da conexão inválida
+            conn = None
+
+        if conn is None:
+            try:
+                conn = self._conectar()
+            except Exception:
+                with self._cond:
+                    self._total -= 1
+                    self._cond.notify()
+                raise
+
+        espera = time.monotonic() - inicio
+        with self._cond:
+            self._em_uso.add(id(conn))
+            self._checkouts += 1
+            self._espera_total += espera
+            self._espera_max = max(self._espera_max, espera)
+        return conn
+
+    def devolver(self, conn):
+        """Devolve a conexão ao pool, desfazendo qualquer transação deixada aberta."""
+        with self._cond:
+            if id(conn) not in self._em_uso:
+                return  # Devolução duplicada: ignora
+            self._em_uso.discard(id(conn))
+
+        try:
+            if conn.closed:
+                raise psycopg2.InterfaceError("conexão fechada")
+            status = conn.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                raise psycopg2.InterfaceError("estado da conexão desconhecido")
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            # Restaura os padrões da sessão para que o próximo usuário não herde ajustes.
+            if conn.autocommit:
+                conn.autocommit = False
+        except Exception:
+            self._descartar(conn)
+            return
+
+        with self._cond:
+            self._livres.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def fechar_todas(self):
+        """Fecha as conexões livres; as que estão emprestadas continuam com quem as usa."""
+        with self._cond:
+            livres = list(self._livres)
+            self._livres.clear()
+        for conn, _ in livres:
+            self._descartar(conn)
+
+    def estatisticas(self):
+        with self._cond:
+            return {
+                'tamanho_minimo': self.minimo,
+                'tamanho_maximo': self.maximo,
+                'abertas': self._total,
+                'em_uso': len(self._em_uso),
+                'livres': len(self._livres),
+                'esperando': self._esperando,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'conexoes_criadas': self._criadas,
+                'conexoes_descartadas': self._descartadas,
+                'tempo_espera_total_ms': round(self._espera_total * 1000, 3),
+                'tempo_espera_medio_ms': round(self._espera_total * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+                'tempo_espera_max_ms': round(self._espera_max * 1000, 3),
+            }
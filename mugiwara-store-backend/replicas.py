@@ -0,0 +1,323 @@
+# --- Réplicas de Leitura ---
+# Divide o tráfego entre o primário e N réplicas em replicação por streaming:
+# escritas (e tudo que não é marcado como leitura) vão ao primário; leituras
+# vão, em rodízio, às réplicas disponíveis. Uma thread mede o atraso de cada
+# réplica (posição do WAL aplicado x posição do primário) e tira do rodízio as
+# que passam de `lag_maximo` segundos, devolvendo-as quando alcançam o primário.
+#
+# Ler o que acabou de escrever: depois de uma escrita, o LSN do primário vai ao
+# cliente (cookie/cabeçalho); nas requisições seguintes dele, só servem réplicas
+# que já aplicaram aquele LSN, e sem nenhuma a leitura vai ao primário.
+# As leituras que alimentam o cache do catálogo (compartilhado entre clientes)
+# seguem a mesma regra com o LSN da última alteração do catálogo.
+import contextvars  # LSN exigido e LSN escrito na requisição atual
+import itertools  # Rodízio entre as réplicas
+import re  # Para validar os LSNs recebidos dos clientes
+import threading  # Thread de monitoramento e proteção dos contadores
+import time  # Intervalo entre medições do atraso
+from collections import deque  # Histórico das posições do primário
+
+import psycopg2
+from psycopg2 import extensions
+
+from pool_conexoes import PoolEsgotadoError
+
+_LSN = re.compile(r'^([0-9A-Fa-f]{1,8})/([0-9A-Fa-f]{1,8})$')
+# Posição de inserção do WAL: já inclui o registro de commit de toda transação terminada antes da leitura.
+SQL_LSN_PRIMARIO = "SELECT pg_current_wal_insert_lsn()::TEXT;"
+JANELA_HISTORICO = 300.0  # Segundos de posições do primário guardadas para medir o atraso
+
+# Piso da requisição (LSN que o cliente já viu) e LSN das escritas feitas nela.
+_lsn_minimo = contextvars.ContextVar('lsn_minimo', default=None)
+_lsn_escrito = contextvars.ContextVar('lsn_escrito', default=None)
+
+
+def ler_lsn(texto):
+    """'16/B374D848' -> inteiro (posição no WAL); None se o texto não for um LSN."""
+    encontrado = _LSN.match((texto or '').strip())
+    if not encontrado:
+        return None
+    return (int(encontrado.group(1), 16) << 32) | int(encontrado.group(2), 16)
+
+
+def formatar_lsn(valor):
+    return f'{valor >> 32:X}/{valor & 0xFFFFFFFF:X}'
+
+
+def configs_das_replicas(texto, db_config):
+    """DB_REPLICAS ('replica1,replica2:5433') -> um db_config por réplica, com o mesmo banco e usuário do primário."""
+    configs = []
+    for item in (texto or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, porta = item.rpartition(':') if ':' in item else (item, '', '')
+        config = {**db_config, 'host': host}
+        if porta:
+            config['port'] = int(porta)
+        configs.append(config)
+    return configs
+
+
+def _nome(db_config):
+    porta = db_config.get('port')
+    return f"{db_config['host']}:{porta}" if porta else db_config['host']
+
+
+class Replica:
+    def __init__(self, nome, pool):
+        self.nome = nome
+        self.pool = pool
+        self.disponivel = False  # Só entra no rodízio depois da primeira medição
+        self.lsn = 0  # Último LSN aplicado (medido pelo monitor)
+        self.atraso = None  # Segundos atrás do primário (0 se já aplicou tudo; None se não foi possível medir)
+        self.erro = None
+        self.leituras = 0
+        self.remocoes = 0
+        self.readmissoes = 0
+        self.falhas = 0
+        self.pool_esgotado = 0
+
+    def estatisticas(self):
+        return {
+            'replica': self.nome,
+            'disponivel': self.disponivel,
+            'lsn_aplicado': formatar_lsn(self.lsn) if self.lsn else None,
+            'atraso_s': None if self.atraso is None else round(self.atraso, 3),
+            'erro': self.erro,
+            'leituras': self.leituras,
+            'remocoes': self.remocoes,
+            'readmissoes': self.readmissoes,
+            'falhas_de_conexao': self.falhas,
+            'pool_esgotado': self.pool_esgotado,
+            'pool': self.pool.estatisticas(),
+        }
+
+
+class RoteadorDeLeitura:
+    def __init__(self, primario, replicas=(), lag_maximo=5.0, intervalo=1.0, obter=None):
+        self.primario = primario
+        self.replicas = [Replica(_nome(pool.db_config), pool) for pool in replicas]
+        self.lag_maximo = lag_maximo
+        self.intervalo = intervalo
+        self._obter = obter or (lambda pool: pool.obter())  # Ex: instrumentacao.obter_conexao
+
+        self._lock = threading.Lock()
+        self._origem = {}  # id(conexão) -> pool de onde ela saiu
+        self._rodizio = itertools.count()
+        self._thread = None
+        self._lsn_primario = 0
+        self._historico = deque()  # (instante, LSN do primário) a cada avanço medido
+        self._piso_catalogo = 0
+        self._catalogo_alterado_em = None  # Alteração ainda sem LSN do primário medido depois dela
+
+        # Contadores expostos em estatisticas()
+        self._leituras_primario = 0
+        self._leituras_retidas = 0  # Leituras que foram ao primário por nenhuma réplica ter o LSN exigido
+        self._escritas_marcadas = 0
+
+    @property
+    def ativo(self):
+        return bool(self.replicas)
+
+    # --- Sessão (LSN do cliente) ---
+    def iniciar_requisicao(self, *lsns):
+        """Define o piso da requisição (o maior dos LSNs válidos recebidos) e zera o LSN escrito."""
+        valores = [v for v in (ler_lsn(t) for t in lsns if t) if v is not None]
+        _lsn_minimo.set(max(valores) if valores else None)
+        _lsn_escrito.set(None)
+
+    def lsn_escrito(self):
+        """LSN da última escrita feita nesta requisição (texto), para devolver ao cliente."""
+        valor = _lsn_escrito.get()
+        return formatar_lsn(valor) if valor is not None else None
+
+    def registrar_escrita(self, conn):
+        """Depois do commit no primário: guarda o LSN atual para o cliente e para esta requisição."""
+        if not self.replicas:
+            return None
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(SQL_LSN_PRIMARIO)
+                lsn = cursor.fetchone()[0]
+            conn.rollback()
+        except Exception as e:
+            print(f"Erro ao ler o LSN após a escrita: {e}")
+            return None
+        return self.registrar_lsn(lsn)
+
+    def registrar_lsn(self, texto):
+        """Guarda um LSN lido do primário após uma escrita (usado também pelo servidor assíncrono)."""
+        lsn = ler_lsn(texto)
+        if lsn is None:
+            return None
+        _lsn_escrito.set(max(lsn, _lsn_escrito.get() or 0))
+        _lsn_minimo.set(max(lsn, _lsn_minimo.get() or 0))  # O resto desta requisição também lê o que escreveu
+        with self._lock:
+            self._escritas_marcadas += 1
+        return formatar_lsn(lsn)
+
+    def marcar_catalogo_alterado(self):
+        """O catálogo mudou: até o monitor medir o primário de novo, as cargas do cache vão ao primário."""
+        if not self.replicas:
+            return
+        with self._lock:
+            if self._catalogo_alterado_em is None:
+                self._catalogo_alterado_em = time.monotonic()
+
+    # --- Empréstimo de conexões ---
+    def _escolher(self, catalogo):
+        piso = _lsn_minimo.get() or 0
+        with self._lock:
+            if catalogo:
+                if self._catalogo_alterado_em is not None:
+                    self._leituras_retidas += 1
+                    return None
+                piso = max(piso, self._piso_catalogo)
+            disponiveis = [r for r in self.replicas if r.disponivel]
+            candidatas = [r for r in disponiveis if r.lsn >= piso]
+            if not candidatas:
+                if disponiveis:
+                    self._leituras_retidas += 1
+                return None
+            replica = candidatas[next(self._rodizio) % len(candidatas)]
+            replica.leituras += 1
+            return replica
+
+    def obter(self, leitura=False, catalogo=False):
+        """Empresta uma conexão: de uma réplica em dia para leituras, senão do primário."""
+        replica = self._escolher(catalogo) if leitura and self.replicas else None
+        if replica is not None:
+            try:
+                conn = self._obter(replica.pool)
+            except psycopg2.OperationalError as e:
+                # Réplica fora do ar: sai do rodízio até o monitor conseguir medi-la de novo.
+                with self._lock:
+                    replica.falhas += 1
+                    if replica.disponivel:
+                        replica.disponivel = False
+                        replica.remocoes += 1
+                    replica.erro = str(e).strip()
+                print(f"Réplica {replica.nome} indisponível ({replica.erro}); lendo do primário.")
+            except PoolEsgotadoError as e:
+                # Réplica ocupada, não fora do ar: continua no rodízio e esta leitura vai ao primário.
+                with self._lock:
+                    replica.pool_esgotado += 1
+                print(f"Pool da réplica {replica.nome} esgotado ({e}); lendo do primário.")
+            else:
+                with self._lock:
+                    self._origem[id(conn)] = replica.pool
+                return conn
+        conn = self._obter(self.primario)
+        if leitura:
+            with self._lock:
+                self._leituras_primario += 1
+        return conn
+
+    def devolver(self, conn):
+        with self._lock:
+            pool = self._origem.pop(id(conn), self.primario)
+        pool.devolver(conn)
+
+    # --- Monitoramento do atraso ---
+    def iniciar(self):
+        with self._lock:
+            if self._thread is not None or not self.replicas:
+                return
+            self._thread = threading.Thread(target=self._monitorar, name='monitor-replicas', daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _conectar(pool):
+        # Conexão dedicada, fora do pool e sem o cursor instrumentado (não entra nas métricas de SQL).
+        config = {k: v for k, v in pool.db_config.items() if k not in ('cursor_factory', 'connection_factory')}
+        conn = psycopg2.connect(connect_timeout=3, **config)
+        conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    def _consultar(self, conexoes, chave, pool, sql):
+        conn = conexoes.get(chave)
+        try:
+            if conn is None or conn.closed:
+                conn = conexoes[chave] = self._conectar(pool)
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+                return cursor.fetchone()
+        except Exception:
+            conexoes.pop(chave, None)
+            if conn is not None and not conn.closed:
+                conn.close()
+            raise
+
+    def _monitorar(self):
+        conexoes = {}
+        while True:
+            inicio = time.monotonic()
+            try:
+                lsn_primario = ler_lsn(self._consultar(conexoes, None, self.primario, SQL_LSN_PRIMARIO)[0])
+            except Exception as e:
+                print(f"Monitor de réplicas sem acesso ao primário: {e}")
+                lsn_primario = None
+            with self._lock:
+                if lsn_primario is not None:
+                    self._lsn_primario = lsn_primario
+                    if not self._historico or lsn_primario > self._historico[-1][1]:
+                        self._historico.append((inicio, lsn_primario))
+                    while len(self._historico) > 1 and inicio - self._historico[0][0] > JANELA_HISTORICO:
+                        self._historico.popleft()
+                    if self._catalogo_alterado_em is not None and self._catalogo_alterado_em <= inicio:
+                        # Alteração anterior a esta medição: o LSN medido já a inclui.
+                        self._piso_catalogo = max(self._piso_catalogo, lsn_primario)
+                        self._catalogo_alterado_em = None
+            for i, replica in enumerate(self.replicas):
+                self._medir(conexoes, i, replica)
+            time.sleep(max(0.0, self.intervalo - (time.monotonic() - inicio)))
+
+    def _atraso(self, lsn, agora):
+        # Tempo desde que o primário passou do LSN que a réplica aplicou (0 se ela aplicou tudo).
+        # Medido pelo relógio do backend, e não pela hora da última transação aplicada, que
+        # cresceria com o primário ocioso sem que a réplica estivesse atrasada.
+        for instante, lsn_primario in self._historico:
+            if lsn_primario > lsn:
+                return agora - instante
+        return 0.0
+
+    def _medir(self, conexoes, chave, replica):
+        try:
+            em_recuperacao, lsn_texto = self._consultar(
+                conexoes, chave, replica.pool, "SELECT pg_is_in_recovery(), pg_last_wal_replay_lsn()::TEXT;")
+            erro = None if em_recuperacao else "não está em recuperação (promovida?)"
+        except Exception as e:
+            lsn_texto, erro = None, str(e).strip()
+        lsn = ler_lsn(lsn_texto) or 0
+        with self._lock:
+            atraso = None if erro is not None else self._atraso(lsn, time.monotonic())
+            replica.lsn, replica.atraso, replica.erro = lsn, atraso, erro
+            if replica.disponivel and (atraso is None or atraso > self.lag_maximo):
+                replica.disponivel = False
+                replica.remocoes += 1
+                print(f"Réplica {replica.nome} fora do rodízio: {erro or f'atraso de {atraso:.1f}s'}.")
+            elif not replica.disponivel and atraso is not None and atraso <= self.lag_maximo / 2:
+                # Volta com folga abaixo do limite, para não entrar e sair a cada medição.
+                replica.disponivel = True
+                if replica.remocoes:
+                    replica.readmissoes += 1
+
+    def estatisticas(self):
+        with self._lock:
+            por_replica = [r.estatisticas() for r in self.replicas]
+            atrasos = [r['atraso_s'] for r in por_replica if r['atraso_s'] is not None]
+            return {
+                'replicas_configuradas': len(self.replicas),
+                'replicas_disponiveis': sum(1 for r in por_replica if r['disponivel']),
+                'lag_maximo_s': self.lag_maximo,
+                'atraso_max_s': max(atrasos) if atrasos else 0.0,
+                'lsn_primario': formatar_lsn(self._lsn_primario) if self._lsn_primario else None,
+                'leituras_em_replicas': sum(r['leituras'] for r in por_replica),
+                'leituras_no_primario': self._leituras_primario,
+                'leituras_retidas_por_lsn': self._leituras_retidas,
+                'escritas_com_lsn': self._escritas_marcadas,
+                'remocoes': sum(r['remocoes'] for r in por_replica),
+                'readmissoes': sum(r['readmissoes'] for r in por_replica),
+                'por_replica': por_replica,
+            }
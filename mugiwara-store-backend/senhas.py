@@ -0,0 +1,171 @@
+# --- Hash e Verificação de Senhas ---
+# O hash de senha é propositalmente caro (pbkdf2 com ~1 milhão de iterações).
+# Para que uma rajada de logins não ocupe as threads que servem o catálogo, as
+# verificações rodam em um pool de processos limitado, com uma fila máxima:
+# quando ela enche, o login é recusado na hora em vez de esperar indefinidamente.
+# No servidor assíncrono (servidor_async.py), verificar_async/gerar_hash_async usam
+# a mesma fila e os mesmos processos, aguardando o resultado sem bloquear o loop.
+import asyncio  # Para aguardar os processos de hash a partir do loop de eventos
+import multiprocessing  # Contexto 'spawn' para os processos de hash
+import threading  # Para contar as tarefas em andamento entre as threads do servidor
+import time  # Para medir o tempo das verificações
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturoTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class SenhasSobrecarregadasError(Exception):
+    """Lançada quando a fila de hash está cheia ou a verificação passa do tempo limite."""
+
+
+def metodo_do_hash(senha_hash):
+    # 'pbkdf2:sha256:1000000$sal$hash' -> 'pbkdf2:sha256:1000000'
+    return senha_hash.split('$', 1)[0]
+
+
+class ServicoDeSenhas:
+    def __init__(self, metodo='pbkdf2:sha256:1000000', processos=2, fila_maxima=16, timeout=10.0):
+        if processos < 1 or fila_maxima < processos:
+            raise ValueError("Exige processos >= 1 e fila_maxima >= processos.")
+        self.metodo = metodo  # Método completo do werkzeug, com os parâmetros de custo
+        self.processos = processos
+        self.fila_maxima = fila_maxima  # Tarefas (executando + aguardando) aceitas ao mesmo tempo
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._executor = None  # Criado no primeiro uso
+        self._pendentes = 0
+
+        # Contadores expostos em estatisticas()
+        self._verificacoes = 0
+        self._hashes_gerados = 0
+        self._recusadas = 0
+        self._timeouts = 0
+        self._tempo_total = 0.0
+        self._tempo_max = 0.0
+
+    def _reservar(self):
+        # Ocupa uma vaga na fila (ou recusa) e devolve o executor, criado no primeiro uso.
+        with self._lock:
+            if self._pendentes >= self.fila_maxima:
+                self._recusadas += 1
+                raise SenhasSobrecarregadasError(
+                    f"Fila de verificação de senhas cheia ({self.fila_maxima} tarefas)."
+                )
+            self._pendentes += 1
+            if self._executor is None:
+                # 'spawn' evita herdar, via fork, as conexões e travas das threads do servidor.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processos, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _submeter(self, executor, funcao, *args):
+        # A vaga só volta à fila quando o processo termina (ou a tarefa é cancelada antes de
+        # começar): uma verificação que passou do tempo continua ocupando um processo, e
+        # liberar a vaga antes disso deixaria mais hashes rodando do que fila_maxima permite.
+        inicio = time.monotonic()
+        try:
+            futuro = executor.submit(funcao, *args)
+        except BaseException:
+            self._liberar(inicio)
+            raise
+        futuro.add_done_callback(lambda _futuro: self._liberar(inicio))
+        return futuro
+
+    def _liberar(self, inicio):
+        decorrido = time.monotonic() - inicio
+        with self._lock:
+            self._pendentes -= 1
+            self._tempo_total += decorrido
+            self._tempo_max = max(self._tempo_max, decorrido)
+
+    def _tempo_esgotado(self, futuro):
+        futuro.cancel()
+        with self._lock:
+            self._timeouts += 1
+        return SenhasSobrecarregadasError(f"A verificação de senha passou de {self.timeout:.1f}s.")
+
+    def _pool_quebrado(self, executor):
+        # Um processo de hash morreu: recria o pool na próxima chamada.
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+        return SenhasSobrecarregadasError("O pool de processos de senha foi reiniciado.")
+
+    def _contar(self, campo):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def _executar(self, funcao, *args):
+        executor = self._reservar()
+        try:
+            futuro = self._submeter(executor, funcao, *args)
+            return futuro.result(timeout=self.timeout)
+        except FuturoTimeoutError:
+            raise self._tempo_esgotado(futuro)
+        except BrokenProcessPool:
+            raise self._pool_quebrado(executor)
+
+    async def _executar_async(self, funcao, *args):
+        # Mesma fila e mesmos limites de _executar; o loop de eventos segue atendendo
+        # outras requisições enquanto o processo calcula o hash.
+        executor = self._reservar()
+        try:
+            futuro = self._submeter(executor, funcao, *args)
+            return await asyncio.wait_for(asyncio.wrap_future(futuro), self.timeout)
+        except asyncio.TimeoutError:
+            raise self._tempo_esgotado(futuro)
+        except BrokenProcessPool:
+            raise self._pool_quebrado(executor)
+
+    def verificar(self, senha_hash, senha):
+        """Confere a senha contra o hash guardado, fora das threads do servidor."""
+        resultado = self._executar(check_password_hash, senha_hash, senha)
+        self._contar('_verificacoes')
+        return resultado
+
+    def gerar_hash(self, senha):
+        """Gera o hash da senha com o método configurado, também no pool de processos."""
+        senha_hash = self._executar(generate_password_hash, senha, self.metodo)
+        self._contar('_hashes_gerados')
+        return senha_hash
+
+    async def verificar_async(self, senha_hash, senha):
+        """verificar() para o loop de eventos: aguarda o processo sem bloquear a thread."""
+        resultado = await self._executar_async(check_password_hash, senha_hash, senha)
+        self._contar('_verificacoes')
+        return resultado
+
+    async def gerar_hash_async(self, senha):
+        senha_hash = await self._executar_async(generate_password_hash, senha, self.metodo)
+        self._contar('_hashes_gerados')
+        return senha_hash
+
+    def precisa_rehash(self, senha_hash):
+        """True se o hash foi gerado com parâmetros diferentes dos configurados."""
+        return metodo_do_hash(senha_hash) != self.metodo
+
+    def encerrar(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def estatisticas(self):
+        with self._lock:
+            tarefas = self._verificacoes + self._hashes_gerados
+            return {
+                'metodo': self.metodo,
+                'processos': self.processos,
+                'fila_maxima': self.fila_maxima,
+                'pendentes': self._pendentes,
+                'verificacoes': self._verificacoes,
+                'hashes_gerados': self._hashes_gerados,
+                'recusadas': self._recusadas,
+                'timeouts': self._timeouts,
+                'tempo_medio_ms': round(self._tempo_total * 1000 / tarefas, 3) if tarefas else 0.0,
+                'tempo_max_ms': round(self._tempo_max * 1000, 3),
+            }
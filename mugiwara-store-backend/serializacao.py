@@ -0,0 +1,114 @@
+# --- Mapeamento de Linhas e Serialização JSON ---
+# Cada consulta declara suas colunas explicitamente (nunca SELECT *) por um
+# Mapeador, que gera uma única vez a função que transforma a tupla do cursor no
+# dict da API, como o namedtuple faz com suas classes. As respostas JSON saem
+# pelo orjson quando ele está instalado (com o json da biblioteca padrão como
+# alternativa), e Decimal, datas e UUIDs são serializados pelo próprio codificador.
+import json
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson  # Opcional: sem o pacote, o json da biblioteca padrão é usado
+except ImportError:
+    orjson = None
+
+
+class Mapeador:
+    """Converte linhas (tuplas) de uma consulta em dicts com chaves fixas.
+
+    `colunas` são as expressões do SELECT, na ordem; `nomes`, as chaves do dict
+    (por padrão, as próprias colunas); `conversores`, funções aplicadas a algumas
+    chaves (ex: {'preco': float}). Valores NULL nunca passam pelo conversor.
+    """
+
+    def __init__(self, colunas, nomes=None, conversores=None):
+        self.colunas = tuple(colunas)
+        self.nomes = tuple(nomes) if nomes else self.colunas
+        if len(self.nomes) != len(self.colunas):
+            raise ValueError("Mapeador: 'nomes' precisa ter uma chave por coluna.")
+        conversores = dict(conversores or {})
+        desconhecidos = set(conversores) - set(self.nomes)
+        if desconhecidos:
+            raise ValueError(f"Mapeador: conversores para chaves inexistentes: {', '.join(sorted(desconhecidos))}.")
+        self.posicoes = {nome: i for i, nome in enumerate(self.nomes)}
+        self.sql = ', '.join(self.colunas)
+        self.linha, self.linhas = self._compilar(conversores)
+
+    def _compilar(self, conversores):
+        # Gera "{'id_produto': r[0], 'preco': (None if r[3] is None else _c3(r[3])), ...}", um
+        # único dict literal, sem laço nem zip por linha; a versão para listas é uma list
+        # comprehension com o mesmo literal, sem uma chamada de função por linha.
+        ambiente, partes = {}, []
+        for i, nome in enumerate(self.nomes):
+            if nome in conversores:
+                ambiente[f'_c{i}'] = conversores[nome]
+                valor = f'(None if r[{i}] is None else _c{i}(r[{i}]))'
+            else:
+                valor = f'r[{i}]'
+            partes.append(f'{nome!r}: {valor}')
+        literal = f"{{{', '.join(partes)}}}"
+        return eval(f'lambda r: {literal}', ambiente), eval(f'lambda resultados: [{literal} for r in resultados]', ambiente)
+
+    def com_prefixo(self, apelido):
+        """Lista do SELECT qualificada pelo apelido da tabela (ex: 'p.id_pedido, p.data_pedido')."""
+        return ', '.join(f'{apelido}.{coluna}' for coluna in self.colunas)
+
+
+def valor_json(valor):
+    """Tipos que o JSON não tem: Decimal vira número, datas viram ISO 8601, UUID vira texto."""
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date, time)):
+        return valor.isoformat()
+    if isinstance(valor, uuid.UUID):
+        return str(valor)
+    raise TypeError(f"Objeto do tipo {type(valor).__name__} não é serializável em JSON")
+
+
+if orjson is not None:
+    # OPT_NON_STR_KEYS: aceita chaves inteiras (ex: larguras das variantes de imagem), como o json.
+    _OPCOES_ORJSON = orjson.OPT_NON_STR_KEYS
+
+    def codificar(dados):
+        """JSON compacto em UTF-8 (bytes)."""
+        return orjson.dumps(dados, default=valor_json, option=_OPCOES_ORJSON)
+
+    decodificar = orjson.loads
+else:
+    _codificador = json.JSONEncoder(default=valor_json, ensure_ascii=False, separators=(',', ':'))
+
+    def codificar(dados):
+        """JSON compacto em UTF-8 (bytes)."""
+        return _codificador.encode(dados).encode('utf-8')
+
+    decodificar = json.loads
+
+
+def codificador_em_uso():
+    return 'orjson' if orjson is not None else 'json'
+
+
+class ProvedorJSON(DefaultJSONProvider):
+    """app.json do Flask: jsonify, request.get_json e app.json.dumps passam pelo codificar()."""
+
+    sort_keys = False  # A ordem das chaves é a da montagem do dict; ordenar só custa tempo
+    ensure_ascii = False
+    default = staticmethod(valor_json)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)  # Opções específicas do json (indent, etc.)
+        return codificar(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return decodificar(s)
+
+    def response(self, *args, **kwargs):
+        dados = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(codificar(dados), mimetype=self.mimetype)
@@ -0,0 +1,724 @@
+# --- Modo de Serviço Assíncrono (ASGI) ---
+# Alternativa ao servidor do Flask para alta concorrência: as rotas mais
+# acessadas (catálogo, busca, login, pedidos e relatórios) rodam em um loop de
+# eventos (Starlette) sobre um pool assíncrono do asyncpg, de modo que uma
+# requisição esperando o banco não ocupa uma thread. Todas as demais rotas
+# (cadastros, uploads, importação, status, /metrics, página inicial) continuam
+# sendo do Flask, montado como aplicação WSGI em um pool de threads.
+#
+# SQL, mapeadores, cache do catálogo, métricas e regras das rotas vêm do app.py;
+# aqui ficam só as DAOs assíncronas e a camada HTTP. O trabalho pesado de CPU
+# sai do loop: senhas no pool de processos de senhas.py e a codificação JSON (e
+# compressão) de listas grandes em um pool de threads. As DAOs daqui leem do
+# primário; com DB_REPLICAS, as réplicas atendem as leituras das rotas do Flask.
+#
+# Uso (a partir de mugiwara-store-backend/):
+#     uvicorn servidor_async:app --host 0.0.0.0 --port 5000
+import asyncio  # Para o loop de eventos e o envio de trabalho de CPU a threads
+import contextlib  # Para o ciclo de vida do servidor e o empréstimo de conexões
+import functools  # Para os decorators das rotas e o cache das conversões de SQL
+import os  # Para as variáveis de ambiente
+import re  # Para traduzir os padrões de rota do Flask
+import threading  # Para proteger os contadores do pool
+import time  # Para medir latências
+from concurrent.futures import ThreadPoolExecutor
+
+import asyncpg  # Driver assíncrono do PostgreSQL
+import jwt
+from a2wsgi import WSGIMiddleware  # Executa o Flask (WSGI) dentro do servidor ASGI
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import http_date, parse_accept_header, parse_date, parse_etags, quote_etag
+
+from app import (
+    CABECALHO_LSN, CONSULTA_CONTA_POR_EMAIL, CONSULTA_PRODUTO_POR_ID, CONSULTAS_HISTORICO_CLIENTE,
+    CONSULTAS_RELATORIO_VENDAS, COOKIE_LSN, FORMATOS_FLUXO, ITERSIZE_FLUXO, LIMITE_MAXIMO_BUSCA, LIMITE_PADRAO_BUSCA,
+    LIMITE_PADRAO_CATALOGO, LIMITE_PADRAO_HISTORICO, LSN_SESSAO_SEGUNDOS, MAPAS_RELATORIO_VENDAS, SQL_BUSCA_PRODUTOS, SQL_CRIAR_PEDIDO, SQL_PEDIDOS_DO_CLIENTE,
+    SQL_RELATORIO_ESTOQUE, SQL_TODOS_PRODUTOS, TAMANHO_BLOCO_FLUXO,
+    app as app_flask, cache_catalogo, classe_da_rota, controle_admissao, fila_pedidos, liberador_reservas, compressor, conta_da_linha, consultas_preparadas, db_config, duracao_http,
+    entrada_do_catalogo, facetas_catalogo, feed_produtos, formato_de_fluxo, instrumentacao, ler_data,
+    ler_filtros_catalogo, ler_paginacao_historico, linha_para_pedido, linha_para_produto,
+    linha_para_produto_com_minimo, mapa_produto, mensagem_do_banco, metricas, montar_pagina_catalogo, montar_pagina_historico,
+    montar_relatorio_estoque, parametros_busca, parametros_historico, pedido_da_reserva, relatorio_mensal,
+    requisicoes_http, roteador, servico_senhas, sql_atualizar_hash, sql_pagina_catalogo, status_da_confirmacao,
+    token_de_acesso,
+)
+from consultas_preparadas import converter_marcadores
+from pool_conexoes import PoolEsgotadoError
+from replicas import SQL_LSN_PRIMARIO
+from senhas import SenhasSobrecarregadasError
+from venda_relampago import FilaDePedidosCheiaError
+from admissao import RequisicaoRecusadaError
+from serializacao import codificar, decodificar
+
+# --- Configuração ---
+# O pool assíncrono é separado do pool do psycopg2 (que segue atendendo as rotas do
+# Flask); somados, os dois precisam caber no max_connections do PostgreSQL.
+DB_ASYNC_POOL_MIN = int(os.getenv("DB_ASYNC_POOL_MIN", "2"))
+DB_ASYNC_POOL_MAX = int(os.getenv("DB_ASYNC_POOL_MAX", "20"))
+DB_ASYNC_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# O asyncpg prepara e guarda por conexão cada consulta executada (o equivalente às
+# consultas preparadas do app.py); DB_CONSULTAS_PREPARADAS=0 também desliga aqui.
+DB_ASYNC_CACHE_CONSULTAS = int(os.getenv("DB_ASYNC_CACHE_CONSULTAS", "100")) if consultas_preparadas.ativo else 0
+# Respostas com pelo menos tantos itens são codificadas (e comprimidas) fora do loop.
+ASYNC_LIMIAR_ITENS = int(os.getenv("ASYNC_LIMIAR_ITENS", "500"))
+ASYNC_THREADS_CPU = int(os.getenv("ASYNC_THREADS_CPU", "4"))
+ASYNC_THREADS_WSGI = int(os.getenv("ASYNC_THREADS_WSGI", "10"))  # Threads para as rotas que ficam no Flask
+
+executor_cpu = ThreadPoolExecutor(max_workers=ASYNC_THREADS_CPU, thread_name_prefix='async-cpu')
+_FIM_DO_FLUXO = object()
+
+
+# --- Pool de Conexões Assíncrono ---
+class PoolAssincrono:
+    """Pool do asyncpg: aberto na inicialização do servidor e fechado no encerramento."""
+
+    def __init__(self, config, minimo, maximo, timeout, cache_consultas):
+        self.config = config
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout  # Segundos de espera por uma conexão livre
+        self.cache_consultas = cache_consultas
+        self._pool = None
+
+        self._lock = threading.Lock()
+        self._emprestimos = 0
+        self._timeouts = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+
+    async def abrir(self):
+        self._pool = await asyncpg.create_pool(
+            **self.config, min_size=self.minimo, max_size=self.maximo,
+            statement_cache_size=self.cache_consultas, init=self._configurar
+        )
+
+    async def fechar(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    @staticmethod
+    async def _configurar(conn):
+        # Colunas e parâmetros json/jsonb com o mesmo codificador das respostas.
+        for tipo in ('json', 'jsonb'):
+            await conn.set_type_codec(tipo, schema='pg_catalog', encoder=lambda valor: codificar(valor).decode('utf-8'),
+                                      decoder=decodificar, format='text')
+
+    @contextlib.asynccontextmanager
+    async def conexao(self):
+        inicio = time.perf_counter()
+        try:
+            conn = await self._pool.acquire(timeout=self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            raise PoolEsgotadoError(f"Nenhuma conexão livre após {self.timeout:.1f}s ({self.maximo} em uso).")
+        espera = time.perf_counter() - inicio
+        with self._lock:
+            self._emprestimos += 1
+            self._espera_total += espera
+            self._espera_max = max(self._espera_max, espera)
+        try:
+            yield conn
+        finally:
+            await self._pool.release(conn)
+
+    def estatisticas(self):
+        with self._lock:
+            estatisticas = {
+                'minimo': self.minimo,
+                'maximo': self.maximo,
+                'abertas': self._pool.get_size() if self._pool else 0,
+                'livres': self._pool.get_idle_size() if self._pool else 0,
+                'emprestimos': self._emprestimos,
+                'timeouts': self._timeouts,
+                'espera_media_ms': round(self._espera_total * 1000 / self._emprestimos, 3) if self._emprestimos else 0.0,
+                'espera_max_ms': round(self._espera_max * 1000, 3),
+                'cache_consultas': self.cache_consultas,
+            }
+        return estatisticas
+
+
+pool_async = PoolAssincrono(
+    db_config,
+    minimo=DB_ASYNC_POOL_MIN,
+    maximo=DB_ASYNC_POOL_MAX,
+    timeout=DB_ASYNC_POOL_TIMEOUT,
+    cache_consultas=DB_ASYNC_CACHE_CONSULTAS
+)
+metricas.registrar_estatisticas('mugiwara_pool_async', 'Pool de conexões assíncrono', pool_async.estatisticas)
+
+
+@functools.lru_cache(maxsize=512)
+def sql_asyncpg(sql):
+    """SQL do psycopg2 (%s / %(nome)s) -> SQL do asyncpg ($1, $2...) e a ordem dos parâmetros."""
+    return converter_marcadores(sql.strip().rstrip(';'))
+
+
+def valores_asyncpg(chaves, parametros):
+    if isinstance(parametros, dict):
+        return [parametros[chave] for chave in chaves]
+    return list(parametros or ())
+
+
+# --- DAOs Assíncronas ---
+# Mesmos métodos, consultas e formatos de retorno das DAOs do app.py, com await.
+class BaseDAOAsync:
+    def __init_subclass__(cls, **kwargs):
+        # Medidas como as DAOs síncronas (a instrumentação reconhece corrotinas).
+        super().__init_subclass__(**kwargs)
+        instrumentacao.instrumentar_dao(cls)
+
+    async def _comando(self, executar, sql, parametros):
+        texto, chaves = sql_asyncpg(sql)
+        inicio = time.perf_counter()
+        try:
+            resultado = await executar(texto, *valores_asyncpg(chaves, parametros))
+        except Exception:
+            instrumentacao.registrar_sql(sql, time.perf_counter() - inicio, erro=True)
+            raise
+        linhas = len(resultado) if isinstance(resultado, list) else None
+        instrumentacao.registrar_sql(sql, time.perf_counter() - inicio, linhas)
+        return resultado
+
+    async def _buscar(self, conn, sql, parametros=None):
+        # Todas as linhas (Record aceita r[0], como as tuplas do psycopg2).
+        return await self._comando(conn.fetch, sql, parametros)
+
+    async def _executar(self, conn, sql, parametros=None):
+        # Comando sem linhas; devolve o status do PostgreSQL (ex: 'UPDATE 1').
+        return await self._comando(conn.execute, sql, parametros)
+
+    async def _iterar_consulta(self, sql, parametros, mapear, itersize=ITERSIZE_FLUXO):
+        # Cursor do servidor dentro de uma transação: o PostgreSQL entrega as linhas em
+        # lotes de `itersize` e a conexão volta ao pool quando o gerador termina.
+        texto, chaves = sql_asyncpg(sql)
+        async with pool_async.conexao() as conn:
+            async with conn.transaction(readonly=True):
+                async for linha in conn.cursor(texto, *valores_asyncpg(chaves, parametros), prefetch=itersize):
+                    yield mapear(linha)
+
+
+class ProdutoDAOAsync(BaseDAOAsync):
+    def iterarTodos(self):
+        return self._iterar_consulta(SQL_TODOS_PRODUTOS, None, linha_para_produto)
+
+    async def listarPagina(self, categoria=None, preco_min=None, preco_max=None, ordem='nome_asc', apos=None, limite=LIMITE_PADRAO_CATALOGO):
+        try:
+            sql_query, params, sql_facetas, params_facetas = sql_pagina_catalogo(
+                categoria, preco_min, preco_max, ordem, apos, limite)
+            async with pool_async.conexao() as conn:
+                pagina = montar_pagina_catalogo(await self._buscar(conn, sql_query, params), limite, ordem)
+                if sql_facetas:
+                    pagina['facetas'] = facetas_catalogo(await self._buscar(conn, sql_facetas, params_facetas))
+            return pagina
+        except Exception as e:
+            print(f"Erro ao listar página de produtos: {e}")
+            return None
+
+    async def pesquisarPorNome(self, nome, limite=LIMITE_PADRAO_BUSCA):
+        try:
+            async with pool_async.conexao() as conn:
+                return mapa_produto.linhas(await self._buscar(conn, SQL_BUSCA_PRODUTOS, parametros_busca(nome, limite)))
+        except Exception as e:
+            print(f"Erro ao pesquisar produtos por nome: {e}")
+            return []
+
+    async def exibirUm(self, id_produto):
+        try:
+            async with pool_async.conexao() as conn:
+                resultados = await self._buscar(conn, consultas_preparadas.sql(CONSULTA_PRODUTO_POR_ID), (id_produto,))
+            return linha_para_produto_com_minimo(resultados[0]) if resultados else None
+        except Exception as e:
+            print(f"Erro ao buscar produto: {e}")
+            return None
+
+    async def gerarRelatorioEstoque(self):
+        try:
+            async with pool_async.conexao() as conn:
+                return montar_relatorio_estoque(await self._buscar(conn, SQL_RELATORIO_ESTOQUE))
+        except Exception as e:
+            print(f"Erro ao gerar relatório de estoque: {e}")
+            return {}
+
+
+class ContaDAOAsync(BaseDAOAsync):
+    async def buscar_por_email(self, email):
+        try:
+            async with pool_async.conexao() as conn:
+                resultados = await self._buscar(conn, consultas_preparadas.sql(CONSULTA_CONTA_POR_EMAIL), {'email': email})
+            return conta_da_linha(resultados[0]) if resultados else None
+        except Exception as e:
+            print(f"Erro ao buscar conta por email: {e}")
+            return None
+
+    async def atualizar_hash(self, tipo, id_conta, hash_antigo, hash_novo):
+        try:
+            async with pool_async.conexao() as conn:
+                status = await self._executar(conn, sql_atualizar_hash(tipo), (hash_novo, id_conta, hash_antigo))
+            return status == 'UPDATE 1'
+        except Exception as e:
+            print(f"Erro ao atualizar hash de senha: {e}")
+            return False
+
+
+class PedidoDAOAsync(BaseDAOAsync):
+    async def criar_pedido(self, id_cliente, id_funcionario, carrinho):
+        try:
+            async with pool_async.conexao() as conn:
+                async with conn.transaction():
+                    # O parâmetro p_itens é JSON: o codec da conexão serializa a lista de itens.
+                    resultados = await self._buscar(conn, SQL_CRIAR_PEDIDO, (
+                        id_cliente, id_funcionario, carrinho['forma_pagamento'], carrinho['itens']))
+                if roteador.ativo:
+                    # Com réplicas, o LSN do commit vai ao cliente: as rotas do Flask leem delas.
+                    try:
+                        roteador.registrar_lsn(await conn.fetchval(SQL_LSN_PRIMARIO))
+                    except Exception as e:
+                        print(f"Erro ao ler o LSN após o pedido: {e}")
+            cache_catalogo.invalidar()  # O estoque mudou: descarta as leituras do catálogo em cache
+            return {"status": "sucesso", "id_pedido": resultados[0][0]}
+        except Exception as e:
+            mensagem_erro = mensagem_do_banco(e)
+            print(f"Erro ao chamar procedure de pedido: {mensagem_erro}")
+            return {"status": "erro", "mensagem": mensagem_erro}
+
+    def iterar_por_cliente(self, id_cliente):
+        return self._iterar_consulta(SQL_PEDIDOS_DO_CLIENTE, (id_cliente,), linha_para_pedido)
+
+    async def listar_pagina_por_cliente(self, id_cliente, apos=None, limite=LIMITE_PADRAO_HISTORICO, com_itens=False):
+        try:
+            sql = consultas_preparadas.sql(CONSULTAS_HISTORICO_CLIENTE[(bool(apos), bool(com_itens))])
+            async with pool_async.conexao() as conn:
+                resultados = await self._buscar(conn, sql, parametros_historico(id_cliente, apos, limite))
+            return montar_pagina_historico(resultados, limite, com_itens)
+        except Exception as e:
+            print(f"Erro ao listar página do histórico de pedidos: {e}")
+            return None
+
+
+class RelatorioDAOAsync(BaseDAOAsync):
+    async def gerar_relatorio_vendas(self, inicio=None, fim=None, agrupar='vendedor'):
+        try:
+            sql, _ = CONSULTAS_RELATORIO_VENDAS[agrupar]
+            async with pool_async.conexao() as conn:
+                return MAPAS_RELATORIO_VENDAS[agrupar].linhas(await self._buscar(conn, sql, {'inicio': inicio, 'fim': fim}))
+        except Exception as e:
+            print(f"Erro ao gerar relatório de vendas por {agrupar}: {e}")
+            return None
+
+    async def gerar_relatorio_vendas_mensal(self):
+        relatorio = await self.gerar_relatorio_vendas(agrupar='vendedor')
+        return relatorio_mensal(relatorio) if relatorio is not None else None
+
+
+# --- RESPOSTAS ---
+def _itens(dados):
+    # Tamanho aproximado da resposta: itens das listas no topo (ex: pagina['produtos']).
+    if isinstance(dados, list):
+        return len(dados)
+    if isinstance(dados, dict):
+        return sum(len(v) for v in dados.values() if isinstance(v, list))
+    return 0
+
+
+async def fora_do_loop(funcao, *args):
+    """Executa trabalho de CPU (JSON, compressão) em uma thread, liberando o loop para outras requisições."""
+    return await asyncio.get_running_loop().run_in_executor(executor_cpu, functools.partial(funcao, *args))
+
+
+def codificacao_aceita(request):
+    return compressor.escolher(parse_accept_header(request.headers.get('accept-encoding')))
+
+
+def _serializar(dados, codificacao):
+    corpo = codificar(dados)
+    if codificacao is None or len(corpo) < compressor.minimo_bytes:
+        return corpo, None
+    return compressor.comprimir_corpo(corpo, codificacao), codificacao
+
+
+async def resposta_json(request, dados, status=200):
+    """Equivalente ao jsonify, com a compressão do after_request do Flask."""
+    codificacao = codificacao_aceita(request) if 200 <= status < 300 else None
+    if _itens(dados) >= ASYNC_LIMIAR_ITENS:
+        corpo, codificacao = await fora_do_loop(_serializar, dados, codificacao)
+    else:
+        corpo, codificacao = _serializar(dados, codificacao)
+    cabecalhos = {'Vary': 'Accept-Encoding'}
+    if codificacao:
+        cabecalhos['Content-Encoding'] = codificacao
+    return Response(corpo, status_code=status, media_type='application/json', headers=cabecalhos)
+
+
+def _nao_modificado(request, etag, modificado_em):
+    se_diferente = request.headers.get('if-none-match')
+    if se_diferente is not None:
+        # Comparação fraca, como o make_conditional: a versão comprimida tem ETag fraco.
+        return parse_etags(se_diferente).contains_weak(etag)
+    desde = parse_date(request.headers.get('if-modified-since'))
+    return desde is not None and modificado_em.replace(microsecond=0) <= desde
+
+
+async def resposta_do_catalogo(request, chave, carregar):
+    """Versão assíncrona de app.resposta_do_catalogo: mesmo cache, ETag, Last-Modified e 304."""
+    entrada = cache_catalogo.obter(chave)
+    if entrada is None:
+        geracao = cache_catalogo.geracao
+        dados = await carregar()
+        if dados is None:
+            return None  # Erros e "não encontrado" não vão para o cache
+        if _itens(dados) >= ASYNC_LIMIAR_ITENS:
+            entrada = await fora_do_loop(entrada_do_catalogo, dados)
+        else:
+            entrada = entrada_do_catalogo(dados)
+        cache_catalogo.guardar(chave, entrada, geracao)
+    corpo, etag, modificado_em = entrada
+
+    codificacao = codificacao_aceita(request) if len(corpo) >= compressor.minimo_bytes else None
+    cabecalhos = {
+        # Cada codificação é uma representação diferente: o ETag deixa de ser forte.
+        'ETag': quote_etag(etag, weak=codificacao is not None),
+        'Last-Modified': http_date(modificado_em),
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept-Encoding',
+    }
+    if _nao_modificado(request, etag, modificado_em):
+        return Response(status_code=304, headers=cabecalhos)
+    if codificacao:
+        # Quase sempre um acerto no cache do compressor (o corpo e o ETag se repetem).
+        corpo = await fora_do_loop(compressor.comprimir_corpo, corpo, codificacao, etag)
+        cabecalhos['Content-Encoding'] = codificacao
+    return Response(corpo, media_type='application/json', headers=cabecalhos)
+
+
+async def resposta_em_fluxo(itens, formato):
+    """Versão assíncrona de app.resposta_em_fluxo. Devolve None se a consulta falhar antes do primeiro item."""
+    try:
+        # Busca o primeiro item antes de responder, para que erros na consulta ainda virem 500.
+        primeiro = await itens.__anext__()
+    except StopAsyncIteration:
+        primeiro = _FIM_DO_FLUXO
+    except Exception as e:
+        print(f"Erro ao iniciar resposta em fluxo: {e}")
+        await itens.aclose()
+        return None
+
+    async def gerar():
+        partes, tamanho, indice = [], 0, 0
+        try:
+            if primeiro is not _FIM_DO_FLUXO:
+                item = primeiro
+                while True:
+                    if formato == 'ndjson':
+                        texto = codificar(item) + b'\n'
+                    else:
+                        texto = (b'[' if indice == 0 else b',') + codificar(item)
+                    partes.append(texto)
+                    tamanho += len(texto)
+                    indice += 1
+                    if tamanho >= TAMANHO_BLOCO_FLUXO:
+                        yield b''.join(partes)
+                        partes, tamanho = [], 0
+                    try:
+                        item = await itens.__anext__()
+                    except StopAsyncIteration:
+                        break
+                if formato == 'json':
+                    partes.append(b']')
+            elif formato == 'json':
+                partes.append(b'[]')
+            yield b''.join(partes)
+        except Exception as e:
+            # O status 200 já foi enviado: só resta registrar e encerrar a resposta (que fica incompleta).
+            print(f"Erro durante resposta em fluxo: {e}")
+        finally:
+            await itens.aclose()  # Devolve a conexão ao pool mesmo se o cliente desconectar no meio
+
+    return StreamingResponse(gerar(), media_type=FORMATOS_FLUXO[formato])
+
+
+async def ler_json(request):
+    # Corpo JSON da requisição, ou None se vazio/inválido (as rotas tratam como dados ausentes).
+    try:
+        return decodificar(await request.body())
+    except ValueError:
+        return None
+
+
+async def senhas_sobrecarregadas(request, e):
+    print(f"Login/registro recusado: {e}")
+    resposta = await resposta_json(request, {'message': 'Muitas requisições de login no momento. Tente novamente em instantes.'}, 503)
+    resposta.headers['Retry-After'] = '1'
+    return resposta
+
+
+async def fila_pedidos_cheia(request, e):
+    print(f"Confirmação de pedido recusada: {e}")
+    resposta = await resposta_json(request, {'status': 'erro', 'mensagem': 'Muitos pedidos no momento. Tente novamente em instantes.'}, 503)
+    resposta.headers['Retry-After'] = '1'
+    return resposta
+
+
+async def requisicao_recusada(request, e):
+    print(f"Requisição recusada pelo controle de admissão: {e}")
+    resposta = await resposta_json(request, {'status': 'erro', 'mensagem': 'Servidor ocupado no momento. Tente novamente em instantes.',
+                                             'classe': e.classe}, e.status)
+    resposta.headers['Retry-After'] = str(e.retry_after)
+    return resposta
+
+
+# --- ROTAS ---
+rotas = []
+
+
+def rota(caminho, metodos=('GET',)):
+    """Registra o endpoint com o padrão de rota do Flask (também usado como rótulo nas métricas HTTP
+    e na classe do controle de admissão, a mesma das rotas do Flask)."""
+    caminho_starlette = re.sub(r'<int:(\w+)>', r'{\1:int}', caminho)
+
+    def registrar(endpoint):
+        @functools.wraps(endpoint)
+        async def medido(request):
+            inicio = time.perf_counter()
+            classe = classe_da_rota(request.method, caminho, request.query_params)
+            try:
+                # Espera a vaga sem ocupar o loop. Aqui a vaga vale até o início da resposta:
+                # nas respostas em fluxo, o pool assíncrono já limita as conexões em uso.
+                request.state.ficha_admissao = await controle_admissao.entrar_async(classe) if classe else None
+            except RequisicaoRecusadaError as e:
+                resposta = await requisicao_recusada(request, e)
+            else:
+                try:
+                    resposta = await endpoint(request)
+                finally:
+                    liberar_vaga_de_admissao(request)
+            duracao_http.observar(time.perf_counter() - inicio, request.method, caminho)
+            requisicoes_http.incrementar(request.method, caminho, str(resposta.status_code))
+            return resposta
+        rotas.append(Route(caminho_starlette, medido, methods=list(metodos)))
+        return endpoint
+    return registrar
+
+
+def liberar_vaga_de_admissao(request):
+    # Como no app.py: devolve a vaga antes do fim da requisição (sem efeito se já devolvida).
+    ficha, request.state.ficha_admissao = getattr(request.state, 'ficha_admissao', None), None
+    controle_admissao.sair(ficha)
+
+
+def token_obrigatorio(endpoint):
+    # Mesmas regras do token_required do app.py.
+    @functools.wraps(endpoint)
+    async def decorado(request):
+        token = request.headers.get('x-access-token')
+        if not token:
+            return await resposta_json(request, {'message': 'Token está faltando!'}, 401)
+        try:
+            dados = jwt.decode(token, app_flask.config['SECRET_KEY'], algorithms=["HS256"])
+        except Exception:
+            return await resposta_json(request, {'message': 'Token é inválido!'}, 401)
+        return await endpoint(request, dados)
+    return decorado
+
+
+@rota('/api/login', ('POST',))
+async def login(request):
+    auth = await ler_json(request)
+    if not isinstance(auth, dict) or not auth.get('email') or not auth.get('senha'):
+        return await resposta_json(request, {'message': 'Não foi possível verificar'}, 401)
+
+    conta_dao = ContaDAOAsync()
+    user = await conta_dao.buscar_por_email(auth['email'])
+    if not user:
+        return await resposta_json(request, {'message': 'Email não encontrado!'}, 401)
+
+    try:
+        # O hash roda no pool de processos; o loop só aguarda o resultado.
+        senha_correta = await servico_senhas.verificar_async(user['senha_hash'], auth['senha'])
+    except SenhasSobrecarregadasError as e:
+        return await senhas_sobrecarregadas(request, e)
+    if not senha_correta:
+        return await resposta_json(request, {'message': 'Senha incorreta!'}, 401)
+
+    # Se o custo do hash mudou, aproveita a senha em mãos para refazê-lo
+    if servico_senhas.precisa_rehash(user['senha_hash']):
+        try:
+            novo_hash = await servico_senhas.gerar_hash_async(auth['senha'])
+            await conta_dao.atualizar_hash(user['tipo'], user['id'], user['senha_hash'], novo_hash)
+        except SenhasSobrecarregadasError as e:
+            print(f"Rehash adiado para o próximo login: {e}")
+    return await resposta_json(request, {'token': token_de_acesso(user)})
+
+
+@rota('/api/pedidos', ('POST',))
+@token_obrigatorio
+async def criar_pedido_api(request, current_user):
+    if current_user['tipo'] != 'cliente':
+        return await resposta_json(request, {'message': 'Acesso negado: apenas clientes podem fazer compras.'}, 403)
+    dados_carrinho = await ler_json(request)
+    roteador.iniciar_requisicao()
+    if isinstance(dados_carrinho, dict) and 'id_reserva' in dados_carrinho:
+        # Venda relâmpago: a mesma fila de pedidos em lote do Flask, esperada sem ocupar o loop.
+        try:
+            pedido = pedido_da_reserva(current_user['id'], dados_carrinho)
+        except ValueError as e:
+            return await resposta_json(request, {'message': str(e)}, 400)
+        liberar_vaga_de_admissao(request)  # A espera pelo lote não ocupa vaga do checkout (ver app.py)
+        try:
+            resultado = await fila_pedidos.confirmar_async(pedido)
+        except FilaDePedidosCheiaError as e:
+            return await fila_pedidos_cheia(request, e)
+        lsn = resultado.pop('lsn', None)
+        if lsn:
+            roteador.registrar_lsn(lsn)
+        status = status_da_confirmacao(resultado)
+    elif not isinstance(dados_carrinho, dict) or not dados_carrinho.get('itens'):
+        return await resposta_json(request, {'message': 'Carrinho vazio ou dados inválidos.'}, 400)
+    else:
+        resultado = await PedidoDAOAsync().criar_pedido(current_user['id'], 1, dados_carrinho)
+        status = 201 if resultado['status'] == 'sucesso' else 400
+    resposta = await resposta_json(request, resultado, status)
+    lsn = roteador.lsn_escrito()
+    if lsn:
+        resposta.headers[CABECALHO_LSN] = lsn
+        resposta.set_cookie(COOKIE_LSN, lsn, max_age=LSN_SESSAO_SEGUNDOS, httponly=True, samesite='lax')
+    return resposta
+
+
+@rota('/api/produtos')
+async def produtos_api(request):
+    # POST (criação de produto) continua no Flask.
+    try:
+        formato = formato_de_fluxo(request.query_params)
+        filtros = ler_filtros_catalogo(request.query_params)
+    except ValueError as e:
+        return await resposta_json(request, {"status": "erro", "mensagem": str(e)}, 400)
+    dao = ProdutoDAOAsync()
+    if formato:
+        resposta = await resposta_em_fluxo(dao.iterarTodos(), formato)
+    else:
+        chave = ('pagina', tuple(sorted(filtros.items())))
+        resposta = await resposta_do_catalogo(request, chave, lambda: dao.listarPagina(**filtros))
+    if resposta is None:
+        return await resposta_json(request, {"status": "erro", "mensagem": "Não foi possível listar os produtos."}, 500)
+    return resposta
+
+
+@rota('/api/produtos/<int:id_produto>')
+async def produto_especifico_api(request):
+    # PUT e DELETE continuam no Flask.
+    id_produto = request.path_params['id_produto']
+    resposta = await resposta_do_catalogo(request, ('produto', id_produto), lambda: ProdutoDAOAsync().exibirUm(id_produto))
+    if resposta is None:
+        return await resposta_json(request, {"status": "erro", "mensagem": "Produto não encontrado."}, 404)
+    return resposta
+
+
+@rota('/api/produtos/buscar')
+async def buscar_produto_api(request):
+    nome = (request.query_params.get('nome') or '').strip()
+    if not nome:
+        return await resposta_json(request, {"status": "erro", "mensagem": "Parâmetro 'nome' é obrigatório."}, 400)
+    try:
+        limite = int(request.query_params.get('limite', LIMITE_PADRAO_BUSCA))
+    except ValueError:
+        limite = LIMITE_PADRAO_BUSCA  # Como o type=int do Flask: valor inválido vira o padrão
+    produtos = await ProdutoDAOAsync().pesquisarPorNome(nome, max(1, min(limite, LIMITE_MAXIMO_BUSCA)))
+    return await resposta_json(request, produtos)
+
+
+@rota('/api/produtos/relatorio')
+async def relatorio_estoque_api(request):
+    async def carregar():
+        return await ProdutoDAOAsync().gerarRelatorioEstoque() or None
+    resposta = await resposta_do_catalogo(request, ('relatorio',), carregar)
+    if resposta is None:
+        return await resposta_json(request, {})
+    return resposta
+
+
+@rota('/api/pedidos/historico')
+@token_obrigatorio
+async def get_historico_pedidos(request, current_user):
+    if current_user['tipo'] != 'cliente':
+        return await resposta_json(request, {'message': 'Acesso negado'}, 403)
+    try:
+        formato = formato_de_fluxo(request.query_params)
+        paginacao = ler_paginacao_historico(request.query_params)
+    except ValueError as e:
+        return await resposta_json(request, {'message': str(e)}, 400)
+
+    dao = PedidoDAOAsync()
+    if formato:
+        resposta = await resposta_em_fluxo(dao.iterar_por_cliente(current_user['id']), formato)
+        return resposta if resposta is not None else await resposta_json(request, {'message': 'Erro ao listar pedidos.'}, 500)
+    pagina = await dao.listar_pagina_por_cliente(current_user['id'], **paginacao)
+    if pagina is None:
+        return await resposta_json(request, {'message': 'Erro ao listar pedidos.'}, 500)
+    return await resposta_json(request, pagina)
+
+
+@rota('/api/relatorios/vendas-mensal')
+@token_obrigatorio
+async def get_relatorio_vendas(request, current_user):
+    if current_user['tipo'] != 'funcionario':
+        return await resposta_json(request, {'message': 'Acesso negado: funcionalidade restrita a funcionários.'}, 403)
+    relatorio = await RelatorioDAOAsync().gerar_relatorio_vendas_mensal()
+    if relatorio is None:
+        return await resposta_json(request, {'message': 'Erro ao gerar o relatório.'}, 500)
+    return await resposta_json(request, relatorio)
+
+
+@rota('/api/relatorios/vendas')
+@token_obrigatorio
+async def get_relatorio_vendas_periodo(request, current_user):
+    if current_user['tipo'] != 'funcionario':
+        return await resposta_json(request, {'message': 'Acesso negado: funcionalidade restrita a funcionários.'}, 403)
+    agrupar = request.query_params.get('agrupar', 'vendedor')
+    if agrupar not in CONSULTAS_RELATORIO_VENDAS:
+        return await resposta_json(request, {'message': f"Agrupamento inválido. Use um de: {', '.join(CONSULTAS_RELATORIO_VENDAS)}."}, 400)
+    try:
+        inicio = ler_data(request.query_params.get('inicio'))
+        fim = ler_data(request.query_params.get('fim'))
+    except ValueError:
+        return await resposta_json(request, {'message': 'Datas devem estar no formato AAAA-MM-DD.'}, 400)
+    if inicio and fim and inicio > fim:
+        return await resposta_json(request, {'message': "'inicio' não pode ser posterior a 'fim'."}, 400)
+    relatorio = await RelatorioDAOAsync().gerar_relatorio_vendas(inicio, fim, agrupar)
+    if relatorio is None:
+        return await resposta_json(request, {'message': 'Erro ao gerar o relatório.'}, 500)
+    return await resposta_json(request, relatorio)
+
+
+@rota('/api/status/pool-async')
+@token_obrigatorio
+async def get_status_pool_async(request, current_user):
+    if current_user['tipo'] != 'funcionario':
+        return await resposta_json(request, {'message': 'Acesso negado: funcionalidade restrita a funcionários.'}, 403)
+    return await resposta_json(request, pool_async.estatisticas())
+
+
+# --- APLICAÇÃO ASGI ---
+@contextlib.asynccontextmanager
+async def ciclo_de_vida(_app):
+    await pool_async.abrir()
+    feed_produtos.iniciar()  # No Flask, começa no primeiro acesso; aqui, junto com o servidor
+    liberador_reservas.iniciar()
+    try:
+        yield
+    finally:
+        await pool_async.fechar()
+        executor_cpu.shutdown(wait=False)
+
+
+# Rotas assíncronas primeiro; qualquer outro caminho ou método (ex: POST /api/produtos) cai no Flask.
+app = Starlette(
+    routes=rotas + [Mount('/', app=WSGIMiddleware(app_flask, workers=ASYNC_THREADS_WSGI))],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=ciclo_de_vida,
+)
@@ -1,6 +1,11 @@
 // Inicializa a aplicação Vue.js
 const { createApp } = Vue
 
+// Imagens enviadas pelo upload têm o hash do conteúdo como nome e variantes WebP
+// nas larguras abaixo (as mesmas de LARGURAS_VARIANTES em imagens.py).
+const IMAGEM_ENVIADA = /^(\/static\/uploads\/produtos\/[0-9a-f]{32})\.(png|jpg|gif|webp)$/;
+const LARGURAS_IMAGEM = [320, 640];
+
 createApp({
     // 'data' é uma função que retorna o estado inicial da nossa aplicação.
     // Todas as variáveis reativas vivem aqui.
@@ -24,6 +29,12 @@ createApp({
                 imagem: ''
             },
             searchTerm: '', // Armazena o termo de busca do usuário.
+            suggestions: [], // Sugestões do autocomplete para o termo digitado.
+            suggestTimer: null, // Timer para esperar o usuário parar de digitar antes de consultar a API.
+            productFeed: null, // Conexão SSE com o feed de alterações do catálogo
+            feedConectado: false, // Enquanto conectado, o feed mantém os produtos atualizados sem recarregar a lista
+            feedJaConectou: false,
+            catalogRefreshTimer: null,
             report: null, // Armazena os dados do relatório de estoque.
             showReport: false, // Controla a visibilidade do card de relatório.
             // Filtros e ordenação
@@ -31,6 +42,12 @@ createApp({
             sortOption: 'nome_asc', // Opção de ordenação selecionada.
             priceMin: null, // Valor mínimo para o filtro de preço.
             priceMax: null, // Valor máximo para o filtro de preço.
+            // --- PAGINAÇÃO DO CATÁLOGO (feita no servidor) ---
+            catalogMode: true, // true quando 'produtos' veio do catálogo paginado (já filtrado e ordenado pela API).
+            nextCursor: null, // Cursor da próxima página, ou null quando não há mais produtos.
+            pageSize: 24, // Quantidade de produtos por página.
+            loadingMore: false, // Controla o botão "Carregar mais".
+            categoryFacets: [], // Contagem de produtos por categoria, calculada pela API.
             
             // --- DADOS PARA UPLOAD DE IMAGEM ---
             imageUploadMode: 'url', // Controla qual input de imagem é mostrado: 'url' ou 'upload'.
@@ -74,6 +91,8 @@ createApp({
             userProfile: null,
             showHistoryModal: false,
             orderHistory: [],
+            historyCursor: null, // Cursor da próxima página do histórico
+            loadingMoreHistory: false,
             showSalesReportModal: false,
             salesReportData: null,
             showRegisterFuncionarioModal: false,
@@ -92,19 +111,29 @@ createApp({
     mounted() {
         this.checkForToken(); // Verifica se já existe um token ao carregar a página.
         this.fetchProdutos(); // Busca os produtos da API assim que a página carrega.
+        this.connectProductFeed(); // Passa a receber as alterações de estoque/preço em tempo real
         this.fetchVendedores(); // Busca a lista de vendedores para o dropdown do carrinho
     },
     // 'computed' são propriedades que calculam seu valor com base em outras propriedades.
     // Elas são reativas e se atualizam automaticamente.
     computed: {
-        // Gera uma lista de categorias únicas a partir dos produtos existentes para usar no filtro.
+        // Lista de categorias para o filtro. No catálogo vem das facetas da API,
+        // que conhecem todas as categorias e não só as da página carregada.
         uniqueCategories() {
+            if (this.categoryFacets.length > 0) {
+                return this.categoryFacets.map(f => f.categoria);
+            }
             const categories = this.produtos.map(p => p.categoria);
             return [...new Set(categories)].sort();
         },
         // A propriedade principal que aplica todos os filtros e ordenações.
         // A interface sempre exibirá o resultado desta função.
         filteredProdutos() {
+            // O catálogo paginado já chega filtrado e ordenado pelo servidor.
+            if (this.catalogMode) {
+                return this.produtos;
+            }
+
             let filtered = [...this.produtos]; // Cria uma cópia para não modificar o array original.
 
             // 1. Filtro por Categoria
@@ -156,8 +185,32 @@ createApp({
             return this.cart.reduce((total, item) => total + item.quantidade, 0);
         }
     },
+    // 'watch' reage a mudanças nos filtros: no catálogo, cada mudança busca
+    // a primeira página novamente no servidor.
+    watch: {
+        searchTerm() { this.scheduleSuggestions(); },
+        categoryFilter() { this.refetchCatalog(); },
+        sortOption() { this.refetchCatalog(); },
+        priceMin() { this.refetchCatalog(); },
+        priceMax() { this.refetchCatalog(); }
+    },
     // 'methods' contém as funções que podemos chamar a partir da nossa interface.
     methods: {
+        // --- IMAGENS RESPONSIVAS ---
+        // URL da variante mais próxima da largura pedida (ou a própria imagem, se não for um upload).
+        imagemNaLargura(url, largura) {
+            const encontrado = IMAGEM_ENVIADA.exec(url || '');
+            if (!encontrado) return url;
+            const escolhida = LARGURAS_IMAGEM.find(l => l >= largura) || LARGURAS_IMAGEM[LARGURAS_IMAGEM.length - 1];
+            return `${encontrado[1]}-${escolhida}.webp`;
+        },
+        // srcset com todas as variantes; o navegador baixa só a que cabe no card.
+        srcsetDaImagem(url) {
+            const encontrado = IMAGEM_ENVIADA.exec(url || '');
+            if (!encontrado) return null;
+            return LARGURAS_IMAGEM.map(l => `${encontrado[1]}-${l}.webp ${l}w`).join(', ');
+        },
+
         // --- MÉTODOS DE AUTENTICAÇÃO ---
         checkForToken() {
             const token = localStorage.getItem('authToken');
@@ -270,13 +323,93 @@ createApp({
             };
         },
 
+        // Monta a URL do catálogo com os filtros atuais e, opcionalmente, o cursor da página.
+        buildCatalogUrl(cursor = null) {
+            const params = new URLSearchParams({ ordem: this.sortOption, limite: this.pageSize });
+            if (this.categoryFilter) params.set('categoria', this.categoryFilter);
+            if (this.priceMin !== null && this.priceMin !== '') params.set('preco_min', this.priceMin);
+            if (this.priceMax !== null && this.priceMax !== '') params.set('preco_max', this.priceMax);
+            if (cursor) params.set('cursor', cursor);
+            return `${this.apiUrl}?${params}`;
+        },
+
+        refetchCatalog() {
+            if (this.catalogMode) this.fetchProdutos();
+        },
+
+        // --- Feed de alterações (Server-Sent Events) ---
+        // O servidor envia eventos compactos {op, p: [[id, estoque, preco, detalhes], ...]};
+        // cada produto é atualizado no lugar, sem baixar o catálogo de novo.
+        connectProductFeed() {
+            if (!window.EventSource) return;
+            const feed = new EventSource(`${this.apiUrl}/stream`);
+            feed.addEventListener('produtos', (e) => this.applyProductEvent(JSON.parse(e.data)));
+            feed.addEventListener('recarregar', () => this.scheduleCatalogRefresh());
+            feed.onopen = () => {
+                // Numa reconexão, eventos podem ter se perdido: relê a página atual.
+                if (this.feedJaConectou && !this.feedConectado) this.scheduleCatalogRefresh();
+                this.feedConectado = true;
+                this.feedJaConectou = true;
+            };
+            feed.onerror = () => {
+                this.feedConectado = false; // O EventSource tenta reconectar sozinho
+            };
+            this.productFeed = feed;
+        },
+        applyProductEvent(evento) {
+            for (const [id, estoque, preco, detalhes] of evento.p) {
+                if (evento.op === 'D') {
+                    this.produtos = this.produtos.filter(p => p.id_produto !== id);
+                    continue;
+                }
+                if (evento.op === 'I') {
+                    // A posição de um produto novo depende dos filtros e da ordenação: relê a primeira página.
+                    this.scheduleCatalogRefresh();
+                    continue;
+                }
+                const produto = this.produtos.find(p => p.id_produto === id);
+                if (produto) {
+                    produto.quantidade_estoque = estoque;
+                    produto.preco = Number(preco);
+                    if (detalhes) this.refreshProduct(produto);
+                }
+                const itemCarrinho = this.cart.find(item => item.id_produto === id);
+                if (itemCarrinho) {
+                    itemCarrinho.quantidade_estoque = estoque;
+                    itemCarrinho.preco = Number(preco);
+                }
+            }
+        },
+        async refreshProduct(produto) {
+            try {
+                const response = await fetch(`${this.apiUrl}/${produto.id_produto}`);
+                if (response.ok) Object.assign(produto, await response.json());
+            } catch (error) {
+                console.error('Erro ao atualizar produto:', error);
+            }
+        },
+        scheduleCatalogRefresh() {
+            // Agrupa vários eventos seguidos em uma única releitura.
+            clearTimeout(this.catalogRefreshTimer);
+            this.catalogRefreshTimer = setTimeout(() => this.refetchCatalog(), 500);
+        },
+
+        categoryLabel(categoria) {
+            const faceta = this.categoryFacets.find(f => f.categoria === categoria);
+            return faceta ? `${categoria} (${faceta.total})` : categoria;
+        },
+
         async fetchProdutos() {
             this.loading = true;
             this.error = null;
+            this.catalogMode = true;
             try {
-                const response = await fetch(this.apiUrl);
+                const response = await fetch(this.buildCatalogUrl());
                 if (!response.ok) throw new Error('Falha ao buscar os tesouros. O Den Den Mushi pode estar fora de alcance!');
-                this.produtos = await response.json();
+                const pagina = await response.json();
+                this.produtos = pagina.produtos;
+                this.nextCursor = pagina.proximo_cursor;
+                if (pagina.facetas) this.categoryFacets = pagina.facetas.categorias;
             } catch (error) {
                 console.error('Erro:', error);
                 this.error = error.message;
@@ -285,6 +418,24 @@ createApp({
             }
         },
 
+        // Busca a próxima página do catálogo e acrescenta ao final da lista.
+        async loadMoreProdutos() {
+            if (!this.nextCursor || this.loadingMore) return;
+            this.loadingMore = true;
+            try {
+                const response = await fetch(this.buildCatalogUrl(this.nextCursor));
+                if (!response.ok) throw new Error('Falha ao buscar mais tesouros.');
+                const pagina = await response.json();
+                this.produtos.push(...pagina.produtos);
+                this.nextCursor = pagina.proximo_cursor;
+            } catch (error) {
+                console.error('Erro:', error);
+                alert(error.message);
+            } finally {
+                this.loadingMore = false;
+            }
+        },
+
         openAddModal() {
             this.isEditMode = false;
             this.currentProduct = {
@@ -371,7 +522,8 @@ createApp({
                     throw new Error(data.message || 'Falha ao salvar o produto.');
                 }
                 
-                await this.fetchProdutos();
+                // Com o feed conectado, a alteração chega por ele; sem feed, relê a lista.
+                if (!this.feedConectado) await this.fetchProdutos();
                 this.closeModal();
             } catch (error) {
                 console.error('Erro ao salvar produto:', error);
@@ -390,7 +542,7 @@ createApp({
                         const data = await response.json();
                         throw new Error(data.message || 'Falha ao deletar produto.');
                     }
-                    await this.fetchProdutos();
+                    if (!this.feedConectado) await this.fetchProdutos();
                 } catch (error) {
                     console.error('Erro ao deletar produto:', error);
                     alert(error.message);
@@ -405,6 +557,7 @@ createApp({
             }
             this.loading = true;
             this.error = null;
+            this.catalogMode = false;
             try {
                 const response = await fetch(`/api/produtos/buscar?nome=${encodeURIComponent(this.searchTerm)}`);
                 if (!response.ok) throw new Error('Falha na busca!');
@@ -417,6 +570,28 @@ createApp({
             }
         },
 
+        // Espera uma pausa curta na digitação antes de pedir sugestões, para não
+        // disparar uma requisição a cada tecla.
+        scheduleSuggestions() {
+            clearTimeout(this.suggestTimer);
+            this.suggestTimer = setTimeout(this.fetchSuggestions, 150);
+        },
+
+        async fetchSuggestions() {
+            const termo = this.searchTerm.trim();
+            if (!termo) {
+                this.suggestions = [];
+                return;
+            }
+            try {
+                const response = await fetch(`/api/produtos/autocomplete?q=${encodeURIComponent(termo)}`);
+                if (!response.ok) return;
+                this.suggestions = await response.json();
+            } catch (error) {
+                console.error('Erro no autocomplete:', error);
+            }
+        },
+
         async fetchReport() {
             try {
                 const response = await fetch('/api/produtos/relatorio');
@@ -495,7 +670,8 @@ createApp({
                 alert(`Pedido #${result.id_pedido} realizado com sucesso!`);
                 this.cart = []; // Limpa o carrinho
                 this.closeCartModal();
-                await this.fetchProdutos(); // Atualiza a lista de produtos para refletir o novo estoque
+                // O novo estoque chega pelo feed; sem ele, relê a lista.
+                if (!this.feedConectado) await this.fetchProdutos();
 
             } catch (error) {
                 console.error("Erro no checkout:", error);
@@ -530,22 +706,49 @@ createApp({
         closeHistoryModal() {
             this.showHistoryModal = false;
         },
+        // O histórico vem paginado e já com os itens de cada pedido (detalhes=1)
+        buildHistoryUrl(cursor) {
+            const params = new URLSearchParams({ detalhes: '1', limite: '20' });
+            if (cursor) params.set('cursor', cursor);
+            return `/api/pedidos/historico?${params.toString()}`;
+        },
         async fetchOrderHistory() {
             try {
-                const response = await fetch('/api/pedidos/historico', {
+                const response = await fetch(this.buildHistoryUrl(null), {
                     headers: this.getAuthHeaders()
                 });
                 if (!response.ok) throw new Error('Falha ao buscar histórico de pedidos.');
-                this.orderHistory = await response.json();
+                const pagina = await response.json();
+                this.orderHistory = pagina.pedidos;
+                this.historyCursor = pagina.proximo_cursor;
             } catch (error) {
                 console.error('Erro:', error);
                 alert(error.message);
             }
         },
+        async loadMoreHistory() {
+            if (!this.historyCursor || this.loadingMoreHistory) return;
+            this.loadingMoreHistory = true;
+            try {
+                const response = await fetch(this.buildHistoryUrl(this.historyCursor), {
+                    headers: this.getAuthHeaders()
+                });
+                if (!response.ok) throw new Error('Falha ao buscar mais pedidos.');
+                const pagina = await response.json();
+                this.orderHistory.push(...pagina.pedidos);
+                this.historyCursor = pagina.proximo_cursor;
+            } catch (error) {
+                console.error('Erro:', error);
+                alert(error.message);
+            } finally {
+                this.loadingMoreHistory = false;
+            }
+        },
 
         async fetchEstoqueBaixo() {
             this.loading = true;
             this.error = null;
+            this.catalogMode = false;
             try {
                 const response = await fetch('/api/produtos/estoque-baixo', {
                     headers: this.getAuthHeaders() // Usa o token para autenticação
@@ -0,0 +1,248 @@
+# --- Venda relâmpago: confirmação de pedidos em lote e liberação de reservas ---
+# Com a venda relâmpago aberta para um produto (ver "Venda relâmpago" no init.sql), o
+# carrinho reserva o estoque por um tempo limitado e o checkout só confirma a reserva.
+# A confirmação não roda na thread da requisição: ela entra em uma fila e uma única
+# thread por processo grava os pedidos que chegaram juntos em uma só transação
+# (group commit), com uma trava e uma baixa de estoque por produto para o lote
+# inteiro. Cada requisição espera o resultado do seu pedido.
+# Outra thread devolve às fatias de estoque as unidades das reservas vencidas.
+import asyncio  # Espera pelo resultado no servidor assíncrono, sem ocupar o loop
+import queue  # Fila entre as requisições e a thread de confirmação
+import threading  # Threads de confirmação/liberação e proteção dos contadores
+import time  # Espera por mais pedidos, intervalos e medição dos lotes
+
+import psycopg2
+
+SQL_LIBERAR_EXPIRADAS = "SELECT liberar_reservas_expiradas();"
+
+TEMPO_ESGOTADO = {"status": "erro", "mensagem": "Tempo esgotado aguardando a confirmação. O pedido não foi gravado.",
+                  "tempo_esgotado": True}
+FALHA_INESPERADA = {"status": "erro", "mensagem": "Não foi possível confirmar o pedido."}
+
+
+class FilaDePedidosCheiaError(Exception):
+    """Lançada quando a fila de confirmação atingiu a capacidade."""
+
+
+class _PedidoNaFila:
+    __slots__ = ('pedido', 'evento', 'futuro', 'loop', 'resultado', 'no_lote', 'desistiu')
+
+    def __init__(self, pedido, futuro=None, loop=None):
+        self.pedido = pedido
+        self.evento = threading.Event() if futuro is None else None
+        self.futuro = futuro
+        self.loop = loop
+        self.resultado = None
+        self.no_lote = False  # Já saiu da fila para um lote: o resultado vem com o fim da transação
+        self.desistiu = False  # Tempo esgotado ainda na fila: a thread descarta o pedido
+
+    def entregar(self, resultado):
+        if self.futuro is not None:
+            self.loop.call_soon_threadsafe(self._definir_futuro, resultado)
+        else:
+            self.resultado = resultado
+            self.evento.set()
+
+    def _definir_futuro(self, resultado):
+        if not self.futuro.done():
+            self.futuro.set_result(resultado)
+
+
+class FilaDePedidos:
+    def __init__(self, confirmar_lote, lote_maximo=200, espera=0.002, capacidade=10000, timeout=10.0):
+        # confirmar_lote(pedidos) grava a lista em uma transação e devolve um resultado
+        # por pedido, na mesma ordem; se a transação inteira falhar, devolve um único
+        # resultado de erro e a fila confirma os pedidos daquele lote um a um.
+        self.confirmar_lote = confirmar_lote
+        self.lote_maximo = lote_maximo
+        self.espera = espera  # Quanto o lote espera por mais pedidos depois do primeiro
+        self.capacidade = capacidade
+        self.timeout = timeout  # Espera máxima de um pedido na fila (não conta a gravação do lote)
+
+        self._fila = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+        # Contadores expostos em estatisticas()
+        self._confirmados = 0
+        self._recusados = 0
+        self._lotes = 0
+        self._lotes_divididos = 0
+        self._maior_lote = 0
+        self._fila_cheia = 0
+        self._tempo_esgotado = 0
+        self._segundos_gravando = 0.0
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._trabalhar, name='fila-pedidos', daemon=True)
+            self._thread.start()
+
+    def _enfileirar(self, item):
+        self.iniciar()
+        if self._fila.qsize() >= self.capacidade:
+            with self._lock:
+                self._fila_cheia += 1
+            raise FilaDePedidosCheiaError(f"Fila de confirmação cheia ({self.capacidade} pedidos).")
+        self._fila.put(item)
+
+    def _desistir(self, item):
+        # True se o pedido ainda não tinha entrado em um lote (e agora não entra mais).
+        with self._lock:
+            if item.no_lote:
+                return False
+            item.desistiu = True
+            self._tempo_esgotado += 1
+            return True
+
+    def confirmar(self, pedido):
+        """Enfileira o pedido e espera o resultado dele ({"status": ..., ...})."""
+        item = _PedidoNaFila(pedido)
+        self._enfileirar(item)
+        if not item.evento.wait(self.timeout) and self._desistir(item):
+            return dict(TEMPO_ESGOTADO)
+        item.evento.wait()
+        return item.resultado
+
+    async def confirmar_async(self, pedido):
+        """Como confirmar(), para o servidor assíncrono: espera sem bloquear o loop."""
+        loop = asyncio.get_running_loop()
+        item = _PedidoNaFila(pedido, loop.create_future(), loop)
+        self._enfileirar(item)
+        try:
+            return await asyncio.wait_for(asyncio.shield(item.futuro), self.timeout)
+        except asyncio.TimeoutError:
+            if self._desistir(item):
+                return dict(TEMPO_ESGOTADO)
+            return await item.futuro
+
+    def _proximo_lote(self):
+        lote = [self._fila.get()]
+        prazo = time.monotonic() + self.espera
+        while len(lote) < self.lote_maximo:
+            restante = prazo - time.monotonic()
+            try:
+                lote.append(self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            lote = [item for item in lote if not item.desistiu]
+            for item in lote:
+                item.no_lote = True
+        return lote
+
+    def _trabalhar(self):
+        while True:
+            lote = self._proximo_lote()
+            if lote:
+                self._gravar(lote)
+
+    def _gravar(self, lote):
+        inicio = time.perf_counter()
+        try:
+            resultados = self.confirmar_lote([item.pedido for item in lote])
+        except Exception as e:
+            print(f"Erro inesperado ao confirmar lote de pedidos: {e}")
+            resultados = dict(FALHA_INESPERADA)
+        if isinstance(resultados, dict) and len(lote) > 1:
+            # Um pedido problemático derrubou a transação: cada um volta sozinho,
+            # e só ele recebe o erro.
+            with self._lock:
+                self._lotes_divididos += 1
+            for item in lote:
+                self._gravar([item])
+            return
+        if isinstance(resultados, dict):
+            resultados = [resultados]
+        for item, resultado in zip(lote, resultados):
+            item.entregar(resultado)
+        confirmados = sum(1 for r in resultados if r.get('status') == 'sucesso')
+        with self._lock:
+            self._lotes += 1
+            self._maior_lote = max(self._maior_lote, len(lote))
+            self._confirmados += confirmados
+            self._recusados += len(resultados) - confirmados
+            self._segundos_gravando += time.perf_counter() - inicio
+
+    def estatisticas(self):
+        with self._lock:
+            pedidos = self._confirmados + self._recusados
+            return {
+                'lote_maximo': self.lote_maximo,
+                'capacidade': self.capacidade,
+                'na_fila': self._fila.qsize(),
+                'pedidos_confirmados': self._confirmados,
+                'pedidos_recusados': self._recusados,
+                'lotes': self._lotes,
+                'lotes_divididos': self._lotes_divididos,
+                'maior_lote': self._maior_lote,
+                'media_por_lote': round(pedidos / self._lotes, 1) if self._lotes else 0.0,
+                'ms_medio_por_lote': round(self._segundos_gravando * 1000 / self._lotes, 2) if self._lotes else 0.0,
+                'recusados_fila_cheia': self._fila_cheia,
+                'tempo_esgotado': self._tempo_esgotado,
+            }
+
+
+class LiberadorDeReservas:
+    def __init__(self, db_config, intervalo=5.0):
+        self.db_config = db_config
+        self.intervalo = intervalo  # 0 = sem thread (as reservas vencidas só voltam com a próxima rodada manual)
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._conn = None
+
+        self._rodadas = 0
+        self._falhas = 0
+        self._unidades = 0
+        self._ultimo_erro = None
+
+    def executar(self):
+        """Uma rodada de liberação; devolve as unidades devolvidas às fatias."""
+        if self._conn is None or self._conn.closed:
+            self._conn = psycopg2.connect(**self.db_config)
+            self._conn.autocommit = True
+        try:
+            with self._conn.cursor() as cursor:
+                cursor.execute(SQL_LIBERAR_EXPIRADAS)
+                unidades = cursor.fetchone()[0]
+        except Exception:
+            self._conn.close()  # Reconecta na próxima rodada
+            raise
+        with self._lock:
+            self._rodadas += 1
+            self._unidades += unidades
+        return unidades
+
+    def iniciar(self):
+        """Inicia a thread de liberação (uma vez por processo; sem efeito com intervalo 0)."""
+        if self.intervalo <= 0:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._liberar, name='reservas-estoque', daemon=True)
+            self._thread.start()
+
+    def _liberar(self):
+        while True:
+            try:
+                self.executar()
+            except Exception as e:
+                with self._lock:
+                    self._falhas += 1
+                    self._ultimo_erro = str(e)
+                print(f"Erro ao liberar reservas de estoque vencidas: {e}")
+            time.sleep(self.intervalo)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'intervalo_s': self.intervalo,
+                'rodadas': self._rodadas,
+                'falhas': self._falhas,
+                'unidades_liberadas': self._unidades,
+                'ultimo_erro': self._ultimo_erro,
+            }
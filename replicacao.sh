@@ -0,0 +1,6 @@
+#!/bin/bash
+# Executado pelo contêiner do PostgreSQL só na criação do banco (como o init.sql):
+# libera conexões de replicação vindas de outros contêineres (a réplica do perfil
+# "replicas" do docker-compose.yml), com a mesma senha dos demais acessos.
+set -e
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"